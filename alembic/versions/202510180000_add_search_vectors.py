@@ -0,0 +1,100 @@
+"""Add full-text search vectors for templates and documents
+
+Revision ID: 202510180000
+Revises: 20250915075842
+Create Date: 2025-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+# revision identifiers, used by Alembic.
+revision = '202510180000'
+down_revision = '20250915075842'
+branch_labels = None
+depends_on = None
+
+
+# Field weights: A = name/title, B = description/keywords, C = tags/content
+TEMPLATE_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}keywords, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce({row}tags::text, '')), 'C')
+"""
+
+# Content is capped so very large documents stay under the tsvector size limit
+DOCUMENT_VECTOR = """
+    setweight(to_tsvector('english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce({row}description, '')), 'B') ||
+    setweight(to_tsvector('english', left(coalesce({row}content, ''), 200000)), 'C')
+"""
+
+
+def upgrade():
+    """Maintained tsvector columns with GIN indexes, plus trigram matching on template names"""
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # The old text column was never populated
+    op.execute("ALTER TABLE templates DROP COLUMN IF EXISTS search_vector")
+    op.add_column('templates', sa.Column('search_vector', TSVECTOR(), nullable=True))
+    op.add_column('documents', sa.Column('search_vector', TSVECTOR(), nullable=True))
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION templates_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {TEMPLATE_VECTOR.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER templates_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF name, description, keywords, tags ON templates
+        FOR EACH ROW EXECUTE FUNCTION templates_search_vector_update()
+    """)
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION documents_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {DOCUMENT_VECTOR.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER documents_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, description, content ON documents
+        FOR EACH ROW EXECUTE FUNCTION documents_search_vector_update()
+    """)
+
+    # Backfill existing rows
+    op.execute(f"UPDATE templates SET search_vector = {TEMPLATE_VECTOR.format(row='')}")
+    op.execute(f"UPDATE documents SET search_vector = {DOCUMENT_VECTOR.format(row='')}")
+
+    op.create_index('ix_templates_search_vector', 'templates', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_documents_search_vector', 'documents', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_templates_name_trgm', 'templates', ['name'],
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade():
+    """Remove full-text search vectors"""
+
+    op.drop_index('ix_templates_name_trgm', table_name='templates')
+    op.drop_index('ix_documents_search_vector', table_name='documents')
+    op.drop_index('ix_templates_search_vector', table_name='templates')
+
+    op.execute("DROP TRIGGER IF EXISTS documents_search_vector_trigger ON documents")
+    op.execute("DROP FUNCTION IF EXISTS documents_search_vector_update()")
+    op.execute("DROP TRIGGER IF EXISTS templates_search_vector_trigger ON templates")
+    op.execute("DROP FUNCTION IF EXISTS templates_search_vector_update()")
+
+    op.drop_column('documents', 'search_vector')
+    op.drop_column('templates', 'search_vector')
+    op.add_column('templates', sa.Column('search_vector', sa.Text(), nullable=True))
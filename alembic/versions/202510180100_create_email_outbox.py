@@ -0,0 +1,54 @@
+"""Create email outbox table
+
+Revision ID: 202510180100
+Revises: 202510180000
+Create Date: 2025-10-18 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202510180100'
+down_revision = '202510180000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the email_outbox table drained by the email dispatcher"""
+    op.create_table('email_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+
+        # Message
+        sa.Column('to_email', sa.String(255), nullable=False),
+        sa.Column('from_email', sa.String(255), nullable=True),
+        sa.Column('subject', sa.String(500), nullable=False),
+        sa.Column('template_name', sa.String(100), nullable=False),
+        sa.Column('template_data', sa.JSON(), nullable=True),
+        sa.Column('attachments', sa.JSON(), nullable=True),
+        sa.Column('priority', sa.String(20), nullable=False, server_default='normal'),
+
+        # Delivery state
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('available_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('provider_used', sa.String(50), nullable=True),
+        sa.Column('message_id', sa.String(255), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('sent_at', sa.DateTime(), nullable=True)
+    )
+
+    op.create_index('ix_email_outbox_id', 'email_outbox', ['id'])
+    op.create_index('ix_email_outbox_due', 'email_outbox', ['status', 'available_at'])
+
+
+def downgrade():
+    """Drop the email_outbox table"""
+    op.drop_index('ix_email_outbox_due', table_name='email_outbox')
+    op.drop_index('ix_email_outbox_id', table_name='email_outbox')
+    op.drop_table('email_outbox')
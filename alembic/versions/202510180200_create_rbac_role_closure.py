@@ -0,0 +1,49 @@
+"""Create RBAC role closure table and backfill it from role_hierarchy
+
+Revision ID: 202510180200
+Revises: 202510180100
+Create Date: 2025-10-18 02:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202510180200'
+down_revision = '202510180100'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create rbac_role_closure and fill it with every (role, ancestor) pair"""
+    op.create_table('rbac_role_closure',
+        sa.Column('role_id', sa.Integer(), sa.ForeignKey('rbac_roles.id'), primary_key=True),
+        sa.Column('ancestor_role_id', sa.Integer(), sa.ForeignKey('rbac_roles.id'), primary_key=True),
+        sa.Column('depth', sa.Integer(), nullable=False)
+    )
+    op.create_index('ix_rbac_role_closure_ancestor_role_id', 'rbac_role_closure', ['ancestor_role_id'])
+
+    # Shortest distance to each ancestor; the depth bound stops hierarchy cycles
+    op.execute("""
+        WITH RECURSIVE closure (role_id, ancestor_role_id, depth) AS (
+            SELECT child_role_id, parent_role_id, 1 FROM role_hierarchy
+            UNION
+            SELECT closure.role_id, role_hierarchy.parent_role_id, closure.depth + 1
+            FROM closure
+            JOIN role_hierarchy ON role_hierarchy.child_role_id = closure.ancestor_role_id
+            WHERE closure.depth < 32
+        )
+        INSERT INTO rbac_role_closure (role_id, ancestor_role_id, depth)
+        SELECT role_id, ancestor_role_id, MIN(depth)
+        FROM closure
+        WHERE role_id <> ancestor_role_id
+        GROUP BY role_id, ancestor_role_id
+    """)
+
+
+def downgrade():
+    """Drop the rbac_role_closure table"""
+    op.drop_index('ix_rbac_role_closure_ancestor_role_id', table_name='rbac_role_closure')
+    op.drop_table('rbac_role_closure')
@@ -0,0 +1,35 @@
+"""Make campaign executions unique per campaign and user
+
+Revision ID: 202510180300
+Revises: 202510180200
+Create Date: 2025-10-18 03:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '202510180300'
+down_revision = '202510180200'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Drop duplicate executions left by concurrent runs, then forbid them"""
+    op.execute("""
+        DELETE FROM campaign_executions duplicate
+        USING campaign_executions original
+        WHERE duplicate.campaign_id = original.campaign_id
+          AND duplicate.user_id = original.user_id
+          AND duplicate.id > original.id
+    """)
+    op.create_unique_constraint(
+        'uq_campaign_executions_campaign_user', 'campaign_executions', ['campaign_id', 'user_id']
+    )
+
+
+def downgrade():
+    """Allow duplicate executions again"""
+    op.drop_constraint('uq_campaign_executions_campaign_user', 'campaign_executions', type_='unique')
@@ -11,6 +11,7 @@ import redis.asyncio as aioredis
 
 from config import settings
 from app.services.audit_service import AuditService
+from app.utils.pattern_matcher import REQUEST_INJECTION, SCANNER_AGENTS
 
 
 class AdvancedSecurityMiddleware(BaseHTTPMiddleware):
@@ -18,19 +19,8 @@ class AdvancedSecurityMiddleware(BaseHTTPMiddleware):
     
     def __init__(self, app):
         super().__init__(app)
-        self.suspicious_patterns = {
-            # SQL injection patterns
-            r"(?i)(union\s+select|drop\s+table|insert\s+into|delete\s+from)",
-            # XSS patterns
-            r"(?i)(<script|javascript:|on\w+\s*=)",
-            # Path traversal
-            r"(\.\./|\.\.\\|%2e%2e)",
-            # Command injection
-            r"(?i)(;|\||&|\$\(|\`|nc\s+|wget\s+|curl\s+)"
-        }
-        self.blocked_user_agents = {
-            "sqlmap", "nikto", "dirbuster", "burpsuite", "nessus"
-        }
+        self.suspicious_patterns = REQUEST_INJECTION
+        self.blocked_user_agents = SCANNER_AGENTS
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Security checks
@@ -49,31 +39,29 @@ class AdvancedSecurityMiddleware(BaseHTTPMiddleware):
     
     async def _check_suspicious_patterns(self, request: Request):
         """Check for suspicious request patterns"""
-        import re
         
         # Check URL path
         path = str(request.url.path)
         query = str(request.url.query) if request.url.query else ""
         
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, path + query):
-                await self._log_security_incident(request, "suspicious_pattern", {"pattern": pattern})
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Malicious request detected"
-                )
+        rule = self.suspicious_patterns.search(path + query)
+        if rule:
+            await self._log_security_incident(request, "suspicious_pattern", {"pattern": rule})
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Malicious request detected"
+            )
     
     async def _check_user_agent(self, request: Request):
         """Check for malicious user agents"""
         user_agent = request.headers.get("user-agent", "").lower()
         
-        for blocked_agent in self.blocked_user_agents:
-            if blocked_agent in user_agent:
-                await self._log_security_incident(request, "blocked_user_agent", {"user_agent": user_agent})
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Access denied"
-                )
+        if self.blocked_user_agents.search(user_agent):
+            await self._log_security_incident(request, "blocked_user_agent", {"user_agent": user_agent})
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Access denied"
+            )
     
     async def _check_request_size(self, request: Request):
         """Check request size limits"""
@@ -2,6 +2,10 @@
 Authentication middleware
 """
 
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
 from jose import jwt
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -10,8 +14,57 @@ from sqlalchemy.orm import Session
 
 from config import settings
 from database import SessionLocal, get_db
-from app.models.user import User
+from app.models.user import User, UserRole, UserStatus
 from app.services.auth_service import AuthService
+from app.services.cache_service import UserCache
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable snapshot of the authenticated user attached to request.state"""
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    status: UserStatus
+    is_active: bool
+    email_verified: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            status=user.status,
+            is_active=user.is_active,
+            email_verified=bool(user.email_verified)
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Principal":
+        return cls(**{**data, "role": UserRole(data["role"]), "status": UserStatus(data["status"])})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "role": self.role.value, "status": self.status.value}
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+    @property
+    def is_moderator(self) -> bool:
+        return self.role in [UserRole.MODERATOR, UserRole.ADMIN]
+
+    @property
+    def is_verified(self) -> bool:
+        return self.email_verified
+
+
+def _token_id(token: str, payload: Dict[str, Any]) -> str:
+    """Token identifier for the principal cache; tokens without a jti use their hash"""
+    return payload.get("jti") or hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -81,22 +134,18 @@ class AuthMiddleware(BaseHTTPMiddleware):
                     headers={"WWW-Authenticate": "Bearer"}
                 )
             
-            # Load user from database
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == int(user_id)).first()
-                if not user or not user.is_active:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="User not found or inactive",
-                        headers={"WWW-Authenticate": "Bearer"}
-                    )
-                
-                # Add user to request state
-                request.state.current_user = user
-                request.state.token_payload = payload
-            finally:
-                db.close()
+            # Cached principal first, database only on a miss
+            principal = await self._load_principal(int(user_id), _token_id(token, payload))
+            if principal is None or not principal.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="User not found or inactive",
+                    headers={"WWW-Authenticate": "Bearer"}
+                )
+            
+            # Add user to request state
+            request.state.current_user = principal
+            request.state.token_payload = payload
         
         except ValueError:
             raise HTTPException(
@@ -114,6 +163,27 @@ class AuthMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
     
+    async def _load_principal(self, user_id: int, token_id: str) -> Optional[Principal]:
+        """Get the user snapshot from the principal cache, loading it on a miss"""
+        
+        cached = await UserCache.get_principal(user_id, token_id)
+        if cached is not None:
+            return Principal.from_dict(cached)
+        
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                return None
+            principal = Principal.from_user(user)
+        finally:
+            db.close()
+        
+        # Only active users are cached; a deactivation invalidates the entry
+        if principal.is_active:
+            await UserCache.cache_principal(user_id, token_id, principal.to_dict())
+        return principal
+    
     def _is_public_route(self, path: str) -> bool:
         """Check if route is public"""
         
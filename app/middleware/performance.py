@@ -3,11 +3,25 @@ Performance monitoring and optimization middleware
 """
 
 import time
+import zlib
 import asyncio
-from typing import Callable, Dict, Any
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Optional, Tuple
 from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from app.services.audit_service import AuditService
 
 
@@ -52,58 +66,207 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
         return response
 
 
-class CompressionMiddleware(BaseHTTPMiddleware):
-    """Advanced response compression"""
-    
-    def __init__(self, app, minimum_size: int = 1024, compression_level: int = 6):
-        super().__init__(app)
+class _Encoder:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+        else:
+            # wbits=31 selects the gzip container
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything compressed so far without ending the stream"""
+        if self.encoding == "zstd":
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Streaming response compression.
+
+    Implemented at the ASGI level so bodies are compressed chunk by chunk as
+    they are sent instead of being buffered; each chunk is flushed, so a
+    streamed response reaches the client as it is produced. The encoding is negotiated from
+    Accept-Encoding (zstd, br, then gzip; zstd and br only when their
+    libraries are installed). Already-compressed media types, event streams
+    and responses that already carry a Content-Encoding pass through
+    untouched. Compressed variants of complete responses on
+    `precompressed_paths` are cached by body hash, so static JSON is only
+    compressed once per change.
+    """
+
+    SKIP_MEDIA_TYPES = {
+        "application/zip",
+        "application/gzip",
+        "application/x-gzip",
+        "application/pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        "application/octet-stream",
+        "image/png",
+        "image/jpeg",
+        "image/gif",
+        "image/webp",
+        "text/event-stream",
+    }
+    SKIP_MEDIA_PREFIXES = ("audio/", "video/")
+
+    def __init__(self, app, minimum_size: int = 1024, compression_level: int = 6,
+                 precompressed_paths: Tuple[str, ...] = ("/api/templates/categories",),
+                 precompressed_cache_size: int = 256):
+        self.app = app
         self.minimum_size = minimum_size
         self.compression_level = compression_level
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
-        
-        # Check if compression is beneficial
-        accept_encoding = request.headers.get("accept-encoding", "")
-        if "gzip" not in accept_encoding:
-            return response
-        
-        # Get response body
-        body = b""
-        async for chunk in response.body_iterator:
-            body += chunk
-        
-        # Compress if beneficial
-        if len(body) >= self.minimum_size:
-            try:
-                import gzip
-                compressed_body = gzip.compress(body, compresslevel=self.compression_level)
-                
-                # Only use compression if it actually reduces size
-                if len(compressed_body) < len(body):
-                    response.headers["content-encoding"] = "gzip"
-                    response.headers["content-length"] = str(len(compressed_body))
-                    
-                    # Create new response with compressed body
-                    from fastapi.responses import Response as FastAPIResponse
-                    return FastAPIResponse(
-                        content=compressed_body,
-                        status_code=response.status_code,
-                        headers=dict(response.headers),
-                        media_type=response.media_type
-                    )
-            except Exception:
-                # Fall back to uncompressed if compression fails
-                pass
-        
-        # Return original response
-        from fastapi.responses import Response as FastAPIResponse
-        return FastAPIResponse(
-            content=body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type
-        )
+        self.precompressed_paths = set(precompressed_paths)
+        self.precompressed_cache_size = precompressed_cache_size
+        self._precompressed: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+
+        self.encodings = ["gzip"]
+        if brotli is not None:
+            self.encodings.insert(0, "br")
+        if zstandard is not None:
+            self.encodings.insert(0, "zstd")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressionResponder(self, scope["path"], encoding, send).send)
+
+    def select_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Pick the preferred supported encoding the client accepts"""
+        accepted: Dict[str, float] = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if name:
+                accepted[name.strip().lower()] = quality
+
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if quality > 0:
+                return encoding
+        return None
+
+    def should_skip(self, headers: Headers, status: int) -> bool:
+        if status < 200 or status in (204, 206, 304):
+            return True
+        if "content-encoding" in headers or "content-range" in headers:
+            return True
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return media_type in self.SKIP_MEDIA_TYPES or media_type.startswith(self.SKIP_MEDIA_PREFIXES)
+
+    def compress_complete(self, path: str, encoding: str, body: bytes, status: int) -> bytes:
+        """Compress a complete body, reusing the cached variant for precompressed paths"""
+        if status != 200 or path not in self.precompressed_paths:
+            encoder = _Encoder(encoding, self.compression_level)
+            return encoder.compress(body) + encoder.finish()
+
+        key = (path, encoding, hashlib.sha1(body).hexdigest())
+        compressed = self._precompressed.get(key)
+        if compressed is not None:
+            self._precompressed.move_to_end(key)
+            return compressed
+
+        encoder = _Encoder(encoding, self.compression_level)
+        compressed = encoder.compress(body) + encoder.finish()
+        self._precompressed[key] = compressed
+        while len(self._precompressed) > self.precompressed_cache_size:
+            self._precompressed.popitem(last=False)
+        return compressed
+
+
+class _CompressionResponder:
+    """Wraps `send` for one response, compressing body messages as they pass"""
+
+    def __init__(self, middleware: CompressionMiddleware, path: str, encoding: str, send):
+        self.middleware = middleware
+        self.path = path
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    async def send(self, message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            headers = MutableHeaders(scope=self.start_message)
+            status = self.start_message["status"]
+
+            if self.middleware.should_skip(headers, status) or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if not more_body:
+                # Whole body in one message: compress in one shot with an exact length
+                compressed = self.middleware.compress_complete(self.path, self.encoding, body, status)
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+
+            # Streamed body: length unknown up front, so send it chunked
+            del headers["Content-Length"]
+            self.encoder = _Encoder(self.encoding, self.middleware.compression_level)
+            await self._send(self.start_message)
+
+        if not body and more_body:
+            return
+        chunk = self.encoder.compress(body)
+        chunk += self.encoder.flush() if more_body else self.encoder.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
 
 
 class ConnectionPoolMonitor:
@@ -1,23 +1,107 @@
 """
 Rate limiting middleware
+
+Limits are enforced with GCRA (generic cell rate algorithm) in a single
+Lua script: one key per client and category holding the theoretical arrival
+time, updated atomically, with allowed/remaining/reset returned in the same
+round trip. Every client reserves a small batch of tokens from Redis and
+spends it locally, growing the batch with its request rate, so under-limit
+traffic mostly skips Redis. Tokens a lease did not spend are handed back on
+the next reservation, so reserving ahead never costs a bursty client budget.
 """
 
+import math
 import time
-import json
-from typing import Dict, Any
-from fastapi import Request, HTTPException, status
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-import redis
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] = tat key; ARGV = limit, window_ms, requested tokens, unspent tokens to return
+# Returns the unspent tokens, grants up to the requested tokens that fit and
+# returns {granted, remaining, reset_ms, retry_after_ms}
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local returned = tonumber(ARGV[4]) or 0
+local interval = window / limit
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local tat = (tonumber(redis.call('GET', KEYS[1])) or now) - returned * interval
+if tat < now then
+    tat = now
+end
+
+local available = math.floor((now + window - tat) / interval)
+if available < 1 then
+    if returned > 0 then
+        redis.call('SET', KEYS[1], math.ceil(tat), 'PX', math.ceil(tat - now))
+    end
+    local retry_after = math.ceil(tat + interval - window - now)
+    return {0, 0, math.ceil(tat - now), retry_after}
+end
+
+-- Close to the limit, hand out single tokens so no worker sits on the last ones
+if available < requested * 2 then
+    requested = 1
+end
+
+local granted = math.min(requested, available)
+local new_tat = tat + granted * interval
+redis.call('SET', KEYS[1], math.ceil(new_tat), 'PX', math.ceil(new_tat - now))
+return {granted, available - granted, math.ceil(new_tat - now), 0}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_time: int  # epoch seconds when the client is fully replenished
+    retry_after: int = 0  # seconds
+
+
+@dataclass
+class _Lease:
+    """Tokens reserved from Redis and spent locally by one worker"""
+    tokens: int
+    remaining: int
+    reset_time: int
+    expires_at: float
+    fetched_at: float
+    demand: int = 0
+
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """Rate limiting middleware using Redis"""
     
-    def __init__(self, app, redis_client: redis.Redis):
+    # Reserved tokens are spent locally for at most this many seconds
+    LEASE_TTL = 5.0
+    # A lease reserves between these shares of a limit, depending on demand
+    MIN_LEASE_FRACTION = 0.02
+    MAX_LEASE_FRACTION = 0.05
+    MAX_LEASES = 10000
+    
+    def __init__(self, app, redis_client: Optional[aioredis.Redis] = None):
         super().__init__(app)
         self.redis_client = redis_client
+        self._script = redis_client.register_script(GCRA_SCRIPT) if redis_client is not None else None
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
         
         # Rate limit configurations
         self.rate_limits = {
@@ -37,13 +121,16 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         category = self._get_rate_limit_category(request.url.path)
         
         # Check rate limit
-        if not self._check_rate_limit(client_id, category):
-            raise HTTPException(
+        result = await self._check_rate_limit(client_id, category)
+        if not result.allowed:
+            return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later.",
+                content={"detail": "Rate limit exceeded. Please try again later."},
                 headers={
-                    "Retry-After": str(self.rate_limits[category]["window"]),
-                    "X-RateLimit-Limit": str(self.rate_limits[category]["requests"]),
+                    "Retry-After": str(result.retry_after),
+                    "X-RateLimit-Limit": str(result.limit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": str(result.reset_time),
                     "X-RateLimit-Window": str(self.rate_limits[category]["window"])
                 }
             )
@@ -52,10 +139,9 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         
         # Add rate limit headers
-        remaining, reset_time = self._get_rate_limit_info(client_id, category)
-        response.headers["X-RateLimit-Limit"] = str(self.rate_limits[category]["requests"])
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(reset_time)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+        response.headers["X-RateLimit-Reset"] = str(result.reset_time)
         
         return response
     
@@ -89,103 +175,117 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         else:
             return "default"
     
-    def _check_rate_limit(self, client_id: str, category: str) -> bool:
-        """Check if client is within rate limit"""
+    async def _check_rate_limit(self, client_id: str, category: str) -> RateLimitResult:
+        """Check if client is within rate limit, spending a local lease when possible"""
         
         config = self.rate_limits[category]
         key = f"rate_limit:{category}:{client_id}"
+        now = time.monotonic()
         
-        try:
-            # Get current count
-            current_count = self.redis_client.get(key)
-            
-            if current_count is None:
-                # First request in window
-                self.redis_client.setex(key, config["window"], 1)
-                return True
-            
-            current_count = int(current_count)
-            
-            if current_count >= config["requests"]:
-                return False
-            
-            # Increment count
-            self.redis_client.incr(key)
-            return True
-        
-        except redis.RedisError:
-            # If Redis is down, allow request but log error
-            print("Redis error in rate limiting - allowing request")
-            return True
-    
-    def _get_rate_limit_info(self, client_id: str, category: str) -> tuple[int, int]:
-        """Get remaining requests and reset time"""
+        lease = self._leases.get(key)
+        if lease is not None:
+            lease.demand += 1
+            if lease.tokens > 0 and lease.expires_at > now:
+                lease.tokens -= 1
+                self._leases.move_to_end(key)
+                return RateLimitResult(True, config["requests"], lease.remaining + lease.tokens, lease.reset_time)
         
-        config = self.rate_limits[category]
-        key = f"rate_limit:{category}:{client_id}"
+        if self._script is None:
+            return self._allow_without_redis(config)
+        
+        # Reserve roughly what this client is expected to use within one lease
+        min_lease = max(1, int(config["requests"] * self.MIN_LEASE_FRACTION))
+        max_lease = max(min_lease, int(config["requests"] * self.MAX_LEASE_FRACTION))
+        requested = min_lease
+        unspent = 0
+        if lease is not None:
+            # Taken before awaiting Redis so concurrent misses cannot hand
+            # the same unspent tokens back twice
+            unspent, lease.tokens = lease.tokens, 0
+            elapsed = max(now - lease.fetched_at, 1e-3)
+            requested = min(max_lease, max(min_lease, round(lease.demand / elapsed * self.LEASE_TTL)))
         
         try:
-            current_count = self.redis_client.get(key)
-            if current_count is None:
-                return config["requests"], int(time.time()) + config["window"]
-            
-            current_count = int(current_count)
-            remaining = max(0, config["requests"] - current_count)
-            
-            # Get TTL for reset time
-            ttl = self.redis_client.ttl(key)
-            reset_time = int(time.time()) + max(ttl, 0)
-            
-            return remaining, reset_time
+            granted, remaining, reset_ms, retry_after_ms = await self._script(
+                keys=[key], args=[config["requests"], config["window"] * 1000, requested, unspent]
+            )
+        except RedisError as e:
+            if lease is not None:
+                lease.tokens += unspent
+            # If Redis is down, allow the request rather than fail closed
+            logger.warning(f"Redis error in rate limiting, allowing request: {e}")
+            return self._allow_without_redis(config)
+        
+        reset_time = int(time.time() + math.ceil(int(reset_ms) / 1000))
+        granted = int(granted)
+        current = self._leases.get(key)
+        if granted < 1:
+            if current is not None and current.tokens < 1:
+                self._leases.pop(key, None)
+            return RateLimitResult(False, config["requests"], 0, reset_time,
+                                   max(1, math.ceil(int(retry_after_ms) / 1000)))
         
-        except redis.RedisError:
-            return config["requests"], int(time.time()) + config["window"]
+        if current is not None and current is not lease:
+            # A concurrent request stored a fresh lease meanwhile; add to it
+            current.tokens += granted - 1
+            current.remaining = min(current.remaining, int(remaining))
+            current.reset_time = max(current.reset_time, reset_time)
+            self._leases.move_to_end(key)
+            return RateLimitResult(True, config["requests"], current.remaining + current.tokens, current.reset_time)
+        
+        self._leases[key] = _Lease(
+            tokens=granted - 1,
+            remaining=int(remaining),
+            reset_time=reset_time,
+            expires_at=now + self.LEASE_TTL,
+            fetched_at=now,
+            demand=1
+        )
+        self._leases.move_to_end(key)
+        while len(self._leases) > self.MAX_LEASES:
+            self._leases.popitem(last=False)
+        
+        return RateLimitResult(True, config["requests"], int(remaining) + granted - 1, reset_time)
+    
+    @staticmethod
+    def _allow_without_redis(config: Dict[str, int]) -> RateLimitResult:
+        return RateLimitResult(True, config["requests"], config["requests"], int(time.time()) + config["window"])
     
-    def reset_rate_limit(self, client_id: str, category: str = None) -> None:
+    async def reset_rate_limit(self, client_id: str, category: str = None) -> None:
         """Reset rate limit for client (admin function)"""
         
-        if category:
-            key = f"rate_limit:{category}:{client_id}"
-            self.redis_client.delete(key)
-        else:
-            # Reset all categories for client
-            for cat in self.rate_limits.keys():
-                key = f"rate_limit:{cat}:{client_id}"
-                self.redis_client.delete(key)
+        categories = [category] if category else list(self.rate_limits.keys())
+        keys = [f"rate_limit:{cat}:{client_id}" for cat in categories]
+        for key in keys:
+            self._leases.pop(key, None)
+        if self.redis_client is not None:
+            await self.redis_client.delete(*keys)
     
-    def get_rate_limit_status(self, client_id: str) -> Dict[str, Any]:
+    async def get_rate_limit_status(self, client_id: str) -> Dict[str, Any]:
         """Get rate limit status for client"""
         
         status = {}
+        now_ms = time.time() * 1000
+        categories = list(self.rate_limits.items())
         
-        for category, config in self.rate_limits.items():
-            key = f"rate_limit:{category}:{client_id}"
-            
-            try:
-                current_count = self.redis_client.get(key)
-                if current_count is None:
-                    remaining = config["requests"]
-                    reset_time = int(time.time()) + config["window"]
-                else:
-                    current_count = int(current_count)
-                    remaining = max(0, config["requests"] - current_count)
-                    ttl = self.redis_client.ttl(key)
-                    reset_time = int(time.time()) + max(ttl, 0)
-                
-                status[category] = {
-                    "limit": config["requests"],
-                    "remaining": remaining,
-                    "reset_time": reset_time,
-                    "window": config["window"]
-                }
+        try:
+            tats = await self.redis_client.mget(
+                [f"rate_limit:{category}:{client_id}" for category, _ in categories]
+            ) if self.redis_client is not None else [None] * len(categories)
+        except RedisError:
+            tats = [None] * len(categories)
+        
+        for (category, config), tat in zip(categories, tats):
+            window_ms = config["window"] * 1000
+            tat = max(float(tat), now_ms) if tat is not None else now_ms
+            interval = window_ms / config["requests"]
             
-            except redis.RedisError:
-                status[category] = {
-                    "limit": config["requests"],
-                    "remaining": config["requests"],
-                    "reset_time": int(time.time()) + config["window"],
-                    "window": config["window"]
-                }
+            status[category] = {
+                "limit": config["requests"],
+                "remaining": max(0, min(config["requests"], int((now_ms + window_ms - tat) // interval))),
+                "reset_time": int((tat if tat > now_ms else now_ms + window_ms) / 1000),
+                "window": config["window"]
+            }
         
         return status
 
@@ -9,6 +9,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
 from config import settings
+from app.utils.pattern_matcher import URL_ATTACKS, PATH_TRAVERSAL, SCANNER_AGENTS
 
 
 class SecurityMiddleware(BaseHTTPMiddleware):
@@ -141,22 +142,15 @@ class SecurityMiddleware(BaseHTTPMiddleware):
     def _detect_suspicious_patterns(self, request: Request) -> bool:
         """Detect suspicious request patterns"""
         
-        # Check for SQL injection patterns in URL
-        sql_patterns = [
-            "union select", "drop table", "delete from", "insert into",
-            "update set", "exec(", "script>", "javascript:", "vbscript:",
-            "onload=", "onerror=", "<iframe", "<object", "<embed"
-        ]
-        
         url_path = request.url.path.lower()
         query_string = str(request.url.query).lower()
         
-        for pattern in sql_patterns:
-            if pattern in url_path or pattern in query_string:
-                return True
+        # SQL injection and XSS markers in the URL
+        if URL_ATTACKS.search(url_path, query_string):
+            return True
         
         # Check for path traversal
-        if "../" in url_path or "..%2f" in url_path or "..%5c" in url_path:
+        if PATH_TRAVERSAL.search(url_path):
             return True
         
         # Check for excessive path length
@@ -165,14 +159,8 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         
         # Check user agent
         user_agent = request.headers.get("user-agent", "").lower()
-        suspicious_agents = [
-            "sqlmap", "nikto", "dirbuster", "burp", "nessus",
-            "whatweb", "wpscan", "metasploit"
-        ]
-        
-        for agent in suspicious_agents:
-            if agent in user_agent:
-                return True
+        if SCANNER_AGENTS.search(user_agent):
+            return True
         
         return False
     
@@ -1,87 +1,229 @@
-"""Token deduction and validation middleware"""
+"""Token reservation for paid document generation
 
-from typing import Optional
-from fastapi import Request, HTTPException, status
+Tokens are reserved in one round trip when a paid generation starts: a
+conditional UPDATE takes them from the balance only if enough are left, and
+the reservation is recorded as a pending SPENT transaction in the same
+commit. The generation then commits the reservation when it finishes or
+releases it (returning the tokens) when it fails, so there is no separate
+check-then-deduct and no window in which two requests spend the same tokens.
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
-from app.models.token import UserToken, TokenType, TokenTransactionType
+from config import settings
+from app.models.token import UserToken, TokenTransaction, TokenType, TokenTransactionType
 from app.models.template import Template
-from app.services.token_service import TokenService
-from database import get_db
 
+logger = logging.getLogger(__name__)
+
+# Reservations still pending after this long belong to a lost generation
+STALE_RESERVATION_AFTER = timedelta(hours=1)
+
+
+@dataclass(frozen=True)
+class TemplateCost:
+    """Token price of one template"""
+    is_premium: bool
+    token_cost: int
+
+    @property
+    def chargeable(self) -> bool:
+        return self.is_premium and self.token_cost > 0
+
+
+@dataclass(frozen=True)
+class TokenReservation:
+    """Tokens held for one generation until it commits or releases them"""
+    transaction_id: int
+    user_id: int
+    template_id: int
+    amount: int
+
+
+class TokenCostCache:
+    """In-process copy of the template token-cost table, refreshed after a TTL"""
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = settings.TOKEN_COST_CACHE_TTL if ttl is None else ttl
+        self._costs: Dict[int, TemplateCost] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
 
-async def verify_token_balance(
-    request: Request,
+    def get(self, db: Session, template_id: int) -> Optional[TemplateCost]:
+        """Cost of a template, or None if it does not exist"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self._load(db)
+
+        cost = self._costs.get(template_id)
+        if cost is None:
+            # Created since the last load
+            row = db.query(Template.is_premium, Template.token_cost).filter(
+                Template.id == template_id
+            ).first()
+            if row is None:
+                return None
+            cost = TemplateCost(bool(row.is_premium), row.token_cost or 0)
+            with self._lock:
+                self._costs[template_id] = cost
+        return cost
+
+    def invalidate(self, template_id: Optional[int] = None) -> None:
+        with self._lock:
+            if template_id is None:
+                self._loaded_at = 0.0
+            else:
+                self._costs.pop(template_id, None)
+
+    def _load(self, db: Session) -> None:
+        rows = db.query(Template.id, Template.is_premium, Template.token_cost).all()
+        costs = {row.id: TemplateCost(bool(row.is_premium), row.token_cost or 0) for row in rows}
+        with self._lock:
+            self._costs = costs
+            self._loaded_at = time.monotonic()
+
+
+token_costs = TokenCostCache()
+
+
+def _insufficient() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail="Insufficient token balance"
+    )
+
+
+def reserve_tokens(
+    db: Session,
     template_id: int,
     user_id: Optional[int] = None,
-    db: Session = None
-) -> bool:
-    """
-    Verify user has enough tokens for template
-    Returns True if user has sufficient balance or is eligible for free document
+    commit: bool = True
+) -> Optional[TokenReservation]:
     """
-    if not db:
-        db = next(get_db())
+    Reserve the template's token cost for a generation.
 
-    # Get template token cost
-    template = db.query(Template).filter(Template.id == template_id).first()
-    if not template:
+    Returns None when the template costs nothing. Raises 404 for an unknown
+    template and 402 when the balance cannot cover the cost.
+    """
+    cost = token_costs.get(db, template_id)
+    if cost is None:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    # Skip token check for non-premium templates
-    if not template.is_premium:
-        return True
+    if not cost.chargeable:
+        return None
 
-    # If no user_id (anonymous), only allow if template is free
+    # Anonymous users can only use free templates
     if not user_id:
-        return template.token_cost == 0
+        raise _insufficient()
 
-    # Get user's token balance
-    token_balance = db.query(UserToken).filter(
-        UserToken.user_id == user_id
+    amount = cost.token_cost
+    row = db.execute(
+        update(UserToken)
+        .where(UserToken.user_id == user_id, UserToken.document_tokens >= amount)
+        .values(
+            document_tokens=UserToken.document_tokens - amount,
+            lifetime_spent=UserToken.lifetime_spent + amount,
+            monthly_used=UserToken.monthly_used + amount
+        )
+        .returning(UserToken.document_tokens)
+        .execution_options(synchronize_session=False)
     ).first()
 
-    # If no token record exists, user only has welcome bonus eligibility
-    if not token_balance:
-        # Check if user is eligible for welcome bonus
-        if await TokenService.is_eligible_for_welcome_bonus(db, user_id):
-            return True
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Insufficient token balance"
-        )
+    if row is None:
+        raise _insufficient()
+
+    # Pending until processed_at is set by commit or release
+    transaction = TokenTransaction(
+        user_id=user_id,
+        transaction_type=TokenTransactionType.SPENT,
+        token_type=TokenType.DOCUMENT_GENERATION,
+        amount=-amount,
+        balance_before=row.document_tokens + amount,
+        balance_after=row.document_tokens,
+        description=f"Document generation with template {template_id}",
+        reference_id=str(template_id),
+        reference_type="template_reservation"
+    )
+    db.add(transaction)
+
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+
+    return TokenReservation(transaction.id, user_id, template_id, amount)
+
+
+def commit_reservation(db: Session, transaction_id: int) -> bool:
+    """Settle a reservation once generation succeeded"""
+    settled = db.execute(
+        update(TokenTransaction)
+        .where(TokenTransaction.id == transaction_id, TokenTransaction.processed_at.is_(None))
+        .values(processed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(settled)
 
-    # Check if user has enough tokens
-    if token_balance.document_tokens < template.token_cost:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Insufficient token balance"
+
+def release_reservation(db: Session, transaction_id: int, reason: Optional[str] = None) -> bool:
+    """Return reserved tokens after a failed generation; only the first release counts"""
+    released = db.execute(
+        update(TokenTransaction)
+        .where(
+            TokenTransaction.id == transaction_id,
+            TokenTransaction.processed_at.is_(None),
+            TokenTransaction.transaction_type == TokenTransactionType.SPENT
+        )
+        .values(
+            transaction_type=TokenTransactionType.REFUNDED,
+            processed_at=datetime.utcnow(),
+            admin_notes=reason
         )
+        .returning(TokenTransaction.user_id, TokenTransaction.amount)
+        .execution_options(synchronize_session=False)
+    ).first()
 
+    if released is None:
+        db.rollback()
+        return False
+
+    amount = -released.amount
+    db.execute(
+        update(UserToken)
+        .where(UserToken.user_id == released.user_id)
+        .values(
+            document_tokens=UserToken.document_tokens + amount,
+            lifetime_spent=UserToken.lifetime_spent - amount,
+            monthly_used=UserToken.monthly_used - amount
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
     return True
 
 
-async def deduct_tokens(
-    request: Request,
-    template_id: int,
-    user_id: int,
-    db: Session = None
-) -> None:
-    """Deduct tokens for template usage"""
-    if not db:
-        db = next(get_db())
-
-    template = db.query(Template).filter(Template.id == template_id).first()
-    if not template or not template.token_cost:
-        return
-
-    # Deduct tokens from user's balance
-    await TokenService.deduct_tokens(
-        db=db,
-        user_id=user_id,
-        token_type=TokenType.DOCUMENT_GENERATION,
-        amount=template.token_cost,
-        transaction_type=TokenTransactionType.SPENT,
-        reference_id=template_id,
-        reference_type="template"
-    )
\ No newline at end of file
+def release_stale_reservations(db: Session, older_than: timedelta = STALE_RESERVATION_AFTER) -> int:
+    """Release reservations whose generation never reported back"""
+    cutoff = datetime.utcnow() - older_than
+    stale = db.query(TokenTransaction.id).filter(
+        TokenTransaction.processed_at.is_(None),
+        TokenTransaction.transaction_type == TokenTransactionType.SPENT,
+        TokenTransaction.reference_type == "template_reservation",
+        TokenTransaction.created_at < cutoff
+    ).all()
+
+    released = sum(
+        release_reservation(db, row.id, "Generation did not complete") for row in stale
+    )
+    if released:
+        logger.warning(f"Released {released} stale token reservations")
+    return released
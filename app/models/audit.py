@@ -94,6 +94,15 @@ class AuditEventType(str, enum.Enum):
     PAYMENT_SYNC_FAILED = "payment_sync_failed"
     MONTHLY_REVENUE_REPORT_GENERATED = "monthly_revenue_report_generated"
     REVENUE_REPORT_GENERATION_FAILED = "revenue_report_generation_failed"
+
+    # Wallet events
+    WALLET_CREATED = "wallet_created"
+    WALLET_CREDIT = "wallet_credit"
+    WALLET_DEBIT = "wallet_debit"
+    WALLET_TRANSFER = "wallet_transfer"
+    WALLET_REFUND = "wallet_refund"
+    WALLET_FROZEN = "wallet_frozen"
+    WALLET_UNFROZEN = "wallet_unfrozen"
     
     # Subscription events
     SUBSCRIPTION_CREATED = "subscription_created"
@@ -153,6 +162,13 @@ class AuditEventType(str, enum.Enum):
     CONSENT_GIVEN = "consent_given"
     CONSENT_WITHDRAWN = "consent_withdrawn"
 
+    @classmethod
+    def _missing_(cls, value):
+        # Service code logs by member name ("WALLET_DEBIT") as well as by value
+        if isinstance(value, str):
+            return cls.__members__.get(value.upper())
+        return None
+
 
 class AuditLevel(str, enum.Enum):
     """Audit event level enumeration"""
@@ -2,7 +2,8 @@
 Document model and related functionality
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Enum, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -39,6 +40,7 @@ class Document(Base):
     content = Column(Text, nullable=True)  # Final document content
     placeholder_data = Column(JSON, nullable=True)  # User input data
     generated_content = Column(Text, nullable=True)  # Processed content
+    search_vector = Column(TSVECTOR, nullable=True)  # Weighted title/description/content, maintained by trigger
     
     # File information
     file_path = Column(String(500), nullable=True)
@@ -100,6 +102,10 @@ class Document(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
     completed_at = Column(DateTime, nullable=True)
     deleted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_documents_search_vector', 'search_vector', postgresql_using='gin'),
+    )
     
     def __repr__(self):
         return f"<Document(id={self.id}, title='{self.title}', status='{self.status}')>"
@@ -0,0 +1,51 @@
+"""
+Durable outbox for outgoing email
+"""
+
+from enum import Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
+from sqlalchemy.sql import func
+from database import Base
+
+
+class OutboxStatus(str, Enum):
+    """Outbox message states"""
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailOutbox(Base):
+    """An email waiting for, or recorded after, delivery by the dispatcher"""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Message, rendered by the dispatcher
+    to_email = Column(String(255), nullable=False)
+    from_email = Column(String(255), nullable=True)
+    subject = Column(String(500), nullable=False)
+    template_name = Column(String(100), nullable=False)
+    template_data = Column(JSON, nullable=True)
+    attachments = Column(JSON, nullable=True)
+    priority = Column(String(20), nullable=False, default="normal")
+
+    # Delivery state
+    status = Column(String(20), nullable=False, default=OutboxStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, server_default=func.now(), nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    provider_used = Column(String(50), nullable=True)
+    message_id = Column(String(255), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_due', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox(id={self.id}, to='{self.to_email}', status='{self.status}')>"
@@ -4,7 +4,8 @@ Consolidated template management with versioning and categories
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Table
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Table, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -73,7 +74,7 @@ class Template(Base):
     # SEO and discoverability
     tags = Column(JSON, nullable=True)  # JSON array of tags
     keywords = Column(Text, nullable=True)
-    search_vector = Column(Text, nullable=True)  # For full-text search
+    search_vector = Column(TSVECTOR, nullable=True)  # Weighted name/description/keywords/tags, maintained by trigger
 
     # Relationships
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -88,6 +89,11 @@ class Template(Base):
     placeholders_rel = relationship("Placeholder", back_populates="template", cascade="all, delete-orphan")
     documents = relationship("Document", back_populates="template")
 
+    __table_args__ = (
+        Index('ix_templates_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_templates_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f"<Template(id={self.id}, name='{self.name}', category='{self.category}')>"
 
@@ -21,6 +21,7 @@ from app.schemas.document import DocumentResponse, DocumentList
 from app.schemas.payment import PaymentResponse, SubscriptionResponse
 from app.services.admin_service import AdminService
 from app.services.audit_service import AuditService
+from app.services.cache_service import cache_service, UserCache
 from app.utils.security import get_current_active_user
 from app.services.admin_dashboard_service import AdminDashboardService
 from app.services.auth_service import AuthService
@@ -262,6 +263,7 @@ async def update_user_status(
     user.status = new_status
     user.updated_at = datetime.utcnow()
     db.commit()
+    await UserCache.invalidate_user_cache(user_id)
 
     # Log status change
     AuditService.log_admin_event(
@@ -307,6 +309,7 @@ async def update_user_role(
     user.role = new_role
     user.updated_at = datetime.utcnow()
     db.commit()
+    await UserCache.invalidate_user_cache(user_id)
 
     # Log role change
     AuditService.log_admin_event(
@@ -358,6 +361,8 @@ async def delete_user(
         db.commit()
         action = "USER_SOFT_DELETED"
 
+    await UserCache.invalidate_user_cache(user_id)
+
     # Log user deletion
     AuditService.log_admin_event(
         action,
@@ -437,6 +442,7 @@ async def update_template_status(
     template.is_active = is_active
     template.updated_at = datetime.utcnow()
     db.commit()
+    await cache_service.invalidate_template(template_id)
 
     # Log template status change
     AuditService.log_admin_event(
@@ -476,6 +482,7 @@ async def update_template_visibility(
     template.is_public = is_public
     template.updated_at = datetime.utcnow()
     db.commit()
+    await cache_service.invalidate_template(template_id)
 
     # Log visibility change
     AuditService.log_admin_event(
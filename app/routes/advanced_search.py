@@ -28,6 +28,7 @@ async def search_templates(
     sort_by: str = Query("relevance", description="Sort by: relevance, price_low, price_high, rating, popularity, newest"),
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous page's next_cursor"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -35,7 +36,7 @@ async def search_templates(
 
     search_results = SearchService.search_templates(
         db, query, current_user.id, category, min_price, max_price,
-        rating, language, tags, sort_by, page, per_page
+        rating, language, tags, sort_by, page, per_page, cursor=cursor
     )
 
     return search_results
@@ -51,6 +52,7 @@ async def search_documents(
     sort_by: str = Query("relevance", description="Sort by: relevance, created_at, updated_at, title, status"),
     page: int = Query(1, ge=1, description="Page number"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Keyset cursor from a previous page's next_cursor"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -58,7 +60,7 @@ async def search_documents(
 
     search_results = SearchService.search_documents(
         db, current_user.id, query, status, template_id,
-        start_date, end_date, sort_by, page, per_page
+        start_date, end_date, sort_by, page, per_page, cursor=cursor
     )
 
     return search_results
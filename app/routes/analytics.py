@@ -3,17 +3,20 @@ Analytics and tracking routes
 Consolidated analytics system including real-time and social analytics
 """
 
+import os
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
 
-from database import get_db
+from database import get_db, SessionLocal
 from config import settings
 from app.models.document import Document
 from app.models.user import User
 from app.models.analytics.visit import DocumentVisit, PageVisit
+from app.services import analytics_export
 from app.services.analytics.visit_tracking import VisitTrackingService
 from app.services.audit_service import AuditService
 from app.services.performance_service import PerformanceService
@@ -22,6 +25,8 @@ from app.services.social_analytics import SocialAnalytics
 from app.schemas.analytics import TimePeriod
 from app.utils.security import get_current_active_user
 from app.dependencies import rate_limit, validate_analytics_request
+from app.tasks.export_tasks import export_analytics_task
+from app.utils.zip_stream import stream_zip
 
 router = APIRouter()
 
@@ -467,37 +472,119 @@ async def export_analytics(
     format: str = "csv",
     document_id: Optional[int] = None,
     days: int = 30,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_active_user)
 ):
-    """Export analytics data"""
+    """Export analytics data as a stream; use export jobs for very large windows"""
 
-    if format not in ["csv", "json"]:
+    if format not in analytics_export.supported_formats():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Unsupported export format"
         )
 
-    # Get analytics data
-    visit_tracking = VisitTrackingService()
-    analytics_data = visit_tracking.export_analytics_data(
-        db, current_user.id, document_id, days, format
-    )
+    user_id = current_user.id
+
+    def body():
+        # The stream outlives the request's session, so it uses its own
+        db = SessionLocal()
+        try:
+            yield from analytics_export.stream_export(db, user_id, document_id, days, format)
+        finally:
+            db.close()
 
     # Log data export
     AuditService.log_analytics_event(
         "ANALYTICS_EXPORTED",
-        current_user.id,
+        user_id,
         None,
         {
             "format": format,
             "document_id": document_id,
-            "days": days,
-            "record_count": len(analytics_data.get("visits", []))
+            "days": days
         }
     )
 
-    return analytics_data
+    filename = f"analytics-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=analytics_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/export/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    format: str = "csv",
+    document_id: Optional[int] = None,
+    days: int = 365,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Start a resumable background export"""
+
+    if format not in analytics_export.supported_formats(job=True):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported export format"
+        )
+
+    job = analytics_export.ExportJobStore().create(current_user.id, document_id, days, format)
+    export_analytics_task.delay(job["job_id"])
+
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+
+@router.get("/export/jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get background export progress"""
+
+    job = analytics_export.ExportJobStore().get(job_id)
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+
+    return {key: job[key] for key in ("job_id", "format", "status", "rows", "error", "created_at", "completed_at")}
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Download a completed background export"""
+
+    store = analytics_export.ExportJobStore()
+    job = store.get(job_id)
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Export job is not complete"
+        )
+
+    output_path = store.output_path(job)
+    if os.path.isdir(output_path):
+        # Parquet jobs are a dataset of part files
+        parts = sorted(os.listdir(output_path))
+        return StreamingResponse(
+            stream_zip([(os.path.join(output_path, part), part) for part in parts]),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="analytics-{job_id}.zip"'}
+        )
+
+    return FileResponse(
+        path=output_path,
+        filename=f"analytics-{job_id}.{job['format']}",
+        media_type=analytics_export.MEDIA_TYPES[job["format"]]
+    )
 
 
 @router.delete("/visits/{visit_id}")
@@ -412,13 +412,11 @@ async def forgot_password(
         # Send password reset email
         try:
             from app.services.email_service import email_service
-            import asyncio
-            asyncio.create_task(
-                email_service.send_password_reset_email(
-                    user.email,
-                    user.first_name or user.username or "User",
-                    reset_token
-                )
+            await email_service.send_password_reset_email(
+                user.email,
+                user.first_name or user.username or "User",
+                reset_token,
+                db=db
             )
         except Exception as e:
             logger.error(f"Failed to send password reset email: {e}")
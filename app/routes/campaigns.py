@@ -3,7 +3,7 @@ Campaign Management API Routes
 Email marketing and token distribution campaigns
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, validator
@@ -12,6 +12,7 @@ from datetime import datetime
 from database import get_db
 from app.services.auth_service import AuthService
 from app.services.campaign_service import CampaignService, Campaign, CampaignType, CampaignStatus
+from app.tasks.campaign_tasks import execute_campaign_task
 from app.models.user import UserRole
 
 router = APIRouter(prefix="/api/campaigns", tags=["campaigns"])
@@ -325,26 +326,26 @@ async def schedule_campaign(
 @router.post("/{campaign_id}/execute")
 async def execute_campaign(
     campaign_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user = Depends(AuthService.get_current_admin_user)
 ):
     """Execute campaign immediately (admin only)"""
     try:
-        campaign_service = CampaignService()
-        
-        # Execute campaign in background
-        background_tasks.add_task(
-            campaign_service.execute_campaign,
-            db,
-            campaign_id
-        )
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        if not campaign:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found")
+
+        # Runs on a worker with its own session; retries resume from the last chunk
+        task = execute_campaign_task.delay(campaign_id)
         
         return {
             "status": "success",
+            "task_id": task.id,
             "message": "Campaign execution started in background"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
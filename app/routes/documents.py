@@ -8,10 +8,11 @@ import hashlib
 from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, desc
 import io
+from urllib.parse import quote
 
 from database import get_db
 from config import settings
@@ -25,8 +26,11 @@ from app.schemas.document import (
 )
 from app.services.document_service import DocumentService
 from app.services.audit_service import AuditService
+from app.services.encryption_service import EncryptionService
+from app.services.thumbnail_service import MEDIA_TYPES as THUMBNAIL_MEDIA_TYPES, thumbnail_key, thumbnail_service
 from app.utils.security import get_current_active_user
 from app.tasks.document_tasks import generate_document_task, generate_batch_documents_task
+from app.middleware.token_deduction import reserve_tokens
 
 router = APIRouter()
 
@@ -98,10 +102,14 @@ async def create_document(
 
     # Start background generation if template is provided
     if template and document_data.placeholder_data:
+        # Paid templates hold their tokens until generation settles them;
+        # the reservation commits together with the document below
+        reservation = reserve_tokens(db, template.id, user_id, commit=False)
         background_tasks.add_task(
             generate_document_task.delay,
             document.id,
-            document_data.placeholder_data
+            document_data.placeholder_data,
+            reservation.transaction_id if reservation else None
         )
         document.status = DocumentStatus.PROCESSING
     
@@ -526,9 +534,22 @@ async def download_document(
         }
     )
 
+    filename = document.original_filename or f"{document.title}.{document.file_format}"
+
+    if document.is_encrypted and document.file_path.endswith(".encrypted"):
+        # Decrypt straight into the response; no plaintext copy touches disk
+        headers = {"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+        if document.file_size and EncryptionService.is_stream_encrypted(document.file_path):
+            headers["Content-Length"] = str(document.file_size)
+        return StreamingResponse(
+            EncryptionService.iter_decrypted_file(document.file_path, document.encryption_key_id or "default"),
+            media_type="application/octet-stream",
+            headers=headers
+        )
+
     return FileResponse(
         path=document.file_path,
-        filename=document.original_filename or f"{document.title}.{document.file_format}",
+        filename=filename,
         media_type="application/octet-stream"
     )
 
@@ -587,14 +608,16 @@ async def download_batch_documents(
         {
             "batch_id": batch_id,
             "document_count": len(documents),
-            "zip_size": zip_file_info["file_size"]
+            "source_size": zip_file_info["file_size"]
         }
     )
 
-    return FileResponse(
-        path=zip_file_info["file_path"],
-        filename=f"batch_{batch_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-        media_type="application/zip"
+    # Members are sent as soon as each one is compressed
+    filename = f"batch_{batch_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        zip_file_info["stream"],
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
@@ -793,6 +816,75 @@ async def preview_document(
     return preview
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an entity tag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+@router.get("/{document_id}/thumbnail")
+async def get_document_thumbnail(
+    document_id: int,
+    request: Request,
+    width: Optional[int] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get a document thumbnail (WebP when accepted, PNG otherwise) with ETag revalidation"""
+
+    document = db.query(Document).filter(
+        Document.id == document_id,
+        Document.user_id == current_user.id
+    ).first()
+
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    width, fmt = thumbnail_service.resolve_variant(width, request.headers.get("accept", ""))
+    headers = {"Vary": "Accept"}
+
+    # Known content can be revalidated without touching the disk or the pool
+    if document.file_hash:
+        etag = f'"{thumbnail_key(document.file_hash)}-{width}.{fmt}"'
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers={**headers, "ETag": etag, "Cache-Control": "private, max-age=300"})
+
+    path = thumbnail_service.variant_file(document.file_hash, width, fmt) if document.file_hash else None
+    content_hash = document.file_hash
+
+    if not path:
+        encrypted = document.is_encrypted and (document.file_path or "").endswith(".encrypted")
+        result = await thumbnail_service.generate_thumbnail(
+            document.id,
+            document.file_path or "",
+            document.file_format,
+            content_hash=document.file_hash,
+            encryption_key_id=(document.encryption_key_id or "default") if encrypted else None
+        )
+        if not result.get("success"):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Thumbnail not available"
+            )
+        content_hash = None if result.get("is_placeholder") else result.get("content_hash")
+        path = result["variants"][width][fmt]
+
+    if content_hash:
+        headers["ETag"] = f'"{thumbnail_key(content_hash)}-{width}.{fmt}"'
+        headers["Cache-Control"] = "private, max-age=300"
+    else:
+        # Placeholders are replaced once a real render exists
+        headers["Cache-Control"] = "no-cache"
+
+    return FileResponse(path=path, media_type=THUMBNAIL_MEDIA_TYPES[fmt], headers=headers)
+
+
 
 
 @router.get("/shared/{share_token}")
@@ -10,8 +10,10 @@ from typing import Dict, Any, Optional
 from database import get_db, DatabaseManager
 from app.middleware.performance import ConnectionPoolMonitor, MemoryOptimizer
 from app.services.cache_service import cache_service
+from app.services.audit_service import audit_writer
 from app.services.production_monitoring import production_monitor
 from app.utils.security import get_current_user
+from app.utils.pattern_matcher import get_pattern_stats
 from app.models.user import User
 
 router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
@@ -90,7 +92,11 @@ async def performance_statistics(
     stats = {
         "database": await ConnectionPoolMonitor.check_pool_health(),
         "memory": await MemoryOptimizer.optimize_memory(),
-        "cache": MemoryOptimizer.get_cache_stats()
+        "cache": MemoryOptimizer.get_cache_stats(),
+        "l1_cache": cache_service.get_l1_stats(),
+        "single_flight": cache_service.get_single_flight_stats(),
+        "audit_writer": audit_writer.get_stats(),
+        "pattern_hits": get_pattern_stats()
     }
     
     return stats
@@ -131,6 +137,7 @@ async def optimize_system(
     
     # Cache cleanup (if Redis is available)
     try:
+        cache_service.l1.clear()
         if cache_service.redis:
             # Clear expired keys
             await cache_service.redis.flushall(asynchronous=True)
@@ -1,9 +1,9 @@
 """
 Routes for SEO-related endpoints
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from fastapi.responses import Response
+from fastapi.responses import FileResponse
 from database import get_db
 from app.services.sitemap_generator import SitemapGenerator
 
@@ -11,12 +11,28 @@ router = APIRouter()
 sitemap_generator = SitemapGenerator()
 
 @router.get("/sitemap.xml")
-async def get_sitemap(db: Session = Depends(get_db)):
+def get_sitemap(db: Session = Depends(get_db)):
     """
-    Generate and serve XML sitemap
+    Serve the sitemap index, regenerating changed shards first
     """
-    sitemap = sitemap_generator.generate_sitemap(db)
-    return Response(
-        content=sitemap,
+    index_path = sitemap_generator.generate_sitemap(db)
+    return FileResponse(
+        path=index_path,
         media_type="application/xml"
-    )
\ No newline at end of file
+    )
+
+@router.get("/sitemaps/{name}")
+def get_sitemap_shard(name: str):
+    """
+    Serve one gzip sitemap shard
+    """
+    path = sitemap_generator.shard_path(name)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sitemap not found"
+        )
+    return FileResponse(
+        path=path,
+        media_type="application/gzip"
+    )
@@ -3,9 +3,6 @@ Production-ready Digital Signature System
 Advanced signature canvas with background removal, admin styling, and placeholder management
 """
 
-import base64
-import hashlib
-import io
 import logging
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
@@ -13,9 +10,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFi
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from PIL import Image, ImageOps, ImageFilter
-import numpy as np
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 
 from database import get_db
 from config import settings
@@ -46,6 +41,11 @@ class SignatureCanvasUpload(BaseModel):
     target_height: Optional[int] = None
 
 
+class SignatureCanvasBatchUpload(BaseModel):
+    """Several canvas signatures processed in one request"""
+    signatures: List[SignatureCanvasUpload] = Field(..., min_items=1, max_items=20)
+
+
 class SignatureImageUpload(BaseModel):
     """Image signature upload response"""
     success: bool
@@ -86,154 +86,48 @@ class AdminSignatureStyling(BaseModel):
         return v
 
 
-class SignatureProcessingService:
-    """Advanced signature image processing service"""
-
-    @staticmethod
-    def remove_background(image: Image.Image, threshold: int = 240) -> Image.Image:
-        """Remove white/light background from signature"""
-        try:
-            # Convert to RGBA if not already
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-
-            # Get image data
-            data = np.array(image)
-
-            # Create mask for background removal
-            # Remove pixels that are close to white
-            mask = (data[:, :, 0] < threshold) | (data[:, :, 1] < threshold) | (data[:, :, 2] < threshold)
-
-            # Set transparent background
-            data[:, :, 3] = mask * 255
-
-            return Image.fromarray(data, 'RGBA')
-        except Exception as e:
-            logger.error(f"Background removal failed: {e}")
-            return image
-
-    @staticmethod
-    def auto_crop(image: Image.Image, padding: int = 10) -> Image.Image:
-        """Auto-crop signature to remove excess whitespace"""
-        try:
-            # Convert to grayscale for cropping detection
-            gray = image.convert('L')
-
-            # Find bounding box of non-white content
-            bbox = ImageOps.invert(gray).getbbox()
-
-            if bbox:
-                # Add padding
-                left, top, right, bottom = bbox
-                width, height = image.size
-
-                left = max(0, left - padding)
-                top = max(0, top - padding)
-                right = min(width, right + padding)
-                bottom = min(height, bottom + padding)
-
-                return image.crop((left, top, right, bottom))
-
-            return image
-        except Exception as e:
-            logger.error(f"Auto-crop failed: {e}")
-            return image
-
-    @staticmethod
-    def enhance_contrast(image: Image.Image, factor: float = 1.5) -> Image.Image:
-        """Enhance signature contrast for better visibility"""
-        try:
-            from PIL import ImageEnhance
-            enhancer = ImageEnhance.Contrast(image)
-            return enhancer.enhance(factor)
-        except Exception as e:
-            logger.error(f"Contrast enhancement failed: {e}")
-            return image
-
-    @staticmethod
-    def resize_signature(image: Image.Image, target_width: int = None, target_height: int = None, preserve_aspect: bool = True) -> Image.Image:
-        """Resize signature while maintaining quality"""
-        try:
-            if not target_width and not target_height:
-                return image
-
-            original_width, original_height = image.size
-
-            if preserve_aspect:
-                if target_width and target_height:
-                    # Fit within both dimensions
-                    ratio = min(target_width / original_width, target_height / original_height)
-                elif target_width:
-                    ratio = target_width / original_width
-                else:
-                    ratio = target_height / original_height
-
-                new_width = int(original_width * ratio)
-                new_height = int(original_height * ratio)
-            else:
-                new_width = target_width or original_width
-                new_height = target_height or original_height
-
-            return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        except Exception as e:
-            logger.error(f"Resize failed: {e}")
-            return image
-
-    @staticmethod
-    def process_signature_image(
-        image_data: bytes,
-        remove_bg: bool = True,
-        auto_crop: bool = True,
-        enhance_contrast: bool = True,
-        target_width: int = None,
-        target_height: int = None
-    ) -> Dict[str, Any]:
-        """Complete signature processing pipeline"""
-        try:
-            # Load image
-            image = Image.open(io.BytesIO(image_data))
-            original_size = {"width": image.width, "height": image.height}
-            processing_steps = []
-
-            # Remove background
-            if remove_bg:
-                image = SignatureProcessingService.remove_background(image)
-                processing_steps.append("background_removal")
-
-            # Auto-crop
-            if auto_crop:
-                image = SignatureProcessingService.auto_crop(image)
-                processing_steps.append("auto_crop")
-
-            # Enhance contrast
-            if enhance_contrast:
-                image = SignatureProcessingService.enhance_contrast(image)
-                processing_steps.append("contrast_enhancement")
-
-            # Resize
-            if target_width or target_height:
-                image = SignatureProcessingService.resize_signature(image, target_width, target_height)
-                processing_steps.append("resize")
-
-            # Convert to base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            processed_image_b64 = base64.b64encode(buffer.getvalue()).decode()
-
-            return {
-                "success": True,
-                "processed_image": processed_image_b64,
-                "original_size": original_size,
-                "processed_size": {"width": image.width, "height": image.height},
-                "processing_applied": processing_steps
-            }
+def _processing_options(
+    background_removal: bool,
+    auto_crop: bool,
+    enhance_contrast: bool,
+    target_width: Optional[int] = None,
+    target_height: Optional[int] = None
+) -> SignatureProcessingOptions:
+    """Processing options requested by a canvas or image upload"""
+    processing_options = SignatureProcessingOptions()
+    processing_options.remove_background = background_removal
+    processing_options.auto_crop = auto_crop
+    processing_options.enhance_contrast = enhance_contrast
+
+    if target_width:
+        processing_options.max_width = target_width
+    if target_height:
+        processing_options.max_height = target_height
+
+    return processing_options
+
+
+def _canvas_processing_options(canvas_data: SignatureCanvasUpload) -> SignatureProcessingOptions:
+    """Processing options requested by a canvas upload"""
+    return _processing_options(
+        canvas_data.background_removal,
+        canvas_data.auto_crop,
+        canvas_data.enhance_contrast,
+        canvas_data.target_width,
+        canvas_data.target_height
+    )
 
-        except Exception as e:
-            logger.error(f"Signature processing failed: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+
+def _processing_steps(options: SignatureProcessingOptions) -> List[str]:
+    """Names of the processing steps that were applied"""
+    steps = {
+        "background_removal": options.remove_background,
+        "auto_crop": options.auto_crop,
+        "contrast_enhancement": options.enhance_contrast,
+        "sharpness_enhancement": options.enhance_sharpness,
+        "noise_reduction": options.noise_reduction,
+    }
+    return [name for name, applied in steps.items() if applied]
 
 
 @router.post("/", response_model=SignatureResponse, status_code=status.HTTP_201_CREATED)
@@ -735,28 +629,10 @@ async def upload_signature_canvas(
     """Upload signature from canvas with advanced processing"""
 
     try:
-        # Decode base64 canvas data
-        if canvas_data.canvas_data.startswith('data:image'):
-            # Remove data URL prefix
-            base64_data = canvas_data.canvas_data.split(',')[1]
-        else:
-            base64_data = canvas_data.canvas_data
-
-        image_bytes = base64.b64decode(base64_data)
-
-        # Create processing options
-        processing_options = SignatureProcessingOptions()
-        processing_options.remove_background = canvas_data.background_removal
-        processing_options.auto_crop = canvas_data.auto_crop
-        processing_options.enhance_contrast = canvas_data.enhance_contrast
-
-        if canvas_data.target_width:
-            processing_options.max_width = canvas_data.target_width
-        if canvas_data.target_height:
-            processing_options.max_height = canvas_data.target_height
-
-        # Process the signature using enhanced SignatureService
-        processing_result = SignatureService.process_canvas_signature(
+        processing_options = _canvas_processing_options(canvas_data)
+
+        # Decoding, processing and encoding run on the signature worker pool
+        processing_result = await SignatureService.process_canvas_signature_async(
             canvas_data.canvas_data,
             processing_options
         )
@@ -799,13 +675,7 @@ async def upload_signature_canvas(
             processed_image=processing_result["signature_data"],
             original_size=processing_result["original_size"],
             processed_size=processing_result["processed_size"],
-            processing_applied={
-                "background_removed": processing_options.remove_background,
-                "auto_cropped": processing_options.auto_crop,
-                "contrast_enhanced": processing_options.enhance_contrast,
-                "noise_reduced": processing_options.noise_reduction,
-                "sharpness_enhanced": processing_options.enhance_sharpness
-            }
+            processing_applied=_processing_steps(processing_options)
         )
 
     except Exception as e:
@@ -816,6 +686,54 @@ async def upload_signature_canvas(
         )
 
 
+@router.post("/canvas-upload/batch", response_model=List[SignatureImageUpload])
+async def upload_signature_canvas_batch(
+    batch: SignatureCanvasBatchUpload,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Upload several canvas signatures; they are processed together on the worker pool"""
+
+    jobs = [(item.canvas_data, _canvas_processing_options(item)) for item in batch.signatures]
+    results = await SignatureService.process_canvas_signatures_async(jobs)
+
+    responses = []
+    for (_, processing_options), processing_result in zip(jobs, results):
+        if not processing_result["success"]:
+            responses.append(SignatureImageUpload(success=False, error=processing_result["error"]))
+            continue
+
+        signature_id = await SignatureService.save_processed_signature(
+            db=db,
+            user_id=current_user.id,
+            processed_image=processing_result["signature_data"],
+            metadata=processing_result["metadata"]
+        )
+
+        responses.append(SignatureImageUpload(
+            success=True,
+            signature_id=signature_id,
+            processed_image=processing_result["signature_data"],
+            original_size=processing_result["original_size"],
+            processed_size=processing_result["processed_size"],
+            processing_applied=_processing_steps(processing_options)
+        ))
+
+    # Log batch signature upload
+    AuditService.log_auth_event(
+        "SIGNATURE_BATCH_UPLOADED",
+        current_user.id,
+        None,
+        {
+            "source": "canvas",
+            "signature_ids": [response.signature_id for response in responses if response.success],
+            "failed": sum(1 for response in responses if not response.success)
+        }
+    )
+
+    return responses
+
+
 @router.post("/image-upload", response_model=SignatureImageUpload)
 async def upload_signature_image(
     file: UploadFile = File(...),
@@ -847,14 +765,14 @@ async def upload_signature_image(
         )
 
     try:
-        # Process the signature image
-        processing_result = SignatureProcessingService.process_signature_image(
-            image_data=file_content,
-            remove_bg=background_removal,
-            auto_crop=auto_crop,
-            enhance_contrast=enhance_contrast,
-            target_width=target_width,
-            target_height=target_height
+        processing_options = _processing_options(
+            background_removal, auto_crop, enhance_contrast, target_width, target_height
+        )
+
+        # Decoding, processing and encoding run on the signature worker pool
+        processing_result = await SignatureService.process_uploaded_signature_async(
+            file_content,
+            processing_options
         )
 
         if not processing_result["success"]:
@@ -863,18 +781,21 @@ async def upload_signature_image(
                 error=processing_result["error"]
             )
 
+        processing_applied = _processing_steps(processing_options)
+
         # Save processed signature
         signature_id = await SignatureService.save_processed_signature(
             db=db,
             user_id=current_user.id,
-            processed_image=processing_result["processed_image"],
+            processed_image=processing_result["signature_data"],
             metadata={
+                **processing_result["metadata"],
                 "source": "upload",
                 "filename": file.filename,
                 "content_type": file.content_type,
                 "original_size": processing_result["original_size"],
                 "processed_size": processing_result["processed_size"],
-                "processing_applied": processing_result["processing_applied"]
+                "processing_applied": processing_applied
             }
         )
 
@@ -887,17 +808,17 @@ async def upload_signature_image(
                 "signature_id": signature_id,
                 "source": "upload",
                 "filename": file.filename,
-                "processing": processing_result["processing_applied"]
+                "processing": processing_applied
             }
         )
 
         return SignatureImageUpload(
             success=True,
             signature_id=signature_id,
-            processed_image=processing_result["processed_image"],
+            processed_image=processing_result["signature_data"],
             original_size=processing_result["original_size"],
             processed_size=processing_result["processed_size"],
-            processing_applied=processing_result["processing_applied"]
+            processing_applied=processing_applied
         )
 
     except Exception as e:
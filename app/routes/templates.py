@@ -22,6 +22,8 @@ from app.schemas.template import (
     TemplateStats, PlaceholderCreate, PlaceholderResponse
 )
 from app.services.template_service import TemplateService
+from app.services.template_render_service import render_plan_cache
+from app.services.cache_service import cache_service
 from app.services.audit_service import AuditService
 from app.utils.security import get_current_active_user
 from app.services.auth_service import AuthService
@@ -291,6 +293,8 @@ async def update_template(
 
     # Update template
     updated_template = TemplateService.update_template(db, template, template_update)
+    render_plan_cache.invalidate(template.id)
+    await cache_service.invalidate_template(template.id)
 
     # Log template update
     AuditService.log_template_event(
@@ -350,10 +350,12 @@ async def re_extract_placeholders(
                 detail="Template not found"
             )
 
-        # Re-run extraction
-        extraction_result = UserTemplateUploadService._extract_placeholders(
-            db, template_id, template.file_path
-        )
+        # Re-run extraction in the background
+        template.extraction_status = "pending"
+        template.extraction_error = None
+        db.commit()
+
+        task_id = UserTemplateUploadService.queue_extraction(template_id)
 
         # Log re-extraction
         AuditService.log_user_activity(
@@ -362,12 +364,16 @@ async def re_extract_placeholders(
             "TEMPLATE_RE_EXTRACTED",
             {
                 "template_id": template_id,
-                "extraction_success": extraction_result.get("success", False),
-                "placeholders_found": extraction_result.get("placeholders_count", 0)
+                "extraction_task_id": task_id
             }
         )
 
-        return extraction_result
+        return {
+            "success": True,
+            "template_id": template_id,
+            "status": template.extraction_status,
+            "extraction_task_id": task_id
+        }
 
     except HTTPException:
         raise
@@ -378,6 +384,44 @@ async def re_extract_placeholders(
         )
 
 
+@router.get("/{template_id}/extraction", response_model=Dict[str, Any])
+async def get_extraction_status(
+    template_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get placeholder extraction status and progress"""
+    from celery.result import AsyncResult
+    from app.services.user_template_upload_service import UserUploadedTemplate
+    from app.tasks.template_tasks import celery_app
+
+    template = db.query(UserUploadedTemplate).filter(
+        UserUploadedTemplate.id == template_id,
+        UserUploadedTemplate.user_id == current_user.id
+    ).first()
+
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Template not found"
+        )
+
+    result = {
+        "template_id": template_id,
+        "status": template.extraction_status,
+        "placeholders_found": template.placeholder_count,
+        "error": template.extraction_error,
+        "progress": None
+    }
+
+    if template.extraction_status == "pending":
+        task = AsyncResult(UserTemplateUploadService.extraction_task_id(template_id), app=celery_app)
+        if task.state == "PROGRESS" and isinstance(task.info, dict):
+            result["progress"] = task.info
+
+    return result
+
+
 @router.get("/admin/review-queue", response_model=Dict[str, Any])
 async def get_template_review_queue(
     status: Optional[str] = None,
@@ -8,6 +8,8 @@ from .template_service import TemplateService
 from .payment_service import PaymentService
 from .encryption_service import EncryptionService
 from .audit_service import AuditService
+# Registers the ORM listeners that feed the realtime dashboard metrics
+from . import realtime_metrics
 
 __all__ = [
     "AuthService",
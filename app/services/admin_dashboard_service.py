@@ -15,6 +15,7 @@ from app.models.template import Template
 from app.models.document import Document
 from app.models.payment import Payment
 from app.models.analytics.visit import PageVisit, DocumentVisit, LandingVisit
+from app.services.realtime_metrics import realtime_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -80,67 +81,84 @@ class AdminDashboardService:
     async def get_realtime_stats(db: Session) -> Dict[str, Any]:
         """Get real-time statistics for admin dashboard"""
         try:
-            fifteen_mins_ago = datetime.utcnow() - timedelta(minutes=15)
-            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            stats = realtime_metrics.snapshot()
 
-            # Active users in last 15 minutes from both page and document visits
-            page_visitors = set(
-                visit.device_fingerprint for visit in
-                db.query(PageVisit.device_fingerprint).filter(
-                    PageVisit.created_at >= fifteen_mins_ago,
-                    PageVisit.device_fingerprint.isnot(None)
-                ).all()
-            )
+            if stats is None:
+                # First read of the day or after a Redis flush: seed today's counters once
+                today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+                realtime_metrics.seed_day(**AdminDashboardService._today_totals(db, today_start))
+                stats = realtime_metrics.snapshot()
 
-            doc_visitors = set(
-                visit.device_fingerprint for visit in
-                db.query(DocumentVisit.device_fingerprint).filter(
-                    DocumentVisit.created_at >= fifteen_mins_ago,
-                    DocumentVisit.device_fingerprint.isnot(None)
-                ).all()
-            )
+            if stats is None:
+                # Redis unavailable
+                stats = AdminDashboardService._realtime_stats_from_db(db)
+
+            stats["timestamp"] = datetime.utcnow().isoformat()
+            return stats
+        except Exception as e:
+            logger.error(f"Failed to get realtime stats: {e}")
+            raise
 
-            active_users = len(page_visitors.union(doc_visitors))
+    @staticmethod
+    def _today_totals(db: Session, today_start: datetime) -> Dict[str, Any]:
+        """Daily counters used to seed the realtime metrics"""
+        pages, engaged = db.query(
+            func.count(PageVisit.id),
+            func.count(PageVisit.id).filter(PageVisit.bounce.is_(False))
+        ).filter(
+            PageVisit.created_at >= today_start
+        ).one()
+
+        revenue = db.query(func.sum(Payment.amount)).filter(
+            Payment.status == "completed",
+            Payment.created_at >= today_start
+        ).scalar() or 0.0
 
-            # Documents being created or viewed now
-            active_docs = db.query(DocumentVisit).filter(
+        return {"pages": pages or 0, "engaged": engaged or 0, "revenue": revenue}
+
+    @staticmethod
+    def _realtime_stats_from_db(db: Session) -> Dict[str, Any]:
+        """Compute the realtime statistics by scanning the visit tables"""
+        fifteen_mins_ago = datetime.utcnow() - timedelta(minutes=15)
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Active users in last 15 minutes from both page and document visits
+        recent_fingerprints = db.query(PageVisit.device_fingerprint).filter(
+            PageVisit.created_at >= fifteen_mins_ago,
+            PageVisit.device_fingerprint.isnot(None)
+        ).union(
+            db.query(DocumentVisit.device_fingerprint).filter(
                 DocumentVisit.created_at >= fifteen_mins_ago,
-                DocumentVisit.metadata.op('->>')('action').in_(['create', 'edit'])
-            ).count()
+                DocumentVisit.device_fingerprint.isnot(None)
+            )
+        ).subquery()
+        active_users = db.query(func.count()).select_from(recent_fingerprints).scalar() or 0
 
-            # Current revenue today
-            today_revenue = db.query(func.sum(Payment.amount)).filter(
-                Payment.status == "completed",
-                Payment.created_at >= today_start
-            ).scalar() or 0.0
+        # Documents being created or viewed now
+        active_docs = db.query(DocumentVisit).filter(
+            DocumentVisit.created_at >= fifteen_mins_ago,
+            or_(
+                DocumentVisit.visit_type.in_(['create', 'edit']),
+                DocumentVisit.visit_metadata.op('->>')('action').in_(['create', 'edit'])
+            )
+        ).count()
 
-            # Get engagement stats
-            avg_session_time = db.query(func.avg(PageVisit.time_on_page_seconds)).filter(
-                PageVisit.created_at >= fifteen_mins_ago,
-                PageVisit.time_on_page_seconds > 0
-            ).scalar() or 0
+        # Get engagement stats
+        avg_session_time = db.query(func.avg(PageVisit.time_on_page_seconds)).filter(
+            PageVisit.created_at >= fifteen_mins_ago,
+            PageVisit.time_on_page_seconds > 0
+        ).scalar() or 0
 
-            bounce_rate = (
-                db.query(func.count(1)).filter(
-                    PageVisit.created_at >= today_start,
-                    PageVisit.bounce.is_(True)
-                ).scalar() /
-                max(db.query(func.count(1)).filter(
-                    PageVisit.created_at >= today_start
-                ).scalar(), 1)
-            ) * 100
+        totals = AdminDashboardService._today_totals(db, today_start)
+        bounce_rate = (totals["pages"] - totals["engaged"]) / max(totals["pages"], 1) * 100
 
-            return {
-                "active_users_now": active_users,
-                "active_documents": active_docs,
-                "revenue_today": today_revenue,
-                "avg_session_time": round(avg_session_time, 2),
-                "bounce_rate_today": round(bounce_rate, 2),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        except Exception as e:
-            logger.error(f"Failed to get realtime stats: {e}")
-            raise
+        return {
+            "active_users_now": active_users,
+            "active_documents": active_docs,
+            "revenue_today": totals["revenue"],
+            "avg_session_time": round(float(avg_session_time), 2),
+            "bounce_rate_today": round(bounce_rate, 2)
+        }
 
     @staticmethod
     async def _get_cohort_conversion(db: Session, user_ids: List[int]) -> Dict[str, float]:
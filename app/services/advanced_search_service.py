@@ -6,9 +6,13 @@ Full-text search, filtering, recommendations, and search analytics
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, func, desc, and_, or_
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, cast, func, desc, and_, or_, tuple_
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 import re
+import json
+import base64
 from collections import Counter
 import math
 
@@ -16,8 +20,31 @@ from database import Base
 from app.models.template import Template
 from app.models.document import Document
 from app.models.user import User
+from app.models.template_purchase import TemplatePurchase
 from app.services.analytics.visit_tracking import VisitTrackingService
 
+# Text search configuration used by the search_vector triggers
+SEARCH_CONFIG = "english"
+
+# Weight of trigram name similarity relative to ts_rank
+TRIGRAM_RANK_WEIGHT = 0.5
+
+# Planner estimates below this are replaced by an exact count
+EXACT_COUNT_THRESHOLD = 1000
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper used to read planner row estimates"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
 
 class SearchQuery(Base):
     """Search query tracking"""
@@ -83,78 +110,58 @@ class AdvancedSearchService:
     def search_templates(db: Session, query: str, user_id: Optional[int] = None,
                         category: str = None, min_price: float = None, max_price: float = None,
                         rating: float = None, language: str = None, tags: List[str] = None,
-                        sort_by: str = "relevance", page: int = 1, per_page: int = 20) -> Dict:
+                        sort_by: str = "relevance", page: int = 1, per_page: int = 20,
+                        cursor: Optional[str] = None) -> Dict:
         """Advanced template search with full-text search and ranking"""
 
         start_time = datetime.utcnow()
 
-        # Base query
-        base_query = db.query(Template).filter(
+        conditions = [
             Template.is_active == True,
             Template.is_public == True
-        )
+        ]
 
-        # Text search with ranking
+        # Text search: weighted tsvector match (GIN) or trigram name match for typos
+        rank = None
         if query:
-            # Clean and prepare search terms
-            search_terms = AdvancedSearchService._prepare_search_terms(query)
-
-            # Build search conditions with weighted scoring
-            search_conditions = []
-
-            for term in search_terms:
-                # Exact name match (highest weight)
-                search_conditions.append(
-                    Template.name.ilike(f"%{term}%")
-                )
-
-                # Description match (medium weight)
-                search_conditions.append(
-                    Template.description.ilike(f"%{term}%")
-                )
-
-                # Keywords match (medium weight)
-                search_conditions.append(
-                    Template.keywords.ilike(f"%{term}%")
+            ts_query = AdvancedSearchService._build_ts_query(query)
+            name_match = Template.name.op("%")(query)
+            similarity = func.similarity(Template.name, query)
+
+            if ts_query is not None:
+                conditions.append(or_(Template.search_vector.op("@@")(ts_query), name_match))
+                rank = AdvancedSearchService._rank_key(
+                    func.ts_rank(Template.search_vector, ts_query) + similarity * TRIGRAM_RANK_WEIGHT
                 )
-
-                # Tags match (lower weight)
-                if Template.tags:
-                    search_conditions.append(
-                        Template.tags.contains(f'"{term}"')
-                    )
-
-            if search_conditions:
-                base_query = base_query.filter(or_(*search_conditions))
+            else:
+                conditions.append(name_match)
+                rank = AdvancedSearchService._rank_key(similarity)
 
         # Apply filters
         if category:
-            base_query = base_query.filter(Template.category == category)
+            conditions.append(Template.category == category)
 
         if min_price is not None:
-            base_query = base_query.filter(Template.price >= min_price)
+            conditions.append(Template.price >= min_price)
 
         if max_price is not None:
-            base_query = base_query.filter(Template.price <= max_price)
+            conditions.append(Template.price <= max_price)
 
         if rating:
-            base_query = base_query.filter(Template.rating >= rating)
+            conditions.append(Template.rating >= rating)
 
         if language:
-            base_query = base_query.filter(Template.language == language)
+            conditions.append(Template.language == language)
 
         if tags:
             for tag in tags:
-                base_query = base_query.filter(Template.tags.contains(f'"{tag}"'))
+                conditions.append(Template.tags.contains(f'"{tag}"'))
 
-        # Apply sorting
-        base_query = AdvancedSearchService._apply_template_sorting(base_query, sort_by, query)
-
-        # Get total count
-        total = base_query.count()
-
-        # Apply pagination
-        templates = base_query.offset((page - 1) * per_page).limit(per_page).all()
+        sort_keys, descending = AdvancedSearchService._template_sort_keys(sort_by, rank)
+        templates, next_cursor = AdvancedSearchService._keyset_page(
+            db, Template, conditions, sort_keys, descending, cursor, page, per_page
+        )
+        total, total_is_estimate = AdvancedSearchService._estimate_count(db, Template.id, conditions)
 
         # Calculate response time
         response_time = (datetime.utcnow() - start_time).total_seconds() * 1000
@@ -182,11 +189,11 @@ class AdvancedSearchService:
 
         # Get user's purchased templates (if logged in)
         purchased_template_ids = set()
-        if user_id:
-            from app.models.template import Template
+        if user_id and templates:
             purchases = db.query(TemplatePurchase.template_id).filter(
                 TemplatePurchase.user_id == user_id,
-                TemplatePurchase.is_active == True
+                TemplatePurchase.template_id.in_([t.id for t in templates]),
+                TemplatePurchase.status == "completed"
             ).all()
             purchased_template_ids = {p[0] for p in purchases}
 
@@ -199,9 +206,11 @@ class AdvancedSearchService:
                 for t in templates
             ],
             "total": total,
+            "total_is_estimate": total_is_estimate,
             "page": page,
             "per_page": per_page,
             "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
             "response_time_ms": int(response_time),
             "filters": {
                 "query": query,
@@ -220,50 +229,44 @@ class AdvancedSearchService:
     def search_documents(db: Session, user_id: int, query: str,
                         status: str = None, template_id: int = None,
                         start_date: datetime = None, end_date: datetime = None,
-                        sort_by: str = "relevance", page: int = 1, per_page: int = 20) -> Dict:
+                        sort_by: str = "relevance", page: int = 1, per_page: int = 20,
+                        cursor: Optional[str] = None) -> Dict:
         """Advanced document search for user's documents"""
 
         start_time = datetime.utcnow()
 
-        # Base query - only user's documents
-        base_query = db.query(Document).filter(Document.user_id == user_id)
+        # Base conditions - only user's documents
+        conditions = [Document.user_id == user_id]
 
-        # Text search
+        # Text search over the weighted title/description/content vector
+        rank = None
         if query:
-            search_terms = AdvancedSearchService._prepare_search_terms(query)
-            search_conditions = []
-
-            for term in search_terms:
-                search_conditions.extend([
-                    Document.title.ilike(f"%{term}%"),
-                    Document.description.ilike(f"%{term}%"),
-                    Document.content.ilike(f"%{term}%")
-                ])
-
-            if search_conditions:
-                base_query = base_query.filter(or_(*search_conditions))
+            ts_query = AdvancedSearchService._build_ts_query(query)
+            if ts_query is not None:
+                conditions.append(Document.search_vector.op("@@")(ts_query))
+                rank = AdvancedSearchService._rank_key(func.ts_rank(Document.search_vector, ts_query))
+            else:
+                conditions.append(Document.title.op("%")(query))
+                rank = AdvancedSearchService._rank_key(func.similarity(Document.title, query))
 
         # Apply filters
         if status:
-            base_query = base_query.filter(Document.status == status)
+            conditions.append(Document.status == status)
 
         if template_id:
-            base_query = base_query.filter(Document.template_id == template_id)
+            conditions.append(Document.template_id == template_id)
 
         if start_date:
-            base_query = base_query.filter(Document.created_at >= start_date)
+            conditions.append(Document.created_at >= start_date)
 
         if end_date:
-            base_query = base_query.filter(Document.created_at <= end_date)
-
-        # Apply sorting
-        base_query = AdvancedSearchService._apply_document_sorting(base_query, sort_by, query)
+            conditions.append(Document.created_at <= end_date)
 
-        # Get total count
-        total = base_query.count()
-
-        # Apply pagination
-        documents = base_query.offset((page - 1) * per_page).limit(per_page).all()
+        sort_keys, descending = AdvancedSearchService._document_sort_keys(sort_by, rank)
+        documents, next_cursor = AdvancedSearchService._keyset_page(
+            db, Document, conditions, sort_keys, descending, cursor, page, per_page
+        )
+        total, total_is_estimate = AdvancedSearchService._estimate_count(db, Document.id, conditions)
 
         # Calculate response time
         response_time = (datetime.utcnow() - start_time).total_seconds() * 1000
@@ -293,9 +296,11 @@ class AdvancedSearchService:
                 for d in documents
             ],
             "total": total,
+            "total_is_estimate": total_is_estimate,
             "page": page,
             "per_page": per_page,
             "pages": (total + per_page - 1) // per_page,
+            "next_cursor": next_cursor,
             "response_time_ms": int(response_time),
             "filters": {
                 "query": query,
@@ -465,42 +470,139 @@ class AdvancedSearchService:
         return terms
 
     @staticmethod
-    def _apply_template_sorting(query, sort_by: str, search_query: str = None):
-        """Apply sorting to template query"""
+    def _build_ts_query(query: str):
+        """Prefix tsquery OR-ing the prepared terms, or None when no term survives"""
+        terms = AdvancedSearchService._prepare_search_terms(query)
+        if not terms:
+            return None
+        # Terms are \w+ only, so they are safe to_tsquery operands
+        return func.to_tsquery(SEARCH_CONFIG, " | ".join(f"{term}:*" for term in terms))
+
+    @staticmethod
+    def _rank_key(rank):
+        """
+        Relevance as double precision.
+
+        ts_rank and similarity return float4, which does not survive the
+        cursor's text round trip: the decoded value no longer equals the
+        stored rank, so rows tied on rank were skipped or repeated.
+        """
+        return cast(rank, Float(53))
+
+    @staticmethod
+    def _template_sort_keys(sort_by: str, rank=None) -> Tuple[list, bool]:
+        """Keyset sort columns and direction for template search"""
         if sort_by == "price_low":
-            return query.order_by(Template.price)
+            return [Template.price], False
         elif sort_by == "price_high":
-            return query.order_by(desc(Template.price))
+            return [Template.price], True
         elif sort_by == "rating":
-            return query.order_by(desc(Template.rating), desc(Template.rating_count))
+            return [Template.rating, Template.rating_count], True
         elif sort_by == "popularity":
-            return query.order_by(desc(Template.usage_count))
+            return [Template.usage_count], True
         elif sort_by == "newest":
-            return query.order_by(desc(Template.created_at))
+            return [Template.created_at], True
         elif sort_by == "name":
-            return query.order_by(Template.name)
+            return [Template.name], False
         else:  # relevance (default)
-            if search_query:
-                # Boost exact matches and higher rated templates
-                return query.order_by(
-                    desc(Template.rating * Template.usage_count / 100)
-                )
-            else:
-                return query.order_by(desc(Template.rating), desc(Template.usage_count))
+            if rank is not None:
+                return [rank], True
+            return [Template.rating, Template.usage_count], True
 
     @staticmethod
-    def _apply_document_sorting(query, sort_by: str, search_query: str = None):
-        """Apply sorting to document query"""
+    def _document_sort_keys(sort_by: str, rank=None) -> Tuple[list, bool]:
+        """Keyset sort columns and direction for document search"""
         if sort_by == "created_at":
-            return query.order_by(desc(Document.created_at))
+            return [Document.created_at], True
         elif sort_by == "updated_at":
-            return query.order_by(desc(Document.updated_at))
+            return [Document.updated_at], True
         elif sort_by == "title":
-            return query.order_by(Document.title)
+            return [Document.title], False
         elif sort_by == "status":
-            return query.order_by(Document.status)
+            return [Document.status], False
         else:  # relevance (default)
-            return query.order_by(desc(Document.updated_at))
+            if rank is not None:
+                return [rank, Document.updated_at], True
+            return [Document.updated_at], True
+
+    @staticmethod
+    def _keyset_page(db: Session, model, conditions: list, sort_keys: list, descending: bool,
+                     cursor: Optional[str], page: int, per_page: int):
+        """
+        Fetch one page ordered by `sort_keys` plus the primary key.
+
+        With a cursor the page starts right after the row it encodes, so deep
+        pages cost the same as the first one. Without a cursor `page` is
+        honoured with an OFFSET for callers that still page by number.
+        """
+        keys = [key.label(f"sort_{i}") for i, key in enumerate(sort_keys)] + [model.id.label("sort_id")]
+        order = [desc(key) if descending else key for key in sort_keys + [model.id]]
+
+        page_query = db.query(model, *keys).filter(*conditions)
+
+        position = AdvancedSearchService._decode_cursor(cursor, sort_keys + [model.id]) if cursor else None
+        if position is not None:
+            row_key = tuple_(*sort_keys, model.id)
+            page_query = page_query.filter(row_key < tuple_(*position) if descending else row_key > tuple_(*position))
+        elif page > 1:
+            page_query = page_query.offset((page - 1) * per_page)
+
+        # One extra row tells whether there is a next page
+        rows = page_query.order_by(*order).limit(per_page + 1).all()
+
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            next_cursor = AdvancedSearchService._encode_cursor(list(rows[-1])[1:])
+
+        return [row[0] for row in rows], next_cursor
+
+    @staticmethod
+    def _encode_cursor(values: list) -> str:
+        payload = json.dumps(
+            [value.isoformat() if isinstance(value, datetime) else value for value in values],
+            separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, columns: list) -> Optional[list]:
+        """Decode a cursor into typed sort values; malformed cursors restart at the top"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            if not isinstance(values, list) or len(values) != len(columns):
+                return None
+            decoded = []
+            for column, value in zip(columns, values):
+                if value is not None and isinstance(column.type, DateTime):
+                    value = datetime.fromisoformat(value)
+                elif value is not None and getattr(column.type, "enum_class", None):
+                    value = column.type.enum_class(value)
+                decoded.append(value)
+            return decoded
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _estimate_count(db: Session, key_column, conditions: list) -> Tuple[int, bool]:
+        """
+        Planner row estimate for the filtered query.
+
+        Large result sets report the estimate instead of running the filter a
+        second time; small ones are cheap enough to count exactly.
+        """
+        count_query = db.query(key_column).filter(*conditions)
+        try:
+            plan = db.execute(_Explain(count_query.statement)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+        except Exception:
+            estimate = None
+
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return count_query.order_by(None).count(), False
+        return estimate, True
 
     @staticmethod
     def _format_template_result(template: Template, query: str = None) -> Dict:
@@ -0,0 +1,396 @@
+"""
+Streaming analytics export
+
+Document visit rows are read through a server-side cursor in `yield_per`
+batches, as plain column tuples instead of ORM objects, and encoded
+incrementally. CSV, NDJSON and the JSON envelope are produced chunk by chunk
+for a `StreamingResponse`. Parquet, when pyarrow is installed, is written
+one row group per batch.
+
+Large windows can run as background export jobs instead. A job writes to a
+file under EXPORTS_PATH and checkpoints the last exported visit id and the
+output size after every batch. A retried job truncates the partial tail and
+resumes after that id.
+"""
+
+import os
+import io
+import csv
+import json
+import uuid
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import settings
+from app.models.document import Document
+from app.models.analytics.visit import DocumentVisit
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_COLUMNS = [
+    ("visit_id", DocumentVisit.id),
+    ("document_id", DocumentVisit.document_id),
+    ("visit_type", DocumentVisit.visit_type),
+    ("country", DocumentVisit.country),
+    ("city", DocumentVisit.city),
+    ("device_type", DocumentVisit.device_type),
+    ("browser_name", DocumentVisit.browser_name),
+    ("os_name", DocumentVisit.os_name),
+    ("created_at", DocumentVisit.created_at),
+    ("session_quality_score", DocumentVisit.session_quality_score),
+    ("active_time_seconds", DocumentVisit.active_time_seconds),
+    ("bounce", DocumentVisit.bounce),
+    ("device_fingerprint", DocumentVisit.device_fingerprint),
+    ("metadata", DocumentVisit.visit_metadata),
+]
+FIELD_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# The JSON envelope cannot be appended to, so jobs offer NDJSON instead
+JOB_FORMATS = ("csv", "ndjson", "parquet")
+
+
+def supported_formats(job: bool = False) -> List[str]:
+    return [f for f in (JOB_FORMATS if job else ENCODERS) if f != "parquet" or pyarrow is not None]
+
+
+def export_query(user_id: int, document_id: Optional[int], start_date: datetime,
+                 end_date: Optional[datetime] = None, after_id: Optional[int] = None):
+    """Select the export columns for a user's document visits, in id order"""
+    query = select(*[column for _, column in EXPORT_COLUMNS]).join(
+        Document, Document.id == DocumentVisit.document_id
+    ).where(
+        Document.user_id == user_id,
+        DocumentVisit.created_at >= start_date
+    )
+
+    if end_date is not None:
+        query = query.where(DocumentVisit.created_at < end_date)
+    if document_id:
+        query = query.where(DocumentVisit.document_id == document_id)
+    if after_id is not None:
+        query = query.where(DocumentVisit.id > after_id)
+
+    return query.order_by(DocumentVisit.id)
+
+
+def iter_batches(db: Session, query, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Sequence[tuple]]:
+    """Stream result batches through a server-side cursor"""
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    try:
+        for partition in result.partitions(batch_size):
+            yield [tuple(row) for row in partition]
+    finally:
+        result.close()
+
+
+def _value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(batches: Iterable[Sequence[tuple]], header: bool = True) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(FIELD_NAMES)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (dict, list)) else _value(value)
+                for value in row
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_ndjson(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(FIELD_NAMES, map(_value, row))), separators=(",", ":")) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+def _json_visit(row: tuple) -> Dict[str, Any]:
+    record = dict(zip(FIELD_NAMES, map(_value, row)))
+    return {
+        "visit_id": record["visit_id"],
+        "document_id": record["document_id"],
+        "visit_type": record["visit_type"],
+        "visitor_info": {
+            "country": record["country"],
+            "city": record["city"],
+            "device_type": record["device_type"],
+            "browser": record["browser_name"],
+            "os": record["os_name"],
+            "device_fingerprint": record["device_fingerprint"]
+        },
+        "engagement": {
+            "session_quality_score": record["session_quality_score"],
+            "active_time_seconds": record["active_time_seconds"],
+            "bounce": record["bounce"]
+        },
+        "created_at": record["created_at"],
+        "metadata": record["metadata"]
+    }
+
+
+def encode_json(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """The previous JSON export envelope, written incrementally"""
+    yield b'{"format":"json","visits":['
+    total = 0
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = ",".join(json.dumps(_json_visit(row), separators=(",", ":")) for row in batch)
+        yield (("," if total else "") + chunk).encode("utf-8")
+        total += len(batch)
+    yield f'],"total_records":{total}}}'.encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _parquet_table(batch: Sequence[tuple]):
+    columns = list(zip(*batch)) if batch else [[] for _ in FIELD_NAMES]
+    data = {}
+    for name, values in zip(FIELD_NAMES, columns):
+        if name == "metadata":
+            values = [json.dumps(value) if value is not None else None for value in values]
+        data[name] = list(values)
+    return pyarrow.table(data, schema=_parquet_schema())
+
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ("visit_id", pyarrow.int64()),
+        ("document_id", pyarrow.int64()),
+        ("visit_type", pyarrow.string()),
+        ("country", pyarrow.string()),
+        ("city", pyarrow.string()),
+        ("device_type", pyarrow.string()),
+        ("browser_name", pyarrow.string()),
+        ("os_name", pyarrow.string()),
+        ("created_at", pyarrow.timestamp("us")),
+        ("session_quality_score", pyarrow.float64()),
+        ("active_time_seconds", pyarrow.int64()),
+        ("bounce", pyarrow.bool_()),
+        ("device_fingerprint", pyarrow.string()),
+        ("metadata", pyarrow.string()),
+    ])
+
+
+def encode_parquet(batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    """One Parquet row group per batch; the footer follows the last one"""
+    if pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow")
+
+    sink = _ChunkSink()
+    writer = parquet.ParquetWriter(sink, _parquet_schema())
+    try:
+        for batch in batches:
+            if batch:
+                writer.write_table(_parquet_table(batch))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "json": encode_json,
+    "parquet": encode_parquet,
+}
+
+
+def stream_export(db: Session, user_id: int, document_id: Optional[int], days: int,
+                  format: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Encoded export body, produced batch by batch"""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    query = export_query(user_id, document_id, start_date)
+    return ENCODERS[format](iter_batches(db, query, batch_size))
+
+
+class ExportJobStore:
+    """Checkpoint files for background export jobs"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.EXPORTS_PATH
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def output_path(self, job: Dict[str, Any]) -> str:
+        return os.path.join(self.directory, f"{job['job_id']}.{job['format']}")
+
+    def create(self, user_id: int, document_id: Optional[int], days: int, format: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "document_id": document_id,
+            "format": format,
+            # The window is fixed when the job is created so resumed runs export the same rows
+            "start_date": (now - timedelta(days=days)).isoformat(),
+            "end_date": now.isoformat(),
+            "status": "pending",
+            "last_id": None,
+            "rows": 0,
+            "bytes": 0,
+            "parts": 0,
+            "error": None,
+            "created_at": now.isoformat(),
+            "completed_at": None,
+        }
+        self.save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, job: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(temp_path, self._path(job["job_id"]))
+
+
+def run_export_job(db: Session, store: ExportJobStore, job_id: str,
+                   batch_size: int = EXPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """Run or resume an export job, checkpointing after every batch"""
+    job = store.get(job_id)
+    if job is None:
+        raise ValueError(f"Export job {job_id} not found")
+    if job["status"] == "completed":
+        return job
+
+    job["status"] = "running"
+    store.save(job)
+
+    query = export_query(
+        job["user_id"],
+        job["document_id"],
+        datetime.fromisoformat(job["start_date"]),
+        datetime.fromisoformat(job["end_date"]),
+        job["last_id"]
+    )
+
+    if job["format"] == "parquet":
+        _run_parquet_job(db, store, job, query, batch_size)
+    else:
+        _run_text_job(db, store, job, query, batch_size)
+
+    job["status"] = "completed"
+    job["completed_at"] = datetime.utcnow().isoformat()
+    store.save(job)
+    return job
+
+
+def _run_text_job(db: Session, store: ExportJobStore, job: Dict[str, Any], query, batch_size: int) -> None:
+    output_path = store.output_path(job)
+    mode = "r+b" if os.path.exists(output_path) else "wb"
+
+    with open(output_path, mode) as output:
+        # Drop anything written after the last checkpoint
+        output.seek(job["bytes"])
+        output.truncate()
+
+        for batch in iter_batches(db, query, batch_size):
+            if not batch:
+                continue
+            if job["format"] == "csv":
+                chunks = encode_csv([batch], header=job["bytes"] == 0)
+            else:
+                chunks = encode_ndjson([batch])
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            os.fsync(output.fileno())
+
+            job["last_id"] = batch[-1][0]
+            job["rows"] += len(batch)
+            job["bytes"] = output.tell()
+            store.save(job)
+
+        if job["format"] == "csv" and job["bytes"] == 0:
+            for chunk in encode_csv([]):
+                output.write(chunk)
+            job["bytes"] = output.tell()
+
+
+def _run_parquet_job(db: Session, store: ExportJobStore, job: Dict[str, Any], query, batch_size: int) -> None:
+    """Parquet jobs write a dataset directory with one part file per batch"""
+    if pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow")
+
+    output_dir = store.output_path(job)
+    os.makedirs(output_dir, exist_ok=True)
+
+    for batch in iter_batches(db, query, batch_size):
+        if not batch:
+            continue
+        part_path = os.path.join(output_dir, f"part-{job['parts']:05d}.parquet")
+        parquet.write_table(_parquet_table(batch), part_path)
+
+        job["last_id"] = batch[-1][0]
+        job["rows"] += len(batch)
+        job["parts"] += 1
+        store.save(job)
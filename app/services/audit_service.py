@@ -7,6 +7,7 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 from fastapi import Request
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 try:
     from geoip2 import database as geoip_db
@@ -17,8 +18,12 @@ except ImportError:
 
 from config import settings
 from app.models.audit import AuditLog, AuditEventType, AuditLevel
+from app.services.audit_writer import AuditEventError, AuditWriter
 from database import get_db
 
+# Opened on first lookup and reused by the writer thread
+_geoip_reader = None
+
 
 class AuditService:
     """Audit logging and compliance service"""
@@ -33,92 +38,137 @@ class AuditService:
         event_details: Optional[Dict[str, Any]] = None,
         resource_type: Optional[str] = None,
         resource_id: Optional[str] = None,
-        resource_name: Optional[str] = None
-    ) -> AuditLog:
-        """Log audit event"""
+        resource_name: Optional[str] = None,
+        processing_time: Optional[float] = None,
+        sensitive_operation: bool = False
+    ) -> bool:
+        """
+        Queue an audit event for the background writer.
+
+        Only request attributes are captured here; GeoIP, risk scoring and
+        anomaly detection run on the writer thread for the whole batch.
+        Returns False when the queue was full and the event was spilled.
+        """
+        
+        # Generate request ID if not present
+        request_id = str(uuid.uuid4())
+        if request and hasattr(request.state, 'request_id'):
+            request_id = request.state.request_id
+        
+        event = {
+            "event_type": event_type,
+            "event_level": event_level,
+            "event_message": event_message,
+            "event_details": event_details,
+            "user_id": user_id,
+            "request_id": request_id,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "resource_name": resource_name,
+            "processing_time": processing_time,
+            "sensitive_operation": sensitive_operation,
+            "timestamp": datetime.utcnow(),
+            "correlation_id": str(uuid.uuid4())
+        }
+        
+        # Extract request information
+        event.update(ip_address=None, user_agent=None, request_method=None,
+                     request_path=None, request_params=None)
+        if request:
+            event.update(
+                ip_address=AuditService._get_client_ip(request),
+                user_agent=request.headers.get("user-agent"),
+                request_method=request.method,
+                request_path=str(request.url.path),
+                request_params=dict(request.query_params) if request.query_params else None
+            )
+        
+        return audit_writer.submit(event)
+    
+    @staticmethod
+    def _write_batch(events: List[Dict[str, Any]]) -> None:
+        """Enrich a batch of queued events and insert it in one multi-row INSERT"""
         
         db = next(get_db())
         
         try:
-            # Generate request ID if not present
-            request_id = str(uuid.uuid4())
-            if request and hasattr(request.state, 'request_id'):
-                request_id = request.state.request_id
-            
-            # Extract request information
-            ip_address = None
-            user_agent = None
-            request_method = None
-            request_path = None
-            request_params = None
-            country = None
-            city = None
-            
-            if request:
-                ip_address = AuditService._get_client_ip(request)
-                user_agent = request.headers.get("user-agent")
-                request_method = request.method
-                request_path = str(request.url.path)
-                request_params = dict(request.query_params) if request.query_params else None
-                
-                # Get geographic information
-                country, city = AuditService._get_location_from_ip(ip_address)
-            
-            # Determine if event is GDPR relevant
-            gdpr_relevant = AuditService._is_gdpr_relevant(event_type, event_details)
-            pii_accessed = AuditService._contains_pii(event_details)
-            sensitive_operation = AuditService._is_sensitive_operation(event_type)
-            
-            # Calculate risk score
-            risk_score = AuditService._calculate_risk_score(
-                event_type, event_level, event_details, user_id, ip_address
-            )
-            
-            # Detect anomalies
-            anomaly_detected = AuditService._detect_anomaly(
-                event_type, user_id, ip_address
-            )
-            
-            # Create audit log entry
-            audit_log = AuditLog(
-                event_type=event_type,
-                event_level=event_level,
-                event_message=event_message,
-                event_details=event_details,
-                user_id=user_id,
-                request_id=request_id,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                request_method=request_method,
-                request_path=request_path,
-                request_params=request_params,
-                resource_type=resource_type,
-                resource_id=resource_id,
-                resource_name=resource_name,
-                country=country,
-                city=city,
-                gdpr_relevant=gdpr_relevant,
-                pii_accessed=pii_accessed,
-                sensitive_operation=sensitive_operation,
-                risk_score=risk_score,
-                anomaly_detected=anomaly_detected,
-                environment="production" if not settings.DEBUG else "development",
-                service_version=settings.APP_VERSION,
-                correlation_id=str(uuid.uuid4())
-            )
-            
-            db.add(audit_log)
+            rows = AuditService._build_rows(db, events)
+            db.execute(insert(AuditLog), rows)
             db.commit()
-            db.refresh(audit_log)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        
+        # Trigger alerts for high-risk events
+        for row in rows:
+            if AuditService._requires_alert(row):
+                AuditService._send_security_alert(row)
+    
+    @staticmethod
+    def _build_rows(db: Session, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Turn queued (or spilled) events into AuditLog rows"""
+        
+        try:
+            events = [AuditService._decode_event(event) for event in events]
+        except (KeyError, TypeError, ValueError) as e:
+            raise AuditEventError(f"Undecodable audit event: {e}") from e
+        
+        # One lookup per batch instead of one query per event
+        known_ips = AuditService._known_login_ips(db, events)
+        recent_failures = AuditService._recent_login_failures(db, events)
+        locations: Dict[str, tuple] = {}
+        
+        environment = "production" if not settings.DEBUG else "development"
+        rows = []
+        
+        for event in events:
+            event_type = event["event_type"]
+            event_details = event.get("event_details")
+            user_id = event.get("user_id")
+            ip_address = event.get("ip_address")
             
-            # Trigger alerts for high-risk events
-            if audit_log.requires_alert:
-                AuditService._send_security_alert(audit_log)
+            # Get geographic information
+            if ip_address not in locations:
+                locations[ip_address] = AuditService._get_location_from_ip(ip_address)
+            country, city = locations[ip_address]
             
-            return audit_log
+            unusual_ip = bool(user_id and ip_address and (user_id, ip_address) not in known_ips)
             
-        finally:
-            db.close()
+            # Detect anomalies - multiple failed logins, counting earlier events in this batch
+            anomaly_detected = False
+            if user_id and event_type == AuditEventType.LOGIN_FAILED:
+                anomaly_detected = recent_failures.get(user_id, 0) >= 3
+                recent_failures[user_id] = recent_failures.get(user_id, 0) + 1
+            
+            rows.append({
+                **event,
+                "country": country,
+                "city": city,
+                "gdpr_relevant": AuditService._is_gdpr_relevant(event_type, event_details),
+                "pii_accessed": AuditService._contains_pii(event_details),
+                "sensitive_operation": bool(event.get("sensitive_operation")) or AuditService._is_sensitive_operation(event_type),
+                "risk_score": AuditService._calculate_risk_score(
+                    event_type, event["event_level"], event_details, unusual_ip
+                ),
+                "anomaly_detected": anomaly_detected,
+                "environment": environment,
+                "service_version": settings.APP_VERSION
+            })
+        
+        return rows
+    
+    @staticmethod
+    def _decode_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        """Restore enum and datetime fields of events read back from the spill file"""
+        
+        event = dict(event)
+        event["event_type"] = AuditEventType(event["event_type"])
+        event["event_level"] = AuditLevel(event["event_level"])
+        if isinstance(event.get("timestamp"), str):
+            event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+        return event
     
     @staticmethod
     def log_auth_event(
@@ -126,7 +176,7 @@ class AuditService:
         user_id: Optional[int],
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log authentication event"""
         
         # Map string event type to enum value
@@ -155,7 +205,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log user management event"""
         
         return AuditService.log_event(
@@ -175,7 +225,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log document event"""
         
         return AuditService.log_event(
@@ -196,7 +246,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log template event"""
         
         return AuditService.log_event(
@@ -217,7 +267,7 @@ class AuditService:
         user_id: Optional[int],
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log signature event"""
         
         return AuditService.log_event(
@@ -237,7 +287,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log payment event"""
         
         return AuditService.log_event(
@@ -257,7 +307,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log subscription event"""
         
         return AuditService.log_event(
@@ -277,7 +327,7 @@ class AuditService:
         user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log analytics event"""
         
         return AuditService.log_event(
@@ -296,7 +346,7 @@ class AuditService:
         admin_user_id: int,
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log admin event"""
         
         return AuditService.log_event(
@@ -316,7 +366,7 @@ class AuditService:
         user_id: Optional[int],
         request: Optional[Request],
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log security event"""
         
         return AuditService.log_event(
@@ -334,7 +384,7 @@ class AuditService:
     def log_system_event(
         event_type: str,
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log system event"""
         
         return AuditService.log_event(
@@ -349,7 +399,7 @@ class AuditService:
     def log_performance_issue(
         event_type: str,
         details: Optional[Dict[str, Any]] = None
-    ) -> AuditLog:
+    ) -> bool:
         """Log performance issue"""
         
         return AuditService.log_event(
@@ -388,11 +438,13 @@ class AuditService:
         try:
             if GEOIP_AVAILABLE and hasattr(settings, 'GEOIP_DATABASE_PATH'):
                 # Use MaxMind GeoIP2 database for accurate location data
-                with geoip_db.Reader(settings.GEOIP_DATABASE_PATH) as reader:
-                    response = reader.city(ip_address)
-                    country = response.country.name
-                    city = response.city.name
-                    return country, city
+                global _geoip_reader
+                if _geoip_reader is None:
+                    _geoip_reader = geoip_db.Reader(settings.GEOIP_DATABASE_PATH)
+                response = _geoip_reader.city(ip_address)
+                country = response.country.name
+                city = response.city.name
+                return country, city
             else:
                 # Fallback for Nigerian businesses when GeoIP is not available
                 return "Nigeria", "Lagos"
@@ -456,8 +508,7 @@ class AuditService:
         event_type: AuditEventType,
         event_level: AuditLevel,
         event_details: Optional[Dict[str, Any]],
-        user_id: Optional[int],
-        ip_address: Optional[str]
+        unusual_ip: bool = False
     ) -> int:
         """Calculate risk score for event (0-100)"""
         
@@ -488,60 +539,57 @@ class AuditService:
             base_score += 15
         
         # Adjust for unusual IP
-        if ip_address and AuditService._is_unusual_ip(user_id, ip_address):
+        if unusual_ip:
             base_score += 25
         
         return min(base_score, 100)
     
     @staticmethod
-    def _detect_anomaly(
-        event_type: AuditEventType,
-        user_id: Optional[int],
-        ip_address: Optional[str]
-    ) -> bool:
-        """Detect anomalous behavior"""
+    def _known_login_ips(db: Session, events: List[Dict[str, Any]]) -> set:
+        """(user_id, ip_address) pairs from the batch that have logged in before"""
         
-        if not user_id:
-            return False
+        pairs = {(e["user_id"], e["ip_address"]) for e in events if e.get("user_id") and e.get("ip_address")}
+        if not pairs:
+            return set()
         
-        # Simple anomaly detection - multiple failed logins
-        if event_type == AuditEventType.LOGIN_FAILED:
-            db = next(get_db())
-            try:
-                recent_failures = db.query(AuditLog).filter(
-                    AuditLog.user_id == user_id,
-                    AuditLog.event_type == AuditEventType.LOGIN_FAILED,
-                    AuditLog.timestamp > datetime.utcnow() - timedelta(minutes=15)
-                ).count()
-                
-                return recent_failures >= 3
-            finally:
-                db.close()
+        seen = db.query(AuditLog.user_id, AuditLog.ip_address).filter(
+            AuditLog.event_type == AuditEventType.LOGIN,
+            AuditLog.user_id.in_({user_id for user_id, _ in pairs}),
+            AuditLog.ip_address.in_({ip for _, ip in pairs})
+        ).distinct().all()
         
-        return False
+        return {(user_id, ip) for user_id, ip in seen}
     
     @staticmethod
-    def _is_unusual_ip(user_id: Optional[int], ip_address: str) -> bool:
-        """Check if IP is unusual for user"""
+    def _recent_login_failures(db: Session, events: List[Dict[str, Any]]) -> Dict[int, int]:
+        """Failed logins in the last 15 minutes for users with failures in the batch"""
         
-        if not user_id:
-            return False
+        user_ids = {
+            e["user_id"] for e in events
+            if e.get("user_id") and e["event_type"] == AuditEventType.LOGIN_FAILED
+        }
+        if not user_ids:
+            return {}
         
-        # Check if IP has been seen before for this user
-        db = next(get_db())
-        try:
-            previous_logins = db.query(AuditLog).filter(
-                AuditLog.user_id == user_id,
-                AuditLog.ip_address == ip_address,
-                AuditLog.event_type == AuditEventType.LOGIN
-            ).count()
-            
-            return previous_logins == 0
-        finally:
-            db.close()
+        counts = db.query(AuditLog.user_id, func.count(AuditLog.id)).filter(
+            AuditLog.user_id.in_(user_ids),
+            AuditLog.event_type == AuditEventType.LOGIN_FAILED,
+            AuditLog.timestamp > datetime.utcnow() - timedelta(minutes=15)
+        ).group_by(AuditLog.user_id).all()
+        
+        return {user_id: count for user_id, count in counts}
+    
+    @staticmethod
+    def _requires_alert(row: Dict[str, Any]) -> bool:
+        """Same rule as AuditLog.requires_alert, applied to an inserted row"""
+        return (
+            row["event_level"] in [AuditLevel.ERROR, AuditLevel.CRITICAL] or
+            row["anomaly_detected"] or
+            row["risk_score"] > 80
+        )
     
     @staticmethod
-    def _send_security_alert(audit_log: AuditLog) -> None:
+    def _send_security_alert(audit_log: Dict[str, Any]) -> None:
         """Send security alert for high-risk events"""
         
         # In production, this would:
@@ -549,7 +597,7 @@ class AuditService:
         # 2. Post to security monitoring systems
         # 3. Trigger automated responses
         
-        print(f"SECURITY ALERT: {audit_log.event_type} - Risk Score: {audit_log.risk_score}")
+        print(f"SECURITY ALERT: {audit_log['event_type']} - Risk Score: {audit_log['risk_score']}")
     
     @staticmethod
     def get_audit_trail(
@@ -727,3 +775,14 @@ class AuditService:
             return report
         finally:
             db.close()
+
+
+audit_writer = AuditWriter(
+    AuditService._write_batch,
+    max_queue_size=settings.AUDIT_QUEUE_MAX_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL,
+    enqueue_timeout=settings.AUDIT_ENQUEUE_TIMEOUT,
+    spill_path=settings.AUDIT_SPILL_PATH,
+    dead_letter_path=settings.AUDIT_DEAD_LETTER_PATH
+)
@@ -0,0 +1,278 @@
+"""
+Background audit log writer
+
+Audit events are put on a bounded in-memory queue and written by a daemon
+thread in multi-row batches, so request handlers never wait on Postgres.
+When the queue is full the caller waits briefly (backpressure) and then
+spills the event to a local JSON-lines file; batches that fail to insert are
+spilled the same way. Spilled events are replayed once writes succeed again.
+
+A batch rejected because of its data (a constraint or data error from the
+database, or an AuditEventError from encoding the events) is
+bisected until the offending events are isolated; those go to a dead-letter
+file and everything else is written, so one bad event never holds back the
+events queued or spilled behind it.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+WriteBatch = Callable[[List[Dict[str, Any]]], None]
+
+
+class AuditEventError(ValueError):
+    """Raised by a batch writer when events cannot be turned into rows"""
+
+
+# Failures caused by the events themselves. Anything else (connection and
+# driver errors included) is treated as the database being unavailable
+ROW_ERRORS: Tuple[type, ...] = (DataError, IntegrityError, AuditEventError)
+
+
+@dataclass
+class AuditWriterStats:
+    """Counters exposed through the monitoring endpoints"""
+    enqueued: int = 0
+    written: int = 0
+    spilled: int = 0
+    replayed: int = 0
+    failed_flushes: int = 0
+    dead_lettered: int = 0
+    flushes: int = 0
+    last_flush_ms: float = 0.0
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class AuditWriter:
+    """Queue audit events and write them in batches on a background thread"""
+
+    def __init__(self,
+                 write_batch: WriteBatch,
+                 max_queue_size: int = 10000,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 enqueue_timeout: float = 0.05,
+                 spill_path: Optional[str] = None,
+                 dead_letter_path: Optional[str] = None):
+        self.write_batch = write_batch
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path or (f"{spill_path}.dead" if spill_path else None)
+        self.stats = AuditWriterStats()
+
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._atexit_registered = False
+
+    def start(self) -> None:
+        """Start the writer thread (also restarts it in forked children)"""
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked child: the parent's thread and queued events are not ours
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self.stats = AuditWriterStats()
+
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """Queue an event; returns False when it had to be spilled to disk"""
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            try:
+                self._queue.put(event, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._spill([event])
+                return False
+
+        self.stats.enqueued += 1
+        return True
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued and stop; anything left over is spilled"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+        leftover = self._drain(block=False)
+        if leftover:
+            self._spill(leftover)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = asdict(self.stats)
+        stats["queued"] = self.pending()
+        stats["queue_capacity"] = self.max_queue_size
+        stats["spill_pending"] = bool(self.spill_path and os.path.exists(self.spill_path))
+        return stats
+
+    def _run(self) -> None:
+        # Events spilled by a previous process are written first
+        self._replay_spill()
+
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch = self._drain(block=not self._stopping.is_set())
+            if not batch:
+                continue
+            if self._flush(batch) and self.spill_path and os.path.exists(self.spill_path):
+                self._replay_spill()
+
+    def _drain(self, block: bool = True) -> List[Dict[str, Any]]:
+        """Collect up to one batch, waiting at most one flush interval for the first event"""
+        batch: List[Dict[str, Any]] = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        started = time.time()
+        unwritten = self._write(batch)
+        if unwritten:
+            self.stats.failed_flushes += 1
+            self._spill(unwritten)
+            return False
+
+        self.stats.flushes += 1
+        self.stats.last_flush_ms = round((time.time() - started) * 1000, 2)
+        return True
+
+    @staticmethod
+    def _is_row_error(error: Exception) -> bool:
+        return isinstance(error, ROW_ERRORS) or isinstance(getattr(error, "orig", None), ROW_ERRORS)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Write a batch, bisecting around events the database rejects.
+
+        Rejected events are dead-lettered. Returns the events left unwritten
+        because the database itself failed; the caller spills them.
+        """
+        parts = [batch]
+        while parts:
+            part = parts.pop()
+            try:
+                self.write_batch(part)
+                self.stats.written += len(part)
+            except Exception as e:
+                if not self._is_row_error(e):
+                    logger.warning(f"Audit batch of {len(part)} events failed, spilling to disk: {e}")
+                    return part + [event for rest in parts for event in rest]
+                if len(part) == 1:
+                    self._dead_letter(part[0], e)
+                else:
+                    middle = len(part) // 2
+                    # Second half pushed first so events keep their order
+                    parts.extend([part[middle:], part[:middle]])
+        return []
+
+    def _dead_letter(self, event: Dict[str, Any], error: Exception) -> None:
+        logger.error(f"Audit event rejected by the database, dead-lettered: {error}; event: {event}")
+        self.stats.dead_lettered += 1
+        if not self.dead_letter_path:
+            return
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    record = {"error": str(error), "event": event}
+                    f.write(json.dumps(record, default=_encode, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.error(f"Could not write audit dead letter: {e}")
+
+    def _spill(self, events: List[Dict[str, Any]]) -> None:
+        if not self.spill_path:
+            logger.error(f"Dropped {len(events)} audit events: no spill path configured")
+            return
+        try:
+            with self._spill_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for event in events:
+                        f.write(json.dumps(event, default=_encode, separators=(",", ":")) + "\n")
+            self.stats.spilled += len(events)
+        except OSError as e:
+            logger.error(f"Dropped {len(events)} audit events: spill failed: {e}")
+
+    def _replay_spill(self) -> None:
+        """Write spilled events back in batches; keep the file if Postgres is still failing"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+
+        replay_path = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            with self._spill_lock:
+                os.replace(self.spill_path, replay_path)
+        except OSError:
+            return  # another process picked it up
+
+        events: List[Dict[str, Any]] = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    if line.strip():
+                        logger.error("Skipping corrupt audit spill line")
+        os.unlink(replay_path)
+
+        for offset in range(0, len(events), self.batch_size):
+            chunk = events[offset:offset + self.batch_size]
+            written = self.stats.written
+            unwritten = self._write(chunk)
+            self.stats.replayed += self.stats.written - written
+            if unwritten:
+                # Database still unavailable; rejected events were already dead-lettered
+                remaining = unwritten + events[offset + self.batch_size:]
+                logger.warning(f"Audit spill replay failed, keeping {len(remaining)} events")
+                self._spill(remaining)
+                self.stats.spilled -= len(remaining)  # already counted when first spilled
+                break
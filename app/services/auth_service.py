@@ -48,7 +48,7 @@ class AuthService:
         """Create JWT access token"""
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(hours=settings.JWT_ACCESS_TOKEN_EXPIRE_HOURS)
-        to_encode.update({"exp": expire, "type": "access"})
+        to_encode.update({"exp": expire, "type": "access", "jti": secrets.token_hex(16)})
         
         encoded_jwt = jwt.encode(
             to_encode, 
@@ -384,6 +384,10 @@ class AuthService:
             for key in redis_client.scan_iter(match=session_pattern):
                 redis_client.delete(key)
             
+            # Drop cached principals so no worker keeps authenticating the user
+            from app.services.cache_service import UserCache
+            await UserCache.invalidate_user_cache(user_id)
+            
             logger.info(f"Revoked all tokens for user {user_id}")
             
         except Exception as e:
@@ -0,0 +1,284 @@
+"""
+Parallel batch document generation
+
+Fans the documents of a batch out to a bounded process pool. Every template
+used by the batch is compiled into a render plan once in the parent and
+shipped to each worker a single time; workers only splice values, write the
+package, hash it and encrypt it when required. Document statuses are written
+back with one bulk update and progress is reported as aggregated counts.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import as_completed
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from app.models.document import Document, DocumentStatus
+from app.models.template import Template, Placeholder
+from app.services.document_service import DocumentService
+from app.services.template_render_service import RenderPlan, render_plan, render_plan_cache
+from app.utils.worker_pool import WorkerPool
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+# Plans installed in each pool worker by the initializer
+_worker_plans: Dict[int, RenderPlan] = {}
+
+
+def _init_worker(plans: Dict[int, RenderPlan]) -> None:
+    """Pool initializer: receive the batch's compiled plans once per worker"""
+    global _worker_plans
+    _worker_plans = plans
+
+
+def _render_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Render one document inside a pool worker"""
+    started = time.time()
+    result = {"document_id": job["document_id"], "success": False}
+
+    try:
+        plan = _worker_plans[job["template_id"]]
+        output_path = job["output_path"]
+        render_plan(plan, job["values"], output_path)
+
+        hash_sha256 = hashlib.sha256()
+        with open(output_path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                hash_sha256.update(chunk)
+
+        result.update(
+            file_size=os.path.getsize(output_path),
+            file_hash=hash_sha256.hexdigest(),
+            file_path=output_path,
+        )
+
+        if job["encrypt"]:
+            from app.services.encryption_service import EncryptionService
+
+            encrypted_path = asyncio.run(EncryptionService.encrypt_file(output_path))
+            if encrypted_path:
+                result["file_path"] = encrypted_path
+                result["encryption_key_id"] = "default"
+
+        result["success"] = True
+
+    except Exception as e:
+        result["error"] = str(e)
+
+    result["generation_time"] = time.time() - started
+    return result
+
+
+class BatchGenerationEngine:
+    """Generate a batch of documents on a bounded worker pool"""
+
+    # Below this many documents the pool start-up costs more than it saves
+    MIN_POOL_BATCH = 4
+
+    def __init__(self, max_workers: Optional[int] = None, progress_interval: float = 1.0):
+        configured = max_workers or settings.BATCH_GENERATION_MAX_WORKERS
+        self.max_workers = max(1, configured or (os.cpu_count() or 1))
+        self.progress_interval = progress_interval
+
+    def run(self,
+            db: Session,
+            batch_id: str,
+            document_ids: List[int],
+            placeholder_data_list: Optional[List[Dict[str, Any]]] = None,
+            progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Generate every document of a batch and persist the outcome"""
+
+        total = len(document_ids)
+
+        # Explicit per-document data when it lines up, stored data otherwise
+        data_by_id: Dict[int, Dict[str, Any]] = {}
+        if isinstance(placeholder_data_list, list) and len(placeholder_data_list) == total:
+            data_by_id = dict(zip(document_ids, placeholder_data_list))
+
+        documents = db.query(Document).filter(Document.id.in_(document_ids)).all()
+        documents_by_id = {document.id: document for document in documents}
+
+        db.query(Document).filter(Document.id.in_(document_ids)).update(
+            {Document.status: DocumentStatus.PROCESSING}, synchronize_session=False
+        )
+        db.commit()
+
+        updates: List[Dict[str, Any]] = []
+        results: List[Dict[str, Any]] = []
+
+        for document_id in document_ids:
+            if document_id not in documents_by_id:
+                results.append({"document_id": document_id, "success": False,
+                                "error": f"Document {document_id} not found"})
+
+        plans, template_errors = self._compile_plans(db, documents)
+
+        jobs = []
+        for document in documents:
+            error = template_errors.get(document.template_id)
+            if error:
+                updates.append({"id": document.id, "status": DocumentStatus.FAILED, "error_message": error})
+                results.append({"document_id": document.id, "success": False, "error": error})
+                continue
+
+            plan = plans[document.template_id]
+            placeholder_data = data_by_id.get(document.id, document.placeholder_data) or {}
+            jobs.append({
+                "document_id": document.id,
+                "template_id": document.template_id,
+                "output_path": document.file_path,
+                "values": {
+                    name: DocumentService._render_placeholder_value(spec, placeholder_data)
+                    for name, spec in plan.placeholders.items()
+                },
+                "encrypt": bool(document.is_encrypted),
+            })
+
+        progress = {
+            "batch_id": batch_id,
+            "current": len(results),
+            "total": total,
+            "successful": 0,
+            "failed": len(results),
+        }
+        self._report(progress_callback, progress)
+
+        last_report = time.time()
+        for result in self._execute(jobs, plans):
+            results.append(result)
+            updates.append(self._status_update(result))
+            progress["current"] += 1
+            progress["successful" if result["success"] else "failed"] += 1
+
+            now = time.time()
+            if now - last_report >= self.progress_interval:
+                self._report(progress_callback, progress)
+                last_report = now
+
+        if updates:
+            db.bulk_update_mappings(Document, updates)
+        db.commit()
+        self._report(progress_callback, progress)
+
+        return {
+            "batch_id": batch_id,
+            "total_documents": total,
+            "successful": progress["successful"],
+            "failed": progress["failed"],
+            "results": [
+                {key: result[key] for key in ("document_id", "success", "error") if key in result}
+                for result in results
+            ],
+        }
+
+    def _compile_plans(self, db: Session, documents: List[Document]):
+        """Compile one render plan per template used by the batch"""
+
+        template_ids = {document.template_id for document in documents}
+        templates = db.query(Template).filter(Template.id.in_(template_ids)).all() if template_ids else []
+
+        placeholders_by_template: Dict[int, List[Placeholder]] = {}
+        if templates:
+            placeholders = db.query(Placeholder).filter(
+                Placeholder.template_id.in_([template.id for template in templates])
+            ).order_by(
+                Placeholder.template_id,
+                Placeholder.paragraph_index,
+                Placeholder.start_run_index
+            ).all()
+            for placeholder in placeholders:
+                placeholders_by_template.setdefault(placeholder.template_id, []).append(placeholder)
+
+        plans: Dict[int, RenderPlan] = {}
+        errors: Dict[int, str] = {template_id: "Template not found" for template_id in template_ids}
+
+        for template in templates:
+            template_path = os.path.join(settings.TEMPLATES_PATH, template.file_path)
+            if not os.path.exists(template_path):
+                errors[template.id] = "Template file not found"
+                continue
+            try:
+                plans[template.id] = render_plan_cache.get_or_compile(
+                    template,
+                    template_path,
+                    lambda template_id=template.id: placeholders_by_template.get(template_id, []),
+                    lambda doc, template=template: DocumentService._apply_document_formatting(doc, template)
+                )
+                del errors[template.id]
+            except Exception as e:
+                logger.error(f"Failed to compile template {template.id}: {e}")
+                errors[template.id] = "Failed to process template"
+
+        return plans, errors
+
+    def _execute(self, jobs: List[Dict[str, Any]], plans: Dict[int, RenderPlan]):
+        """Yield job results as they complete"""
+
+        if not jobs:
+            return
+
+        workers = min(self.max_workers, len(jobs))
+
+        if workers <= 1 or len(jobs) < self.MIN_POOL_BATCH:
+            _init_worker(plans)
+            for job in jobs:
+                yield _render_job(job)
+            return
+
+        # Inside a Celery worker this is a billiard pool, so batches still
+        # render on separate processes rather than threads
+        pool = WorkerPool(workers, initializer=_init_worker, initargs=(plans,))
+        try:
+            futures = {pool.submit(_render_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {"document_id": futures[future]["document_id"], "success": False, "error": str(e)}
+        finally:
+            pool.shutdown(wait=True, cancel_futures=False)
+
+    @staticmethod
+    def _status_update(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the bulk update mapping for one job result"""
+
+        if not result["success"]:
+            return {
+                "id": result["document_id"],
+                "status": DocumentStatus.FAILED,
+                "error_message": result.get("error") or "Failed to process template",
+            }
+
+        update = {
+            "id": result["document_id"],
+            "status": DocumentStatus.COMPLETED,
+            "completed_at": datetime.utcnow(),
+            "generation_time": result.get("generation_time"),
+            "file_size": result.get("file_size"),
+            "file_hash": result.get("file_hash"),
+            "file_path": result.get("file_path"),
+        }
+        if result.get("encryption_key_id"):
+            update["encryption_key_id"] = result["encryption_key_id"]
+        return update
+
+    @staticmethod
+    def _report(progress_callback: Optional[ProgressCallback], progress: Dict[str, Any]) -> None:
+        if progress_callback is None:
+            return
+        total = progress["total"]
+        snapshot = dict(progress)
+        snapshot["progress"] = int((progress["current"] / total) * 100) if total else 100
+        try:
+            progress_callback(snapshot)
+        except Exception as e:
+            logger.warning(f"Batch progress update failed: {e}")
@@ -10,14 +10,18 @@ import pickle
 import time
 import asyncio
 import logging
+import math
+import random
+import uuid
 import zlib
-from typing import Any, Dict, List, Optional, Union, Callable
+from typing import Any, Awaitable, Dict, List, Optional, Union, Callable
 from functools import wraps
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import redis.asyncio as aioredis
 from config import settings
+from app.services.memory_cache import NamespacedLRUCache, SharedMemoryTier
 
 # Configure logging
 cache_logger = logging.getLogger('cache_service')
@@ -33,6 +37,20 @@ class CacheMetrics:
     eviction_count: int = 0
     compression_ratio: float = 0.0
 
+@dataclass
+class SingleFlightMetrics:
+    """Request coalescing and refresh metrics for get_or_load"""
+    loads: int = 0
+    coalesced_local: int = 0  # waited on a load running in this process
+    coalesced_remote: int = 0  # served by a load another worker ran
+    early_refreshes: int = 0
+    stale_served: int = 0
+    lock_wait_timeouts: int = 0
+
+    @property
+    def duplicate_loads_avoided(self) -> int:
+        return self.coalesced_local + self.coalesced_remote
+
 @dataclass
 class CacheConfig:
     """Advanced cache configuration"""
@@ -45,6 +63,23 @@ class CacheConfig:
     replication_enabled: bool = False
     persistence_enabled: bool = True
     key_prefix: str = "mytypist:"
+    # Single-flight loading
+    stale_ttl: int = 60  # seconds a value may be served stale while it is refreshed
+    early_refresh_beta: float = 1.0  # XFetch aggressiveness; 0 disables early refresh
+    single_flight_lock_timeout: float = 10.0
+    # L1 (in-process) budgets, per namespace
+    l1_ttl: int = 300  # 5 minutes
+    l1_default_budget_bytes: int = settings.CACHE_L1_NAMESPACE_BUDGET_BYTES
+    l1_namespace_budgets: Dict[str, int] = field(
+        default_factory=lambda: {"template": settings.CACHE_L1_TEMPLATE_BUDGET_BYTES}
+    )
+    l1_max_entry_bytes: int = 4 * 1024 * 1024
+    # Optional host-wide tier on tmpfs shared by all workers (disabled when empty)
+    shared_memory_dir: str = settings.CACHE_SHARED_MEMORY_DIR
+    shared_memory_max_bytes: int = settings.CACHE_SHARED_MEMORY_MAX_BYTES
+    shared_memory_namespaces: List[str] = field(
+        default_factory=lambda: list(settings.CACHE_SHARED_MEMORY_NAMESPACES)
+    )
 
 
 class CacheService:
@@ -63,14 +98,39 @@ class CacheService:
         self.redis: Optional[aioredis.Redis] = None
         self.compression_threshold = self.config.compression_threshold
         self.metrics = CacheMetrics()
-        self.cache_dependencies: Dict[str, List[str]] = {}
-        self.cache_tags: Dict[str, List[str]] = {}
         self.warming_tasks: Dict[str, asyncio.Task] = {}
 
-        # L1 Cache (In-memory)
-        self.l1_cache: Dict[str, Dict[str, Any]] = {}
-        self.l1_max_size = 1000
-        self.l1_ttl = 300  # 5 minutes
+        # Cross-worker invalidation (tag sets live in Redis, L1 evictions via pub/sub)
+        self.instance_id = uuid.uuid4().hex
+        self.invalidation_channel = f"{self.config.key_prefix}invalidation"
+        self._tag_add_script = None
+        self._invalidation_task: Optional[asyncio.Task] = None
+
+        # Single-flight state: foreground loads and background refreshes
+        self.single_flight_metrics = SingleFlightMetrics()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+        # L1 Cache (In-memory, O(1) LRU/TTL with per-namespace byte budgets)
+        self.l1_ttl = self.config.l1_ttl
+        self.l1 = NamespacedLRUCache(
+            default_budget_bytes=self.config.l1_default_budget_bytes,
+            namespace_budgets=self.config.l1_namespace_budgets,
+            default_ttl=self.l1_ttl,
+            max_entry_bytes=self.config.l1_max_entry_bytes
+        )
+
+        # Shared-memory tier (same host, all workers)
+        self.shared_tier: Optional[SharedMemoryTier] = None
+        if self.config.shared_memory_dir:
+            try:
+                self.shared_tier = SharedMemoryTier(
+                    self.config.shared_memory_dir,
+                    max_bytes=self.config.shared_memory_max_bytes,
+                    namespaces=self.config.shared_memory_namespaces or None
+                )
+            except OSError as e:
+                cache_logger.warning(f"Shared memory cache tier disabled: {e}")
 
     async def initialize(self):
         """Initialize Redis connection"""
@@ -85,6 +145,8 @@ class CacheService:
                 max_connections=20
             )
             await self.redis.ping()
+            self._tag_add_script = self.redis.register_script(self._TAG_ADD_SCRIPT)
+            self.start_invalidation_listener()
             return True
         except Exception as e:
             print(f"Redis initialization failed: {e}")
@@ -104,17 +166,6 @@ class CacheService:
             cache_logger.error(f"Serialization error: {e}")
             return None
 
-    def _deserialize_data(self, data: bytes) -> Any:
-        """Deserialize and decompress data"""
-        try:
-            # Check if data is compressed
-            if data.startswith(b'\x1f\x8b'):  # gzip magic number
-                data = gzip.decompress(data)
-            return json.loads(data.decode('utf-8'))
-        except Exception as e:
-            cache_logger.error(f"Deserialization error: {e}")
-            return None
-
     async def cache_template(self, template: Any, ttl: int = None) -> bool:
         """Cache a template with metadata"""
         try:
@@ -144,7 +195,7 @@ class CacheService:
             )
             
             # Track template dependencies
-            await self.track_dependencies([cache_key], [f"template:{template.id}"])
+            await self.track_dependencies([cache_key], [f"template:{template.id}"], ttl)
             return True
             
         except Exception as e:
@@ -179,6 +230,9 @@ class CacheService:
     async def invalidate_template(self, template_id: int) -> bool:
         """Invalidate all versions of a template"""
         try:
+            from app.middleware.token_deduction import token_costs
+            token_costs.invalidate(template_id)
+
             # Invalidate by dependency
             await self.invalidate_by_tag(f"template:{template_id}")
             return True
@@ -190,11 +244,9 @@ class CacheService:
         """Cache multiple templates efficiently"""
         try:
             pipe = self.redis.pipeline()
-            dependencies = []
             
             for template in templates:
                 cache_key = f"{self.config.key_prefix}template:{template.id}:v{template.version}"
-                dependencies.append((cache_key, f"template:{template.id}"))
                 
                 template_data = {
                     "id": template.id,
@@ -218,13 +270,11 @@ class CacheService:
                         ttl or self.config.default_ttl,
                         serialized
                     )
+                    # Tag membership goes out in the same round trip
+                    await self.track_dependencies([cache_key], [f"template:{template.id}"], ttl, pipe=pipe)
                     
             # Execute all cache operations
             await pipe.execute()
-            
-            # Track all dependencies
-            for key, tag in dependencies:
-                await self.track_dependencies([key], [tag])
                 
             return True
             
@@ -232,65 +282,45 @@ class CacheService:
             cache_logger.error(f"Bulk template cache error: {e}")
             return False
 
-    async def track_dependencies(self, keys: List[str], tags: List[str]) -> bool:
-        """Track cache key dependencies for invalidation"""
-        try:
-            # Store key -> tag mapping
-            for key in keys:
-                self.cache_dependencies[key] = tags
-                
-            # Store tag -> key mapping
-            for tag in tags:
-                if tag not in self.cache_tags:
-                    self.cache_tags[tag] = []
-                self.cache_tags[tag].extend(keys)
-                
-            return True
-        except Exception as e:
-            cache_logger.error(f"Error tracking dependencies: {e}")
+    # Tag sets: SADD every key into each tag set and only ever extend the
+    # set's TTL, so a short-lived member cannot expire a long-lived one's tag
+    _TAG_ADD_SCRIPT = """
+    local ttl = tonumber(ARGV[1])
+    for i, tag_key in ipairs(KEYS) do
+        for j = 2, #ARGV do
+            redis.call('sadd', tag_key, ARGV[j])
+        end
+        if redis.call('ttl', tag_key) < ttl then
+            redis.call('expire', tag_key, ttl)
+        end
+    end
+    return #KEYS
+    """
+
+    # Keys deleted per pipeline round trip during invalidation
+    _INVALIDATION_BATCH = 500
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.config.key_prefix}tag:{tag}"
+
+    async def track_dependencies(self, keys: List[str], tags: List[str], ttl: int = None, pipe=None) -> bool:
+        """Track cache key dependencies for invalidation (Redis tag sets shared by all workers)"""
+        if not self.redis or not keys or not tags:
             return False
 
-    async def invalidate_by_tag(self, tag: str) -> bool:
-        """Invalidate all cache entries with the given tag"""
         try:
-            if tag not in self.cache_tags:
-                return True
-                
-            # Get all keys for this tag
-            keys = self.cache_tags[tag]
-            if not keys:
-                return True
-                
-            # Delete all keys
-            await self.redis.delete(*keys)
-            
-            # Clean up tracking
-            del self.cache_tags[tag]
-            for key in keys:
-                if key in self.cache_dependencies:
-                    del self.cache_dependencies[key]
-                    
+            tag_ttl = (ttl or self.config.default_ttl) + 60
+            script_keys = [self._tag_key(tag) for tag in tags]
+            script_args = [tag_ttl] + list(keys)
+
+            if self._tag_add_script is not None:
+                await self._tag_add_script(keys=script_keys, args=script_args, client=pipe)
+            else:
+                await (pipe or self.redis).eval(self._TAG_ADD_SCRIPT, len(script_keys), *script_keys, *script_args)
             return True
         except Exception as e:
-            cache_logger.error(f"Error invalidating by tag: {e}")
+            cache_logger.error(f"Error tracking dependencies: {e}")
             return False
-            
-            # Compress if data is large enough
-            if len(json_data) > self.compression_threshold:
-                compressed = gzip.compress(json_data)
-                # Mark as compressed with prefix
-                return b'GZIP:' + compressed
-            else:
-                return b'JSON:' + json_data
-
-        except Exception:
-            # Fallback to pickle for complex objects
-            pickled = pickle.dumps(data)
-            if len(pickled) > self.compression_threshold:
-                compressed = gzip.compress(pickled)
-                return b'GZIP_PICKLE:' + compressed
-            else:
-                return b'PICKLE:' + pickled
 
     def _deserialize_data(self, data: bytes) -> Any:
         """Deserialize and decompress data"""
@@ -305,6 +335,9 @@ class CacheService:
                 return pickle.loads(decompressed)
             elif data.startswith(b'PICKLE:'):
                 return pickle.loads(data[7:])
+            elif data.startswith(b'\x1f\x8b'):
+                # Compressed output of _serialize_data
+                return json.loads(gzip.decompress(data).decode('utf-8'))
             else:
                 # Legacy format
                 return json.loads(data.decode('utf-8'))
@@ -325,30 +358,28 @@ class CacheService:
         ttl = expire or self.config.default_ttl
 
         try:
+            # Serialized once: its length is the L1 size cost and the
+            # payload for the shared and Redis tiers
+            serialized = self._serialize_data(value)
+
             # Store in L1 cache
-            self._set_to_l1(cache_key, value, ttl)
+            self._set_to_l1(cache_key, value, min(ttl, self.l1_ttl), len(serialized) if serialized else None)
+
+            # Store in shared-memory tier
+            if self.shared_tier and serialized and self.shared_tier.accepts(self._namespace_for(cache_key)):
+                self.shared_tier.set(cache_key, serialized, ttl)
 
             # Store in L2 cache (Redis)
             if self.redis:
-                serialized = self._serialize_data(value)
                 success = await self.redis.setex(cache_key, ttl, serialized)
                 if not success:
                     return False
 
-                # Add tags for grouped invalidation
-                if tags and success:
-                    for tag in tags:
-                        await self.redis.sadd(f"tag:{tag}", cache_key)
-                        await self.redis.expire(f"tag:{tag}", ttl + 60)
-
-                        # Update local tag registry
-                        if tag not in self.cache_tags:
-                            self.cache_tags[tag] = []
-                        self.cache_tags[tag].append(cache_key)
-
-                # Handle dependencies for cascade invalidation
-                if dependencies:
-                    self._register_dependencies(cache_key, dependencies)
+                # Tags for grouped invalidation; dependencies become `dep:<key>`
+                # tags so invalidate_dependents(key) cascades to this entry
+                all_tags = list(tags or []) + [f"dep:{dependency}" for dependency in dependencies or []]
+                if all_tags:
+                    await self.track_dependencies([cache_key], all_tags, ttl)
 
             return True
 
@@ -363,31 +394,29 @@ class CacheService:
             prefix += f"{namespace}:"
         return f"{prefix}{key}"
 
+    def _namespace_for(self, cache_key: str) -> str:
+        """Namespace used for L1 budgets and stats: first key segment after the prefix"""
+        key = cache_key
+        if key.startswith(self.config.key_prefix):
+            key = key[len(self.config.key_prefix):]
+        return key.split(":", 1)[0] if ":" in key else "default"
+
     def _get_from_l1(self, key: str) -> Any:
         """Get from L1 (memory) cache"""
-        if key in self.l1_cache:
-            entry = self.l1_cache[key]
-            if entry['expires_at'] > time.time():
-                return entry['value']
-            else:
-                # Expired, remove from L1
-                del self.l1_cache[key]
-        return None
-
-    def _set_to_l1(self, key: str, value: Any, ttl: int = None):
-        """Set to L1 (memory) cache with LRU eviction"""
-        # Implement LRU eviction if cache is full
-        if len(self.l1_cache) >= self.l1_max_size:
-            # Remove oldest entry
-            oldest_key = min(self.l1_cache.keys(),
-                           key=lambda k: self.l1_cache[k]['created_at'])
-            del self.l1_cache[oldest_key]
-
-        ttl = ttl or self.l1_ttl
-        self.l1_cache[key] = {
-            'value': value,
-            'created_at': time.time(),
-            'expires_at': time.time() + ttl
+        return self.l1.get(key, self._namespace_for(key))
+
+    def _set_to_l1(self, key: str, value: Any, ttl: int = None, size: int = None):
+        """Set to L1 (memory) cache with O(1) LRU eviction within the namespace budget"""
+        if size is None:
+            size = len(json.dumps(value, default=str))
+        self.l1.set(key, value, self._namespace_for(key), size, ttl or self.l1_ttl)
+
+    def get_l1_stats(self) -> Dict[str, Any]:
+        """Per-namespace L1 hit/miss/eviction counters and byte usage"""
+        return {
+            "namespaces": self.l1.stats(),
+            "entries": len(self.l1),
+            "shared_memory_enabled": self.shared_tier is not None
         }
 
     def _update_response_time(self, start_time: float):
@@ -418,6 +447,17 @@ class CacheService:
                 self._update_response_time(start_time)
                 return l1_result
 
+            # Shared-memory tier (populated by any worker on this host)
+            if self.shared_tier and self.shared_tier.accepts(self._namespace_for(cache_key)):
+                data = self.shared_tier.get(cache_key)
+                if data is not None:
+                    result = self._deserialize_data(data)
+                    if result is not None:
+                        self._set_to_l1(cache_key, result, size=len(data))
+                        self.metrics.hit_count += 1
+                        self._update_response_time(start_time)
+                        return result
+
             # L2 Cache check (Redis)
             if self.redis:
                 data = await self.redis.get(cache_key)
@@ -425,7 +465,7 @@ class CacheService:
                     result = self._deserialize_data(data)
                     if result is not None:
                         # Store in L1 for faster future access
-                        self._set_to_l1(cache_key, result)
+                        self._set_to_l1(cache_key, result, size=len(data))
                         self.metrics.hit_count += 1
                         self._update_response_time(start_time)
                         return result
@@ -440,30 +480,144 @@ class CacheService:
             return default
 
     async def delete(self, key: str) -> bool:
-        """Delete cached value"""
+        """Delete cached value from every tier"""
+        deleted = self.l1.delete(key)
+        if self.shared_tier:
+            deleted = self.shared_tier.delete(key) or deleted
+
         if not self.redis:
-            return False
+            return deleted
 
         try:
-            return await self.redis.delete(key) > 0
+            removed = await self.redis.delete(key) > 0
+            await self._publish_invalidation([key])
+            return removed or deleted
         except Exception:
-            return False
+            return deleted
 
     async def invalidate_by_tag(self, tag: str) -> int:
-        """Invalidate all cache entries with specific tag"""
+        """
+        Invalidate all cache entries with specific tag on every worker.
+
+        The tag set is renamed first so keys tagged during the invalidation
+        land in a fresh set; members are then scanned and unlinked in
+        pipelined batches, and each batch is published so every worker
+        evicts the same keys from its L1 and shared tier.
+        """
         if not self.redis:
             return 0
 
+        tag_key = self._tag_key(tag)
+        draining_key = f"{tag_key}:invalidating:{uuid.uuid4().hex}"
+
         try:
-            keys = await self.redis.smembers(f"tag:{tag}")
-            if keys:
-                deleted = await self.redis.delete(*keys)
-                await self.redis.delete(f"tag:{tag}")
-                return deleted
+            try:
+                await self.redis.rename(tag_key, draining_key)
+            except aioredis.ResponseError:
+                # No such tag set: nothing tagged, or it already expired
+                return 0
+
+            deleted = 0
+            cursor = 0
+            while True:
+                cursor, members = await self.redis.sscan(draining_key, cursor, count=self._INVALIDATION_BATCH)
+                if members:
+                    keys = [m.decode("utf-8") if isinstance(m, bytes) else m for m in members]
+                    deleted += await self._delete_keys(keys)
+                if cursor == 0:
+                    break
+
+            await self.redis.unlink(draining_key)
+            return deleted
+        except Exception as e:
+            cache_logger.error(f"Error invalidating by tag {tag}: {e}")
             return 0
-        except Exception:
+
+    async def invalidate_dependents(self, key: str) -> int:
+        """Invalidate every entry set with `dependencies` containing `key`"""
+        return await self.invalidate_by_tag(f"dep:{key}")
+
+    async def _delete_keys(self, keys: List[str]) -> int:
+        """Unlink one batch of keys in a single round trip and broadcast the eviction"""
+        self.l1.delete_many(keys)
+        if self.shared_tier:
+            self.shared_tier.delete_many(keys)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.unlink(*keys)
+        pipe.publish(self.invalidation_channel, self._invalidation_message(keys))
+        results = await pipe.execute()
+        return results[0] or 0
+
+    def _invalidation_message(self, keys: List[str]) -> str:
+        return json.dumps({"origin": self.instance_id, "keys": keys})
+
+    async def _publish_invalidation(self, keys: List[str]) -> None:
+        try:
+            await self.redis.publish(self.invalidation_channel, self._invalidation_message(keys))
+        except Exception as e:
+            cache_logger.warning(f"Failed to publish cache invalidation: {e}")
+
+    def _apply_invalidation(self, raw_message: Any) -> int:
+        """Evict keys announced by another worker from local tiers"""
+        try:
+            if isinstance(raw_message, bytes):
+                raw_message = raw_message.decode("utf-8")
+            message = json.loads(raw_message)
+        except (ValueError, UnicodeDecodeError):
             return 0
 
+        if message.get("origin") == self.instance_id:
+            return 0  # evicted locally before publishing
+
+        keys = message.get("keys") or []
+        evicted = self.l1.delete_many(keys)
+        if self.shared_tier:
+            self.shared_tier.delete_many(keys)
+        return evicted
+
+    def start_invalidation_listener(self) -> None:
+        """Subscribe to the invalidation channel in the background"""
+        if self._invalidation_task is None or self._invalidation_task.done():
+            self._invalidation_task = asyncio.get_running_loop().create_task(self._listen_for_invalidations())
+
+    async def _listen_for_invalidations(self) -> None:
+        backoff = 1
+        while self.redis is not None:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.invalidation_channel)
+                backoff = 1
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self._apply_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                cache_logger.warning(f"Invalidation listener error, reconnecting in {backoff}s: {e}")
+                # Whatever was published meanwhile is lost; drop L1 to stay correct
+                self.l1.clear()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def close(self) -> None:
+        """Stop the invalidation listener and close the Redis connection"""
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            try:
+                await self._invalidation_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._invalidation_task = None
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
     async def mget(self, keys: List[str]) -> Dict[str, Any]:
         """Get multiple cache values"""
         if not self.redis or not keys:
@@ -496,12 +650,186 @@ class CacheService:
             return False
 
 
+    # Single-flight loading
+
+    _ENVELOPE_MARKER = "__sf__"
+
+    # Delete the lock only if it still holds our token
+    _RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def _is_envelope(self, entry: Any) -> bool:
+        return isinstance(entry, dict) and entry.get(self._ENVELOPE_MARKER) == 1
+
+    async def get_or_load(self,
+                          key: str,
+                          loader: Callable[[], Awaitable[Any]],
+                          expire: int = 300,
+                          tags: List[str] = None,
+                          stale_ttl: Optional[int] = None,
+                          early_refresh_beta: Optional[float] = None,
+                          background_refresh: bool = True) -> Any:
+        """
+        Return the cached value for `key`, computing it with `loader` at most
+        once across concurrent callers.
+
+        - Misses are coalesced: one caller per process runs `loader`, the
+          others await its result; a Redis lock extends this across workers.
+        - Fresh values are refreshed early in the background with a
+          probability that rises as expiry approaches (XFetch), so hot keys
+          are rarely seen expired.
+        - Values up to `stale_ttl` seconds past expiry are served immediately
+          while one background refresh rebuilds them.
+
+        Background refreshes run `loader` after the caller has returned, so
+        it must open its own resources. Pass background_refresh=False when
+        it closes over request-scoped state such as a database session.
+        """
+        if not background_refresh:
+            stale_ttl, early_refresh_beta = 0, 0
+        stale_ttl = self.config.stale_ttl if stale_ttl is None else stale_ttl
+        beta = self.config.early_refresh_beta if early_refresh_beta is None else early_refresh_beta
+
+        entry = await self.get(key)
+        if self._is_envelope(entry):
+            now = time.time()
+            soft_expiry = entry["exp"]
+
+            if now < soft_expiry:
+                # XFetch: -log(U) is exponential, scaled by the load duration
+                if beta > 0 and now - entry["delta"] * beta * math.log(1.0 - random.random()) >= soft_expiry:
+                    if self._schedule_refresh(key, loader, expire, tags, stale_ttl):
+                        self.single_flight_metrics.early_refreshes += 1
+                return entry["value"]
+
+            if now < soft_expiry + stale_ttl:
+                self.single_flight_metrics.stale_served += 1
+                self._schedule_refresh(key, loader, expire, tags, stale_ttl)
+                return entry["value"]
+
+        return await self._load_single_flight(key, loader, expire, tags, stale_ttl)
+
+    async def _load_single_flight(self, key: str, loader: Callable[[], Awaitable[Any]],
+                                  expire: int, tags: Optional[List[str]], stale_ttl: int) -> Any:
+        """Run `loader` once per key per process; concurrent callers share the result"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.single_flight_metrics.coalesced_local += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load_with_lock(key, loader, expire, tags, stale_ttl, wait_for_peer=True)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # consumed here; waiters still receive it
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _schedule_refresh(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          expire: int, tags: Optional[List[str]], stale_ttl: int) -> bool:
+        """Start one background refresh for `key` unless one is already running"""
+        if key in self._refreshing or key in self._inflight:
+            return False
+
+        async def refresh():
+            try:
+                await self._load_with_lock(key, loader, expire, tags, stale_ttl, wait_for_peer=False)
+            except Exception as e:
+                cache_logger.warning(f"Background refresh failed for key {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(refresh())
+        return True
+
+    async def _load_with_lock(self, key: str, loader: Callable[[], Awaitable[Any]],
+                              expire: int, tags: Optional[List[str]], stale_ttl: int,
+                              wait_for_peer: bool) -> Any:
+        """Load under a short Redis lock so only one worker hits the database"""
+        lock_key = f"{key}:sf-lock"
+        token = None
+
+        if self.redis:
+            token = uuid.uuid4().hex
+            timeout = self.config.single_flight_lock_timeout
+            try:
+                acquired = await self.redis.set(lock_key, token, nx=True, px=int(timeout * 1000))
+            except Exception:
+                acquired, token = True, None  # Redis trouble: load locally
+
+            if not acquired:
+                if not wait_for_peer:
+                    # Another worker is already refreshing this key
+                    return None
+
+                waited_since = time.time()
+                while time.time() - waited_since < timeout:
+                    await asyncio.sleep(0.05)
+                    data = await self.redis.get(key)
+                    entry = self._deserialize_data(data) if data is not None else None
+                    if self._is_envelope(entry) and time.time() < entry["exp"] + stale_ttl:
+                        self._set_to_l1(key, entry, size=len(data))
+                        self.single_flight_metrics.coalesced_remote += 1
+                        return entry["value"]
+
+                self.single_flight_metrics.lock_wait_timeouts += 1
+                token = None
+
+        try:
+            started = time.time()
+            value = await loader()
+            finished = time.time()
+            self.single_flight_metrics.loads += 1
+
+            envelope = {
+                self._ENVELOPE_MARKER: 1,
+                "value": value,
+                "at": finished,
+                "delta": finished - started,
+                "exp": finished + expire,
+            }
+            await self.set(key, envelope, expire + stale_ttl, tags=tags)
+            return value
+        finally:
+            if token:
+                try:
+                    await self.redis.eval(self._RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception:
+                    pass
+
+    def get_single_flight_stats(self) -> Dict[str, Any]:
+        """Loads performed, duplicate loads avoided and refresh counters"""
+        metrics = self.single_flight_metrics
+        return {
+            "loads": metrics.loads,
+            "duplicate_loads_avoided": metrics.duplicate_loads_avoided,
+            "coalesced_local": metrics.coalesced_local,
+            "coalesced_remote": metrics.coalesced_remote,
+            "early_refreshes": metrics.early_refreshes,
+            "stale_served": metrics.stale_served,
+            "lock_wait_timeouts": metrics.lock_wait_timeouts,
+            "inflight": len(self._inflight),
+            "refreshing": len(self._refreshing)
+        }
+
 # Global cache instance
 cache_service = CacheService()
 
 
 def cache_response(expire: int = 300, key_prefix: str = "api", tags: List[str] = None):
-    """Decorator for caching API responses"""
+    """Decorator for caching API responses (single-flight)"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -509,23 +837,21 @@ def cache_response(expire: int = 300, key_prefix: str = "api", tags: List[str] =
             params_hash = hashlib.md5(str(sorted(kwargs.items())).encode()).hexdigest()
             cache_key = f"{key_prefix}:{func.__name__}:{params_hash}"
 
-            # Try cache first
-            cached = await cache_service.get(cache_key)
-            if cached is not None:
-                return cached
-
-            # Execute function
-            result = await func(*args, **kwargs)
-
-            # Cache result
-            await cache_service.set(cache_key, result, expire, tags or [])
-            return result
+            # Concurrent misses share one execution of the function. The
+            # arguments are request-scoped, so nothing refreshes in the background.
+            return await cache_service.get_or_load(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                expire=expire,
+                tags=tags or [],
+                background_refresh=False
+            )
         return wrapper
     return decorator
 
 
 def cache_query(expire: int = 600, key_prefix: str = "query"):
-    """Decorator for caching database query results"""
+    """Decorator for caching database query results (single-flight)"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -533,17 +859,14 @@ def cache_query(expire: int = 600, key_prefix: str = "query"):
             query_hash = hashlib.md5(str(args + tuple(sorted(kwargs.items()))).encode()).hexdigest()
             cache_key = f"{key_prefix}:{func.__name__}:{query_hash}"
 
-            # Try cache first
-            cached = await cache_service.get(cache_key)
-            if cached is not None:
-                return cached
-
-            # Execute query
-            result = await func(*args, **kwargs)
-
-            # Cache result
-            await cache_service.set(cache_key, result, expire)
-            return result
+            # Concurrent misses share one execution of the query. The session
+            # belongs to the caller, so nothing refreshes in the background.
+            return await cache_service.get_or_load(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                expire=expire,
+                background_refresh=False
+            )
         return wrapper
     return decorator
 
@@ -609,6 +932,18 @@ class UserCache:
         cache_key = f"user_permissions:{user_id}"
         return await cache_service.get(cache_key)
 
+    @staticmethod
+    async def cache_principal(user_id: int, token_id: str, principal: Dict, expire: int = 60) -> bool:
+        """Cache the authenticated user snapshot for one access token"""
+        cache_key = f"principal:{user_id}:{token_id}"
+        return await cache_service.set(cache_key, principal, expire, tags=[f"principal:{user_id}"])
+
+    @staticmethod
+    async def get_principal(user_id: int, token_id: str) -> Optional[Dict]:
+        """Get the cached user snapshot for an access token"""
+        cache_key = f"principal:{user_id}:{token_id}"
+        return await cache_service.get(cache_key)
+
     @staticmethod
     async def invalidate_user_cache(user_id: int) -> int:
         """Invalidate all user-related cache"""
@@ -621,4 +956,7 @@ class UserCache:
         for key in keys_to_delete:
             if await cache_service.delete(key):
                 deleted += 1
+
+        # Principals of every token the user holds, on every worker
+        deleted += await cache_service.invalidate_by_tag(f"principal:{user_id}")
         return deleted
\ No newline at end of file
@@ -0,0 +1,459 @@
+"""
+Chunked campaign execution
+
+Target users are streamed in keyset-paginated chunks (``id > last_id``), so a
+campaign never holds its whole audience in memory. Each chunk commits its
+token gifts and CampaignExecution rows in one transaction with bulk
+statements, then sends its emails through a bounded-concurrency pool that
+respects per-provider rate limits. The committed execution rows are the
+checkpoint: a run that crashes resumes after the highest user id already
+recorded and first finishes emails that were recorded but never sent.
+
+Only one task runs a campaign at a time. It holds a Redis lease, renewed
+after every chunk, and a campaign already running is resumed only by the
+task that owns the lease coming back on a retry or redelivery. Execution
+rows are unique per (campaign, user) and inserted with ON CONFLICT DO
+NOTHING, so even a stray second run never gifts or emails a user twice.
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config import settings
+from app.models.user import User
+from app.models.campaign import Campaign, CampaignStatus
+from app.models.token import UserToken, TokenTransaction, TokenType, TokenTransactionType
+from app.services.email_service import EmailService, email_service as shared_email_service
+
+logger = logging.getLogger(__name__)
+
+# Balance column credited for each gifted token type; bonuses land on document tokens
+_TOKEN_COLUMNS = {
+    TokenType.DOCUMENT_GENERATION: "document_tokens",
+    TokenType.TEMPLATE_CREATION: "template_tokens",
+    TokenType.API_USAGE: "api_tokens",
+    TokenType.PREMIUM_FEATURES: "premium_tokens",
+}
+
+GIFT_EXPIRY = timedelta(days=365)
+
+
+class Recipient(namedtuple("Recipient", "id email username first_name last_name")):
+    """The user columns a campaign needs, without loading full User rows"""
+
+    @property
+    def full_name(self) -> str:
+        return " ".join(part for part in (self.first_name, self.last_name) if part) or self.username
+
+
+def parse_rate_limits(value: str) -> Dict[str, float]:
+    """Parse "sendgrid:100,smtp:5" into sends per second per provider"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        provider, _, rate = item.partition(":")
+        if rate:
+            limits[provider.strip()] = float(rate)
+    return limits
+
+
+class ProviderRateLimiter:
+    """Token bucket per email provider, shared by every send in one run"""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = rates
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, provider: Optional[str]) -> None:
+        rate = self.rates.get(provider) if provider else None
+        if not rate:
+            return
+
+        lock = self._locks.setdefault(provider, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(provider, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate)
+            if tokens < 1:
+                await asyncio.sleep((1 - tokens) / rate)
+                now = time.monotonic()
+                tokens = 1.0
+            self._buckets[provider] = (tokens - 1, now)
+
+
+class CampaignLeaseLost(Exception):
+    """Another run took the campaign over; this one must stop"""
+
+
+class CampaignLease:
+    """Redis lease naming the one task allowed to run a campaign"""
+
+    KEY = "campaign:run:{}"
+    # Only the current owner may extend or drop the lease
+    _RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client=None, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.CAMPAIGN_LEASE_SECONDS
+        self._client = client
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.from_url(settings.REDIS_URL, decode_responses=True, socket_timeout=2)
+        return self._client
+
+    def acquire(self, campaign_id: int, owner: str) -> bool:
+        key = self.KEY.format(campaign_id)
+        if self._redis().set(key, owner, nx=True, ex=self.ttl):
+            return True
+        # The owner coming back on a retry or redelivery takes its lease back
+        return self.renew(campaign_id, owner)
+
+    def renew(self, campaign_id: int, owner: str) -> bool:
+        return bool(self._redis().eval(self._RENEW, 1, self.KEY.format(campaign_id), owner, self.ttl))
+
+    def release(self, campaign_id: int, owner: str) -> None:
+        self._redis().eval(self._RELEASE, 1, self.KEY.format(campaign_id), owner)
+
+
+class CampaignEngine:
+    """Runs or resumes one campaign chunk by chunk"""
+
+    def __init__(self, email_service: Optional[EmailService] = None,
+                 chunk_size: Optional[int] = None, concurrency: Optional[int] = None,
+                 rate_limits: Optional[Dict[str, float]] = None, lease: Optional[CampaignLease] = None):
+        self.email_service = email_service or shared_email_service
+        self.lease = lease or CampaignLease()
+        self.chunk_size = chunk_size or settings.CAMPAIGN_CHUNK_SIZE
+        self.concurrency = concurrency or settings.CAMPAIGN_EMAIL_CONCURRENCY
+        self.rate_limits = rate_limits if rate_limits is not None else parse_rate_limits(
+            settings.CAMPAIGN_EMAIL_RATE_LIMITS
+        )
+
+    async def run(self, db: Session, campaign_id: int, owner: Optional[str] = None,
+                  resume: bool = False) -> Dict[str, Any]:
+        """
+        Execute a scheduled campaign as `owner`.
+
+        A campaign already running is only picked up when `resume` is set,
+        i.e. by a retry or redelivery of the task that started it, and only
+        while no other owner holds its lease.
+        """
+        from app.services.campaign_service import CampaignService
+
+        owner = owner or uuid.uuid4().hex
+        campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+        if not campaign:
+            return {"success": False, "message": "Campaign not found"}
+
+        if campaign.status not in (CampaignStatus.SCHEDULED, CampaignStatus.RUNNING):
+            return {"success": False, "message": "Campaign is not in scheduled state"}
+        if campaign.status == CampaignStatus.RUNNING and not resume:
+            return {"success": False, "message": "Campaign is already running"}
+        if not self.lease.acquire(campaign_id, owner):
+            return {"success": False, "message": "Campaign is already running"}
+
+        if campaign.status == CampaignStatus.SCHEDULED:
+            # Only one run may start a scheduled campaign
+            claimed = db.execute(
+                update(Campaign)
+                .where(Campaign.id == campaign_id, Campaign.status == CampaignStatus.SCHEDULED)
+                .values(status=CampaignStatus.RUNNING)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not claimed:
+                db.rollback()
+                self.lease.release(campaign_id, owner)
+                return {"success": False, "message": "Campaign is already running"}
+            campaign.status = CampaignStatus.RUNNING
+            campaign.executed_at = datetime.utcnow()
+            db.commit()
+
+        limiter = ProviderRateLimiter(self.rate_limits)
+        summary = {"recipients": 0, "emails_sent": 0, "emails_failed": 0, "tokens_distributed": 0}
+
+        # Emails recorded by a crashed run but never sent
+        await self._send_pending(db, campaign, owner, limiter, summary)
+
+        last_id, processed = self._checkpoint(db, campaign_id)
+        resumed = processed > 0
+        targets = CampaignService.target_query(db, campaign).with_entities(
+            User.id, User.email, User.username, User.first_name, User.last_name
+        )
+
+        while True:
+            limit = self.chunk_size
+            if campaign.max_recipients:
+                limit = min(limit, campaign.max_recipients - processed)
+                if limit <= 0:
+                    break
+
+            chunk = [
+                Recipient(*row)
+                for row in targets.filter(User.id > last_id).order_by(User.id).limit(limit)
+            ]
+            if not chunk:
+                break
+
+            executions = self._commit_chunk(db, campaign, chunk, summary)
+            if executions:
+                await self._send_emails(db, campaign, executions, limiter, summary)
+
+            last_id = chunk[-1].id
+            processed += len(chunk)
+            logger.info(f"Campaign {campaign_id}: {processed} recipients processed")
+            self._heartbeat(campaign_id, owner)
+
+        campaign.status = CampaignStatus.COMPLETED
+        campaign.completed_at = datetime.utcnow()
+        db.commit()
+        self.lease.release(campaign_id, owner)
+
+        logger.info(
+            f"Campaign {campaign_id} executed: {processed} recipients, "
+            f"{summary['emails_sent']} emails sent, {summary['emails_failed']} failed"
+        )
+
+        return {
+            "success": True,
+            "campaign_id": campaign_id,
+            "recipients_count": processed,
+            "resumed": resumed,
+            "successful_executions": processed - summary["emails_failed"],
+            "failed_executions": summary["emails_failed"],
+            "tokens_distributed": summary["tokens_distributed"],
+            "message": "Campaign executed successfully"
+        }
+
+    def _heartbeat(self, campaign_id: int, owner: str) -> None:
+        """Extend the lease, or stop if another run has taken the campaign"""
+        if not self.lease.renew(campaign_id, owner):
+            raise CampaignLeaseLost(f"Campaign {campaign_id} lease lost by {owner}")
+
+    @staticmethod
+    def _insert_new_executions(db: Session):
+        """INSERT that skips users the campaign already recorded"""
+        from app.services.campaign_service import CampaignExecution
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            statement = postgresql.insert(CampaignExecution)
+        elif dialect == "sqlite":
+            statement = sqlite.insert(CampaignExecution)
+        else:
+            return insert(CampaignExecution)
+        return statement.on_conflict_do_nothing(index_elements=["campaign_id", "user_id"])
+
+    @staticmethod
+    def _checkpoint(db: Session, campaign_id: int) -> Tuple[int, int]:
+        """Highest user id already recorded for the campaign, and how many were"""
+        from app.services.campaign_service import CampaignExecution
+
+        last_id, processed = db.query(
+            func.max(CampaignExecution.user_id), func.count(CampaignExecution.id)
+        ).filter(CampaignExecution.campaign_id == campaign_id).one()
+        return last_id or 0, processed
+
+    def _commit_chunk(self, db: Session, campaign: Campaign, chunk: List[Recipient],
+                      summary: Dict[str, int]) -> List[Tuple[int, Recipient]]:
+        """Record executions for a chunk and gift the users newly recorded, in one transaction"""
+        from app.services.campaign_service import CampaignExecution
+
+        now = datetime.utcnow()
+        wants_email = bool(campaign.send_email and campaign.email_subject)
+
+        rows = [
+            {
+                "campaign_id": campaign.id,
+                "user_id": user.id,
+                "email_sent": False,
+                "tokens_gifted": 0,
+                "token_gift_successful": False,
+                # Set once the email is attempted; no email means nothing left to do
+                "sent_at": None if wants_email else now,
+                "retry_count": 0
+            }
+            for user in chunk
+        ]
+        created = db.execute(
+            self._insert_new_executions(db).returning(CampaignExecution.id, CampaignExecution.user_id),
+            rows
+        ).all()
+        # Users another run already recorded were gifted and emailed by it
+        execution_ids = {row.user_id: row.id for row in created}
+
+        gifted = {}
+        if execution_ids and campaign.gift_tokens and campaign.token_amount and campaign.token_amount > 0:
+            recipients = [user.id for user in chunk if user.id in execution_ids]
+            gift_error = None
+            if campaign.max_tokens_per_campaign:
+                remaining = campaign.max_tokens_per_campaign - (campaign.tokens_distributed or 0)
+                allowed = max(remaining // campaign.token_amount, 0)
+                if allowed < len(recipients):
+                    recipients = recipients[:allowed]
+                    gift_error = "Campaign token budget exhausted"
+            if recipients:
+                gifted = self._gift_tokens(db, campaign, recipients, now)
+
+            db.bulk_update_mappings(CampaignExecution, [
+                {
+                    "id": execution_id,
+                    "tokens_gifted": gifted.get(user_id, 0),
+                    "token_gift_successful": user_id in gifted,
+                    "token_gift_error": None if user_id in gifted else gift_error
+                }
+                for user_id, execution_id in execution_ids.items()
+            ])
+
+        tokens = sum(gifted.values())
+        campaign.recipients_count = (campaign.recipients_count or 0) + len(execution_ids)
+        campaign.tokens_distributed = (campaign.tokens_distributed or 0) + tokens
+        db.commit()
+
+        summary["recipients"] += len(execution_ids)
+        summary["tokens_distributed"] += tokens
+
+        if not wants_email:
+            return []
+        return [(execution_ids[user.id], user) for user in chunk if user.id in execution_ids]
+
+    @staticmethod
+    def _gift_tokens(db: Session, campaign: Campaign, user_ids: List[int],
+                     now: datetime) -> Dict[int, int]:
+        """Credit a chunk of users with one UPDATE and bulk INSERTs; returns user id -> amount"""
+        token_type = TokenType.DOCUMENT_GENERATION
+        if campaign.token_type:
+            try:
+                token_type = TokenType(campaign.token_type)
+            except ValueError:
+                pass
+
+        amount = campaign.token_amount
+        column_name = _TOKEN_COLUMNS.get(token_type, "document_tokens")
+        column = getattr(UserToken, column_name)
+
+        updated = db.execute(
+            update(UserToken)
+            .where(UserToken.user_id.in_(user_ids))
+            .values({column_name: column + amount, "lifetime_earned": UserToken.lifetime_earned + amount})
+            .returning(UserToken.user_id, column)
+            .execution_options(synchronize_session=False)
+        ).all()
+        balances = {row[0]: row[1] for row in updated}
+
+        # Users without a token account get one holding just the gift
+        missing = [user_id for user_id in user_ids if user_id not in balances]
+        if missing:
+            db.execute(insert(UserToken), [
+                {"user_id": user_id, column_name: amount, "lifetime_earned": amount}
+                for user_id in missing
+            ])
+            balances.update((user_id, amount) for user_id in missing)
+
+        db.execute(insert(TokenTransaction), [
+            {
+                "user_id": user_id,
+                "transaction_type": TokenTransactionType.EARNED,
+                "token_type": token_type,
+                "amount": amount,
+                "balance_before": balance - amount,
+                "balance_after": balance,
+                "description": campaign.token_message or f"Campaign gift: {campaign.name}",
+                "reference_id": str(campaign.id),
+                "reference_type": "campaign_gift",
+                "campaign_id": str(campaign.id),
+                "bonus_multiplier": 1.0,
+                "expires_at": now + GIFT_EXPIRY
+            }
+            for user_id, balance in balances.items()
+        ])
+
+        return {user_id: amount for user_id in balances}
+
+    async def _send_pending(self, db: Session, campaign: Campaign, owner: str,
+                            limiter: ProviderRateLimiter, summary: Dict[str, int]) -> None:
+        """Send emails whose execution rows were committed by an interrupted run"""
+        from app.services.campaign_service import CampaignExecution
+
+        last_id = 0
+        while True:
+            rows = db.query(
+                CampaignExecution.id, User.id, User.email, User.username, User.first_name, User.last_name
+            ).join(User, User.id == CampaignExecution.user_id).filter(
+                CampaignExecution.campaign_id == campaign.id,
+                CampaignExecution.sent_at.is_(None),
+                CampaignExecution.id > last_id
+            ).order_by(CampaignExecution.id).limit(self.chunk_size).all()
+            if not rows:
+                return
+
+            await self._send_emails(db, campaign, [(row[0], Recipient(*row[1:])) for row in rows],
+                                    limiter, summary)
+            last_id = rows[-1][0]
+            self._heartbeat(campaign.id, owner)
+
+    async def _send_emails(self, db: Session, campaign: Campaign,
+                           executions: List[Tuple[int, Recipient]], limiter: ProviderRateLimiter,
+                           summary: Dict[str, int]) -> None:
+        """Send a chunk's emails concurrently and record the outcomes in one bulk update"""
+        from app.services.campaign_service import CampaignExecution
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(user: Recipient) -> Dict[str, Any]:
+            async with semaphore:
+                await limiter.acquire(self.email_service.primary_provider)
+                return await self._send_email(campaign, user)
+
+        results = await asyncio.gather(*(send(user) for _, user in executions))
+
+        now = datetime.utcnow()
+        updates = [
+            {
+                "id": execution_id,
+                "email_sent": bool(result.get("success")),
+                "error_message": None if result.get("success") else result.get("error"),
+                "sent_at": now
+            }
+            for (execution_id, _), result in zip(executions, results)
+        ]
+        db.bulk_update_mappings(CampaignExecution, updates)
+
+        sent = sum(1 for item in updates if item["email_sent"])
+        campaign.emails_sent = (campaign.emails_sent or 0) + sent
+        db.commit()
+
+        summary["emails_sent"] += sent
+        summary["emails_failed"] += len(updates) - sent
+
+    async def _send_email(self, campaign: Campaign, user: Recipient) -> Dict[str, Any]:
+        """Send the campaign email to one recipient"""
+        try:
+            template_data = dict(campaign.email_template_data or {})
+            template_data.update({
+                'user_name': user.full_name,
+                'user_email': user.email,
+                'campaign_name': campaign.name,
+                'unsubscribe_url': f"{settings.FRONTEND_URL}/unsubscribe?token={user.id}"
+            })
+
+            return await self.email_service.send_email(
+                to_email=user.email,
+                subject=campaign.email_subject,
+                template_name=campaign.email_template_name or 'campaign',
+                template_data=template_data
+            )
+
+        except Exception as e:
+            logger.error(f"Failed to send campaign email to user {user.id}: {e}")
+            return {"success": False, "error": str(e)}
@@ -5,19 +5,17 @@ Comprehensive marketing campaign management with automated workflows
 
 import logging
 import json
-import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from sqlalchemy.orm import Session, relationship
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, UniqueConstraint
 from enum import Enum as PyEnum
 
 from database import get_db, Base
 from app.models.user import User
 from app.models.campaign import Campaign, CampaignType, CampaignStatus
-from app.services.email_service import EmailService
-from app.services.token_management_service import TokenManagementService
-from app.models.token import TokenType
+from app.services.email_service import email_service
+from app.services.campaign_engine import CampaignEngine
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +29,10 @@ logger = logging.getLogger(__name__)
 class CampaignExecution(Base):
     """Campaign execution log and individual recipient tracking"""
     __tablename__ = "campaign_executions"
+    __table_args__ = (
+        # One execution per recipient; reruns insert with ON CONFLICT DO NOTHING
+        UniqueConstraint('campaign_id', 'user_id', name='uq_campaign_executions_campaign_user'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False, index=True)
@@ -66,7 +68,7 @@ class CampaignService:
     """Service for managing marketing campaigns"""
 
     def __init__(self):
-        self.email_service = EmailService()
+        self.email_service = email_service
 
     @staticmethod
     def create_campaign(
@@ -129,43 +131,49 @@ class CampaignService:
                 "message": f"Failed to create campaign: {str(e)}"
             }
 
+    @staticmethod
+    def target_query(db: Session, campaign: Campaign):
+        """Query for the users targeted by campaign, without the recipient limit"""
+        query = db.query(User).filter(User.status == "active")
+
+        # Apply specific user list if provided
+        if campaign.target_user_ids:
+            return query.filter(User.id.in_(campaign.target_user_ids))
+
+        # Apply audience targeting criteria
+        if campaign.target_audience:
+            criteria = campaign.target_audience
+
+            # User role targeting
+            if 'roles' in criteria:
+                query = query.filter(User.role.in_(criteria['roles']))
+
+            # Registration date range
+            if 'registered_after' in criteria:
+                query = query.filter(User.created_at >= datetime.fromisoformat(criteria['registered_after']))
+            if 'registered_before' in criteria:
+                query = query.filter(User.created_at <= datetime.fromisoformat(criteria['registered_before']))
+
+            # Email verification status
+            if 'email_verified' in criteria:
+                query = query.filter(User.email_verified == criteria['email_verified'])
+
+            # Activity-based targeting
+            if 'last_login_days_ago' in criteria:
+                cutoff_date = datetime.utcnow() - timedelta(days=criteria['last_login_days_ago'])
+                query = query.filter(User.last_login_at >= cutoff_date)
+
+        # Exclude specific users
+        if campaign.exclude_user_ids:
+            query = query.filter(~User.id.in_(campaign.exclude_user_ids))
+
+        return query
+
     @staticmethod
     def get_target_users(db: Session, campaign: Campaign) -> List[User]:
         """Get list of users targeted by campaign"""
         try:
-            query = db.query(User).filter(User.status == "active")
-
-            # Apply specific user list if provided
-            if campaign.target_user_ids:
-                query = query.filter(User.id.in_(campaign.target_user_ids))
-                return query.all()
-
-            # Apply audience targeting criteria
-            if campaign.target_audience:
-                criteria = campaign.target_audience
-                
-                # User role targeting
-                if 'roles' in criteria:
-                    query = query.filter(User.role.in_(criteria['roles']))
-                
-                # Registration date range
-                if 'registered_after' in criteria:
-                    query = query.filter(User.created_at >= datetime.fromisoformat(criteria['registered_after']))
-                if 'registered_before' in criteria:
-                    query = query.filter(User.created_at <= datetime.fromisoformat(criteria['registered_before']))
-                
-                # Email verification status
-                if 'email_verified' in criteria:
-                    query = query.filter(User.email_verified == criteria['email_verified'])
-                
-                # Activity-based targeting
-                if 'last_login_days_ago' in criteria:
-                    cutoff_date = datetime.utcnow() - timedelta(days=criteria['last_login_days_ago'])
-                    query = query.filter(User.last_login_at >= cutoff_date)
-
-            # Exclude specific users
-            if campaign.exclude_user_ids:
-                query = query.filter(~User.id.in_(campaign.exclude_user_ids))
+            query = CampaignService.target_query(db, campaign)
 
             # Apply recipient limit
             if campaign.max_recipients:
@@ -178,93 +186,13 @@ class CampaignService:
             return []
 
     async def execute_campaign(self, db: Session, campaign_id: int) -> Dict[str, Any]:
-        """Execute a campaign (send emails and distribute tokens)"""
+        """Execute a campaign (send emails and distribute tokens) in checkpointed chunks"""
         try:
-            campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
-            if not campaign:
-                return {"success": False, "message": "Campaign not found"}
-
-            if campaign.status != CampaignStatus.SCHEDULED:
-                return {"success": False, "message": "Campaign is not in scheduled state"}
-
-            # Update campaign status
-            campaign.status = CampaignStatus.RUNNING
-            campaign.executed_at = datetime.utcnow()
-            db.commit()
-
-            # Get target users
-            target_users = CampaignService.get_target_users(db, campaign)
-            
-            if not target_users:
-                campaign.status = CampaignStatus.COMPLETED
-                campaign.completed_at = datetime.utcnow()
-                db.commit()
-                return {"success": False, "message": "No target users found"}
-
-            # Execute campaign for each user
-            successful_executions = 0
-            failed_executions = 0
-            total_tokens_distributed = 0
-
-            for user in target_users:
-                try:
-                    # Create execution record
-                    execution = CampaignExecution(
-                        campaign_id=campaign_id,
-                        user_id=user.id
-                    )
-                    
-                    # Send email if configured
-                    if campaign.send_email and campaign.email_subject:
-                        email_result = await self._send_campaign_email(campaign, user)
-                        execution.email_sent = email_result.get('success', False)
-                        if not email_result.get('success'):
-                            execution.error_message = email_result.get('error')
-                    
-                    # Gift tokens if configured
-                    if campaign.gift_tokens and campaign.token_amount:
-                        token_result = self._gift_campaign_tokens(db, campaign, user)
-                        execution.tokens_gifted = token_result.get('amount', 0)
-                        execution.token_gift_successful = token_result.get('success', False)
-                        if not token_result.get('success'):
-                            execution.token_gift_error = token_result.get('error')
-                        else:
-                            total_tokens_distributed += execution.tokens_gifted
-                    
-                    execution.sent_at = datetime.utcnow()
-                    db.add(execution)
-                    successful_executions += 1
-
-                except Exception as e:
-                    logger.error(f"Failed to execute campaign for user {user.id}: {e}")
-                    execution.error_message = str(e)
-                    execution.retry_count += 1
-                    db.add(execution)
-                    failed_executions += 1
-
-            # Update campaign statistics
-            campaign.recipients_count = len(target_users)
-            campaign.emails_sent = sum(1 for exec in campaign.executions if exec.email_sent)
-            campaign.tokens_distributed = total_tokens_distributed
-            campaign.status = CampaignStatus.COMPLETED
-            campaign.completed_at = datetime.utcnow()
-            
-            db.commit()
-
-            logger.info(f"Campaign {campaign_id} executed: {successful_executions} successful, {failed_executions} failed")
-
-            return {
-                "success": True,
-                "campaign_id": campaign_id,
-                "recipients_count": len(target_users),
-                "successful_executions": successful_executions,
-                "failed_executions": failed_executions,
-                "tokens_distributed": total_tokens_distributed,
-                "message": "Campaign executed successfully"
-            }
+            return await CampaignEngine(self.email_service).run(db, campaign_id)
 
         except Exception as e:
             logger.error(f"Failed to execute campaign: {e}")
+            db.rollback()
             # Update campaign status to failed
             try:
                 campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
@@ -279,89 +207,6 @@ class CampaignService:
                 "message": f"Failed to execute campaign: {str(e)}"
             }
 
-    async def _send_campaign_email(self, campaign: Campaign, user: User) -> Dict[str, Any]:
-        """Send campaign email to user"""
-        try:
-            # Prepare template data
-            template_data = campaign.email_template_data or {}
-            template_data.update({
-                'user_name': user.full_name or user.username,
-                'user_email': user.email,
-                'campaign_name': campaign.name,
-                'unsubscribe_url': f"{settings.FRONTEND_URL}/unsubscribe?token={user.id}"
-            })
-
-            # Send email using email service
-            result = await self.email_service.send_template_email(
-                to_email=user.email,
-                to_name=user.full_name or user.username,
-                subject=campaign.email_subject,
-                template_name=campaign.email_template_name or 'campaign',
-                template_data=template_data
-            )
-
-            return result
-
-        except Exception as e:
-            logger.error(f"Failed to send campaign email: {e}")
-            return {"success": False, "error": str(e)}
-
-    async def _gift_campaign_tokens(self, db: Session, campaign: Campaign, user: User) -> Dict[str, Any]:
-        """Gift tokens to user as part of campaign with notification"""
-        try:
-            if not campaign.token_amount or campaign.token_amount <= 0:
-                return {"success": False, "error": "Invalid token amount"}
-
-            # Determine token type
-            token_type = TokenType.DOCUMENT_GENERATION
-            if campaign.token_type:
-                try:
-                    token_type = TokenType(campaign.token_type)
-                except ValueError:
-                    pass
-
-            # Gift tokens
-            success = TokenManagementService.add_tokens(
-                db=db,
-                user_id=user.id,
-                token_type=token_type,
-                amount=campaign.token_amount,
-                description=campaign.token_message or f"Campaign gift: {campaign.name}",
-                reference_id=str(campaign.id),
-                reference_type="campaign_gift",
-                campaign_id=str(campaign.id)
-            )
-
-            if success:
-                # Send notification about reward
-                await CampaignNotificationService.notify_campaign_reward(
-                    user_id=user.id,
-                    campaign_id=campaign.id,
-                    reward_amount=campaign.token_amount,
-                    token_type=token_type
-                )
-
-                # Track campaign engagement
-                campaign.tokens_distributed += campaign.token_amount
-                campaign.recipients_count += 1
-
-                if campaign.token_message:
-                    campaign.emails_sent += 1
-
-                db.commit()
-
-                return {
-                    "success": True,
-                    "amount": campaign.token_amount,
-                    "token_type": token_type.value
-                }
-            else:
-                return {"success": False, "error": "Failed to add tokens"}
-
-        except Exception as e:
-            logger.error(f"Failed to gift campaign tokens: {e}")
-            return {"success": False, "error": str(e)}
-
     @staticmethod
     def schedule_campaign(db: Session, campaign_id: int) -> Dict[str, Any]:
         """Schedule campaign for execution"""
@@ -467,8 +312,9 @@ class CampaignScheduler:
     def check_and_execute_scheduled_campaigns():
         """Check for scheduled campaigns and execute them"""
         try:
+            from app.tasks.campaign_tasks import execute_campaign_task
+
             db = next(get_db())
-            campaign_service = CampaignService()
             
             # Find campaigns that should be executed now
             now = datetime.utcnow()
@@ -480,9 +326,7 @@ class CampaignScheduler:
             for campaign in scheduled_campaigns:
                 try:
                     logger.info(f"Executing scheduled campaign: {campaign.name}")
-                    asyncio.create_task(
-                        campaign_service.execute_campaign(db, campaign.id)
-                    )
+                    execute_campaign_task.delay(campaign.id)
                 except Exception as e:
                     logger.error(f"Failed to execute scheduled campaign {campaign.id}: {e}")
 
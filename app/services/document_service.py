@@ -29,6 +29,11 @@ from app.schemas.document import (
     DocumentSearch, DocumentStats, DocumentPreview
 )
 from app.services.encryption_service import EncryptionService
+from app.services.template_render_service import (
+    PlaceholderSpec, render_plan, render_plan_cache
+)
+from app.utils.zip_stream import stream_zip
+from app.utils.pattern_matcher import PLACEHOLDER_INJECTION
 from database import get_db
 
 import logging
@@ -358,47 +363,60 @@ class DocumentService:
         """Process template placeholders and generate output document"""
 
         try:
-            # Load template document
-            doc = DocxDocument(template_path)
+            # Compiled once per template version; later renders only splice values
+            plan = render_plan_cache.get_or_compile(
+                template,
+                template_path,
+                lambda: DocumentService._load_template_placeholders(template.id),
+                lambda doc: DocumentService._apply_document_formatting(doc, template)
+            )
 
-            # Get placeholders for this template
-            db = next(get_db())
-            placeholders = db.query(Placeholder).filter(
-                Placeholder.template_id == template.id
+            values = {
+                name: DocumentService._render_placeholder_value(spec, placeholder_data)
+                for name, spec in plan.placeholders.items()
+            }
+
+            # Save document
+            render_plan(plan, values, output_path)
+
+            return True
+
+        except Exception as e:
+            logger.error(f"Error processing template {template.id}: {e}")
+            return False
+
+    @staticmethod
+    def _load_template_placeholders(template_id: int) -> List[Placeholder]:
+        """Load placeholder definitions for a template (render plan compile only)"""
+
+        db = next(get_db())
+        try:
+            return db.query(Placeholder).filter(
+                Placeholder.template_id == template_id
             ).order_by(
                 Placeholder.paragraph_index,
                 Placeholder.start_run_index
             ).all()
+        finally:
             db.close()
 
-            # Process placeholders
-            for placeholder in placeholders:
-                value = placeholder_data.get(placeholder.name, placeholder.default_value or "")
-
-                # Sanitize user input to prevent injection attacks
-                sanitized_value = DocumentService._sanitize_placeholder_value(value)
-
-                # Format value based on placeholder type
-                formatted_value = DocumentService._format_placeholder_value(
-                    sanitized_value, placeholder.placeholder_type, placeholder.casing
-                )
-
-                # Apply formatting
-                DocumentService._replace_placeholder_in_document(
-                    doc, placeholder, formatted_value
-                )
+    @staticmethod
+    def _render_placeholder_value(spec: PlaceholderSpec, placeholder_data: Dict[str, Any]) -> str:
+        """Format and sanitize a placeholder value for splicing into document XML"""
 
-            # Apply document-level formatting
-            DocumentService._apply_document_formatting(doc, template)
+        value = placeholder_data.get(spec.name, spec.default_value or "")
+        value = str(value) if value is not None else ""
 
-            # Save document
-            doc.save(output_path)
+        # Format before sanitizing so casing never touches escaped entities
+        formatted = DocumentService._format_placeholder_value(
+            value, spec.placeholder_type, spec.casing
+        )
 
-            return True
+        # Sanitize user input to prevent injection attacks (output is XML-escaped)
+        sanitized = DocumentService._sanitize_placeholder_value(formatted)
 
-        except Exception as e:
-            print(f"Error processing template: {e}")
-            return False
+        # Truncation may have cut an entity in half
+        return re.sub(r'&[^;]*$', '', sanitized)
 
     @staticmethod
     def _format_placeholder_value(value: str, placeholder_type: str, casing: str) -> str:
@@ -440,58 +458,13 @@ class DocumentService:
         sanitized = ''.join(char for char in sanitized if ord(char) >= 32 or char in '\t\n\r')
 
         # Block common injection patterns
-        dangerous_patterns = [
-            r'<script[^>]*>.*?</script>',
-            r'javascript:',
-            r'vbscript:',
-            r'on\w+\s*=',
-            r'eval\s*\(',
-            r'exec\s*\(',
-            r'system\s*\(',
-            r'import\s+\w+',
-            r'__\w+__',
-            r'\.\./',
-            r'\\\\',
-        ]
-
-        for pattern in dangerous_patterns:
-            sanitized = re.sub(pattern, '', sanitized, flags=re.IGNORECASE)
+        sanitized = PLACEHOLDER_INJECTION.sub(sanitized)
 
         # Limit length to prevent buffer overflow
         sanitized = sanitized[:1000]
 
         return sanitized.strip()
 
-    @staticmethod
-    def _replace_placeholder_in_document(doc: DocxDocument, placeholder: Placeholder, value: str):
-        """Replace placeholder in document with formatted value"""
-
-        try:
-            paragraph = doc.paragraphs[placeholder.paragraph_index]
-
-            # Find the placeholder text in runs
-            placeholder_text = f"${{{placeholder.name}}}"
-
-            # Simple replacement - in production, you'd want more sophisticated handling
-            full_text = "".join(run.text for run in paragraph.runs)
-            if placeholder_text in full_text:
-                # Clear all runs and add the replaced text
-                for run in paragraph.runs:
-                    run.clear()
-
-                # Add new text with formatting
-                new_run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
-                new_run.text = full_text.replace(placeholder_text, value)
-
-                # Apply formatting
-                new_run.bold = placeholder.bold
-                new_run.italic = placeholder.italic
-                new_run.underline = placeholder.underline
-
-        except (IndexError, AttributeError):
-            # Skip if paragraph index is invalid
-            pass
-
     @staticmethod
     def _apply_document_formatting(doc: DocxDocument, template: Template):
         """Apply document-level formatting"""
@@ -632,30 +605,31 @@ class DocumentService:
             try:
                 from app.services.thumbnail_service import thumbnail_service
 
-                # Decide whether to generate thumbnails synchronously based on configuration.
-                if getattr(settings, 'ENABLE_SYNC_THUMBNAILS', False):
-                    try:
-                        # thumbnail_service.generate_thumbnail is async; run it safely
-                        # If we are in an async context this will work; otherwise, fallback to not blocking
-                        import asyncio
-
-                        if asyncio.get_event_loop().is_running():
-                            thumbnail_result = asyncio.get_event_loop().create_task(
-                                thumbnail_service.generate_thumbnail(document.id, document.file_path, document.file_format)
-                            )
-                            # We won't await here to avoid blocking; set a placeholder and let background worker fill cache
-                            thumbnail_result = {"success": False, "thumbnail_url": None}
-                        else:
-                            # Synchronous runner for environments where event loop is not running
-                            thumbnail_result = asyncio.run(
-                                thumbnail_service.generate_thumbnail(document.id, document.file_path, document.file_format)
-                            )
-                    except Exception:
-                        # If thumbnail generation fails, continue with placeholder
-                        thumbnail_result = {"success": False, "thumbnail_url": None}
-                else:
-                    # Sync thumbnails disabled — leave placeholder to be generated asynchronously
+                encrypted = document.is_encrypted and document.file_path.endswith(".encrypted")
+                key_id = (document.encryption_key_id or "default") if encrypted else None
+
+                if document.file_hash:
+                    thumbnail_result = thumbnail_service.get_cached_thumbnail(document.id, document.file_hash)
+
+                if not thumbnail_result:
+                    # Rendering runs in the thumbnail pool; only wait for it when
+                    # sync thumbnails are enabled and no event loop would be blocked
+                    future = thumbnail_service.submit(
+                        document.id, document.file_path, document.file_format, document.file_hash, key_id
+                    )
                     thumbnail_result = {"success": False, "thumbnail_url": None}
+
+                    if getattr(settings, 'ENABLE_SYNC_THUMBNAILS', False):
+                        try:
+                            asyncio.get_running_loop()
+                        except RuntimeError:
+                            try:
+                                if future.result(timeout=30)["success"]:
+                                    thumbnail_result = {"success": True,
+                                                        "thumbnail_url": f"/api/documents/{document.id}/thumbnail"}
+                            except Exception:
+                                # If thumbnail generation fails, continue with placeholder
+                                pass
             except ImportError:
                 thumbnail_result = {"success": False, "thumbnail_url": None}
 
@@ -787,32 +761,38 @@ class DocumentService:
         documents: List[Document],
         batch_id: str
     ) -> Dict[str, Any]:
-        """Create ZIP file for batch document download"""
-
-        import zipfile
-        import tempfile
+        """Prepare a streamed ZIP of batch documents (no temporary files)"""
 
         try:
-            # Create temporary ZIP file
-            temp_dir = tempfile.mkdtemp()
-            zip_path = os.path.join(temp_dir, f"batch_{batch_id}.zip")
-
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for doc in documents:
-                    if doc.file_path and os.path.exists(doc.file_path):
-                        # Add file to ZIP with proper naming
-                        filename = f"{doc.title}.{doc.file_format}"
-                        # Sanitize filename
-                        filename = re.sub(r'[^\w\s.-]', '', filename)
-                        zipf.write(doc.file_path, filename)
-
-            # Get file size
-            file_size = os.path.getsize(zip_path)
+            entries = []
+            used_names = set()
+            total_size = 0
+
+            for doc in documents:
+                if not doc.file_path or not os.path.exists(doc.file_path):
+                    continue
+
+                # Add file to ZIP with proper naming
+                filename = f"{doc.title}.{doc.file_format}"
+                # Sanitize filename
+                filename = re.sub(r'[^\w\s.-]', '', filename)
+
+                # Keep archive names unique so no member shadows another
+                stem, extension = os.path.splitext(filename)
+                counter = 2
+                while filename in used_names:
+                    filename = f"{stem} ({counter}){extension}"
+                    counter += 1
+                used_names.add(filename)
+
+                entries.append((doc.file_path, filename))
+                total_size += os.path.getsize(doc.file_path)
 
             return {
                 "success": True,
-                "file_path": zip_path,
-                "file_size": file_size
+                "stream": stream_zip(entries),
+                "file_count": len(entries),
+                "file_size": total_size
             }
 
         except Exception as e:
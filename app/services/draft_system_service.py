@@ -70,6 +70,32 @@ class DraftAutoSave(Base):
 class DraftSystemService:
     """Service for managing document drafts with auto-save and payment options"""
 
+    @staticmethod
+    def build_draft(
+        template,
+        title: str,
+        user_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        device_fingerprint: Optional[str] = None,
+        is_free_eligible: bool = False
+    ) -> DocumentDraft:
+        """Unsaved draft row priced from its template"""
+        # Calculate expiration (30 days for registered users, 7 days for guests)
+        expires_in_days = 30 if user_id else 7
+
+        return DocumentDraft(
+            user_id=user_id,
+            template_id=template.id,
+            title=title,
+            draft_name=f"Draft - {title}",
+            token_cost=template.price or 0,
+            is_free_eligible=is_free_eligible,
+            requires_payment=not is_free_eligible and (template.price or 0) > 0,
+            session_id=session_id,
+            device_fingerprint=device_fingerprint,
+            expires_at=datetime.utcnow() + timedelta(days=expires_in_days)
+        )
+
     @staticmethod
     def create_draft(
         db: Session,
@@ -89,23 +115,10 @@ class DraftSystemService:
             if not template:
                 return {"success": False, "error": "Template not found"}
 
-            # Calculate expiration (30 days for registered users, 7 days for guests)
-            expires_in_days = 30 if user_id else 7
-            expires_at = datetime.utcnow() + timedelta(days=expires_in_days)
-
-            # Create draft
-            draft = DocumentDraft(
-                user_id=user_id,
-                template_id=template_id,
-                title=title,
-                draft_name=f"Draft - {title}",
-                token_cost=template.price or 0,
-                is_free_eligible=is_free_eligible,
-                requires_payment=not is_free_eligible and (template.price or 0) > 0,
-                session_id=session_id,
-                device_fingerprint=device_fingerprint,
-                expires_at=expires_at
+            draft = DraftSystemService.build_draft(
+                template, title, user_id, session_id, device_fingerprint, is_free_eligible
             )
+            expires_at = draft.expires_at
 
             db.add(draft)
             db.commit()
@@ -579,14 +592,19 @@ class DraftSystemService:
                 Placeholder.template_id == template_id
             ).count()
 
-            total_fields = max(len(placeholder_data), template_placeholders, 5)
-            filled_fields = len([v for v in placeholder_data.values() if v and str(v).strip()])
-
-            return min(100.0, (filled_fields / total_fields) * 100)
+            return DraftSystemService.completion_percentage(placeholder_data, template_placeholders)
 
         except Exception:
             return 0.0
 
+    @staticmethod
+    def completion_percentage(placeholder_data: Dict[str, Any], template_placeholders: int) -> float:
+        """Share of fields filled, out of the template's placeholders (at least 5)"""
+        total_fields = max(len(placeholder_data), template_placeholders, 5)
+        filled_fields = len([v for v in placeholder_data.values() if v and str(v).strip()])
+
+        return min(100.0, (filled_fields / total_fields) * 100)
+
     @staticmethod
     def _generate_document_from_draft(
         db: Session,
@@ -0,0 +1,190 @@
+"""
+Email outbox
+
+Request handlers and tasks record emails in the email_outbox table as part
+of their own transaction and return immediately; provider latency never
+reaches them. Dispatcher workers claim due rows in batches (SKIP LOCKED, so
+several workers can drain the table side by side), render and send them
+concurrently through the shared persistent transports, and reschedule
+failures with exponential backoff until they run out of attempts.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, or_, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from app.models.email_outbox import EmailOutbox, OutboxStatus
+from app.services.email_transport import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+# A row still marked sending after this long belongs to a dead dispatcher
+SENDING_LEASE = timedelta(minutes=10)
+MAX_BACKOFF = timedelta(hours=1)
+
+
+class EmailOutboxService:
+    """Queue emails durably and deliver them in batches"""
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        to_email: str,
+        subject: str,
+        template_name: str,
+        template_data: Dict[str, Any],
+        from_email: Optional[str] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None,
+        priority: str = 'normal',
+        commit: bool = True
+    ) -> int:
+        """Record an email for delivery; commit=False joins the caller's transaction"""
+        message = EmailOutbox(
+            to_email=to_email,
+            from_email=from_email,
+            subject=subject,
+            template_name=template_name,
+            template_data=template_data,
+            attachments=attachments,
+            priority=priority,
+            status=OutboxStatus.PENDING.value,
+            available_at=datetime.utcnow()
+        )
+        db.add(message)
+
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+
+        return message.id
+
+    @staticmethod
+    def claim_batch(db: Session, limit: int) -> List[Any]:
+        """Mark up to limit due messages as sending and return them"""
+        now = datetime.utcnow()
+        due = select(EmailOutbox.id).where(
+            or_(
+                (EmailOutbox.status == OutboxStatus.PENDING.value) & (EmailOutbox.available_at <= now),
+                (EmailOutbox.status == OutboxStatus.SENDING.value) & (EmailOutbox.locked_at < now - SENDING_LEASE)
+            )
+        ).order_by(
+            case((EmailOutbox.priority == 'high', 0), else_=1),
+            EmailOutbox.id
+        ).limit(limit).with_for_update(skip_locked=True)
+
+        claimed = db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                status=OutboxStatus.SENDING.value,
+                locked_at=now,
+                attempts=EmailOutbox.attempts + 1
+            )
+            .returning(
+                EmailOutbox.id, EmailOutbox.to_email, EmailOutbox.from_email, EmailOutbox.subject,
+                EmailOutbox.template_name, EmailOutbox.template_data, EmailOutbox.attachments,
+                EmailOutbox.attempts
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        return claimed
+
+    @staticmethod
+    def _outcome(row: Any, result: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """Column values recording one delivery attempt"""
+        if result.get('success'):
+            return {
+                "id": row.id,
+                "status": OutboxStatus.SENT.value,
+                "sent_at": now,
+                "locked_at": None,
+                "provider_used": result.get('provider_used'),
+                "message_id": result.get('message_id'),
+                "last_error": None
+            }
+
+        attempts = row.attempts
+        if result.get('circuit_open'):
+            # Every provider was cooling down; nothing was actually tried
+            attempts -= 1
+        elif attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            return {
+                "id": row.id,
+                "status": OutboxStatus.FAILED.value,
+                "locked_at": None,
+                "last_error": result.get('error')
+            }
+
+        delay = min(timedelta(seconds=30 * 2 ** max(attempts - 1, 0)), MAX_BACKOFF)
+        return {
+            "id": row.id,
+            "status": OutboxStatus.PENDING.value,
+            "attempts": attempts,
+            "available_at": now + delay,
+            "locked_at": None,
+            "last_error": result.get('error')
+        }
+
+    @staticmethod
+    async def dispatch_batch(db: Session, email_service=None, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """Claim one batch, send it concurrently and record the outcomes"""
+        if email_service is None:
+            from app.services.email_service import email_service
+
+        rows = EmailOutboxService.claim_batch(db, batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+        if not rows:
+            return {"claimed": 0, "sent": 0, "failed": 0}
+
+        semaphore = asyncio.Semaphore(settings.EMAIL_OUTBOX_CONCURRENCY)
+
+        async def send(row) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    content = await email_service._prepare_email_content(
+                        row.template_name, row.template_data or {}
+                    )
+                    message = EmailMessage(
+                        to_email=row.to_email,
+                        from_email=row.from_email or email_service.default_from_email,
+                        subject=row.subject,
+                        html=content['html'],
+                        text=content['text'],
+                        attachments=row.attachments or []
+                    )
+                    return await email_service.deliver(message)
+                except Exception as e:
+                    logger.error(f"Outbox message {row.id} could not be sent: {e}")
+                    return {'success': False, 'error': str(e)}
+
+        results = await asyncio.gather(*(send(row) for row in rows))
+
+        now = datetime.utcnow()
+        outcomes = [EmailOutboxService._outcome(row, result, now) for row, result in zip(rows, results)]
+        db.bulk_update_mappings(EmailOutbox, outcomes)
+        db.commit()
+
+        sent = sum(1 for outcome in outcomes if outcome["status"] == OutboxStatus.SENT.value)
+        failed = sum(1 for outcome in outcomes if outcome["status"] == OutboxStatus.FAILED.value)
+        if failed:
+            logger.warning(f"{failed} outbox emails failed permanently")
+
+        return {"claimed": len(rows), "sent": sent, "failed": failed}
+
+    @staticmethod
+    async def drain(db: Session, email_service=None, max_batches: int = 20) -> Dict[str, int]:
+        """Dispatch batches until the outbox has nothing due"""
+        totals = {"claimed": 0, "sent": 0, "failed": 0}
+        for _ in range(max_batches):
+            stats = await EmailOutboxService.dispatch_batch(db, email_service)
+            for key in totals:
+                totals[key] += stats[key]
+            if stats["claimed"] < settings.EMAIL_OUTBOX_BATCH_SIZE:
+                break
+        return totals
@@ -3,33 +3,19 @@ Production-Ready Email Service
 Real email sending implementation with multiple providers and templates
 """
 
+import re
 import logging
-import smtplib
-import asyncio
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 from typing import Dict, List, Optional, Any
 from pathlib import Path
 import jinja2
 from datetime import datetime
-
-# Third-party email services
-try:
-    import sendgrid
-    from sendgrid.helpers.mail import Mail, Email, To, Content, Attachment, FileContent, FileName, FileType, Disposition
-    SENDGRID_AVAILABLE = True
-except ImportError:
-    SENDGRID_AVAILABLE = False
-
-try:
-    import resend
-    RESEND_AVAILABLE = True
-except ImportError:
-    RESEND_AVAILABLE = False
+from sqlalchemy.orm import Session
 
 from config import settings
+from app.services.email_transport import (
+    CircuitBreaker, EmailMessage, EmailRejectedError, PROVIDER_PRIORITY, build_transports
+)
+from app.services.email_outbox_service import EmailOutboxService
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +32,9 @@ class EmailService:
 
         # Initialize providers based on availability and configuration
         self.providers = self._initialize_providers()
+        self.breakers = {name: CircuitBreaker(name) for name in self.providers}
         self.primary_provider = self._get_primary_provider()
+        self.default_from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@mytypist.com')
 
     def _get_built_in_templates(self) -> Dict[str, str]:
         """Get built-in email templates to avoid file dependency issues"""
@@ -158,7 +146,7 @@ class EmailService:
                 <ul>
                     <li><strong>Amount:</strong> {{ amount }} {{ currency }}</li>
                     <li><strong>Transaction ID:</strong> {{ transaction_id }}</li>
-                    <li><strong>Tokens Purchased:</strong> {{ tokens_purchased }}</li>
+                    {% if tokens_purchased %}<li><strong>Tokens Purchased:</strong> {{ tokens_purchased }}</li>{% endif %}
                 </ul>
                 <p>Your tokens have been added to your account and you can start creating documents immediately.</p>
                 <p><a href="{{ dashboard_url }}" style="background: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Go to Dashboard</a></p>
@@ -212,38 +200,15 @@ class EmailService:
         }
 
     def _initialize_providers(self) -> Dict[str, Any]:
-        """Initialize available email providers"""
-        providers = {}
-
-        # SendGrid
-        if SENDGRID_AVAILABLE and hasattr(settings, 'SENDGRID_API_KEY'):
-            providers['sendgrid'] = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
-            logger.info("SendGrid email provider initialized")
-
-        # Resend
-        if RESEND_AVAILABLE and hasattr(settings, 'RESEND_API_KEY'):
-            resend.api_key = settings.RESEND_API_KEY
-            providers['resend'] = resend
-            logger.info("Resend email provider initialized")
-
-        # SMTP Fallback
-        if hasattr(settings, 'SMTP_HOST'):
-            providers['smtp'] = {
-                'host': settings.SMTP_HOST,
-                'port': getattr(settings, 'SMTP_PORT', 587),
-                'username': getattr(settings, 'SMTP_USERNAME', ''),
-                'password': getattr(settings, 'SMTP_PASSWORD', ''),
-                'use_tls': getattr(settings, 'SMTP_USE_TLS', True)
-            }
-            logger.info("SMTP email provider initialized")
-
+        """Initialize persistent transports for the configured providers"""
+        providers = build_transports()
+        for name in providers:
+            logger.info(f"{name} email provider initialized")
         return providers
 
     def _get_primary_provider(self) -> str:
         """Get primary email provider based on priority"""
-        priority = ['sendgrid', 'resend', 'smtp']
-
-        for provider in priority:
+        for provider in PROVIDER_PRIORITY:
             if provider in self.providers:
                 logger.info(f"Using {provider} as primary email provider")
                 return provider
@@ -269,54 +234,15 @@ class EmailService:
                 template_name, template_data
             )
 
-            # Set from email
-            from_email = from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@mytypist.com')
-
-            # Try primary provider first
-            if self.primary_provider:
-                result = await self._send_via_provider(
-                    provider=self.primary_provider,
-                    to_email=to_email,
-                    from_email=from_email,
-                    subject=subject,
-                    html_content=email_content['html'],
-                    text_content=email_content['text'],
-                    attachments=attachments,
-                    priority=priority
-                )
-
-                if result['success']:
-                    return result
-
-                logger.warning(f"Primary provider {self.primary_provider} failed, trying fallbacks")
-
-            # Try fallback providers
-            for provider_name in self.providers:
-                if provider_name != self.primary_provider:
-                    result = await self._send_via_provider(
-                        provider=provider_name,
-                        to_email=to_email,
-                        from_email=from_email,
-                        subject=subject,
-                        html_content=email_content['html'],
-                        text_content=email_content['text'],
-                        attachments=attachments,
-                        priority=priority
-                    )
-
-                    if result['success']:
-                        logger.info(f"Email sent successfully via fallback provider: {provider_name}")
-                        return result
-
-            # If all providers failed, log the email instead of failing completely
-            logger.warning(f"All email providers failed. Email details: To: {to_email}, Subject: {subject}")
-
-            return {
-                'success': False,
-                'error': 'All email providers failed - email logged for manual processing',
-                'provider_used': None,
-                'fallback_logged': True
-            }
+            message = EmailMessage(
+                to_email=to_email,
+                from_email=from_email or self.default_from_email,
+                subject=subject,
+                html=email_content['html'],
+                text=email_content['text'],
+                attachments=attachments or []
+            )
+            return await self.deliver(message)
 
         except Exception as e:
             logger.error(f"Email sending failed: {e}")
@@ -326,6 +252,68 @@ class EmailService:
                 'provider_used': None
             }
 
+    def queue_email(
+        self,
+        db: Session,
+        to_email: str,
+        subject: str,
+        template_name: str,
+        template_data: Dict[str, Any],
+        from_email: Optional[str] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None,
+        priority: str = 'normal',
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """Record an email in the outbox for the dispatcher instead of sending it inline"""
+        outbox_id = EmailOutboxService.enqueue(
+            db, to_email, subject, template_name, template_data,
+            from_email=from_email, attachments=attachments, priority=priority, commit=commit
+        )
+        return {'success': True, 'queued': True, 'outbox_id': outbox_id}
+
+    async def deliver(self, message: EmailMessage) -> Dict[str, Any]:
+        """Send a rendered message via the primary provider, then fallbacks whose circuit is closed"""
+        if not self.providers:
+            return {'success': False, 'error': 'No email providers configured', 'provider_used': None}
+
+        order = [self.primary_provider] + [name for name in self.providers if name != self.primary_provider]
+        skipped = 0
+        last_error = None
+
+        for provider_name in order:
+            breaker = self.breakers[provider_name]
+            if not breaker.allow():
+                skipped += 1
+                continue
+
+            try:
+                result = await self.providers[provider_name].send(message)
+            except EmailRejectedError as e:
+                # The provider answered, so it stays healthy; another may still accept it
+                breaker.record_success()
+                last_error = str(e)
+            except Exception as e:
+                breaker.record_failure()
+                last_error = str(e)
+                logger.warning(f"Email provider {provider_name} failed: {e}")
+            else:
+                breaker.record_success()
+                if provider_name != self.primary_provider:
+                    logger.info(f"Email sent successfully via fallback provider: {provider_name}")
+                return result
+
+        if skipped == len(order):
+            last_error = 'All email provider circuits are open'
+
+        logger.warning(f"All email providers failed. Email details: To: {message.to_email}, Subject: {message.subject}")
+
+        return {
+            'success': False,
+            'error': last_error,
+            'provider_used': None,
+            'circuit_open': skipped == len(order)
+        }
+
     async def _prepare_email_content(
         self,
         template_name: str,
@@ -344,7 +332,6 @@ class EmailService:
                 text_content = text_template.render(**template_data)
             except jinja2.TemplateNotFound:
                 # Convert HTML to basic text
-                import re
                 text_content = re.sub(r'<[^>]+>', '', html_content)
                 text_content = re.sub(r'\s+', ' ', text_content).strip()
 
@@ -385,178 +372,10 @@ class EmailService:
                 'text': text_content
             }
 
-    async def _send_via_provider(
-        self,
-        provider: str,
-        to_email: str,
-        from_email: str,
-        subject: str,
-        html_content: str,
-        text_content: str,
-        attachments: Optional[List[Dict[str, Any]]] = None,
-        priority: str = 'normal'
-    ) -> Dict[str, Any]:
-        """Send email via specific provider"""
-
-        try:
-            if provider == 'sendgrid':
-                return await self._send_via_sendgrid(
-                    to_email, from_email, subject, html_content, text_content, attachments
-                )
-            elif provider == 'resend':
-                return await self._send_via_resend(
-                    to_email, from_email, subject, html_content, attachments
-                )
-            elif provider == 'smtp':
-                return await self._send_via_smtp(
-                    to_email, from_email, subject, html_content, text_content, attachments
-                )
-            else:
-                return {'success': False, 'error': f'Unknown provider: {provider}'}
-
-        except Exception as e:
-            logger.error(f"Provider {provider} failed: {e}")
-            return {'success': False, 'error': str(e)}
-
-    async def _send_via_sendgrid(
-        self,
-        to_email: str,
-        from_email: str,
-        subject: str,
-        html_content: str,
-        text_content: str,
-        attachments: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
-        """Send email via SendGrid"""
-
-        try:
-            message = Mail(
-                from_email=Email(from_email),
-                to_emails=To(to_email),
-                subject=subject,
-                html_content=Content("text/html", html_content),
-                plain_text_content=Content("text/plain", text_content)
-            )
-
-            # Add attachments
-            if attachments:
-                for attachment in attachments:
-                    file_attachment = Attachment(
-                        FileContent(attachment['content']),
-                        FileName(attachment['filename']),
-                        FileType(attachment.get('type', 'application/octet-stream')),
-                        Disposition('attachment')
-                    )
-                    message.attachment = file_attachment
-
-            sg = self.providers['sendgrid']
-            response = sg.send(message)
-
-            return {
-                'success': response.status_code in [200, 202],
-                'provider_used': 'sendgrid',
-                'response_code': response.status_code,
-                'message_id': response.headers.get('X-Message-Id')
-            }
-
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-
-    async def _send_via_resend(
-        self,
-        to_email: str,
-        from_email: str,
-        subject: str,
-        html_content: str,
-        attachments: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
-        """Send email via Resend"""
-
-        try:
-            email_data = {
-                "from": from_email,
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content
-            }
-
-            # Add attachments
-            if attachments:
-                email_data["attachments"] = [
-                    {
-                        "filename": att['filename'],
-                        "content": att['content']
-                    }
-                    for att in attachments
-                ]
-
-            response = resend.Emails.send(email_data)
-
-            return {
-                'success': True,
-                'provider_used': 'resend',
-                'message_id': response.get('id')
-            }
-
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-
-    async def _send_via_smtp(
-        self,
-        to_email: str,
-        from_email: str,
-        subject: str,
-        html_content: str,
-        text_content: str,
-        attachments: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
-        """Send email via SMTP"""
-
-        try:
-            smtp_config = self.providers['smtp']
-
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = from_email
-            msg['To'] = to_email
-
-            # Add text and HTML parts
-            text_part = MIMEText(text_content, 'plain')
-            html_part = MIMEText(html_content, 'html')
-
-            msg.attach(text_part)
-            msg.attach(html_part)
-
-            # Add attachments
-            if attachments:
-                for attachment in attachments:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment['content'])
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename= {attachment["filename"]}'
-                    )
-                    msg.attach(part)
-
-            # Send email
-            with smtplib.SMTP(smtp_config['host'], smtp_config['port']) as server:
-                if smtp_config['use_tls']:
-                    server.starttls()
-
-                if smtp_config['username']:
-                    server.login(smtp_config['username'], smtp_config['password'])
-
-                server.send_message(msg)
-
-            return {
-                'success': True,
-                'provider_used': 'smtp'
-            }
-
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    async def _send_or_queue(self, db: Optional[Session], **message) -> Dict[str, Any]:
+        if db is not None:
+            return self.queue_email(db, **message)
+        return await self.send_email(**message)
 
     async def send_welcome_email(self, user_email: str, user_name: str) -> Dict[str, Any]:
         """Send welcome email to new user"""
@@ -575,12 +394,14 @@ class EmailService:
         self,
         user_email: str,
         user_name: str,
-        reset_token: str
+        reset_token: str,
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
-        """Send password reset email"""
+        """Send password reset email; with a session it is queued in the outbox"""
         reset_url = f"{settings.FRONTEND_URL}/reset-password?token={reset_token}"
 
-        return await self.send_email(
+        return await self._send_or_queue(
+            db,
             to_email=user_email,
             subject="Reset Your MyTypist Password",
             template_name="password_reset",
@@ -588,7 +409,8 @@ class EmailService:
                 'user_name': user_name,
                 'reset_url': reset_url,
                 'expires_in': "24 hours"
-            }
+            },
+            priority='high'
         )
 
     async def send_document_ready_email(
@@ -596,10 +418,12 @@ class EmailService:
         user_email: str,
         user_name: str,
         document_title: str,
-        download_url: str
+        download_url: str,
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
-        """Send document ready notification"""
-        return await self.send_email(
+        """Send document ready notification; with a session it is queued in the outbox"""
+        return await self._send_or_queue(
+            db,
             to_email=user_email,
             subject=f"Your document '{document_title}' is ready!",
             template_name="document_ready",
@@ -618,10 +442,12 @@ class EmailService:
         amount: float,
         currency: str,
         transaction_id: str,
-        tokens_purchased: int
+        tokens_purchased: int = 0,
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
-        """Send payment confirmation email"""
-        return await self.send_email(
+        """Send payment confirmation email; with a session it is queued in the outbox"""
+        return await self._send_or_queue(
+            db,
             to_email=user_email,
             subject="Payment Confirmation - MyTypist",
             template_name="payment_confirmation",
@@ -0,0 +1,304 @@
+"""
+Persistent email provider transports
+
+Each provider keeps one long-lived connection for the life of the process:
+keep-alive HTTP clients for SendGrid and Resend, and a reused SMTP session
+that reconnects only when the server drops it. Every transport sits behind
+a circuit breaker, so once a provider keeps failing it is skipped outright
+for a cool-down period instead of adding its timeout to every send.
+"""
+
+import time
+import asyncio
+import smtplib
+import logging
+import threading
+from dataclasses import dataclass, field
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_PRIORITY = ['sendgrid', 'resend', 'smtp']
+
+
+class EmailTransportError(Exception):
+    """Transient provider failure; counts against the circuit breaker"""
+
+
+class EmailRejectedError(Exception):
+    """The provider refused this message but is itself healthy"""
+
+
+@dataclass
+class EmailMessage:
+    """A rendered email ready for any transport"""
+    to_email: str
+    from_email: str
+    subject: str
+    html: str
+    text: str
+    attachments: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after a cool-down"""
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None,
+                 reset_seconds: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.EMAIL_BREAKER_FAILURES
+        self.reset_seconds = settings.EMAIL_BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a send may go to this provider now"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                # One probe at a time decides whether the provider is back
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Email provider {self.name} circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+class HTTPTransport:
+    """Base for JSON API providers sharing one keep-alive client"""
+
+    name = ""
+    url = ""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Pooled connections belong to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=settings.EMAIL_PROVIDER_TIMEOUT,
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60)
+            )
+        return self._client
+
+    def _payload(self, message: EmailMessage) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _message_id(self, response: httpx.Response) -> Optional[str]:
+        raise NotImplementedError
+
+    async def send(self, message: EmailMessage) -> Dict[str, Any]:
+        try:
+            response = await self._get_client().post(self.url, json=self._payload(message))
+        except httpx.HTTPError as e:
+            raise EmailTransportError(f"{self.name}: {e}") from e
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise EmailTransportError(f"{self.name} returned {response.status_code}")
+        if response.status_code >= 400:
+            raise EmailRejectedError(f"{self.name} rejected message: {response.status_code} {response.text[:200]}")
+
+        return {
+            'success': True,
+            'provider_used': self.name,
+            'response_code': response.status_code,
+            'message_id': self._message_id(response)
+        }
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SendGridTransport(HTTPTransport):
+    name = "sendgrid"
+    url = "https://api.sendgrid.com/v3/mail/send"
+
+    def _payload(self, message: EmailMessage) -> Dict[str, Any]:
+        payload = {
+            "personalizations": [{"to": [{"email": message.to_email}]}],
+            "from": {"email": message.from_email, "name": settings.SENDGRID_FROM_NAME},
+            "subject": message.subject,
+            "content": [
+                {"type": "text/plain", "value": message.text},
+                {"type": "text/html", "value": message.html}
+            ]
+        }
+        if message.attachments:
+            payload["attachments"] = [
+                {
+                    "content": attachment['content'],
+                    "filename": attachment['filename'],
+                    "type": attachment.get('type', 'application/octet-stream'),
+                    "disposition": "attachment"
+                }
+                for attachment in message.attachments
+            ]
+        return payload
+
+    def _message_id(self, response: httpx.Response) -> Optional[str]:
+        return response.headers.get('X-Message-Id')
+
+
+class ResendTransport(HTTPTransport):
+    name = "resend"
+    url = "https://api.resend.com/emails"
+
+    def _payload(self, message: EmailMessage) -> Dict[str, Any]:
+        payload = {
+            "from": message.from_email,
+            "to": [message.to_email],
+            "subject": message.subject,
+            "html": message.html,
+            "text": message.text
+        }
+        if message.attachments:
+            payload["attachments"] = [
+                {"filename": attachment['filename'], "content": attachment['content']}
+                for attachment in message.attachments
+            ]
+        return payload
+
+    def _message_id(self, response: httpx.Response) -> Optional[str]:
+        return response.json().get('id')
+
+
+class SMTPTransport:
+    """One SMTP session reused across messages, reopened when the server drops it"""
+
+    name = "smtp"
+
+    def __init__(self, host: str, port: int, username: str = '', password: str = '', use_tls: bool = True):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self._server: Optional[smtplib.SMTP] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=settings.EMAIL_PROVIDER_TIMEOUT)
+        if self.use_tls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _build(self, message: EmailMessage) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = message.subject
+        msg['From'] = message.from_email
+        msg['To'] = message.to_email
+
+        msg.attach(MIMEText(message.text, 'plain'))
+        msg.attach(MIMEText(message.html, 'html'))
+
+        for attachment in message.attachments:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(attachment['content'])
+            encoders.encode_base64(part)
+            part.add_header('Content-Disposition', f'attachment; filename= {attachment["filename"]}')
+            msg.attach(part)
+        return msg
+
+    def _send_sync(self, message: EmailMessage) -> None:
+        msg = self._build(message)
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._server is None:
+                        self._server = self._connect()
+                    self._server.send_message(msg)
+                    return
+                except smtplib.SMTPRecipientsRefused as e:
+                    raise EmailRejectedError(f"smtp refused recipient: {e}") from e
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPException, OSError) as e:
+                    self._drop()
+                    # A session that idled out gets one fresh connection
+                    if attempt or not isinstance(e, smtplib.SMTPServerDisconnected):
+                        raise EmailTransportError(f"smtp: {e}") from e
+
+    def _drop(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    async def send(self, message: EmailMessage) -> Dict[str, Any]:
+        await asyncio.to_thread(self._send_sync, message)
+        return {'success': True, 'provider_used': self.name}
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+            self._drop()
+
+
+def build_transports() -> Dict[str, Any]:
+    """Configured transports in provider priority order"""
+    transports = {}
+
+    if settings.SENDGRID_API_KEY:
+        transports['sendgrid'] = SendGridTransport(settings.SENDGRID_API_KEY)
+
+    resend_key = getattr(settings, 'RESEND_API_KEY', '')
+    if resend_key:
+        transports['resend'] = ResendTransport(resend_key)
+
+    if settings.SMTP_HOST:
+        transports['smtp'] = SMTPTransport(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            settings.SMTP_USER,
+            settings.SMTP_PASSWORD,
+            getattr(settings, 'SMTP_USE_TLS', True)
+        )
+
+    return transports
@@ -1,27 +1,55 @@
 """
 File encryption and security service
+
+Files are encrypted into a chunked container so they can be encrypted and
+decrypted as streams without holding the whole document in memory:
+
+    header:  MAGIC (4) | version (1) | chunk size (4, big endian) | nonce prefix (7)
+    chunks:  AES-256-GCM(chunk) + 16-byte tag, each of `chunk size` plaintext
+             bytes except the last
+
+Each chunk nonce is the prefix, a 4-byte chunk counter and a final-chunk flag,
+and the header is authenticated with every chunk. Reordered, truncated or
+extended files therefore fail to decrypt. Files written by the previous
+whole-file Fernet format are still readable.
 """
 
 import os
+import struct
 import hashlib
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, BinaryIO, Iterable, Iterator
 from pathlib import Path
 import base64
 
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 from config import settings
 
 
+STREAM_MAGIC = b"MTE\x00"
+STREAM_VERSION = 1
+STREAM_HEADER = struct.Struct("!4sBI7s")
+STREAM_TAG_SIZE = 16
+STREAM_MAX_CHUNKS = 2 ** 32
+
+
 class EncryptionService:
     """File and data encryption service"""
     
     # Master encryption key (in production, store in secure key management)
     MASTER_KEY = settings.SECRET_KEY.encode()[:32].ljust(32, b'0')
     
+    # Plaintext bytes per encrypted chunk
+    STREAM_CHUNK_SIZE = 64 * 1024
+    
+    _stream_keys: Dict[str, bytes] = {}
+    
     @staticmethod
     def generate_key() -> bytes:
         """Generate a new encryption key"""
@@ -47,31 +75,121 @@ class EncryptionService:
         key_hash = hashlib.sha256(f"{key_id}{settings.SECRET_KEY}".encode()).digest()
         return base64.urlsafe_b64encode(key_hash)
     
+    @staticmethod
+    def get_stream_key(key_id: str = "default") -> bytes:
+        """AES-256 key for the chunked file format, derived from the key for `key_id`"""
+        
+        key = EncryptionService._stream_keys.get(key_id)
+        if key is None:
+            hkdf = HKDF(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=None,
+                info=b"mytypist-file-stream-v1",
+            )
+            key = hkdf.derive(base64.urlsafe_b64decode(EncryptionService.get_encryption_key(key_id)))
+            EncryptionService._stream_keys[key_id] = key
+        return key
+    
+    @staticmethod
+    def encrypt_stream(chunks: Iterable[bytes], key_id: str = "default",
+                       chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Encrypt an iterable of plaintext blocks into the chunked format"""
+        
+        chunk_size = chunk_size or EncryptionService.STREAM_CHUNK_SIZE
+        aesgcm = AESGCM(EncryptionService.get_stream_key(key_id))
+        header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, os.urandom(7))
+        nonce_prefix = header[-7:]
+        yield header
+        
+        counter = 0
+        pending = b""
+        for block in chunks:
+            pending += block
+            # Keep at least one byte back so the final chunk is always flagged as such
+            while len(pending) > chunk_size:
+                yield EncryptionService._seal_chunk(aesgcm, nonce_prefix, counter, pending[:chunk_size], header, False)
+                pending = pending[chunk_size:]
+                counter += 1
+        
+        yield EncryptionService._seal_chunk(aesgcm, nonce_prefix, counter, pending, header, True)
+    
+    @staticmethod
+    def decrypt_stream(source: BinaryIO, key_id: str = "default") -> Iterator[bytes]:
+        """Decrypt a chunked-format stream, yielding one plaintext chunk at a time"""
+        
+        header = source.read(STREAM_HEADER.size)
+        if len(header) != STREAM_HEADER.size:
+            raise ValueError("Encrypted stream header is truncated")
+        magic, version, chunk_size, nonce_prefix = STREAM_HEADER.unpack(header)
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise ValueError("Not a chunked encrypted stream")
+        
+        aesgcm = AESGCM(EncryptionService.get_stream_key(key_id))
+        sealed_size = chunk_size + STREAM_TAG_SIZE
+        
+        counter = 0
+        sealed = source.read(sealed_size)
+        while True:
+            following = source.read(sealed_size)
+            last = not following
+            nonce = nonce_prefix + struct.pack("!IB", counter, int(last))
+            try:
+                yield aesgcm.decrypt(nonce, sealed, header)
+            except InvalidTag:
+                raise ValueError(f"Encrypted stream chunk {counter} failed authentication")
+            if last:
+                return
+            sealed = following
+            counter += 1
+    
+    @staticmethod
+    def _seal_chunk(aesgcm: AESGCM, nonce_prefix: bytes, counter: int,
+                    data: bytes, header: bytes, last: bool) -> bytes:
+        if counter >= STREAM_MAX_CHUNKS:
+            raise ValueError("File too large for the encrypted stream format")
+        return aesgcm.encrypt(nonce_prefix + struct.pack("!IB", counter, int(last)), data, header)
+    
+    @staticmethod
+    def is_stream_encrypted(file_path: str) -> bool:
+        """Whether a file uses the chunked format (as opposed to legacy Fernet)"""
+        
+        with open(file_path, 'rb') as file:
+            return file.read(len(STREAM_MAGIC)) == STREAM_MAGIC
+    
+    @staticmethod
+    def iter_decrypted_file(encrypted_file_path: str, key_id: str = "default") -> Iterator[bytes]:
+        """Yield the plaintext of an encrypted file without writing it to disk"""
+        
+        with open(encrypted_file_path, 'rb') as encrypted_file:
+            if encrypted_file.read(len(STREAM_MAGIC)) != STREAM_MAGIC:
+                # Legacy whole-file Fernet token
+                encrypted_file.seek(0)
+                yield Fernet(EncryptionService.get_encryption_key(key_id)).decrypt(encrypted_file.read())
+                return
+            
+            encrypted_file.seek(0)
+            yield from EncryptionService.decrypt_stream(encrypted_file, key_id)
+    
     @staticmethod
     async def encrypt_file(file_path: str, key_id: str = "default") -> Optional[str]:
         """Encrypt a file and return encrypted file path"""
         
+        encrypted_file_path = file_path + '.encrypted'
+        temp_path = encrypted_file_path + '.tmp'
+        
         try:
             if not os.path.exists(file_path):
                 return None
             
-            # Get encryption key
-            encryption_key = EncryptionService.get_encryption_key(key_id)
-            fernet = Fernet(encryption_key)
+            chunk_size = EncryptionService.STREAM_CHUNK_SIZE
             
-            # Read original file
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
-            
-            # Encrypt data
-            encrypted_data = fernet.encrypt(file_data)
-            
-            # Create encrypted file path
-            encrypted_file_path = file_path + '.encrypted'
-            
-            # Write encrypted data
-            with open(encrypted_file_path, 'wb') as encrypted_file:
-                encrypted_file.write(encrypted_data)
+            # Encrypt chunk by chunk into a temp file, then move it into place
+            with open(file_path, 'rb') as file, open(temp_path, 'wb') as encrypted_file:
+                blocks = iter(lambda: file.read(chunk_size), b"")
+                for sealed in EncryptionService.encrypt_stream(blocks, key_id, chunk_size):
+                    encrypted_file.write(sealed)
+            os.replace(temp_path, encrypted_file_path)
             
             # Remove original file
             os.remove(file_path)
@@ -80,38 +198,35 @@ class EncryptionService:
             
         except Exception as e:
             print(f"Encryption error: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             return None
     
     @staticmethod
     async def decrypt_file(encrypted_file_path: str, key_id: str = "default") -> Optional[str]:
-        """Decrypt a file and return decrypted file path"""
+        """Decrypt a file and return decrypted file path
+        
+        Prefer `iter_decrypted_file` when the plaintext is only being served.
+        """
+        
+        decrypted_file_path = encrypted_file_path.replace('.encrypted', '')
+        temp_path = decrypted_file_path + '.decrypted'
         
         try:
             if not os.path.exists(encrypted_file_path):
                 return None
             
-            # Get encryption key
-            encryption_key = EncryptionService.get_encryption_key(key_id)
-            fernet = Fernet(encryption_key)
-            
-            # Read encrypted file
-            with open(encrypted_file_path, 'rb') as encrypted_file:
-                encrypted_data = encrypted_file.read()
-            
-            # Decrypt data
-            decrypted_data = fernet.decrypt(encrypted_data)
-            
-            # Create decrypted file path
-            decrypted_file_path = encrypted_file_path.replace('.encrypted', '')
-            
-            # Write decrypted data
-            with open(decrypted_file_path, 'wb') as decrypted_file:
-                decrypted_file.write(decrypted_data)
+            with open(temp_path, 'wb') as decrypted_file:
+                for chunk in EncryptionService.iter_decrypted_file(encrypted_file_path, key_id):
+                    decrypted_file.write(chunk)
+            os.replace(temp_path, decrypted_file_path)
             
             return decrypted_file_path
             
         except Exception as e:
             print(f"Decryption error: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             return None
     
     @staticmethod
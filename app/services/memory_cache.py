@@ -0,0 +1,293 @@
+"""
+In-process L1 cache and host-shared memory tier for CacheService
+
+`NamespacedLRUCache` keeps one LRU segment per namespace, each with its own
+byte budget and hit/miss/eviction counters. Lookups, inserts and evictions
+are O(1): segments are OrderedDicts, hits move to the tail and evictions pop
+from the head. Expiry is checked lazily on access, and expired entries age
+out through normal LRU eviction.
+
+`SharedMemoryTier` stores serialized values as files on a tmpfs directory
+(`/dev/shm` by default), so every gunicorn worker on the host sees the same
+hot entries without a Redis round trip.
+"""
+
+import os
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+cache_logger = logging.getLogger('cache_service')
+
+
+@dataclass
+class NamespaceStats:
+    """Per-namespace L1 counters"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+    budget_bytes: int = 0
+
+
+class _Segment:
+    """LRU segment for a single namespace"""
+
+    __slots__ = ("entries", "budget_bytes", "stats")
+
+    def __init__(self, budget_bytes: int):
+        # key -> (value, expires_at, size)
+        self.entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self.budget_bytes = budget_bytes
+        self.stats = NamespaceStats(budget_bytes=budget_bytes)
+
+
+class NamespacedLRUCache:
+    """Thread-safe LRU/TTL cache with per-namespace byte budgets"""
+
+    def __init__(self,
+                 default_budget_bytes: int = 16 * 1024 * 1024,
+                 namespace_budgets: Optional[Dict[str, int]] = None,
+                 default_ttl: int = 300,
+                 max_entry_bytes: Optional[int] = None):
+        self.default_budget_bytes = default_budget_bytes
+        self.namespace_budgets = dict(namespace_budgets or {})
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._segments: Dict[str, _Segment] = {}
+        self._namespace_of: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def _segment(self, namespace: str) -> _Segment:
+        segment = self._segments.get(namespace)
+        if segment is None:
+            budget = self.namespace_budgets.get(namespace, self.default_budget_bytes)
+            segment = self._segments[namespace] = _Segment(budget)
+        return segment
+
+    def get(self, key: str, namespace: str, default: Any = None) -> Any:
+        with self._lock:
+            segment = self._segment(namespace)
+            entry = segment.entries.get(key)
+            if entry is None:
+                segment.stats.misses += 1
+                return default
+
+            value, expires_at, size = entry
+            if expires_at <= time.time():
+                self._remove(segment, key, size)
+                segment.stats.expirations += 1
+                segment.stats.misses += 1
+                return default
+
+            segment.entries.move_to_end(key)
+            segment.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, namespace: str, size: int, ttl: Optional[int] = None) -> bool:
+        """Insert or replace an entry; `size` is its approximate byte cost"""
+        size = max(int(size or 0), 1)
+        with self._lock:
+            segment = self._segment(namespace)
+            if size > segment.budget_bytes or (self.max_entry_bytes and size > self.max_entry_bytes):
+                # Too big to keep in memory; make sure no stale copy survives
+                self._discard(key)
+                return False
+
+            previous_namespace = self._namespace_of.get(key)
+            if previous_namespace is not None:
+                previous = self._segments[previous_namespace]
+                self._remove(previous, key, previous.entries[key][2])
+
+            segment.entries[key] = (value, time.time() + (ttl or self.default_ttl), size)
+            self._namespace_of[key] = namespace
+            segment.stats.entries += 1
+            segment.stats.bytes += size
+
+            while segment.stats.bytes > segment.budget_bytes:
+                evicted_key, (_, _, evicted_size) = segment.entries.popitem(last=False)
+                self._namespace_of.pop(evicted_key, None)
+                segment.stats.entries -= 1
+                segment.stats.bytes -= evicted_size
+                segment.stats.evictions += 1
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._discard(key)
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._discard(key))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            segments = [namespace] if namespace else list(self._segments)
+            for name in segments:
+                segment = self._segments.get(name)
+                if segment is None:
+                    continue
+                for key in segment.entries:
+                    self._namespace_of.pop(key, None)
+                segment.entries.clear()
+                segment.stats.entries = 0
+                segment.stats.bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._namespace_of
+
+    def __len__(self) -> int:
+        return len(self._namespace_of)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: asdict(segment.stats) for name, segment in self._segments.items()}
+
+    def _discard(self, key: str) -> bool:
+        namespace = self._namespace_of.get(key)
+        if namespace is None:
+            return False
+        segment = self._segments[namespace]
+        self._remove(segment, key, segment.entries[key][2])
+        return True
+
+    def _remove(self, segment: _Segment, key: str, size: int) -> None:
+        del segment.entries[key]
+        self._namespace_of.pop(key, None)
+        segment.stats.entries -= 1
+        segment.stats.bytes -= size
+
+
+class SharedMemoryTier:
+    """Host-wide cache tier shared by all worker processes.
+
+    Each entry is one file named after the key hash: an 8-byte expiry
+    timestamp followed by the serialized value. Writes go through a temp
+    file and an atomic rename, so readers never see partial values and no
+    cross-process lock is needed.
+    """
+
+    _HEADER = struct.Struct("!d")
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024,
+                 namespaces: Optional[Iterable[str]] = None, sweep_every: int = 200):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.namespaces = set(namespaces) if namespaces else None
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def accepts(self, namespace: str) -> bool:
+        return self.namespaces is None or namespace in self.namespaces
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < self._HEADER.size:
+            return None
+        (expires_at,) = self._HEADER.unpack_from(data)
+        if expires_at <= time.time():
+            self._unlink(path)
+            return None
+        return data[self._HEADER.size:]
+
+    def set(self, key: str, data: bytes, ttl: int) -> bool:
+        if data is None or len(data) > self.max_bytes:
+            return False
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._HEADER.pack(time.time() + ttl))
+                f.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            cache_logger.warning(f"Shared memory cache write failed: {e}")
+            return False
+
+        with self._lock:
+            self._writes += 1
+            should_sweep = self._writes % self.sweep_every == 0
+        if should_sweep:
+            self.sweep()
+        return True
+
+    def delete(self, key: str) -> bool:
+        return self._unlink(self._path(key))
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        return sum(1 for key in keys if self.delete(key))
+
+    def sweep(self) -> Dict[str, int]:
+        """Drop expired entries, then the oldest ones while over budget"""
+        now = time.time()
+        live = []
+        total = 0
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return {"removed": 0, "bytes": 0}
+
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if name.startswith(".tmp-"):
+                    # Orphaned temp file from a crashed writer
+                    if now - stat.st_mtime > 60:
+                        removed += self._unlink(path)
+                    continue
+                with open(path, "rb") as f:
+                    header = f.read(self._HEADER.size)
+            except OSError:
+                continue
+
+            if len(header) < self._HEADER.size or self._HEADER.unpack(header)[0] <= now:
+                removed += self._unlink(path)
+                continue
+            live.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total > self.max_bytes:
+            live.sort()
+            for _, size, path in live:
+                if total <= self.max_bytes:
+                    break
+                if self._unlink(path):
+                    removed += 1
+                    total -= size
+
+        return {"removed": removed, "bytes": total}
+
+    def clear(self) -> None:
+        try:
+            for name in os.listdir(self.directory):
+                self._unlink(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
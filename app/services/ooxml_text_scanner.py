@@ -0,0 +1,197 @@
+"""
+Streaming paragraph scanner for WordprocessingML packages
+
+Yields every paragraph of a .docx - body, tables, text boxes, headers,
+footers, footnotes and endnotes - in document order with its visible text
+and a map back to the runs that produced it, so callers can match patterns
+that Word has split across several runs and still report exactly where each
+match lives. Parts are streamed with iterparse and paragraphs are discarded
+as soon as they are yielded, so memory stays flat for large templates.
+"""
+
+import bisect
+import re
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+_P = _W + "p"
+_R = _W + "r"
+_T = _W + "t"
+_TBL = _W + "tbl"
+_TXBX = _W + "txbxContent"
+_FALLBACK = _MC + "Fallback"
+
+# Run children that render as whitespace between text nodes
+_BREAKS = {_W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n"}
+
+_PART_RE = re.compile(r'^word/(document|header(\d*)|footer(\d*)|footnotes|endnotes)\.xml$')
+_PART_ORDER = {"document": 0, "header": 1, "footer": 2, "footnotes": 3, "endnotes": 4}
+
+# Progress is reported at least once per part and every this many paragraphs
+PROGRESS_EVERY = 200
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+@dataclass
+class ScannedParagraph:
+    """Visible text of one paragraph and the runs it came from"""
+    part: str
+    index: int
+    offset: int
+    in_table: bool = False
+    in_textbox: bool = False
+    text: str = ""
+    # (paragraph character offset, run index) for each text fragment
+    fragments: List[Tuple[int, int]] = field(default_factory=list)
+
+    def runs_for(self, start: int, end: int) -> Tuple[int, int]:
+        """First and last run index covering text[start:end]"""
+        starts = [offset for offset, _ in self.fragments]
+        first = bisect.bisect_right(starts, start) - 1
+        last = bisect.bisect_right(starts, max(end - 1, start)) - 1
+        return self.fragments[max(first, 0)][1], self.fragments[max(last, 0)][1]
+
+    def locate(self, start: int, end: int) -> Dict[str, Any]:
+        """Serializable location of text[start:end] inside the package"""
+        first_run, last_run = self.runs_for(start, end)
+        return {
+            "part": self.part,
+            "paragraph": self.index,
+            "start": start,
+            "end": end,
+            "runs": [first_run, last_run],
+            "split_across_runs": first_run != last_run,
+            "in_table": self.in_table,
+            "in_textbox": self.in_textbox
+        }
+
+
+class _CountingReader:
+    """File wrapper that tracks how many uncompressed bytes were parsed"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def content_parts(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Text-bearing parts of the package, body first"""
+    parts = []
+    for info in archive.infolist():
+        match = _PART_RE.match(info.filename)
+        if match:
+            kind = re.sub(r'\d+$', '', match.group(1))
+            number = int(match.group(2) or match.group(3) or 0)
+            parts.append((_PART_ORDER[kind], number, info))
+    return [info for _, _, info in sorted(parts, key=lambda item: item[:2])]
+
+
+def iter_paragraphs(file_path: str,
+                    progress_callback: Optional[ProgressCallback] = None) -> Iterator[ScannedParagraph]:
+    """Stream the paragraphs of a .docx package in document order"""
+    with zipfile.ZipFile(file_path) as archive:
+        parts = content_parts(archive)
+        if not any(info.filename == "word/document.xml" for info in parts):
+            raise ValueError("Not a Word document: word/document.xml is missing")
+
+        progress = {
+            "parts_total": len(parts),
+            "parts_done": 0,
+            "part": None,
+            "part_done": False,
+            "bytes_total": sum(info.file_size for info in parts),
+            "bytes_read": 0,
+            "paragraphs": 0
+        }
+        offset = 0
+        bytes_done = 0
+
+        for info in parts:
+            progress["part"] = info.filename
+            progress["part_done"] = False
+            with archive.open(info) as raw:
+                reader = _CountingReader(raw)
+                for paragraph in _iter_part(info.filename, reader, offset):
+                    offset = paragraph.offset + len(paragraph.text) + 1
+                    yield paragraph
+
+                    progress["paragraphs"] += 1
+                    if progress_callback and progress["paragraphs"] % PROGRESS_EVERY == 0:
+                        progress["bytes_read"] = bytes_done + reader.bytes_read
+                        progress_callback(dict(progress))
+
+            bytes_done += info.file_size
+            progress["parts_done"] += 1
+            progress["part_done"] = True
+            progress["bytes_read"] = bytes_done
+            if progress_callback:
+                progress_callback(dict(progress))
+
+
+def _iter_part(part: str, reader: _CountingReader, offset: int) -> Iterator[ScannedParagraph]:
+    """Paragraphs of one XML part; text boxes nest inside their anchor paragraph"""
+    stack: List[ScannedParagraph] = []
+    run_counts: List[int] = []
+    tables = 0
+    textboxes = 0
+    # Alternate-content fallbacks repeat the choice (e.g. VML text boxes)
+    fallback = 0
+    index = 0
+
+    for event, element in ET.iterparse(reader, events=("start", "end")):
+        tag = element.tag
+
+        if tag == _FALLBACK:
+            fallback += 1 if event == "start" else -1
+            if event == "end":
+                element.clear()
+            continue
+        if fallback:
+            continue
+
+        if event == "start":
+            if tag == _P:
+                stack.append(ScannedParagraph(part, index, 0, tables > 0, textboxes > 0))
+                run_counts.append(-1)
+                index += 1
+            elif tag == _R and run_counts:
+                run_counts[-1] += 1
+            elif tag == _TBL:
+                tables += 1
+            elif tag == _TXBX:
+                textboxes += 1
+            continue
+
+        if tag in (_T, *_BREAKS) and stack:
+            text = (element.text or "") if tag == _T else _BREAKS[tag]
+            if text:
+                paragraph = stack[-1]
+                paragraph.fragments.append((len(paragraph.text), max(run_counts[-1], 0)))
+                paragraph.text += text
+        elif tag == _P and stack:
+            paragraph = stack.pop()
+            run_counts.pop()
+            element.clear()
+            if paragraph.text:
+                # Offsets follow yield order, so a text box precedes its anchor
+                paragraph.offset = offset
+                offset += len(paragraph.text) + 1
+                yield paragraph
+        elif tag == _TBL:
+            tables -= 1
+        elif tag == _TXBX:
+            textboxes -= 1
@@ -5,12 +5,20 @@ Implements granular permissions, role hierarchies, and resource-based access con
 
 from enum import Enum
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Table, select, or_
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import json
+import time
+import logging
+import threading
+
+import redis
 
 from config import settings
 from database import Base
@@ -39,6 +47,98 @@ role_hierarchy = Table(
     Column('child_role_id', Integer, ForeignKey('rbac_roles.id'), primary_key=True)
 )
 
+# Transitive closure of role_hierarchy: every (role, ancestor) pair with its distance
+role_closure = Table(
+    'rbac_role_closure',
+    Base.metadata,
+    Column('role_id', Integer, ForeignKey('rbac_roles.id'), primary_key=True),
+    Column('ancestor_role_id', Integer, ForeignKey('rbac_roles.id'), primary_key=True, index=True),
+    Column('depth', Integer, nullable=False)
+)
+
+logger = logging.getLogger(__name__)
+
+# Compiled permission sets never outlive this, even if no change is observed
+PERMISSION_CACHE_TTL = 300
+PERMISSION_CACHE_MAX_USERS = 10000
+
+
+@dataclass(frozen=True)
+class PermissionGrant:
+    """Permission attributes needed to evaluate a check"""
+    id: int
+    name: str
+    display_name: str
+    resource_type: str
+    action: str
+    scope: str
+    conditions: Optional[str]
+
+
+@dataclass(frozen=True)
+class CompiledPermissions:
+    """A user's effective permissions, flattened across assigned and inherited roles"""
+    user_id: int
+    version: Tuple[Optional[int], int]
+    role_ids: frozenset
+    actions: frozenset  # {(resource_type, action)}
+    grants: MappingProxyType  # (resource_type, action) -> tuple of PermissionGrant
+    valid_until: float
+
+
+class RBACVersion:
+    """
+    Global RBAC version counter.
+
+    Every change to roles, permissions, the hierarchy or assignments bumps
+    it; compiled permission sets are only reused while it is unchanged. The
+    counter lives in Redis so all workers see a bump, and is re-read at most
+    once per `check_interval` seconds. Local bumps take effect immediately.
+    """
+
+    KEY = "rbac:version"
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._local = 0
+        self._remote: Optional[int] = None
+        self._checked_at = 0.0
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        if self._client is None:
+            self._client = redis.from_url(settings.REDIS_URL, decode_responses=True, socket_timeout=0.5)
+        return self._client
+
+    def current(self) -> Tuple[Optional[int], int]:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            try:
+                value = self._redis().get(self.KEY)
+                self._remote = int(value) if value is not None else 0
+            except redis.RedisError:
+                # Without Redis only local bumps and the cache TTL apply
+                self._remote = None
+            self._checked_at = now
+        return self._remote, self._local
+
+    def bump(self) -> None:
+        with self._lock:
+            self._local += 1
+        try:
+            self._remote = int(self._redis().incr(self.KEY))
+            self._checked_at = time.monotonic()
+        except redis.RedisError as e:
+            logger.warning(f"RBAC version bump not shared with other workers: {e}")
+
+
+rbac_version = RBACVersion()
+_permission_cache: "OrderedDict[int, CompiledPermissions]" = OrderedDict()
+_permission_cache_lock = threading.Lock()
+# Set once this process has seen a populated (or legitimately empty) role closure
+_closure_verified = False
+
 
 class ResourceType(str, Enum):
     """Types of resources that can be protected"""
@@ -202,6 +302,7 @@ class RBACService:
 
         db.commit()
         db.refresh(role)
+        rbac_version.bump()
 
         # Log audit event
         AuditService.log_system_event(
@@ -234,6 +335,7 @@ class RBACService:
         db.add(permission)
         db.commit()
         db.refresh(permission)
+        rbac_version.bump()
 
         # Log audit event
         AuditService.log_system_event(
@@ -287,6 +389,7 @@ class RBACService:
 
         db.add(assignment)
         db.commit()
+        rbac_version.bump()
 
         # Log audit event
         AuditService.log_system_event(
@@ -316,6 +419,7 @@ class RBACService:
 
         assignment.is_active = False
         db.commit()
+        rbac_version.bump()
 
         # Log audit event
         role = db.query(RBACRole).filter(RBACRole.id == role_id).first()
@@ -351,6 +455,7 @@ class RBACService:
             role.permissions.append(permission)
 
         db.commit()
+        rbac_version.bump()
 
         # Log audit event
         AuditService.log_system_event(
@@ -370,53 +475,20 @@ class RBACService:
                         resource_id: str = None, context: Dict = None) -> bool:
         """Check if user has permission for action on resource"""
 
-        # Get user's active roles
-        user_roles_query = db.query(UserRoleAssignment).filter(
-            UserRoleAssignment.user_id == user_id,
-            UserRoleAssignment.is_active == True
-        )
-
-        # Check for expired assignments
-        current_time = datetime.utcnow()
-        user_roles_query = user_roles_query.filter(
-            (UserRoleAssignment.expires_at.is_(None)) |
-            (UserRoleAssignment.expires_at > current_time)
-        )
-
-        user_role_assignments = user_roles_query.all()
-
-        if not user_role_assignments:
-            return False
-
-        # Get all role IDs including inherited roles
-        all_role_ids = set()
-        for assignment in user_role_assignments:
-            all_role_ids.add(assignment.role_id)
-            # Add parent roles (role hierarchy)
-            parent_roles = RBACService._get_parent_roles(db, assignment.role_id)
-            all_role_ids.update(parent_roles)
-
-        # Check permissions for all roles
-        permissions = db.query(RBACPermission).join(
-            role_permissions, RBACPermission.id == role_permissions.c.permission_id
-        ).filter(
-            role_permissions.c.role_id.in_(all_role_ids),
-            RBACPermission.resource_type == resource_type,
-            RBACPermission.action == action,
-            RBACPermission.is_active == True
-        ).all()
+        compiled = RBACService.get_compiled_permissions(db, user_id)
 
-        if not permissions:
+        if (resource_type, action) not in compiled.actions:
             return False
 
         # Check scope and conditions
-        for permission in permissions:
+        for permission in compiled.grants[(resource_type, action)]:
             if RBACService._check_permission_scope(permission, user_id, resource_id, context):
                 if RBACService._check_permission_conditions(permission, context):
                     return True
 
         # Check resource-specific access
         if resource_id:
+            current_time = datetime.utcnow()
             resource_access = db.query(ResourceAccess).filter(
                 ResourceAccess.user_id == user_id,
                 ResourceAccess.resource_type == resource_type,
@@ -436,32 +508,13 @@ class RBACService:
     @staticmethod
     def get_user_permissions(db: Session, user_id: int) -> List[Dict[str, any]]:
         """Get all permissions for user"""
-        # Get user's active roles
-        user_role_assignments = db.query(UserRoleAssignment).filter(
-            UserRoleAssignment.user_id == user_id,
-            UserRoleAssignment.is_active == True
-        ).filter(
-            (UserRoleAssignment.expires_at.is_(None)) |
-            (UserRoleAssignment.expires_at > datetime.utcnow())
-        ).all()
-
-        if not user_role_assignments:
-            return []
-
-        # Get all role IDs including inherited roles
-        all_role_ids = set()
-        for assignment in user_role_assignments:
-            all_role_ids.add(assignment.role_id)
-            parent_roles = RBACService._get_parent_roles(db, assignment.role_id)
-            all_role_ids.update(parent_roles)
+        compiled = RBACService.get_compiled_permissions(db, user_id)
 
-        # Get permissions
-        permissions = db.query(RBACPermission).join(
-            role_permissions, RBACPermission.id == role_permissions.c.permission_id
-        ).filter(
-            role_permissions.c.role_id.in_(all_role_ids),
-            RBACPermission.is_active == True
-        ).all()
+        permissions = {
+            permission.id: permission
+            for grants in compiled.grants.values()
+            for permission in grants
+        }
 
         return [
             {
@@ -473,9 +526,166 @@ class RBACService:
                 "scope": perm.scope,
                 "conditions": json.loads(perm.conditions) if perm.conditions else None
             }
-            for perm in permissions
+            for perm in permissions.values()
         ]
 
+    @staticmethod
+    def get_compiled_permissions(db: Session, user_id: int) -> CompiledPermissions:
+        """Return the user's compiled permission set, rebuilding it only after an RBAC change"""
+        version = rbac_version.current()
+        now = time.time()
+
+        with _permission_cache_lock:
+            compiled = _permission_cache.get(user_id)
+            if compiled is not None and compiled.version == version and compiled.valid_until > now:
+                _permission_cache.move_to_end(user_id)
+                return compiled
+
+        compiled = RBACService._compile_permissions(db, user_id, version)
+
+        with _permission_cache_lock:
+            _permission_cache[user_id] = compiled
+            _permission_cache.move_to_end(user_id)
+            while len(_permission_cache) > PERMISSION_CACHE_MAX_USERS:
+                _permission_cache.popitem(last=False)
+
+        return compiled
+
+    @staticmethod
+    def _compile_permissions(db: Session, user_id: int, version: Tuple[Optional[int], int]) -> CompiledPermissions:
+        """Flatten assigned roles, their ancestors and permissions in two queries"""
+        current_time = datetime.utcnow()
+        valid_until = time.time() + PERMISSION_CACHE_TTL
+
+        # Get user's active roles
+        assignments = db.query(UserRoleAssignment.role_id, UserRoleAssignment.expires_at).filter(
+            UserRoleAssignment.user_id == user_id,
+            UserRoleAssignment.is_active == True
+        ).filter(
+            (UserRoleAssignment.expires_at.is_(None)) |
+            (UserRoleAssignment.expires_at > current_time)
+        ).all()
+
+        role_ids = frozenset(role_id for role_id, _ in assignments)
+
+        # The set must not outlive the first assignment to expire
+        for _, expires_at in assignments:
+            if expires_at is not None:
+                valid_until = min(valid_until, time.time() + (expires_at - current_time).total_seconds())
+
+        grants: Dict[Tuple[str, str], List[PermissionGrant]] = {}
+        if role_ids:
+            RBACService.ensure_role_closure(db)
+            inherited_roles = select(role_closure.c.ancestor_role_id).where(role_closure.c.role_id.in_(role_ids))
+            permissions = db.query(RBACPermission).join(
+                role_permissions, RBACPermission.id == role_permissions.c.permission_id
+            ).filter(
+                or_(
+                    role_permissions.c.role_id.in_(role_ids),
+                    role_permissions.c.role_id.in_(inherited_roles)
+                ),
+                RBACPermission.is_active == True
+            ).distinct().all()
+
+            for perm in permissions:
+                grants.setdefault((perm.resource_type, perm.action), []).append(PermissionGrant(
+                    id=perm.id,
+                    name=perm.name,
+                    display_name=perm.display_name,
+                    resource_type=perm.resource_type,
+                    action=perm.action,
+                    scope=perm.scope,
+                    conditions=perm.conditions
+                ))
+
+        return CompiledPermissions(
+            user_id=user_id,
+            version=version,
+            role_ids=role_ids,
+            actions=frozenset(grants),
+            grants=MappingProxyType({key: tuple(value) for key, value in grants.items()}),
+            valid_until=valid_until
+        )
+
+    @staticmethod
+    def add_parent_role(db: Session, role_id: int, parent_role_id: int) -> bool:
+        """Make `role_id` inherit the permissions of `parent_role_id`"""
+        # A role cannot inherit from itself or from one of its descendants
+        if role_id == parent_role_id or role_id in RBACService._get_parent_roles(db, parent_role_id):
+            return False
+
+        db.execute(role_hierarchy.insert().values(parent_role_id=parent_role_id, child_role_id=role_id))
+        RBACService.rebuild_role_closure(db)
+        db.commit()
+        rbac_version.bump()
+        return True
+
+    @staticmethod
+    def remove_parent_role(db: Session, role_id: int, parent_role_id: int) -> bool:
+        """Stop `role_id` inheriting from `parent_role_id`"""
+        result = db.execute(role_hierarchy.delete().where(
+            role_hierarchy.c.parent_role_id == parent_role_id,
+            role_hierarchy.c.child_role_id == role_id
+        ))
+        if not result.rowcount:
+            return False
+
+        RBACService.rebuild_role_closure(db)
+        db.commit()
+        rbac_version.bump()
+        return True
+
+    @staticmethod
+    def ensure_role_closure(db: Session) -> None:
+        """Rebuild the role closure if the hierarchy has edges but the closure has none"""
+        global _closure_verified
+        if _closure_verified:
+            return
+
+        closure_empty = db.query(role_closure.c.role_id).first() is None
+        if closure_empty and db.query(role_hierarchy.c.child_role_id).first() is not None:
+            try:
+                rows = RBACService.rebuild_role_closure(db)
+                db.commit()
+            except Exception as e:
+                # Another worker may be rebuilding it at the same moment
+                db.rollback()
+                logger.warning(f"Role closure rebuild failed, will retry: {e}")
+                return
+            logger.info(f"Rebuilt empty role closure with {rows} rows")
+            rbac_version.bump()
+
+        _closure_verified = True
+
+    @staticmethod
+    def rebuild_role_closure(db: Session) -> int:
+        """Recompute the role closure table from role_hierarchy (caller commits)"""
+        parents: Dict[int, Set[int]] = {}
+        for parent_id, child_id in db.query(role_hierarchy.c.parent_role_id, role_hierarchy.c.child_role_id).all():
+            parents.setdefault(child_id, set()).add(parent_id)
+
+        rows = []
+        for role_id in parents:
+            # Breadth-first so each ancestor is recorded at its shortest distance
+            seen = {role_id}
+            frontier = [role_id]
+            depth = 0
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for current in frontier:
+                    for parent_id in parents.get(current, ()):
+                        if parent_id not in seen:
+                            seen.add(parent_id)
+                            next_frontier.append(parent_id)
+                            rows.append({"role_id": role_id, "ancestor_role_id": parent_id, "depth": depth})
+                frontier = next_frontier
+
+        db.execute(role_closure.delete())
+        if rows:
+            db.execute(role_closure.insert(), rows)
+        return len(rows)
+
     @staticmethod
     def get_user_roles(db: Session, user_id: int) -> List[Dict[str, any]]:
         """Get all roles for user"""
@@ -677,26 +887,17 @@ class RBACService:
                     db, role_name, display_name, description, permissions
                 )
 
+        RBACService.rebuild_role_closure(db)
         db.commit()
 
     @staticmethod
     def _get_parent_roles(db: Session, role_id: int) -> Set[int]:
         """Get all parent roles in hierarchy"""
-        parent_roles = set()
-
-        # Direct parents
-        direct_parents = db.query(role_hierarchy).filter(
-            role_hierarchy.c.child_role_id == role_id
+        ancestors = db.query(role_closure.c.ancestor_role_id).filter(
+            role_closure.c.role_id == role_id
         ).all()
 
-        for parent in direct_parents:
-            parent_id = parent.parent_role_id
-            parent_roles.add(parent_id)
-            # Recursive call for grandparents
-            grandparents = RBACService._get_parent_roles(db, parent_id)
-            parent_roles.update(grandparents)
-
-        return parent_roles
+        return {ancestor_id for (ancestor_id,) in ancestors}
 
     @staticmethod
     def _check_permission_scope(permission: RBACPermission, user_id: int, resource_id: str = None,
@@ -753,6 +954,9 @@ class RBACService:
 
         db.commit()
 
+        if expired_assignments:
+            rbac_version.bump()
+
         return {
             "expired_role_assignments": expired_assignments,
             "expired_resource_access": expired_access
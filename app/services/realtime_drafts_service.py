@@ -1,41 +1,69 @@
 """
 Real-time Draft Management System
-Implements auto-save every 3 seconds, background pre-processing, and 
-instant document generation with intelligent form state management.
+Keeps realtime draft state in Redis so every worker process sees the same
+draft, and persists it to DocumentDraft through a write-behind journal.
+
+Each draft is one Redis hash: metadata fields plus one field per form value
+(``f:``), validation result (``v:``) and pre-processed value (``p:``), so a
+keystroke is a field-level HSET rather than a rewrite of the whole draft.
+Edited drafts are recorded once in a sorted set scored by when they first
+became dirty; a single flusher per process claims drafts that have been
+dirty for the flush interval and writes them to the database in one batch,
+so a burst of edits to a draft becomes a single row update.
 """
 
 import asyncio
 import json
 import time
 import uuid
-from typing import Dict, List, Optional, Any, Callable
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from app.models.document import Document, DocumentStatus
-from app.models.template import Template
-from app.services.cache_service import cache_service
+
+from database import SessionLocal
+from app.models.template import Template, Placeholder
+from app.services.draft_system_service import DocumentDraft, DraftSystemService
 from config import settings
-import redis
 
 # Configure logging
 drafts_logger = logging.getLogger('realtime_drafts')
 
+DRAFT_TTL_SECONDS = 86400  # Idle drafts expire from Redis after 24 hours
+JOURNAL_KEY = "drafts:journal"
+
+FORM_PREFIX = "f:"
+VALIDATION_PREFIX = "v:"
+PROCESSED_PREFIX = "p:"
+
+# Atomically take due drafts off the journal so concurrent flushers never
+# write the same draft; edits made after the claim re-add it.
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
 @dataclass
 class DraftState:
     """Real-time draft state management"""
     draft_id: str
     template_id: int
-    user_id: int
+    user_id: Optional[int]
     form_data: Dict[str, Any] = field(default_factory=dict)
     validation_results: Dict[str, Any] = field(default_factory=dict)
     pre_processing_cache: Dict[str, Any] = field(default_factory=dict)
     last_modified: datetime = field(default_factory=datetime.utcnow)
-    auto_save_enabled: bool = True
-    is_dirty: bool = False
     processing_status: str = "draft"
+    document_draft_id: Optional[int] = None
 
 @dataclass
 class ValidationResult:
@@ -46,67 +74,263 @@ class ValidationResult:
     warnings: List[str] = field(default_factory=list)
     suggestions: List[str] = field(default_factory=list)
 
-class RealtimeDraftsManager:
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'is_valid': self.is_valid,
+            'errors': self.errors,
+            'warnings': self.warnings,
+            'suggestions': self.suggestions
+        }
+
+
+def draft_key(draft_id: str) -> str:
+    return f"draft:{draft_id}"
+
+
+class DraftJournal:
     """
-    Manages real-time draft states with auto-save, validation, and pre-processing
+    Write-behind journal that batches realtime draft saves into DocumentDraft rows
     """
-    
-    def __init__(self):
-        self.active_drafts: Dict[str, DraftState] = {}
-        self.auto_save_tasks: Dict[str, asyncio.Task] = {}
-        self.validation_cache = {}
-        self.processing_cache = {}
-        
-        # Redis for distributed draft storage
+
+    def __init__(self, manager: "RealtimeDraftsManager", flush_interval: float, batch_size: int):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._claim_script = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def record(self, pipe, draft_id: str, immediate: bool = False) -> None:
+        """Add a draft to the journal as part of the caller's pipeline"""
+        now = time.time()
+        if immediate:
+            # Significant edits are due at the next flush
+            pipe.zadd(JOURNAL_KEY, {draft_id: now - self.flush_interval}, lt=True)
+        else:
+            # Keep the first dirty time so further edits coalesce into one write
+            pipe.zadd(JOURNAL_KEY, {draft_id: now}, nx=True)
+
+    async def claim(self, cutoff: float) -> List[str]:
+        """Take up to batch_size drafts that have been dirty since before cutoff"""
+        if self._claim_script is None:
+            self._claim_script = self.manager.redis.register_script(_CLAIM_SCRIPT)
+        return await self._claim_script(keys=[JOURNAL_KEY], args=[cutoff, self.batch_size])
+
+    async def flush(self, cutoff: Optional[float] = None) -> int:
+        """Write one batch of due drafts to the database; returns the number written"""
+        if cutoff is None:
+            cutoff = time.time() - self.flush_interval
+
+        # Shielded so a cancelled flusher never abandons a claimed batch: it is
+        # either written (with new row ids recorded) or put back on the journal
+        batch = asyncio.ensure_future(self._flush_batch(cutoff))
         try:
-            self.redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                password=settings.REDIS_PASSWORD,
-                decode_responses=False,  # Keep binary for complex data
-                socket_connect_timeout=2
+            return await asyncio.shield(batch)
+        except asyncio.CancelledError:
+            await asyncio.gather(batch, return_exceptions=True)
+            raise
+
+    async def _flush_batch(self, cutoff: float) -> int:
+        draft_ids = await self.claim(cutoff)
+        if not draft_ids:
+            return 0
+
+        written = False
+        try:
+            drafts = await self.manager._load_drafts(draft_ids)
+            created = await asyncio.to_thread(self._write_batch, drafts) if drafts else {}
+            written = True
+        finally:
+            if not written:
+                # Put the claimed drafts back so the next flush retries them
+                pipe = self.manager.redis.pipeline(transaction=False)
+                pipe.zadd(JOURNAL_KEY, {draft_id: cutoff for draft_id in draft_ids}, nx=True)
+                await pipe.execute()
+
+        if created:
+            pipe = self.manager.redis.pipeline(transaction=False)
+            for draft_id, document_draft_id in created.items():
+                pipe.hset(draft_key(draft_id), "document_draft_id", document_draft_id)
+            await pipe.execute()
+
+        for draft in drafts:
+            await self.manager._emit_draft_saved_event(draft.draft_id)
+
+        drafts_logger.debug(f"Flushed {len(drafts)} drafts")
+        return len(drafts)
+
+    def _write_batch(self, drafts: List[DraftState]) -> Dict[str, int]:
+        """Persist drafts with one bulk update; returns ids of newly created rows"""
+        db = SessionLocal()
+        try:
+            template_ids = {draft.template_id for draft in drafts}
+            placeholder_counts = dict(
+                db.query(Placeholder.template_id, func.count(Placeholder.id))
+                .filter(Placeholder.template_id.in_(template_ids))
+                .group_by(Placeholder.template_id)
+                .all()
             )
-            self.redis_available = True
+
+            now = datetime.utcnow()
+            updates = []
+            new_rows = []
+
+            for draft in drafts:
+                completion = DraftSystemService.completion_percentage(
+                    draft.form_data, placeholder_counts.get(draft.template_id, 0)
+                )
+                values = {
+                    "placeholder_data": json.dumps(draft.form_data),
+                    "completion_percentage": completion,
+                    "auto_save_data": json.dumps({
+                        "save_trigger": "realtime",
+                        "total_fields": len(draft.form_data),
+                        "completion": completion,
+                        "timestamp": now.isoformat()
+                    }),
+                    "last_auto_save": now,
+                    "last_modified": draft.last_modified
+                }
+                if draft.document_draft_id:
+                    updates.append({"id": draft.document_draft_id, **values})
+                else:
+                    new_rows.append((draft, values))
+
+            if updates:
+                db.bulk_update_mappings(DocumentDraft, updates)
+
+            created = []
+            if new_rows:
+                templates = {
+                    template.id: template
+                    for template in db.query(Template).filter(
+                        Template.id.in_({draft.template_id for draft, _ in new_rows})
+                    )
+                }
+                for draft, values in new_rows:
+                    template = templates.get(draft.template_id)
+                    if template is None:
+                        continue
+                    row = DraftSystemService.build_draft(template, template.name, draft.user_id)
+                    for name, value in values.items():
+                        setattr(row, name, value)
+                    db.add(row)
+                    created.append((draft.draft_id, row))
+
+            db.commit()
+            return {draft_id: row.id for draft_id, row in created}
+
         except Exception:
-            self.redis_available = False
-        
-        # Start cleanup task when event loop is available
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run(self) -> None:
+        """Flush due drafts until stopped"""
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                # Drain while full batches are due, then wait for the next tick
+                while not self._stopping.is_set() and await self.flush() >= self.batch_size:
+                    pass
+                failures = 0
+                await self._wait(min(1.0, self.flush_interval))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                failures += 1
+                drafts_logger.warning(f"Draft journal flush failed: {e}")
+                await self._wait(min(30.0, self.flush_interval * 2 ** failures))
+
+    async def _wait(self, seconds: float) -> None:
+        """Sleep until the next tick, waking early when stopped"""
         try:
-            asyncio.create_task(self._cleanup_expired_drafts())
-        except RuntimeError:
-            # No event loop available during import, will start later
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
             pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still pending"""
+        if self._task is not None:
+            # Let the loop finish its current batch rather than cancelling it mid-write
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+        try:
+            while await self.flush(cutoff=float("inf")) >= self.batch_size:
+                pass
+        except Exception as e:
+            drafts_logger.error(f"Final draft journal flush failed: {e}")
+
+
+class RealtimeDraftsManager:
+    """
+    Manages real-time draft states with write-behind saves, validation, and pre-processing
+    """
+    
+    def __init__(self, redis_client=None, validation_cache_size: int = 10000):
+        self._redis = redis_client
+        self.validation_cache: "OrderedDict[str, ValidationResult]" = OrderedDict()
+        self.validation_cache_size = validation_cache_size
+        self.journal = DraftJournal(
+            self,
+            flush_interval=settings.DRAFT_FLUSH_INTERVAL_SECONDS,
+            batch_size=settings.DRAFT_FLUSH_BATCH_SIZE
+        )
+
+    @property
+    def redis(self):
+        """Shared async client for distributed draft storage"""
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=2
+            )
+        return self._redis
+
+    def start(self) -> None:
+        """Start the journal flusher for this process"""
+        self.journal.start()
+
+    async def stop(self) -> None:
+        await self.journal.stop()
     
     async def create_draft(
         self,
         template_id: int,
         user_id: int,
-        initial_data: Optional[Dict[str, Any]] = None
+        initial_data: Optional[Dict[str, Any]] = None,
+        document_draft_id: Optional[int] = None
     ) -> str:
         """
-        Create a new real-time draft
+        Create a new real-time draft, optionally backed by an existing DocumentDraft row
         """
         draft_id = str(uuid.uuid4())
         
-        draft_state = DraftState(
-            draft_id=draft_id,
-            template_id=template_id,
-            user_id=user_id,
-            form_data=initial_data or {},
-            last_modified=datetime.utcnow()
-        )
-        
-        # Store in memory
-        self.active_drafts[draft_id] = draft_state
-        
-        # Store in Redis for persistence
-        if self.redis_available:
-            await self._store_draft_in_redis(draft_state)
+        mapping = {
+            'template_id': template_id,
+            'user_id': user_id if user_id is not None else '',
+            'document_draft_id': document_draft_id or '',
+            'last_modified': datetime.utcnow().isoformat(),
+            'processing_status': 'draft'
+        }
+        for name, value in (initial_data or {}).items():
+            mapping[FORM_PREFIX + name] = json.dumps(value)
         
-        # Start auto-save task
-        self.auto_save_tasks[draft_id] = asyncio.create_task(
-            self._auto_save_loop(draft_id)
-        )
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(draft_key(draft_id), mapping=mapping)
+        pipe.expire(draft_key(draft_id), DRAFT_TTL_SECONDS)
+        if initial_data:
+            self.journal.record(pipe, draft_id)
+        await pipe.execute()
         
         drafts_logger.info(f"Created draft {draft_id} for template {template_id}")
         return draft_id
@@ -121,30 +345,41 @@ class RealtimeDraftsManager:
         """
         Update a single field in the draft with real-time validation
         """
-        if draft_id not in self.active_drafts:
+        key = draft_key(draft_id)
+        template_id, old_raw = await self.redis.hmget(key, 'template_id', FORM_PREFIX + field_name)
+        if not template_id:
             raise ValueError(f"Draft {draft_id} not found")
         
-        draft = self.active_drafts[draft_id]
-        old_value = draft.form_data.get(field_name)
-        
-        # Update field value
-        draft.form_data[field_name] = field_value
-        draft.last_modified = datetime.utcnow()
-        draft.is_dirty = True
+        old_value = json.loads(old_raw) if old_raw is not None else None
+        last_modified = datetime.utcnow()
         
         # Real-time validation
         validation_result = await self._validate_field(
-            field_name, field_value, draft.template_id, db
+            field_name, field_value, int(template_id), db
         )
-        draft.validation_results[field_name] = validation_result
         
-        # Background pre-processing if validation passes
-        if validation_result.is_valid:
-            await self._pre_process_field(draft_id, field_name, field_value)
+        mapping = {
+            FORM_PREFIX + field_name: json.dumps(field_value),
+            VALIDATION_PREFIX + field_name: json.dumps(validation_result.to_dict()),
+            'last_modified': last_modified.isoformat()
+        }
         
-        # Trigger auto-save if field is significant
-        if self._is_significant_change(field_name, old_value, field_value):
-            await self._schedule_immediate_save(draft_id)
+        # Pre-processing if validation passes
+        pre_processed = None
+        if validation_result.is_valid:
+            pre_processed = await self._pre_process_field(field_name, field_value)
+            mapping[PROCESSED_PREFIX + field_name] = json.dumps(pre_processed)
+        
+        # One round trip: field-level write, TTL refresh and journal entry
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        if pre_processed is None:
+            pipe.hdel(key, PROCESSED_PREFIX + field_name)
+        pipe.expire(key, DRAFT_TTL_SECONDS)
+        self.journal.record(
+            pipe, draft_id, immediate=self._is_significant_change(field_name, old_value, field_value)
+        )
+        await pipe.execute()
         
         response = {
             'draft_id': draft_id,
@@ -155,8 +390,8 @@ class RealtimeDraftsManager:
                 'warnings': validation_result.warnings,
                 'suggestions': validation_result.suggestions
             },
-            'pre_processing_ready': field_name in draft.pre_processing_cache,
-            'last_modified': draft.last_modified.isoformat()
+            'pre_processing_ready': pre_processed is not None,
+            'last_modified': last_modified.isoformat()
         }
         
         drafts_logger.debug(f"Updated field {field_name} in draft {draft_id}")
@@ -166,32 +401,23 @@ class RealtimeDraftsManager:
         """
         Get current draft state
         """
-        if draft_id in self.active_drafts:
-            draft = self.active_drafts[draft_id]
-            return {
-                'draft_id': draft.draft_id,
-                'template_id': draft.template_id,
-                'form_data': draft.form_data,
-                'validation_results': {
-                    field: {
-                        'is_valid': result.is_valid,
-                        'errors': result.errors,
-                        'warnings': result.warnings,
-                        'suggestions': result.suggestions
-                    }
-                    for field, result in draft.validation_results.items()
-                },
-                'last_modified': draft.last_modified.isoformat(),
-                'processing_status': draft.processing_status,
-                'pre_processing_complete': len(draft.pre_processing_cache),
-                'is_ready_for_generation': self._is_ready_for_generation(draft)
-            }
+        draft = await self._load_draft(draft_id)
+        if draft is None:
+            return None
         
-        # Try to load from Redis
-        if self.redis_available:
-            return await self._load_draft_from_redis(draft_id)
-        
-        return None
+        return {
+            'draft_id': draft.draft_id,
+            'template_id': draft.template_id,
+            'form_data': draft.form_data,
+            'validation_results': {
+                field: result.to_dict()
+                for field, result in draft.validation_results.items()
+            },
+            'last_modified': draft.last_modified.isoformat(),
+            'processing_status': draft.processing_status,
+            'pre_processing_complete': len(draft.pre_processing_cache),
+            'is_ready_for_generation': self._is_ready_for_generation(draft)
+        }
     
     async def prepare_for_instant_generation(
         self,
@@ -201,11 +427,10 @@ class RealtimeDraftsManager:
         """
         Prepare draft for instant document generation
         """
-        if draft_id not in self.active_drafts:
+        draft = await self._load_draft(draft_id)
+        if draft is None:
             raise ValueError(f"Draft {draft_id} not found")
         
-        draft = self.active_drafts[draft_id]
-        
         # Validate all fields
         validation_summary = await self._validate_all_fields(draft, db)
         
@@ -213,7 +438,7 @@ class RealtimeDraftsManager:
             return {
                 'ready_for_generation': False,
                 'validation_summary': validation_summary,
-                'errors': validation_summary['errors']
+                'errors': validation_summary['field_errors']
             }
         
         # Complete pre-processing
@@ -229,47 +454,6 @@ class RealtimeDraftsManager:
             'validation_summary': validation_summary
         }
     
-    async def _auto_save_loop(self, draft_id: str):
-        """
-        Auto-save loop running every 3 seconds
-        """
-        while draft_id in self.active_drafts:
-            try:
-                await asyncio.sleep(3)  # 3-second interval
-                
-                if draft_id in self.active_drafts:
-                    draft = self.active_drafts[draft_id]
-                    
-                    if draft.is_dirty and draft.auto_save_enabled:
-                        await self._save_draft(draft_id)
-                        drafts_logger.debug(f"Auto-saved draft {draft_id}")
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                drafts_logger.error(f"Auto-save error for draft {draft_id}: {e}")
-        
-        drafts_logger.info(f"Auto-save loop ended for draft {draft_id}")
-    
-    async def _save_draft(self, draft_id: str):
-        """
-        Save draft state
-        """
-        if draft_id not in self.active_drafts:
-            return
-        
-        draft = self.active_drafts[draft_id]
-        
-        # Store in Redis
-        if self.redis_available:
-            await self._store_draft_in_redis(draft)
-        
-        # Mark as clean
-        draft.is_dirty = False
-        
-        # Emit save event (for WebSocket notifications)
-        await self._emit_draft_saved_event(draft_id)
-    
     async def _validate_field(
         self,
         field_name: str,
@@ -284,6 +468,7 @@ class RealtimeDraftsManager:
         cache_key = f"validation_{template_id}_{field_name}_{str(field_value)[:50]}"
         
         if cache_key in self.validation_cache:
+            self.validation_cache.move_to_end(cache_key)
             return self.validation_cache[cache_key]
         
         # Perform validation
@@ -295,8 +480,10 @@ class RealtimeDraftsManager:
             validation_rules = self._get_field_validation_rules(field_name, template)
             result = await self._apply_validation_rules(field_value, validation_rules)
         
-        # Cache result
+        # Cache result (bounded; the oldest entries go first)
         self.validation_cache[cache_key] = result
+        if len(self.validation_cache) > self.validation_cache_size:
+            self.validation_cache.popitem(last=False)
         
         return result
     
@@ -436,17 +623,14 @@ class RealtimeDraftsManager:
         
         return suggestions
     
-    async def _pre_process_field(self, draft_id: str, field_name: str, field_value: Any):
+    async def _pre_process_field(self, field_name: str, field_value: Any) -> Dict[str, Any]:
         """
         Pre-process field value for faster document generation
         """
-        draft = self.active_drafts[draft_id]
-        
         # Format value based on field type
         processed_value = await self._format_field_value(field_name, field_value)
         
-        # Store in pre-processing cache
-        draft.pre_processing_cache[field_name] = {
+        return {
             'original_value': field_value,
             'processed_value': processed_value,
             'processed_at': datetime.utcnow().isoformat()
@@ -501,22 +685,6 @@ class RealtimeDraftsManager:
         
         return abs(old_len - new_len) > 5
     
-    async def _schedule_immediate_save(self, draft_id: str):
-        """
-        Schedule immediate save for significant changes
-        """
-        if draft_id in self.active_drafts:
-            # Cancel current auto-save task and save immediately
-            if draft_id in self.auto_save_tasks:
-                self.auto_save_tasks[draft_id].cancel()
-            
-            await self._save_draft(draft_id)
-            
-            # Restart auto-save task
-            self.auto_save_tasks[draft_id] = asyncio.create_task(
-                self._auto_save_loop(draft_id)
-            )
-    
     async def _validate_all_fields(self, draft: DraftState, db: Session) -> Dict[str, Any]:
         """
         Validate all fields in draft
@@ -546,9 +714,15 @@ class RealtimeDraftsManager:
         """
         Complete all pre-processing for draft
         """
+        missing = {}
         for field_name, field_value in draft.form_data.items():
             if field_name not in draft.pre_processing_cache:
-                await self._pre_process_field(draft.draft_id, field_name, field_value)
+                entry = await self._pre_process_field(field_name, field_value)
+                draft.pre_processing_cache[field_name] = entry
+                missing[PROCESSED_PREFIX + field_name] = json.dumps(entry)
+        
+        if missing:
+            await self.redis.hset(draft_key(draft.draft_id), mapping=missing)
     
     def _is_ready_for_generation(self, draft: DraftState) -> bool:
         """
@@ -582,48 +756,50 @@ class RealtimeDraftsManager:
         
         return base_time + field_time + signature_time
     
-    async def _store_draft_in_redis(self, draft: DraftState):
+    def _draft_from_hash(self, draft_id: str, data: Dict[str, str]) -> Optional[DraftState]:
         """
-        Store draft state in Redis
+        Rebuild draft state from its Redis hash
         """
-        try:
-            draft_data = {
-                'draft_id': draft.draft_id,
-                'template_id': draft.template_id,
-                'user_id': draft.user_id,
-                'form_data': json.dumps(draft.form_data),
-                'last_modified': draft.last_modified.isoformat(),
-                'processing_status': draft.processing_status
-            }
-            
-            redis_key = f"draft_{draft.draft_id}"
-            self.redis_client.hset(redis_key, mapping=draft_data)
-            self.redis_client.expire(redis_key, 86400)  # 24 hours
-            
-        except Exception as e:
-            drafts_logger.error(f"Failed to store draft in Redis: {e}")
+        if not data or not data.get('template_id'):
+            return None
+        
+        draft = DraftState(
+            draft_id=draft_id,
+            template_id=int(data['template_id']),
+            user_id=int(data['user_id']) if data.get('user_id') else None,
+            last_modified=datetime.fromisoformat(data['last_modified']),
+            processing_status=data.get('processing_status', 'draft'),
+            document_draft_id=int(data['document_draft_id']) if data.get('document_draft_id') else None
+        )
+        
+        for name, raw in data.items():
+            if name.startswith(FORM_PREFIX):
+                draft.form_data[name[len(FORM_PREFIX):]] = json.loads(raw)
+            elif name.startswith(VALIDATION_PREFIX):
+                field_name = name[len(VALIDATION_PREFIX):]
+                draft.validation_results[field_name] = ValidationResult(field_name=field_name, **json.loads(raw))
+            elif name.startswith(PROCESSED_PREFIX):
+                draft.pre_processing_cache[name[len(PROCESSED_PREFIX):]] = json.loads(raw)
+        
+        return draft
     
-    async def _load_draft_from_redis(self, draft_id: str) -> Optional[Dict[str, Any]]:
+    async def _load_draft(self, draft_id: str) -> Optional[DraftState]:
         """
         Load draft state from Redis
         """
-        try:
-            redis_key = f"draft_{draft_id}"
-            draft_data = self.redis_client.hgetall(redis_key)
-            
-            if draft_data:
-                return {
-                    'draft_id': draft_data[b'draft_id'].decode(),
-                    'template_id': int(draft_data[b'template_id']),
-                    'user_id': int(draft_data[b'user_id']),
-                    'form_data': json.loads(draft_data[b'form_data'].decode()),
-                    'last_modified': draft_data[b'last_modified'].decode(),
-                    'processing_status': draft_data[b'processing_status'].decode()
-                }
-        except Exception as e:
-            drafts_logger.error(f"Failed to load draft from Redis: {e}")
+        return self._draft_from_hash(draft_id, await self.redis.hgetall(draft_key(draft_id)))
+    
+    async def _load_drafts(self, draft_ids: List[str]) -> List[DraftState]:
+        """
+        Load several drafts in one round trip, skipping any that have expired
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for draft_id in draft_ids:
+            pipe.hgetall(draft_key(draft_id))
+        results = await pipe.execute()
         
-        return None
+        drafts = (self._draft_from_hash(draft_id, data) for draft_id, data in zip(draft_ids, results))
+        return [draft for draft in drafts if draft is not None]
     
     async def _emit_draft_saved_event(self, draft_id: str):
         """
@@ -632,52 +808,19 @@ class RealtimeDraftsManager:
         # Implementation would depend on WebSocket setup
         drafts_logger.debug(f"Draft saved event emitted for {draft_id}")
     
-    async def _cleanup_expired_drafts(self):
-        """
-        Cleanup expired drafts periodically
-        """
-        while True:
-            try:
-                await asyncio.sleep(300)  # Run every 5 minutes
-                
-                current_time = datetime.utcnow()
-                expired_drafts = []
-                
-                for draft_id, draft in self.active_drafts.items():
-                    if current_time - draft.last_modified > timedelta(hours=24):
-                        expired_drafts.append(draft_id)
-                
-                # Clean up expired drafts
-                for draft_id in expired_drafts:
-                    await self.cleanup_draft(draft_id)
-                
-                if expired_drafts:
-                    drafts_logger.info(f"Cleaned up {len(expired_drafts)} expired drafts")
-                
-            except Exception as e:
-                drafts_logger.error(f"Draft cleanup error: {e}")
-    
     async def cleanup_draft(self, draft_id: str):
         """
         Clean up draft resources
         """
-        # Cancel auto-save task
-        if draft_id in self.auto_save_tasks:
-            self.auto_save_tasks[draft_id].cancel()
-            del self.auto_save_tasks[draft_id]
-        
-        # Remove from memory
-        if draft_id in self.active_drafts:
-            del self.active_drafts[draft_id]
-        
-        # Remove from Redis
-        if self.redis_available:
-            try:
-                self.redis_client.delete(f"draft_{draft_id}")
-            except Exception:
-                pass
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(draft_key(draft_id))
+            pipe.zrem(JOURNAL_KEY, draft_id)
+            await pipe.execute()
+        except RedisError as e:
+            drafts_logger.warning(f"Failed to remove draft {draft_id}: {e}")
         
         drafts_logger.info(f"Draft {draft_id} cleaned up")
 
 # Global drafts manager instance
-realtime_drafts_manager = RealtimeDraftsManager()
\ No newline at end of file
+realtime_drafts_manager = RealtimeDraftsManager()
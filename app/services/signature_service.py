@@ -3,17 +3,19 @@ Digital signature service for document signing
 """
 
 import os
-import io
+import asyncio
 import base64
 import hashlib
+import struct
 import uuid
+import zlib
+from concurrent.futures import Future
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 from sqlalchemy.orm import Session
 from fastapi import Request
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance
+import cv2
 import numpy as np
-from io import BytesIO
 import logging
 
 from app.models.signature import Signature, SignatureType, SignatureStatus
@@ -25,6 +27,7 @@ from app.schemas.signature import (
 )
 from app.services.encryption_service import EncryptionService
 from config import settings
+from app.utils.worker_pool import WorkerPool
 
 # Configure logging
 signature_logger = logging.getLogger('signature_service')
@@ -60,6 +63,33 @@ class SignatureProcessingOptions:
         self.dpi = (300, 300)  # High DPI for print quality
 
 
+# Same weights as PIL's SMOOTH filter, which ImageEnhance.Sharpness blends against
+_SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+
+def _png_with_dpi(png: np.ndarray, dpi: Tuple[int, int]) -> bytes:
+    """Insert a pHYs chunk after IHDR so the PNG carries its print resolution"""
+    payload = struct.pack("!IIB", round(dpi[0] / 0.0254), round(dpi[1] / 0.0254), 1)
+    chunk = struct.pack("!I", len(payload)) + b"pHYs" + payload + struct.pack("!I", zlib.crc32(b"pHYs" + payload))
+    # 8-byte signature + 25-byte IHDR chunk
+    view = memoryview(png)
+    return b"".join((view[:33], chunk, view[33:]))
+
+
+def _process_canvas_job(job: Tuple[str, Optional[SignatureProcessingOptions]]) -> Dict[str, Any]:
+    canvas_data, options = job
+    return SignatureService.process_canvas_signature(canvas_data, options)
+
+
+def _run_chunk(fn, items: List[Any]) -> List[Any]:
+    return [fn(item) for item in items]
+
+
+def _init_worker() -> None:
+    # One OpenCV thread per worker; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
 class SignatureService:
     """Digital signature management service"""
 
@@ -463,25 +493,10 @@ class SignatureService:
         try:
             # Decode canvas data
             image = SignatureService._decode_canvas_data(canvas_data)
-            if not image:
+            if image is None:
                 return {"success": False, "error": "Invalid canvas data"}
 
-            # Apply processing pipeline
-            processed_image = SignatureService._apply_processing_pipeline(image, options)
-
-            # Generate metadata
-            metadata = SignatureService._generate_signature_metadata(processed_image, options)
-
-            # Encode processed signature
-            processed_data = SignatureService._encode_signature(processed_image, options)
-
-            return {
-                "success": True,
-                "signature_data": processed_data,
-                "metadata": metadata,
-                "original_size": image.size,
-                "processed_size": processed_image.size
-            }
+            return SignatureService._process_image(image, options)
 
         except Exception as e:
             signature_logger.error(f"Canvas signature processing failed: {e}")
@@ -496,214 +511,210 @@ class SignatureService:
             options = SignatureProcessingOptions()
 
         try:
-            # Load image
-            image = Image.open(BytesIO(image_data))
+            image = SignatureService._decode_image_bytes(image_data)
+            if image is None:
+                return {"success": False, "error": "Invalid image data"}
 
-            # Convert to RGBA for processing
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
+            return SignatureService._process_image(image, options)
 
-            # Apply processing pipeline
-            processed_image = SignatureService._apply_processing_pipeline(image, options)
+        except Exception as e:
+            signature_logger.error(f"Uploaded signature processing failed: {e}")
+            return {"success": False, "error": str(e)}
 
-            # Generate metadata
-            metadata = SignatureService._generate_signature_metadata(processed_image, options)
+    @staticmethod
+    async def process_canvas_signature_async(
+        canvas_data: str,
+        options: SignatureProcessingOptions = None
+    ) -> Dict[str, Any]:
+        """Process a canvas signature on the worker pool without blocking the event loop"""
+        return await asyncio.wrap_future(
+            signature_pool.submit(SignatureService.process_canvas_signature, canvas_data, options)
+        )
 
-            # Encode processed signature
-            processed_data = SignatureService._encode_signature(processed_image, options)
+    @staticmethod
+    async def process_uploaded_signature_async(
+        image_data: bytes,
+        options: SignatureProcessingOptions = None
+    ) -> Dict[str, Any]:
+        """Process an uploaded signature image on the worker pool without blocking the event loop"""
+        return await asyncio.wrap_future(
+            signature_pool.submit(SignatureService.process_uploaded_signature, image_data, options)
+        )
 
-            return {
-                "success": True,
-                "signature_data": processed_data,
-                "metadata": metadata,
-                "original_size": image.size,
-                "processed_size": processed_image.size
-            }
+    @staticmethod
+    async def process_canvas_signatures_async(
+        jobs: List[Tuple[str, Optional[SignatureProcessingOptions]]]
+    ) -> List[Dict[str, Any]]:
+        """Process many canvas signatures at once on the worker pool, in input order"""
+        futures = signature_pool.map(_process_canvas_job, jobs)
+        chunks = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return [result for chunk in chunks for result in chunk]
 
-        except Exception as e:
-            signature_logger.error(f"Uploaded signature processing failed: {e}")
-            return {"success": False, "error": str(e)}
+    @staticmethod
+    def _process_image(image: np.ndarray, options: SignatureProcessingOptions) -> Dict[str, Any]:
+        """Run the pipeline on a decoded BGRA array and encode the result"""
+        height, width = image.shape[:2]
+
+        processed = SignatureService._apply_processing_pipeline(image, options)
+
+        return {
+            "success": True,
+            "signature_data": SignatureService._encode_signature(processed, options),
+            "metadata": SignatureService._generate_signature_metadata(processed, options),
+            "original_size": {"width": width, "height": height},
+            "processed_size": {"width": processed.shape[1], "height": processed.shape[0]}
+        }
 
     @staticmethod
-    def _decode_canvas_data(canvas_data: str) -> Optional[Image.Image]:
-        """Decode base64 canvas data to PIL Image"""
+    def _decode_canvas_data(canvas_data: str) -> Optional[np.ndarray]:
+        """Decode base64 canvas data to a BGRA array"""
         try:
             # Remove data URL prefix if present
             if canvas_data.startswith('data:image'):
-                canvas_data = canvas_data.split(',')[1]
+                canvas_data = canvas_data[canvas_data.index(',') + 1:]
 
-            # Decode base64
-            image_bytes = base64.b64decode(canvas_data)
-
-            # Load image
-            image = Image.open(BytesIO(image_bytes))
-
-            # Convert to RGBA for processing
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-
-            return image
+            return SignatureService._decode_image_bytes(base64.b64decode(canvas_data))
 
         except Exception as e:
             signature_logger.error(f"Failed to decode canvas data: {e}")
             return None
 
     @staticmethod
-    def _apply_processing_pipeline(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Apply complete processing pipeline to signature image"""
+    def _decode_image_bytes(image_bytes: bytes) -> Optional[np.ndarray]:
+        """Decode encoded image bytes straight into a BGRA uint8 array"""
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            return None
+
+        if image.dtype == np.uint16:
+            image = (image >> 8).astype(np.uint8)
+
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        if image.shape[2] == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        return image
+
+    @staticmethod
+    def _apply_processing_pipeline(image: np.ndarray, options: SignatureProcessingOptions) -> np.ndarray:
+        """Apply complete processing pipeline to a BGRA signature array
 
-        # Step 1: Remove background
+        Colour and alpha are carried as two planes from decode to encode; crops
+        are views and every other step is a single OpenCV call.
+        """
+        bgr = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        alpha = np.ascontiguousarray(image[..., 3])
+
+        # Step 1: Remove background (light pixels become transparent)
         if options.remove_background:
-            image = SignatureService._remove_background(image, options)
+            gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+            _, ink = cv2.threshold(gray, options.background_threshold, 255, cv2.THRESH_BINARY_INV)
+            alpha = cv2.min(alpha, ink)
 
         # Step 2: Auto-crop to signature bounds
         if options.auto_crop:
-            image = SignatureService._auto_crop_signature(image, options)
+            bgr, alpha = SignatureService._auto_crop_signature(bgr, alpha, options)
 
-        # Step 3: Enhance contrast
+        # Step 3: Enhance contrast around the mean luminance
         if options.enhance_contrast:
-            image = SignatureService._enhance_contrast(image, options)
+            mean = int(cv2.mean(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))[0] + 0.5)
+            bgr = cv2.addWeighted(bgr, options.contrast_factor, bgr, 0, mean * (1 - options.contrast_factor))
 
-        # Step 4: Enhance sharpness
+        # Step 4: Enhance sharpness (blend away from a smoothed copy)
         if options.enhance_sharpness:
-            image = SignatureService._enhance_sharpness(image, options)
+            smooth = cv2.filter2D(bgr, -1, _SMOOTH_KERNEL)
+            bgr = cv2.addWeighted(bgr, options.sharpness_factor, smooth, 1 - options.sharpness_factor, 0)
 
         # Step 5: Noise reduction
         if options.noise_reduction:
-            image = SignatureService._reduce_noise(image)
+            bgr = cv2.medianBlur(bgr, 3)
+            alpha = cv2.medianBlur(alpha, 3)
 
         # Step 6: Resize if necessary
-        image = SignatureService._resize_if_needed(image, options)
+        bgr, alpha = SignatureService._resize_if_needed(bgr, alpha, options)
 
-        return image
+        return cv2.merge([bgr, alpha])
 
     @staticmethod
-    def _remove_background(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Remove white/light background from signature"""
-        try:
-            # Convert to numpy array for processing
-            img_array = np.array(image)
-
-            # Create alpha channel based on brightness
-            gray = np.dot(img_array[...,:3], [0.2989, 0.5870, 0.1140])
-
-            # Make white/light areas transparent
-            alpha = np.where(gray > options.background_threshold, 0, 255)
-
-            # Apply alpha channel
-            img_array[..., 3] = alpha
-
-            # Convert back to PIL Image
-            return Image.fromarray(img_array, 'RGBA')
-
-        except Exception as e:
-            signature_logger.error(f"Background removal failed: {e}")
-            return image
+    def _auto_crop_signature(
+        bgr: np.ndarray,
+        alpha: np.ndarray,
+        options: SignatureProcessingOptions
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Crop both planes to the visible signature bounds with padding"""
+        points = cv2.findNonZero(alpha)
+        if points is None:
+            return bgr, alpha
+
+        x, y, w, h = cv2.boundingRect(points)
+        height, width = alpha.shape
+
+        left = max(0, x - options.padding)
+        top = max(0, y - options.padding)
+        right = min(width, x + w + options.padding)
+        bottom = min(height, y + h + options.padding)
+
+        return bgr[top:bottom, left:right], alpha[top:bottom, left:right]
 
     @staticmethod
-    def _auto_crop_signature(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Automatically crop image to signature bounds with padding"""
-        try:
-            # Get bounding box of non-transparent pixels
-            bbox = image.getbbox()
+    def _target_size(width: int, height: int, options: SignatureProcessingOptions) -> Tuple[int, int]:
+        """Size after applying the min/max constraints, keeping the aspect ratio"""
+        if (options.min_width <= width <= options.max_width and
+                options.min_height <= height <= options.max_height):
+            return width, height
 
-            if bbox:
-                # Add padding
-                left, top, right, bottom = bbox
-                width, height = image.size
+        aspect_ratio = width / height
 
-                left = max(0, left - options.padding)
-                top = max(0, top - options.padding)
-                right = min(width, right + options.padding)
-                bottom = min(height, bottom + options.padding)
+        if width > options.max_width:
+            width = options.max_width
+            height = int(width / aspect_ratio)
 
-                # Crop to bounding box
-                cropped = image.crop((left, top, right, bottom))
-                return cropped
+        if height > options.max_height:
+            height = options.max_height
+            width = int(height * aspect_ratio)
 
-            return image
+        if width < options.min_width:
+            width = options.min_width
+            height = int(width / aspect_ratio)
 
-        except Exception as e:
-            signature_logger.error(f"Auto-crop failed: {e}")
-            return image
+        if height < options.min_height:
+            height = options.min_height
+            width = int(height * aspect_ratio)
 
-    @staticmethod
-    def _enhance_contrast(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Enhance signature contrast"""
-        try:
-            enhancer = ImageEnhance.Contrast(image)
-            return enhancer.enhance(options.contrast_factor)
-        except Exception as e:
-            signature_logger.error(f"Contrast enhancement failed: {e}")
-            return image
-
-    @staticmethod
-    def _enhance_sharpness(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Enhance signature sharpness"""
-        try:
-            enhancer = ImageEnhance.Sharpness(image)
-            return enhancer.enhance(options.sharpness_factor)
-        except Exception as e:
-            signature_logger.error(f"Sharpness enhancement failed: {e}")
-            return image
-
-    @staticmethod
-    def _reduce_noise(image: Image.Image) -> Image.Image:
-        """Apply noise reduction filter"""
-        try:
-            return image.filter(ImageFilter.MedianFilter(size=3))
-        except Exception as e:
-            signature_logger.error(f"Noise reduction failed: {e}")
-            return image
+        return max(1, width), max(1, height)
 
     @staticmethod
-    def _resize_if_needed(image: Image.Image, options: SignatureProcessingOptions) -> Image.Image:
-        """Resize image if it exceeds size constraints"""
-        try:
-            width, height = image.size
-
-            # Check if resizing is needed
-            if (width > options.max_width or height > options.max_height or
-                width < options.min_width or height < options.min_height):
-
-                # Calculate new size maintaining aspect ratio
-                aspect_ratio = width / height
-
-                if width > options.max_width:
-                    width = options.max_width
-                    height = int(width / aspect_ratio)
-
-                if height > options.max_height:
-                    height = options.max_height
-                    width = int(height * aspect_ratio)
-
-                if width < options.min_width:
-                    width = options.min_width
-                    height = int(width / aspect_ratio)
-
-                if height < options.min_height:
-                    height = options.min_height
-                    width = int(height * aspect_ratio)
-
-                # Resize with high quality
-                resized = image.resize((width, height), Image.Resampling.LANCZOS)
-                return resized
-
-            return image
-
-        except Exception as e:
-            signature_logger.error(f"Resize failed: {e}")
-            return image
+    def _resize_if_needed(
+        bgr: np.ndarray,
+        alpha: np.ndarray,
+        options: SignatureProcessingOptions
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Resize if the signature exceeds size constraints"""
+        height, width = alpha.shape
+        size = SignatureService._target_size(width, height, options)
+        if size == (width, height):
+            return bgr, alpha
+
+        # Area averaging when shrinking, Lanczos when enlarging
+        interpolation = cv2.INTER_AREA if size[0] < width else cv2.INTER_LANCZOS4
+
+        # Resample premultiplied colour so transparent pixels do not bleed into strokes
+        alpha3 = cv2.merge([alpha, alpha, alpha])
+        premultiplied = cv2.multiply(bgr, alpha3, scale=1 / 255)
+        premultiplied = cv2.resize(premultiplied, size, interpolation=interpolation)
+        alpha = cv2.resize(alpha, size, interpolation=interpolation)
+
+        bgr = cv2.divide(premultiplied, cv2.merge([alpha, alpha, alpha]), scale=255)
+        return bgr, alpha
 
     @staticmethod
-    def _generate_signature_metadata(image: Image.Image, options: SignatureProcessingOptions) -> Dict[str, Any]:
+    def _generate_signature_metadata(image: np.ndarray, options: SignatureProcessingOptions) -> Dict[str, Any]:
         """Generate metadata for processed signature"""
         try:
-            width, height = image.size
+            height, width = image.shape[:2]
 
             # Calculate signature density (non-transparent pixels)
-            img_array = np.array(image)
-            non_transparent = np.sum(img_array[..., 3] > 0)
+            non_transparent = cv2.countNonZero(np.ascontiguousarray(image[..., 3]))
             total_pixels = width * height
             density = non_transparent / total_pixels if total_pixels > 0 else 0
 
@@ -722,21 +733,24 @@ class SignatureService:
             return {}
 
     @staticmethod
-    def _encode_signature(image: Image.Image, options: SignatureProcessingOptions) -> str:
-        """Encode processed signature to base64"""
+    def _encode_signature(image: np.ndarray, options: SignatureProcessingOptions) -> str:
+        """Encode processed signature to a base64 data URL"""
         try:
-            buffer = BytesIO()
-            image.save(
-                buffer,
-                format=options.output_format,
-                quality=options.quality,
-                dpi=options.dpi
-            )
-            buffer.seek(0)
+            fmt = options.output_format.lower()
+            params: List[int] = []
+
+            if fmt in ("jpeg", "jpg"):
+                image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+                params = [cv2.IMWRITE_JPEG_QUALITY, options.quality]
+            elif fmt == "webp":
+                params = [cv2.IMWRITE_WEBP_QUALITY, options.quality]
 
-            # Encode to base64
-            encoded = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            return f"data:image/{options.output_format.lower()};base64,{encoded}"
+            ok, buffer = cv2.imencode(f".{fmt}", image, params)
+            if not ok:
+                raise ValueError(f"Could not encode signature as {options.output_format}")
+
+            data = _png_with_dpi(buffer, options.dpi) if fmt == "png" and options.dpi else buffer
+            return f"data:image/{fmt};base64," + base64.b64encode(data).decode("ascii")
 
         except Exception as e:
             signature_logger.error(f"Signature encoding failed: {e}")
@@ -850,3 +864,21 @@ class SignatureService:
         except Exception as e:
             signature_logger.error(f"Failed to delete user signature: {e}")
             return False
+
+
+class SignatureWorkerPool(WorkerPool):
+    """Bounded worker pool for CPU-bound signature image processing"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        configured = max_workers or settings.SIGNATURE_MAX_WORKERS
+        super().__init__(configured or min(4, os.cpu_count() or 1), initializer=_init_worker)
+
+    def map(self, fn, items: List[Any]) -> List[Future]:
+        """Split items into one chunk per worker; each future yields its chunk's results"""
+        if not items:
+            return []
+        size = -(-len(items) // self.max_workers)
+        return [self.submit(_run_chunk, fn, items[i:i + size]) for i in range(0, len(items), size)]
+
+
+signature_pool = SignatureWorkerPool()
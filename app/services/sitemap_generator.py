@@ -1,18 +1,48 @@
 """
 Sitemap generation service for SEO optimization
+
+The sitemap is published as a sitemap index pointing at gzip shards of at
+most 50,000 URLs each. Public documents and templates are sharded by primary
+key range, so a row always lands in the same shard. Each run compares every
+shard's row count and newest `updated_at` against the manifest from the
+previous run and rewrites only the shards that changed. Rows are streamed
+with `yield_per` and written straight into the gzip files.
 """
+import os
+import re
+import gzip
+import json
+import time
+import tempfile
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+
+from config import settings
 from app.models.document import Document
 from app.models.template import Template
-from urllib.parse import urljoin
+
+# sitemaps.org limit on URLs per sitemap file
+SHARD_SIZE = 50000
+SHARD_NAME_PATTERN = re.compile(r"^sitemap-[a-z]+(-\d+)?\.xml\.gz$")
+
+URLSET_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>\n'
+
 
 class SitemapGenerator:
     """Service for generating XML sitemaps"""
-    
-    def __init__(self, base_url: str = "https://mytypist.net"):
+
+    def __init__(self, base_url: str = "https://mytypist.net", output_dir: Optional[str] = None,
+                 shard_size: int = SHARD_SIZE, refresh_interval: int = 300):
         self.base_url = base_url
+        self.output_dir = output_dir or settings.SITEMAPS_PATH
+        self.shard_size = shard_size
+        self.refresh_interval = refresh_interval
         self.static_pages = [
             {"url": "/", "changefreq": "daily", "priority": "1.0"},
             {"url": "/about", "changefreq": "monthly", "priority": "0.8"},
@@ -22,51 +52,134 @@ class SitemapGenerator:
             {"url": "/blog", "changefreq": "weekly", "priority": "0.8"},
             {"url": "/faq", "changefreq": "weekly", "priority": "0.8"}
         ]
-    
-    def generate_sitemap(self, db: Session) -> str:
-        """Generate complete XML sitemap"""
-        # Start XML sitemap
-        sitemap = '<?xml version="1.0" encoding="UTF-8"?>\n'
-        sitemap += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        
-        # Add static pages
-        for page in self.static_pages:
-            sitemap += self._create_url_entry(
-                urljoin(self.base_url, page["url"]),
-                page["changefreq"],
-                page["priority"]
-            )
-        
-        # Add public documents
-        documents = db.query(Document).filter(
-            Document.is_public == True
-        ).all()
-        
-        for doc in documents:
-            sitemap += self._create_url_entry(
-                urljoin(self.base_url, f"/document/{doc.id}"),
-                "weekly",
-                "0.7",
-                doc.updated_at
-            )
-        
-        # Add public templates
-        templates = db.query(Template).filter(
-            Template.is_public == True
-        ).all()
-        
-        for template in templates:
-            sitemap += self._create_url_entry(
-                urljoin(self.base_url, f"/template/{template.id}"),
-                "weekly",
-                "0.8",
-                template.updated_at
-            )
-        
-        # Close sitemap
-        sitemap += '</urlset>'
-        return sitemap
-    
+        # shard prefix -> (model, URL pattern, changefreq, priority)
+        self.sources = {
+            "documents": (Document, "/document/{}", "weekly", "0.7"),
+            "templates": (Template, "/template/{}", "weekly", "0.8"),
+        }
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.output_dir, "sitemap.xml")
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.output_dir, "manifest.json")
+
+    def shard_path(self, name: str) -> Optional[str]:
+        """Path of a published shard, or None for names that are not shards"""
+        if not SHARD_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.output_dir, name)
+        return path if os.path.exists(path) else None
+
+    def generate_sitemap(self, db: Session, force: bool = False) -> str:
+        """Bring the sitemap shards up to date and return the sitemap index path"""
+        manifest = self._load_manifest()
+
+        if (not force and os.path.exists(self.index_path)
+                and time.time() - manifest.get("checked_at", 0) < self.refresh_interval):
+            return self.index_path
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        previous = manifest.get("shards", {})
+        shards: Dict[str, Dict] = {}
+
+        # Static pages are a handful of URLs; rewriting them is cheaper than tracking them
+        static_name = "sitemap-static.xml.gz"
+        self._write_shard(static_name, (
+            self._create_url_entry(urljoin(self.base_url, page["url"]), page["changefreq"], page["priority"])
+            for page in self.static_pages
+        ))
+        shards[static_name] = {"count": len(self.static_pages), "updated_at": None}
+
+        for prefix, (model, url_pattern, changefreq, priority) in self.sources.items():
+            for bucket, count, newest in self._shard_watermarks(db, model):
+                name = f"sitemap-{prefix}-{bucket}.xml.gz"
+                watermark = {"count": count, "updated_at": newest.isoformat() if newest else None}
+                shards[name] = watermark
+
+                if previous.get(name) == watermark and os.path.exists(os.path.join(self.output_dir, name)):
+                    continue
+
+                self._write_shard(name, (
+                    self._create_url_entry(urljoin(self.base_url, url_pattern.format(row_id)), changefreq, priority, updated_at)
+                    for row_id, updated_at in self._shard_rows(db, model, bucket)
+                ))
+
+        # Shards whose rows were all deleted or unpublished
+        for name in previous:
+            if name not in shards:
+                try:
+                    os.remove(os.path.join(self.output_dir, name))
+                except OSError:
+                    pass
+
+        self._write_index(shards)
+        self._write_file(self.manifest_path, json.dumps({"checked_at": time.time(), "shards": shards}).encode("utf-8"))
+        return self.index_path
+
+    def _shard_watermarks(self, db: Session, model) -> List[Tuple[int, int, Optional[datetime]]]:
+        """Per-shard public row count and newest update, in one aggregate query"""
+        bucket = (model.id // self.shard_size).label("bucket")
+        return db.query(
+            bucket,
+            func.count(model.id),
+            func.max(model.updated_at)
+        ).filter(
+            model.is_public == True
+        ).group_by(bucket).order_by(bucket).all()
+
+    def _shard_rows(self, db: Session, model, bucket: int) -> Iterator[Tuple[int, Optional[datetime]]]:
+        """Stream (id, updated_at) for one shard without loading ORM objects"""
+        low = bucket * self.shard_size
+        return db.query(model.id, model.updated_at).filter(
+            model.is_public == True,
+            model.id >= low,
+            model.id < low + self.shard_size
+        ).order_by(model.id).yield_per(5000)
+
+    def _write_shard(self, name: str, entries) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as shard:
+                shard.write(URLSET_OPEN.encode("utf-8"))
+                for entry in entries:
+                    shard.write(entry.encode("utf-8"))
+                shard.write(URLSET_CLOSE.encode("utf-8"))
+            os.replace(temp_path, os.path.join(self.output_dir, name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _write_index(self, shards: Dict[str, Dict]) -> None:
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n',
+            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        ]
+        for name, watermark in shards.items():
+            lines.append('  <sitemap>\n')
+            lines.append(f'    <loc>{escape(urljoin(self.base_url, "/sitemaps/" + name))}</loc>\n')
+            if watermark["updated_at"]:
+                lines.append(f'    <lastmod>{watermark["updated_at"][:10]}</lastmod>\n')
+            lines.append('  </sitemap>\n')
+        lines.append('</sitemapindex>\n')
+        self._write_file(self.index_path, "".join(lines).encode("utf-8"))
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.output_dir, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
     def _create_url_entry(
         self,
         url: str,
@@ -76,13 +189,13 @@ class SitemapGenerator:
     ) -> str:
         """Create a single URL entry for the sitemap"""
         entry = '  <url>\n'
-        entry += f'    <loc>{url}</loc>\n'
-        
+        entry += f'    <loc>{escape(url)}</loc>\n'
+
         if lastmod:
             entry += f'    <lastmod>{lastmod.strftime("%Y-%m-%d")}</lastmod>\n'
-            
+
         entry += f'    <changefreq>{changefreq}</changefreq>\n'
         entry += f'    <priority>{priority}</priority>\n'
         entry += '  </url>\n'
-        
-        return entry
\ No newline at end of file
+
+        return entry
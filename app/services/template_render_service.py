@@ -0,0 +1,439 @@
+"""
+Compiled template render plans for document generation
+
+A render plan is built once per template version: the .docx package is read,
+document-level formatting is applied, and every ``${name}`` placeholder is
+located inside the WordprocessingML parts (body, headers, footers, footnotes
+and endnotes), including placeholders split across several runs. Rendering
+then only splices the formatted values into the stored XML and rewrites the
+package - no python-docx parsing and no Placeholder queries per document.
+"""
+
+import re
+import zipfile
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, BinaryIO
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# WordprocessingML parts that can carry placeholders
+_XML_PART_RE = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+
+# Paragraph boundaries and text nodes, in document order. `<w:pPr>`,
+# `<w:tab/>`, `<w:tbl>` etc. are excluded by the character after the name.
+_TOKEN_RE = re.compile(
+    r'<w:p[\s>/]|</w:p>|<w:t(?:\s[^>]*)?>(?P<text>[^<]*)</w:t>'
+)
+
+_PLACEHOLDER_RE = re.compile(r'\$\{\s*([^{}$<>]+?)\s*\}')
+
+_RUN_PROPERTIES_RE = re.compile(r'<w:rPr>.*?</w:rPr>|<w:rPr/>', re.DOTALL)
+_RUN_PROPERTY_CHILD_RE = re.compile(r'<w:(\w+)\b[^>]*?/>|<w:(\w+)\b[^>]*>.*?</w:\2>', re.DOTALL)
+
+# Schema order of CT_RPr children; Word rejects out-of-order run properties
+_RUN_PROPERTY_ORDER = (
+    'rStyle', 'rFonts', 'b', 'bCs', 'i', 'iCs', 'caps', 'smallCaps', 'strike',
+    'dstrike', 'outline', 'shadow', 'emboss', 'imprint', 'noProof', 'snapToGrid',
+    'vanish', 'webHidden', 'color', 'spacing', 'w', 'kern', 'position', 'sz',
+    'szCs', 'highlight', 'u', 'effect', 'bdr', 'shd', 'fitText', 'vertAlign',
+    'rtl', 'cs', 'em', 'lang', 'eastAsianLayout', 'specVanish', 'oMath', 'rPrChange'
+)
+
+_PRESERVE_SPACE = ' xml:space="preserve"'
+
+
+@dataclass(frozen=True)
+class PlaceholderSpec:
+    """Placeholder definition captured when the plan is compiled"""
+    name: str
+    placeholder_type: str = "text"
+    casing: str = "none"
+    default_value: Optional[str] = None
+    bold: bool = False
+    italic: bool = False
+    underline: bool = False
+
+    @property
+    def is_styled(self) -> bool:
+        return self.bold or self.italic or self.underline
+
+
+@dataclass(frozen=True)
+class PlaceholderSlot:
+    """A placeholder occurrence: where it sits in the source part and the
+    static markup wrapped around the value when it carries its own styling"""
+    name: str
+    offset: int
+    prefix: str = ""
+    suffix: str = ""
+
+
+@dataclass
+class RenderPlan:
+    """Parsed template package ready for value splicing"""
+    template_id: int
+    file_hash: str
+    revision: str
+    # (member name, compress type, raw bytes) for every package member, in order
+    members: List[Tuple[str, int, bytes]]
+    # Compiled XML parts: literal text interleaved with placeholder slots
+    parts: Dict[str, List[Union[str, PlaceholderSlot]]]
+    placeholders: Dict[str, PlaceholderSpec]
+    slot_count: int = 0
+    compiled_at: float = 0.0
+
+    def occurrences(self) -> Dict[str, List[Tuple[str, int]]]:
+        """Map placeholder name to its (part, XML offset) locations"""
+        found: Dict[str, List[Tuple[str, int]]] = {}
+        for part_name, segments in self.parts.items():
+            for segment in segments:
+                if isinstance(segment, PlaceholderSlot):
+                    found.setdefault(segment.name, []).append((part_name, segment.offset))
+        return found
+
+
+def _styled_run_properties(base_rpr: str, spec: PlaceholderSpec) -> str:
+    """Merge the placeholder's bold/italic/underline flags into a run's rPr"""
+    inner = ""
+    if base_rpr.startswith('<w:rPr>'):
+        inner = base_rpr[len('<w:rPr>'):-len('</w:rPr>')]
+
+    overridden = set()
+    added = []
+    if spec.bold:
+        overridden.update(('b', 'bCs'))
+        added += [('b', '<w:b/>'), ('bCs', '<w:bCs/>')]
+    if spec.italic:
+        overridden.update(('i', 'iCs'))
+        added += [('i', '<w:i/>'), ('iCs', '<w:iCs/>')]
+    if spec.underline:
+        overridden.add('u')
+        added.append(('u', '<w:u w:val="single"/>'))
+
+    children = []
+    for match in _RUN_PROPERTY_CHILD_RE.finditer(inner):
+        tag = match.group(1) or match.group(2)
+        if tag not in overridden:
+            children.append((tag, match.group(0)))
+    children.extend(added)
+
+    fallback = len(_RUN_PROPERTY_ORDER)
+    children.sort(key=lambda child: _RUN_PROPERTY_ORDER.index(child[0])
+                  if child[0] in _RUN_PROPERTY_ORDER else fallback)
+    return '<w:rPr>' + ''.join(xml for _, xml in children) + '</w:rPr>'
+
+
+def _enclosing_run_properties(xml: str, position: int) -> str:
+    """Return the rPr of the run that contains the text node at `position`"""
+    run_start = max(xml.rfind('<w:r>', 0, position), xml.rfind('<w:r ', 0, position))
+    if run_start < 0:
+        return ""
+    match = _RUN_PROPERTIES_RE.search(xml, run_start, position)
+    return match.group(0) if match else ""
+
+
+def _make_slot(xml: str, name: str, offset: int, spec: PlaceholderSpec) -> PlaceholderSlot:
+    """Build a slot; styled placeholders get their value in a dedicated run"""
+    if not spec.is_styled:
+        return PlaceholderSlot(name=name, offset=offset)
+
+    base_rpr = _enclosing_run_properties(xml, offset)
+    prefix = (
+        '</w:t></w:r><w:r>' + _styled_run_properties(base_rpr, spec) +
+        '<w:t xml:space="preserve">'
+    )
+    suffix = '</w:t></w:r><w:r>' + base_rpr + '<w:t xml:space="preserve">'
+    return PlaceholderSlot(name=name, offset=offset, prefix=prefix, suffix=suffix)
+
+
+def _compile_part(xml: str, placeholders: Dict[str, PlaceholderSpec]) -> Tuple[List[Union[str, PlaceholderSlot]], int]:
+    """Split one XML part into literal segments and placeholder slots.
+
+    Text nodes are grouped per paragraph so placeholders that Word split
+    across runs (`${cli` + `ent_name}`) are still found. The slot is placed
+    at the start of the first node and the remaining characters of the
+    placeholder are cut from the following nodes.
+    """
+    # (start, end, replacement) edits against the source XML
+    edits: List[Tuple[int, int, Union[str, PlaceholderSlot]]] = []
+    preserved = set()
+
+    def preserve(node):
+        tag_close, has_preserve = node[3], node[4]
+        if not has_preserve and tag_close not in preserved:
+            preserved.add(tag_close)
+            edits.append((tag_close, tag_close, _PRESERVE_SPACE))
+
+    def flush(nodes):
+        if not nodes:
+            return
+        text = "".join(node[2] for node in nodes)
+        if '${' not in text:
+            return
+
+        # Character offset in `text` where each node begins
+        starts = []
+        cursor = 0
+        for node in nodes:
+            starts.append(cursor)
+            cursor += len(node[2])
+
+        def locate_start(char_index):
+            # Node holding the character at `char_index`
+            for i, node in enumerate(nodes):
+                if starts[i] <= char_index < starts[i] + len(node[2]):
+                    return i, char_index - starts[i]
+            raise ValueError("placeholder start outside paragraph text")
+
+        def locate_end(char_index):
+            # Node holding the character just before `char_index`
+            for i, node in enumerate(nodes):
+                if starts[i] < char_index <= starts[i] + len(node[2]):
+                    return i, char_index - starts[i]
+            raise ValueError("placeholder end outside paragraph text")
+
+        for match in _PLACEHOLDER_RE.finditer(text):
+            name = match.group(1)
+            spec = placeholders.get(name)
+            if spec is None:
+                continue
+
+            first, first_offset = locate_start(match.start())
+            last, last_offset = locate_end(match.end())
+            first_node = nodes[first]
+            slot = _make_slot(xml, name, first_node[0] + first_offset, spec)
+
+            if first == last:
+                edits.append((first_node[0] + first_offset, first_node[0] + last_offset, slot))
+            else:
+                edits.append((first_node[0] + first_offset, first_node[1], slot))
+                for middle in nodes[first + 1:last]:
+                    edits.append((middle[0], middle[1], ""))
+                    preserve(middle)
+                last_node = nodes[last]
+                edits.append((last_node[0], last_node[0] + last_offset, ""))
+                preserve(last_node)
+            preserve(first_node)
+
+    nodes = []
+    for token in _TOKEN_RE.finditer(xml):
+        if token.group('text') is None:
+            # Paragraph boundary
+            flush(nodes)
+            nodes = []
+            continue
+        opening_tag = xml[token.start():token.start('text')]
+        nodes.append((
+            token.start('text'),
+            token.end('text'),
+            token.group('text'),
+            token.start('text') - 1,  # position of the opening tag's '>'
+            'xml:space' in opening_tag,
+        ))
+    flush(nodes)
+
+    if not edits:
+        return [xml], 0
+
+    edits.sort(key=lambda edit: (edit[0], edit[1]))
+    segments: List[Union[str, PlaceholderSlot]] = []
+    slot_count = 0
+    cursor = 0
+    for start, end, replacement in edits:
+        segments.append(xml[cursor:start])
+        if isinstance(replacement, PlaceholderSlot):
+            segments.append(replacement)
+            slot_count += 1
+        elif replacement:
+            segments.append(replacement)
+        cursor = end
+    segments.append(xml[cursor:])
+
+    # Merge adjacent literals so rendering joins as few strings as possible
+    merged: List[Union[str, PlaceholderSlot]] = []
+    for segment in segments:
+        if isinstance(segment, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += segment
+        elif segment != "":
+            merged.append(segment)
+    return merged, slot_count
+
+
+def template_revision(template: Any) -> str:
+    """Version marker for template fields baked into a plan (fonts, margins)"""
+    updated_at = getattr(template, "updated_at", None)
+    return updated_at.isoformat() if updated_at else ""
+
+
+def compile_render_plan(template: Any,
+                        template_path: str,
+                        placeholders: List[Any],
+                        prepare_document: Optional[Callable[[Any], None]] = None) -> RenderPlan:
+    """Compile a template package into a render plan.
+
+    `placeholders` are Placeholder rows (or objects with the same attributes).
+    `prepare_document` receives a python-docx Document once, so document-level
+    formatting is baked into the plan instead of being applied per render.
+    """
+    import time
+
+    if prepare_document is not None:
+        from docx import Document as DocxDocument
+
+        doc = DocxDocument(template_path)
+        prepare_document(doc)
+        buffer = BytesIO()
+        doc.save(buffer)
+        package = buffer.getvalue()
+    else:
+        with open(template_path, "rb") as f:
+            package = f.read()
+
+    specs: Dict[str, PlaceholderSpec] = {}
+    for placeholder in placeholders:
+        specs.setdefault(placeholder.name, PlaceholderSpec(
+            name=placeholder.name,
+            placeholder_type=getattr(placeholder, "placeholder_type", None) or "text",
+            casing=getattr(placeholder, "casing", None) or "none",
+            default_value=getattr(placeholder, "default_value", None),
+            bold=bool(getattr(placeholder, "bold", False)),
+            italic=bool(getattr(placeholder, "italic", False)),
+            underline=bool(getattr(placeholder, "underline", False)),
+        ))
+
+    members: List[Tuple[str, int, bytes]] = []
+    parts: Dict[str, List[Union[str, PlaceholderSlot]]] = {}
+    slot_count = 0
+
+    with zipfile.ZipFile(BytesIO(package)) as archive:
+        for info in archive.infolist():
+            data = archive.read(info.filename)
+            members.append((info.filename, info.compress_type, data))
+            if specs and _XML_PART_RE.match(info.filename):
+                segments, count = _compile_part(data.decode("utf-8"), specs)
+                if count:
+                    parts[info.filename] = segments
+                    slot_count += count
+
+    return RenderPlan(
+        template_id=template.id,
+        file_hash=template.file_hash or "",
+        revision=template_revision(template),
+        members=members,
+        parts=parts,
+        placeholders=specs,
+        slot_count=slot_count,
+        compiled_at=time.time(),
+    )
+
+
+def render_plan(plan: RenderPlan, values: Dict[str, str], output: Union[str, BinaryIO]) -> None:
+    """Write a rendered document for `plan` to a path or binary stream.
+
+    `values` must already be XML-safe; placeholders without a value render
+    as an empty string.
+    """
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, compress_type, data in plan.members:
+            segments = plan.parts.get(name)
+            if segments is not None:
+                data = "".join(
+                    segment if isinstance(segment, str)
+                    else segment.prefix + values.get(segment.name, "") + segment.suffix
+                    for segment in segments
+                ).encode("utf-8")
+            archive.writestr(name, data, compress_type=compress_type)
+
+
+class RenderPlanCache:
+    """Process-local LRU of compiled plans keyed by (template id, file hash)"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[Tuple[int, str], RenderPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.compilations = 0
+
+    def get(self, template: Any) -> Optional[RenderPlan]:
+        """Return the cached plan if it still matches the template revision"""
+        key = (template.id, template.file_hash or "")
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None and plan.revision == template_revision(template):
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+            return None
+
+    def put(self, plan: RenderPlan) -> None:
+        key = (plan.template_id, plan.file_hash)
+        with self._lock:
+            # Drop plans for superseded file versions of the same template
+            for stale in [k for k in self._plans if k[0] == plan.template_id and k != key]:
+                del self._plans[stale]
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+
+    def get_or_compile(self,
+                       template: Any,
+                       template_path: str,
+                       load_placeholders: Callable[[], List[Any]],
+                       prepare_document: Optional[Callable[[Any], None]] = None) -> RenderPlan:
+        """Return a plan for `template`, compiling it on a miss.
+
+        `load_placeholders` is only called when a compile is needed.
+        """
+        plan = self.get(template)
+        if plan is not None:
+            return plan
+
+        plan = compile_render_plan(template, template_path, load_placeholders(), prepare_document)
+        with self._lock:
+            self.compilations += 1
+        self.put(plan)
+        logger.debug(
+            f"Compiled render plan for template {template.id}: "
+            f"{plan.slot_count} slots in {len(plan.parts)} parts"
+        )
+        return plan
+
+    def invalidate(self, template_id: int) -> int:
+        """Drop every cached plan of a template; returns the number removed"""
+        with self._lock:
+            keys = [key for key in self._plans if key[0] == template_id]
+            for key in keys:
+                del self._plans[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._plans),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "compilations": self.compilations,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+# Global plan cache shared by all generations in this process
+render_plan_cache = RenderPlanCache(
+    max_entries=settings.TEMPLATE_RENDER_PLAN_CACHE_SIZE
+)
@@ -1,25 +1,35 @@
 """
 Production-Ready Document Thumbnail Generation Service
-Real thumbnail generation for documents with multiple format support
+
+Thumbnails are rendered in a bounded process pool so decoding and encoding
+never run on the event loop. Each source is decoded once, at the resolution
+of the largest configured size, and every smaller size is reduced from it.
+Every size is written as WebP (when Pillow supports it) and PNG.
+
+Outputs are keyed by the SHA-256 of the document content, so identical
+documents share one set of thumbnails, and concurrent requests for the same
+content wait on a single render.
 """
 
+import hashlib
 import logging
 import os
 import asyncio
-from typing import Dict, Any, Optional, Tuple
-from pathlib import Path
-import tempfile
+import threading
+from concurrent.futures import Future
 from io import BytesIO
-import base64
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 # Image processing
 try:
-    from PIL import Image, ImageDraw, ImageFont
+    from PIL import Image, ImageDraw, ImageFont, features as pil_features
     PIL_AVAILABLE = True
 except ImportError:
     Image = None
     ImageDraw = None
     ImageFont = None
+    pil_features = None
     PIL_AVAILABLE = False
 
 # PDF processing
@@ -32,421 +42,395 @@ except ImportError:
 
 # Alternative PDF processing
 try:
-    from pdf2image import convert_from_path, convert_from_bytes
+    from pdf2image import convert_from_bytes
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
-    convert_from_path = None
     convert_from_bytes = None
     PDF2IMAGE_AVAILABLE = False
 
 # Document processing
 try:
     from docx import Document as DocxDocument
-    from docx.shared import Inches
     DOCX_AVAILABLE = True
 except ImportError:
     DocxDocument = None
     DOCX_AVAILABLE = False
 
 from config import settings
+from app.utils.worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+# Bump when rendering changes so stale outputs are not served
+RENDER_VERSION = 1
 
-class ThumbnailService:
-    """Production-ready document thumbnail generation service"""
+# Thumbnails are portrait cards; a width maps to a (width, width * 4 / 3) box
+ASPECT_RATIO = (3, 4)
 
-    def __init__(self):
-        self.thumbnail_size = (300, 400)  # Standard thumbnail size
-        self.quality = 85
-        self.cache_dir = Path(getattr(settings, 'THUMBNAILS_PATH', 'storage/thumbnails'))
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+MEDIA_TYPES = {"webp": "image/webp", "png": "image/png"}
+IMAGE_FORMATS = ("png", "jpg", "jpeg", "gif", "bmp", "webp")
 
-        # Check available libraries
-        self.available_processors = self._check_available_processors()
-        logger.info(f"Thumbnail processors available: {list(self.available_processors.keys())}")
+WEBP_AVAILABLE = bool(PIL_AVAILABLE and pil_features.check("webp"))
 
-    def _check_available_processors(self) -> Dict[str, bool]:
-        """Check which thumbnail processors are available"""
-        return {
-            'pil': PIL_AVAILABLE,
-            'pymupdf': PYMUPDF_AVAILABLE,
-            'pdf2image': PDF2IMAGE_AVAILABLE,
-            'docx': DOCX_AVAILABLE
-        }
 
-    async def generate_thumbnail(
-        self,
-        document_id: int,
-        file_path: str,
-        file_format: str,
-        force_regenerate: bool = False
-    ) -> Dict[str, Any]:
-        """Generate thumbnail for document"""
+def thumbnail_box(width: int) -> Tuple[int, int]:
+    """Bounding box for a thumbnail width"""
+    return width, width * ASPECT_RATIO[1] // ASPECT_RATIO[0]
 
-        try:
-            # Check cache first
-            cached_thumbnail = await self._get_cached_thumbnail(document_id, force_regenerate)
-            if cached_thumbnail and not force_regenerate:
-                return cached_thumbnail
 
-            # Validate file exists
-            if not os.path.exists(file_path):
-                return await self._generate_placeholder_thumbnail(document_id, "File not found")
+def thumbnail_key(content_hash: str) -> str:
+    """Storage key shared by every document with this content"""
+    return f"{content_hash}-v{RENDER_VERSION}"
 
-            # Generate thumbnail based on file format
-            thumbnail_result = await self._generate_thumbnail_by_format(
-                file_path, file_format, document_id
-            )
-
-            if thumbnail_result['success']:
-                # Cache the thumbnail
-                await self._cache_thumbnail(document_id, thumbnail_result)
-
-                return {
-                    'success': True,
-                    'thumbnail_url': thumbnail_result['thumbnail_url'],
-                    'thumbnail_path': thumbnail_result['thumbnail_path'],
-                    'file_size': thumbnail_result.get('file_size', 0),
-                    'dimensions': thumbnail_result.get('dimensions', self.thumbnail_size)
-                }
-            else:
-                # Generate placeholder thumbnail
-                return await self._generate_placeholder_thumbnail(
-                    document_id,
-                    thumbnail_result.get('error', 'Unknown error')
-                )
 
-        except Exception as e:
-            logger.error(f"Thumbnail generation failed for document {document_id}: {e}")
-            return await self._generate_placeholder_thumbnail(document_id, str(e))
+def variant_path(cache_dir: str, key: str, width: int, fmt: str) -> str:
+    """Path of one size/format output"""
+    return os.path.join(cache_dir, key[:2], key, f"{width}.{fmt}")
 
-    async def _generate_thumbnail_by_format(
-        self,
-        file_path: str,
-        file_format: str,
-        document_id: int
-    ) -> Dict[str, Any]:
-        """Generate thumbnail based on file format"""
-
-        file_format = file_format.lower()
-
-        if file_format == 'pdf':
-            return await self._generate_pdf_thumbnail(file_path, document_id)
-        elif file_format in ['docx', 'doc']:
-            return await self._generate_docx_thumbnail(file_path, document_id)
-        elif file_format in ['png', 'jpg', 'jpeg', 'gif', 'bmp']:
-            return await self._generate_image_thumbnail(file_path, document_id)
-        elif file_format in ['txt', 'rtf']:
-            return await self._generate_text_thumbnail(file_path, document_id)
-        else:
-            return await self._generate_generic_thumbnail(file_path, file_format, document_id)
 
-    async def _generate_pdf_thumbnail(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate thumbnail from PDF file"""
+def _read_source(file_path: str, encryption_key_id: Optional[str]) -> bytes:
+    """Read the document bytes, decrypting when the stored file is encrypted"""
+    if encryption_key_id:
+        from app.services.encryption_service import EncryptionService
 
-        try:
-            # Try PyMuPDF first (faster and more reliable)
-            if self.available_processors['pymupdf']:
-                return await self._generate_pdf_thumbnail_pymupdf(file_path, document_id)
+        return b"".join(EncryptionService.iter_decrypted_file(file_path, encryption_key_id))
 
-            # Fallback to pdf2image
-            elif self.available_processors['pdf2image']:
-                return await self._generate_pdf_thumbnail_pdf2image(file_path, document_id)
+    with open(file_path, "rb") as f:
+        return f.read()
 
-            else:
-                return {'success': False, 'error': 'No PDF processing libraries available'}
 
-        except Exception as e:
-            logger.error(f"PDF thumbnail generation failed: {e}")
-            return {'success': False, 'error': str(e)}
+def _load_font(size: int):
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except (OSError, IOError):
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1 has a single bitmap size
+            return ImageFont.load_default()
+
+
+def _wrap_text(text: str, width: int) -> List[str]:
+    """Wrap text to specified width"""
+    words = text.split()
+    lines = []
+    current_line = []
+    current_length = 0
+
+    for word in words:
+        if current_length + len(word) + 1 <= width:
+            current_line.append(word)
+            current_length += len(word) + 1
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+            current_length = len(word)
 
-    async def _generate_pdf_thumbnail_pymupdf(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate PDF thumbnail using PyMuPDF"""
+    if current_line:
+        lines.append(' '.join(current_line))
 
-        try:
-            # Open PDF
-            pdf_document = fitz.open(file_path)
+    return lines
 
-            if pdf_document.page_count == 0:
-                return {'success': False, 'error': 'PDF has no pages'}
 
-            # Get first page
-            first_page = pdf_document[0]
+def _text_card(text: str, title: str, box: Tuple[int, int]):
+    """Draw a text preview card at the given size"""
+    scale = box[0] / 300
+    image = Image.new('RGB', box, color='white')
+    draw = ImageDraw.Draw(image)
 
-            # Render page as image
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better quality
-            pix = first_page.get_pixmap(matrix=mat)
+    font_title = _load_font(round(16 * scale))
+    font_text = _load_font(round(12 * scale))
 
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            image = Image.open(BytesIO(img_data))
+    y_offset = 10 * scale
+    if title:
+        draw.text((10 * scale, y_offset), title, fill='black', font=font_title)
+        y_offset = 40 * scale
 
-            # Resize to thumbnail size
-            image.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
+    for i, line in enumerate(_wrap_text(text, 35)[:15]):
+        draw.text((10 * scale, y_offset + i * 15 * scale), line, fill='gray', font=font_text)
 
-            # Save thumbnail
-            thumbnail_path = self.cache_dir / f"doc_{document_id}_thumb.png"
-            image.save(thumbnail_path, "PNG", quality=self.quality)
+    draw.rectangle([0, 0, box[0] - 1, box[1] - 1], outline='lightgray')
+    return image
 
-            pdf_document.close()
 
-            return {
-                'success': True,
-                'thumbnail_path': str(thumbnail_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': thumbnail_path.stat().st_size,
-                'dimensions': image.size,
-                'page_count': pdf_document.page_count
-            }
+def _placeholder_card(box: Tuple[int, int]):
+    """Draw the shared "preview not available" card"""
+    scale = box[0] / 300
+    image = Image.new('RGB', box, color='#f0f0f0')
+    draw = ImageDraw.Draw(image)
+    font = _load_font(round(14 * scale))
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    for i, line in enumerate(("Document", "Preview", "Not Available")):
+        draw.text((50 * scale, (150 + i * 20) * scale), line, fill='gray', font=font)
 
-    async def _generate_pdf_thumbnail_pdf2image(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate PDF thumbnail using pdf2image"""
+    draw.rectangle([0, 0, box[0] - 1, box[1] - 1], outline='gray')
+    return image
 
-        try:
-            # Convert first page to image
-            images = convert_from_path(file_path, first_page=1, last_page=1, dpi=150)
 
-            if not images:
-                return {'success': False, 'error': 'Could not convert PDF page'}
+def _decode_pdf(data: bytes, box: Tuple[int, int]):
+    """Rasterise the first page straight at the target resolution"""
+    if PYMUPDF_AVAILABLE:
+        with fitz.open(stream=data, filetype="pdf") as pdf_document:
+            if pdf_document.page_count == 0:
+                raise ValueError("PDF has no pages")
+            page = pdf_document[0]
+            zoom = min(box[0] / page.rect.width, box[1] / page.rect.height)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    if PDF2IMAGE_AVAILABLE:
+        images = convert_from_bytes(data, first_page=1, last_page=1, size=(box[0], None))
+        if not images:
+            raise ValueError("Could not convert PDF page")
+        return images[0]
+
+    raise RuntimeError("No PDF processing libraries available")
+
+
+def _decode_image(data: bytes, box: Tuple[int, int]):
+    image = Image.open(BytesIO(data))
+    # Lets JPEG decode at a reduced scale instead of full resolution
+    image.draft("RGB", box)
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "P") else "RGB")
+    return image
+
+
+def _decode_docx(data: bytes, box: Tuple[int, int]):
+    if not DOCX_AVAILABLE:
+        raise RuntimeError("DOCX processing not available")
+
+    doc = DocxDocument(BytesIO(data))
+    text_content = [p.text.strip() for p in doc.paragraphs[:10] if p.text.strip()]
+    content_text = '\n'.join(text_content) or "Document content preview not available"
+    return _text_card(content_text, "DOCX Document", box)
+
+
+def _decode_source(data: bytes, file_format: str, box: Tuple[int, int]):
+    """Decode a document once into an image covering the largest box"""
+    if file_format == 'pdf':
+        return _decode_pdf(data, box)
+    if file_format in ('docx', 'doc'):
+        return _decode_docx(data, box)
+    if file_format in IMAGE_FORMATS:
+        return _decode_image(data, box)
+    if file_format in ('txt', 'rtf'):
+        content = data[:4000].decode('utf-8', errors='ignore')[:1000]
+        return _text_card(content.strip() or "Empty text document", "Text Document", box)
+
+    file_size = len(data)
+    if file_size < 1024:
+        size_str = f"{file_size} bytes"
+    elif file_size < 1024 * 1024:
+        size_str = f"{file_size / 1024:.1f} KB"
+    else:
+        size_str = f"{file_size / (1024 * 1024):.1f} MB"
+    info = (f"File Format: {file_format.upper()}\n\nFile Size: {size_str}\n\n"
+            "Preview not available for this file type")
+    return _text_card(info, f"{file_format.upper()} Document", box)
+
+
+def _write_variants(image, key: str, cache_dir: str, widths: List[int], formats: List[str]) -> Dict[int, Dict[str, Any]]:
+    """Reduce one decoded image to every size and encode each format"""
+    variants: Dict[int, Dict[str, Any]] = {}
+    os.makedirs(os.path.join(cache_dir, key[:2], key), exist_ok=True)
+
+    current = image
+    for width in sorted(widths, reverse=True):
+        # Each size is reduced from the previous, smaller-than-source image
+        current = current.copy()
+        current.thumbnail(thumbnail_box(width), Image.Resampling.LANCZOS)
+        variants[width] = {"dimensions": current.size}
+
+        for fmt in formats:
+            path = variant_path(cache_dir, key, width, fmt)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            if fmt == "webp":
+                current.save(temp_path, "WEBP", quality=80, method=4)
+            else:
+                current.save(temp_path, "PNG", optimize=False, compress_level=6)
+            os.replace(temp_path, path)
+            variants[width][fmt] = path
 
-            image = images[0]
+    return variants
 
-            # Resize to thumbnail size
-            image.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
 
-            # Save thumbnail
-            thumbnail_path = self.cache_dir / f"doc_{document_id}_thumb.png"
-            image.save(thumbnail_path, "PNG", quality=self.quality)
+def _outputs_exist(key: str, cache_dir: str, widths: List[int], formats: List[str]) -> bool:
+    return all(os.path.exists(variant_path(cache_dir, key, width, fmt)) for width in widths for fmt in formats)
 
-            return {
-                'success': True,
-                'thumbnail_path': str(thumbnail_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': thumbnail_path.stat().st_size,
-                'dimensions': image.size
-            }
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+def _hash_file(file_path: str) -> str:
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
 
-    async def _generate_docx_thumbnail(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate thumbnail from DOCX file"""
 
-        try:
-            if not self.available_processors['docx'] or not self.available_processors['pil']:
-                return {'success': False, 'error': 'DOCX processing not available'}
+def _render_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Render every size and format of one document inside a pool worker"""
+    result: Dict[str, Any] = {"success": False}
 
-            # Read DOCX content
-            doc = DocxDocument(file_path)
+    try:
+        # Without a stored hash, key by the stored bytes (hashed here, off the event loop)
+        content_hash = job.get("content_hash") or _hash_file(job["file_path"])
+        key = thumbnail_key(content_hash)
+        result.update(content_hash=content_hash, key=key)
 
-            # Extract text from first few paragraphs
-            text_content = []
-            for paragraph in doc.paragraphs[:10]:  # First 10 paragraphs
-                if paragraph.text.strip():
-                    text_content.append(paragraph.text.strip())
+        if not job.get("force") and _outputs_exist(key, job["cache_dir"], job["widths"], job["formats"]):
+            result.update(success=True, cached=True)
+            return result
 
-            content_text = '\n'.join(text_content)
+        data = _read_source(job["file_path"], job.get("encryption_key_id"))
+        image = _decode_source(data, job["file_format"].lower(), thumbnail_box(max(job["widths"])))
+        _write_variants(image, key, job["cache_dir"], job["widths"], job["formats"])
+        result["success"] = True
 
-            if not content_text:
-                content_text = "Document content preview not available"
+    except Exception as e:
+        result["error"] = str(e)
 
-            # Create thumbnail image with text
-            return await self._create_text_thumbnail(content_text, document_id, "DOCX Document")
+    return result
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
 
-    async def _generate_image_thumbnail(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate thumbnail from image file"""
+def _render_placeholder_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Render the shared placeholder set"""
+    key = "placeholder"
+    if not _outputs_exist(key, job["cache_dir"], job["widths"], job["formats"]):
+        image = _placeholder_card(thumbnail_box(max(job["widths"])))
+        _write_variants(image, key, job["cache_dir"], job["widths"], job["formats"])
+    return {"success": True, "key": key, "is_placeholder": True}
 
-        try:
-            if not self.available_processors['pil']:
-                return {'success': False, 'error': 'Image processing not available'}
-
-            # Open and resize image
-            with Image.open(file_path) as image:
-                # Convert to RGB if necessary
-                if image.mode in ('RGBA', 'P'):
-                    image = image.convert('RGB')
-
-                # Create thumbnail
-                image.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
-
-                # Save thumbnail
-                thumbnail_path = self.cache_dir / f"doc_{document_id}_thumb.jpg"
-                image.save(thumbnail_path, "JPEG", quality=self.quality)
-
-                return {
-                    'success': True,
-                    'thumbnail_path': str(thumbnail_path),
-                    'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                    'file_size': thumbnail_path.stat().st_size,
-                    'dimensions': image.size
-                }
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+class ThumbnailService:
+    """Production-ready document thumbnail generation service"""
 
-    async def _generate_text_thumbnail(self, file_path: str, document_id: int) -> Dict[str, Any]:
-        """Generate thumbnail from text file"""
+    def __init__(self, max_workers: Optional[int] = None):
+        self.widths = sorted({int(width) for width in settings.THUMBNAIL_SIZES})
+        self.default_width = 300 if 300 in self.widths else self.widths[len(self.widths) // 2]
+        self.thumbnail_size = thumbnail_box(self.default_width)
+        self.formats = ["webp", "png"] if WEBP_AVAILABLE else ["png"]
+        self.cache_dir = Path(getattr(settings, 'THUMBNAILS_PATH', 'storage/thumbnails'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-        try:
-            # Read text content
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(1000)  # First 1000 characters
+        configured = max_workers or settings.THUMBNAIL_MAX_WORKERS
+        self.max_workers = max(1, configured or min(4, os.cpu_count() or 1))
+        self._pool = WorkerPool(self.max_workers)
+        self._lock = threading.RLock()
+        # Renders in progress, by content hash (or document when the hash is unknown)
+        self._inflight: Dict[str, Future] = {}
 
-            if not content.strip():
-                content = "Empty text document"
+        # Check available libraries
+        self.available_processors = self._check_available_processors()
+        logger.info(f"Thumbnail processors available: {list(self.available_processors.keys())}")
 
-            return await self._create_text_thumbnail(content, document_id, "Text Document")
+    def _check_available_processors(self) -> Dict[str, bool]:
+        """Check which thumbnail processors are available"""
+        return {
+            'pil': PIL_AVAILABLE,
+            'webp': WEBP_AVAILABLE,
+            'pymupdf': PYMUPDF_AVAILABLE,
+            'pdf2image': PDF2IMAGE_AVAILABLE,
+            'docx': DOCX_AVAILABLE
+        }
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    def shutdown(self) -> None:
+        """Stop the worker pool"""
+        self._pool.shutdown()
 
-    async def _generate_generic_thumbnail(self, file_path: str, file_format: str, document_id: int) -> Dict[str, Any]:
-        """Generate generic thumbnail for unsupported formats"""
+    def submit(
+        self,
+        document_id: int,
+        file_path: str,
+        file_format: str,
+        content_hash: Optional[str] = None,
+        encryption_key_id: Optional[str] = None,
+        force_regenerate: bool = False
+    ) -> Future:
+        """Queue a render; callers asking for the same content share one future"""
+
+        inflight_key = content_hash or f"document:{document_id}"
+        job = {
+            "file_path": file_path,
+            "file_format": file_format,
+            "content_hash": content_hash,
+            "encryption_key_id": encryption_key_id,
+            "cache_dir": str(self.cache_dir),
+            "widths": self.widths,
+            "formats": self.formats,
+            "force": force_regenerate,
+        }
 
-        try:
-            file_info = f"File Format: {file_format.upper()}\n\n"
-
-            # Get file size
-            file_size = os.path.getsize(file_path)
-            if file_size < 1024:
-                size_str = f"{file_size} bytes"
-            elif file_size < 1024 * 1024:
-                size_str = f"{file_size / 1024:.1f} KB"
-            else:
-                size_str = f"{file_size / (1024 * 1024):.1f} MB"
+        with self._lock:
+            future = self._inflight.get(inflight_key)
+            if future is not None:
+                return future
 
-            file_info += f"File Size: {size_str}\n\n"
-            file_info += "Preview not available for this file type"
+            future = self._pool.submit(_render_job, job)
+            self._inflight[inflight_key] = future
 
-            return await self._create_text_thumbnail(file_info, document_id, f"{file_format.upper()} Document")
+        future.add_done_callback(lambda done: self._forget(inflight_key, done))
+        return future
 
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+    def _forget(self, inflight_key: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(inflight_key) is future:
+                del self._inflight[inflight_key]
 
-    async def _create_text_thumbnail(self, text: str, document_id: int, title: str = "") -> Dict[str, Any]:
-        """Create thumbnail image from text content"""
+    async def generate_thumbnail(
+        self,
+        document_id: int,
+        file_path: str,
+        file_format: str,
+        force_regenerate: bool = False,
+        content_hash: Optional[str] = None,
+        encryption_key_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Generate every thumbnail size for a document without blocking the loop"""
 
         try:
-            if not self.available_processors['pil']:
-                return {'success': False, 'error': 'PIL not available'}
-
-            # Create image
-            image = Image.new('RGB', self.thumbnail_size, color='white')
-            draw = ImageDraw.Draw(image)
-
-            # Try to load a font
-            try:
-                font_title = ImageFont.truetype("arial.ttf", 16)
-                font_text = ImageFont.truetype("arial.ttf", 12)
-            except (OSError, IOError):
-                font_title = ImageFont.load_default()
-                font_text = ImageFont.load_default()
-
-            # Draw title
-            if title:
-                draw.text((10, 10), title, fill='black', font=font_title)
-                y_offset = 40
-            else:
-                y_offset = 10
+            if not force_regenerate and content_hash:
+                cached_thumbnail = self.get_cached_thumbnail(document_id, content_hash)
+                if cached_thumbnail:
+                    return cached_thumbnail
 
-            # Draw text content (wrapped)
-            lines = self._wrap_text(text, 35)  # Wrap at ~35 characters
-            for i, line in enumerate(lines[:15]):  # Max 15 lines
-                draw.text((10, y_offset + i * 15), line, fill='gray', font=font_text)
+            # Validate file exists
+            if not os.path.exists(file_path):
+                return await self._generate_placeholder_thumbnail(document_id, "File not found")
 
-            # Add border
-            draw.rectangle([0, 0, self.thumbnail_size[0]-1, self.thumbnail_size[1]-1], outline='lightgray')
+            result = await asyncio.wrap_future(self.submit(
+                document_id, file_path, file_format, content_hash, encryption_key_id, force_regenerate
+            ))
 
-            # Save thumbnail
-            thumbnail_path = self.cache_dir / f"doc_{document_id}_thumb.png"
-            image.save(thumbnail_path, "PNG", quality=self.quality)
+            if result['success']:
+                return self._describe(document_id, result['key'], content_hash=result['content_hash'],
+                                      cached=result.get('cached', False))
 
-            return {
-                'success': True,
-                'thumbnail_path': str(thumbnail_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': thumbnail_path.stat().st_size,
-                'dimensions': image.size
-            }
+            return await self._generate_placeholder_thumbnail(document_id, result.get('error', 'Unknown error'))
 
         except Exception as e:
-            return {'success': False, 'error': str(e)}
-
-    def _wrap_text(self, text: str, width: int) -> list:
-        """Wrap text to specified width"""
-        words = text.split()
-        lines = []
-        current_line = []
-        current_length = 0
-
-        for word in words:
-            if current_length + len(word) + 1 <= width:
-                current_line.append(word)
-                current_length += len(word) + 1
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-                current_length = len(word)
-
-        if current_line:
-            lines.append(' '.join(current_line))
-
-        return lines
+            logger.error(f"Thumbnail generation failed for document {document_id}: {e}")
+            return await self._generate_placeholder_thumbnail(document_id, str(e))
 
     async def _generate_placeholder_thumbnail(self, document_id: int, error_message: str = "") -> Dict[str, Any]:
-        """Generate placeholder thumbnail for failed documents"""
+        """Return the shared placeholder set for a document that cannot be previewed"""
 
-        try:
-            if not self.available_processors['pil']:
-                return {
-                    'success': False,
-                    'error': 'Cannot generate placeholder - PIL not available'
-                }
-
-            # Create placeholder image
-            image = Image.new('RGB', self.thumbnail_size, color='#f0f0f0')
-            draw = ImageDraw.Draw(image)
-
-            # Try to load font
-            try:
-                font = ImageFont.truetype("arial.ttf", 14)
-            except (OSError, IOError):
-                font = ImageFont.load_default()
-
-            # Draw placeholder content
-            draw.text((50, 150), "Document", fill='gray', font=font)
-            draw.text((50, 170), "Preview", fill='gray', font=font)
-            draw.text((50, 190), "Not Available", fill='gray', font=font)
-
-            if error_message:
-                error_lines = self._wrap_text(error_message, 25)
-                for i, line in enumerate(error_lines[:3]):
-                    draw.text((10, 250 + i * 15), line, fill='red', font=ImageFont.load_default())
-
-            # Draw border
-            draw.rectangle([0, 0, self.thumbnail_size[0]-1, self.thumbnail_size[1]-1], outline='gray')
-
-            # Save placeholder
-            thumbnail_path = self.cache_dir / f"doc_{document_id}_placeholder.png"
-            image.save(thumbnail_path, "PNG", quality=self.quality)
+        if error_message:
+            logger.info(f"Using placeholder thumbnail for document {document_id}: {error_message}")
 
+        if not PIL_AVAILABLE:
             return {
-                'success': True,
-                'thumbnail_path': str(thumbnail_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': thumbnail_path.stat().st_size,
-                'dimensions': image.size,
-                'is_placeholder': True
+                'success': False,
+                'error': 'Cannot generate placeholder - PIL not available',
+                'thumbnail_url': None
             }
 
+        try:
+            job = {"cache_dir": str(self.cache_dir), "widths": self.widths, "formats": self.formats}
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, _render_placeholder_job, job)
+            return self._describe(document_id, "placeholder", is_placeholder=True)
+
         except Exception as e:
             logger.error(f"Failed to generate placeholder thumbnail: {e}")
             return {
@@ -455,49 +439,63 @@ class ThumbnailService:
                 'thumbnail_url': None
             }
 
-    async def _get_cached_thumbnail(self, document_id: int, force_regenerate: bool = False) -> Optional[Dict[str, Any]]:
-        """Get cached thumbnail if available"""
+    def _describe(
+        self,
+        document_id: int,
+        key: str,
+        content_hash: Optional[str] = None,
+        cached: bool = False,
+        is_placeholder: bool = False
+    ) -> Dict[str, Any]:
+        """Result payload listing every stored variant"""
 
-        if force_regenerate:
-            return None
+        default_path = Path(variant_path(str(self.cache_dir), key, self.default_width, "png"))
+        variants = {
+            width: {fmt: variant_path(str(self.cache_dir), key, width, fmt) for fmt in self.formats}
+            for width in self.widths
+        }
 
-        thumbnail_path = self.cache_dir / f"doc_{document_id}_thumb.png"
-        placeholder_path = self.cache_dir / f"doc_{document_id}_placeholder.png"
+        result = {
+            'success': True,
+            'content_hash': content_hash,
+            'thumbnail_path': str(default_path),
+            'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
+            'file_size': default_path.stat().st_size,
+            'dimensions': self.thumbnail_size,
+            'variants': variants,
+            'cached': cached
+        }
+        if is_placeholder:
+            result['is_placeholder'] = True
+        return result
 
-        # Check for regular thumbnail first
-        if thumbnail_path.exists():
-            return {
-                'success': True,
-                'thumbnail_path': str(thumbnail_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': thumbnail_path.stat().st_size,
-                'cached': True
-            }
+    def get_cached_thumbnail(self, document_id: int, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Existing thumbnails for this content, without rendering"""
 
-        # Check for placeholder thumbnail
-        elif placeholder_path.exists():
-            return {
-                'success': True,
-                'thumbnail_path': str(placeholder_path),
-                'thumbnail_url': f"/api/documents/{document_id}/thumbnail",
-                'file_size': placeholder_path.stat().st_size,
-                'is_placeholder': True,
-                'cached': True
-            }
+        key = thumbnail_key(content_hash)
+        if not _outputs_exist(key, str(self.cache_dir), self.widths, self.formats):
+            return None
+        return self._describe(document_id, key, content_hash=content_hash, cached=True)
 
-        return None
+    def resolve_variant(self, width: Optional[int], accept: str = "") -> Tuple[int, str]:
+        """Nearest configured width at or above the request, and the best format the client accepts"""
 
-    async def _cache_thumbnail(self, document_id: int, thumbnail_result: Dict[str, Any]) -> None:
-        """Cache thumbnail result for future use"""
+        width = width or self.default_width
+        chosen = next((w for w in self.widths if w >= width), self.widths[-1])
+        fmt = "webp" if "webp" in self.formats and "image/webp" in (accept or "") else "png"
+        return chosen, fmt
 
-        # The thumbnail is already saved to disk in the generation methods
-        # This method can be extended for additional caching logic if needed
-        pass
+    def variant_file(self, content_hash: Optional[str], width: int, fmt: str) -> Optional[str]:
+        """Stored file for one variant, or None when it has not been rendered"""
 
-    async def get_thumbnail_info(self, document_id: int) -> Dict[str, Any]:
+        key = thumbnail_key(content_hash) if content_hash else "placeholder"
+        path = variant_path(str(self.cache_dir), key, width, fmt)
+        return path if os.path.exists(path) else None
+
+    async def get_thumbnail_info(self, document_id: int, content_hash: str) -> Dict[str, Any]:
         """Get thumbnail information without generating"""
 
-        cached = await self._get_cached_thumbnail(document_id)
+        cached = self.get_cached_thumbnail(document_id, content_hash)
         if cached:
             return cached
 
@@ -507,26 +505,27 @@ class ThumbnailService:
             'thumbnail_url': None
         }
 
-    async def delete_thumbnail(self, document_id: int) -> bool:
-        """Delete cached thumbnail"""
+    async def delete_thumbnail(self, content_hash: str) -> bool:
+        """Delete the thumbnails stored for a content hash"""
 
         try:
-            thumbnail_files = [
-                self.cache_dir / f"doc_{document_id}_thumb.png",
-                self.cache_dir / f"doc_{document_id}_thumb.jpg",
-                self.cache_dir / f"doc_{document_id}_placeholder.png"
-            ]
-
+            key = thumbnail_key(content_hash)
             deleted = False
-            for thumb_file in thumbnail_files:
-                if thumb_file.exists():
-                    thumb_file.unlink()
-                    deleted = True
+            for width in self.widths:
+                for fmt in MEDIA_TYPES:
+                    path = Path(variant_path(str(self.cache_dir), key, width, fmt))
+                    if path.exists():
+                        path.unlink()
+                        deleted = True
+
+            directory = self.cache_dir / key[:2] / key
+            if directory.exists() and not any(directory.iterdir()):
+                directory.rmdir()
 
             return deleted
 
         except Exception as e:
-            logger.error(f"Failed to delete thumbnail for document {document_id}: {e}")
+            logger.error(f"Failed to delete thumbnails for {content_hash}: {e}")
             return False
 
 
@@ -13,14 +13,7 @@ from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, desc
 from database import Base
-from docx import Document
-
-try:
-    import docx2txt
-    DOCX2TXT_AVAILABLE = True
-except ImportError:
-    DOCX2TXT_AVAILABLE = False
-    print("⚠️ WARNING: docx2txt not available - using fallback text extraction")
+from app.services.ooxml_text_scanner import ProgressCallback, iter_paragraphs
 
 logger = logging.getLogger(__name__)
 
@@ -114,15 +107,33 @@ class UserTemplateUploadService:
     """Service for handling user template uploads and placeholder extraction"""
 
     # Common placeholder patterns
-    PLACEHOLDER_PATTERNS = [
-        r'\{([^}]+)\}',  # {placeholder}
-        r'\[\[([^\]]+)\]\]',  # [[placeholder]]
-        r'\{\{([^}]+)\}\}',  # {{placeholder}}
-        r'_([A-Z_]+)_',  # _PLACEHOLDER_
-        r'<([^>]+)>',  # <placeholder>
-        r'\$\{([^}]+)\}',  # ${placeholder}
+    PLACEHOLDER_PATTERNS = {
+        'dollar_brace': r'\$\{(?P<dollar_brace>[^}]+)\}',  # ${placeholder}
+        'double_brace': r'\{\{(?P<double_brace>[^}]+)\}\}',  # {{placeholder}}
+        'brace': r'\{(?P<brace>[^}]+)\}',  # {placeholder}
+        'double_bracket': r'\[\[(?P<double_bracket>[^\]]+)\]\]',  # [[placeholder]]
+        'angle': r'<(?P<angle>[^>]+)>',  # <placeholder>
+        'upper': r'(?-i:_(?P<upper>[A-Z][A-Z_]*[A-Z])_)',  # _PLACEHOLDER_
+    }
+
+    # Words that mark a fill-in blank such as "Name: ______"
+    PLACEHOLDER_KEYWORDS = [
+        'name', 'date', 'address', 'phone', 'email', 'signature',
+        'company', 'title', 'amount', 'price', 'quantity', 'description'
     ]
 
+    # Every detection method as one alternation, matched once per paragraph.
+    # Instructions are a lookahead so placeholders inside brackets still match;
+    # they never start with a second "[", which belongs to [[placeholder]].
+    SCAN_PATTERN = re.compile(
+        '|'.join([
+            r'\[(?=(?P<instruction>[^\[\]]{10,})\])',
+            *PLACEHOLDER_PATTERNS.values(),
+            r'\b(?P<keyword>' + '|'.join(PLACEHOLDER_KEYWORDS) + r')\s*:?\s*[_\s]{3,}',
+        ]),
+        re.IGNORECASE
+    )
+
     # Common placeholder types based on name
     PLACEHOLDER_TYPES = {
         'name': 'text',
@@ -192,10 +203,8 @@ class UserTemplateUploadService:
             db.commit()
             db.refresh(template)
 
-            # Extract placeholders asynchronously (or immediately for demo)
-            extraction_result = UserTemplateUploadService._extract_placeholders(
-                db, template.id, file_path
-            )
+            # Placeholders are extracted by a background job
+            task_id = UserTemplateUploadService.queue_extraction(template.id)
 
             logger.info(f"User template uploaded: {template.id} by user {user_id}")
 
@@ -204,8 +213,9 @@ class UserTemplateUploadService:
                 "template_id": template.id,
                 "title": title,
                 "file_path": file_path,
-                "extraction_status": extraction_result.get("status", "pending"),
-                "placeholders_found": extraction_result.get("placeholders_count", 0),
+                "extraction_status": template.extraction_status,
+                "extraction_task_id": task_id,
+                "placeholders_found": 0,
                 "message": "Template uploaded successfully. Placeholder extraction in progress."
             }
 
@@ -213,11 +223,26 @@ class UserTemplateUploadService:
             logger.error(f"Failed to upload user template: {e}")
             raise
 
+    @staticmethod
+    def extraction_task_id(template_id: int) -> str:
+        """Celery task id for a template's extraction, so progress can be looked up"""
+        return f"placeholder-extraction-{template_id}"
+
+    @staticmethod
+    def queue_extraction(template_id: int) -> str:
+        """Enqueue placeholder extraction and return its task id"""
+        from app.tasks.template_tasks import extract_placeholders_task
+
+        task_id = UserTemplateUploadService.extraction_task_id(template_id)
+        extract_placeholders_task.apply_async(args=[template_id], task_id=task_id)
+        return task_id
+
     @staticmethod
     def _extract_placeholders(
         db: Session,
         template_id: int,
-        file_path: str
+        file_path: str,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Dict[str, Any]:
         """Extract placeholders from uploaded document"""
         start_time = datetime.utcnow()
@@ -231,12 +256,9 @@ class UserTemplateUploadService:
             if not template:
                 return {"success": False, "error": "Template not found"}
 
-            # Extract text from document
-            document_text = UserTemplateUploadService._extract_text_from_document(file_path)
-
-            # Find placeholders using multiple methods
-            placeholders = UserTemplateUploadService._find_placeholders_multi_method(
-                document_text, file_path
+            # One streaming pass over every text-bearing part
+            placeholders, document_length = UserTemplateUploadService._scan_document(
+                file_path, progress_callback
             )
 
             # Process and categorize placeholders
@@ -246,6 +268,7 @@ class UserTemplateUploadService:
             template.extracted_placeholders = json.dumps(processed_placeholders)
             template.placeholder_count = len(processed_placeholders)
             template.extraction_status = "completed"
+            template.extraction_error = None
             template.updated_at = datetime.utcnow()
 
             # Log extraction
@@ -253,14 +276,14 @@ class UserTemplateUploadService:
 
             extraction_log = PlaceholderExtractionLog(
                 template_id=template_id,
-                extraction_method="multi_method",
+                extraction_method="ooxml_stream",
                 placeholders_found=len(processed_placeholders),
                 extraction_time_ms=extraction_time,
                 success=True,
                 extracted_data=json.dumps({
                     "raw_placeholders": placeholders,
                     "processed_placeholders": processed_placeholders,
-                    "document_length": len(document_text)
+                    "document_length": document_length
                 })
             )
 
@@ -278,10 +301,12 @@ class UserTemplateUploadService:
             }
 
         except Exception as e:
+            db.rollback()
+
             # Log error
             extraction_log = PlaceholderExtractionLog(
                 template_id=template_id,
-                extraction_method="multi_method",
+                extraction_method="ooxml_stream",
                 placeholders_found=0,
                 success=False,
                 error_message=str(e)
@@ -310,100 +335,63 @@ class UserTemplateUploadService:
             }
 
     @staticmethod
-    def _extract_text_from_document(file_path: str) -> str:
-        """Extract text from Word document"""
-        try:
-            # Try python-docx first
-            doc = Document(file_path)
-            text_parts = []
-
-            for paragraph in doc.paragraphs:
-                text_parts.append(paragraph.text)
-
-            # Also extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text_parts.append(cell.text)
-
-            document_text = '\n'.join(text_parts)
-
-            # Fallback to docx2txt if needed
-            if not document_text.strip() and DOCX2TXT_AVAILABLE:
-                document_text = docx2txt.process(file_path)
-
-            return document_text
-
-        except Exception as e:
-            logger.error(f"Failed to extract text from {file_path}: {e}")
-            # Fallback method
-            if DOCX2TXT_AVAILABLE:
-                try:
-                    return docx2txt.process(file_path)
-                except:
-                    return ""
-            return ""
-
-    @staticmethod
-    def _find_placeholders_multi_method(document_text: str, file_path: str) -> List[Dict[str, Any]]:
-        """Find placeholders using multiple extraction methods"""
+    def _scan_document(
+        file_path: str,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Find placeholders in every paragraph of the package, with their locations"""
         all_placeholders = []
-
-        # Method 1: Regex patterns
-        for pattern in UserTemplateUploadService.PLACEHOLDER_PATTERNS:
-            matches = re.finditer(pattern, document_text, re.IGNORECASE)
-            for match in matches:
-                placeholder_name = match.group(1).strip()
-                # Sanitize placeholder name to prevent injection
-                placeholder_name = UserTemplateUploadService._sanitize_placeholder_name(placeholder_name)
-                if placeholder_name and len(placeholder_name) > 1:
-                    all_placeholders.append({
-                        "name": placeholder_name,
-                        "pattern": pattern,
-                        "method": "regex",
-                        "position": match.start(),
-                        "original_text": match.group(0)
-                    })
-
-        # Method 2: Look for common words that might be placeholders
-        placeholder_keywords = [
-            'name', 'date', 'address', 'phone', 'email', 'signature',
-            'company', 'title', 'amount', 'price', 'quantity', 'description'
-        ]
-
-        for keyword in placeholder_keywords:
-            # Look for patterns like "Name: ______" or "Date: _____"
-            pattern = rf'{keyword}\s*:?\s*[_\s]{{3,}}'
-            matches = re.finditer(pattern, document_text, re.IGNORECASE)
-            for match in matches:
-                all_placeholders.append({
-                    "name": keyword,
-                    "pattern": "keyword_detection",
-                    "method": "keyword",
-                    "position": match.start(),
-                    "original_text": match.group(0)
+        document_length = 0
+
+        for paragraph in iter_paragraphs(file_path, progress_callback):
+            document_length = paragraph.offset + len(paragraph.text)
+
+            for match in UserTemplateUploadService.SCAN_PATTERN.finditer(paragraph.text):
+                method = match.lastgroup
+                if method == "instruction":
+                    content = match.group("instruction").strip()
+                    start, end = match.start(), match.end("instruction") + 1
+                else:
+                    content = match.group(method).strip()
+                    start, end = match.span()
+
+                placeholder = UserTemplateUploadService._match_placeholder(method, content)
+                if not placeholder:
+                    continue
+
+                placeholder.update({
+                    "position": paragraph.offset + start,
+                    "original_text": paragraph.text[start:end],
+                    "location": paragraph.locate(start, end)
                 })
+                all_placeholders.append(placeholder)
 
-        # Method 3: Look for bracketed content that might be instructions
-        instruction_pattern = r'\[([^\]]{10,})\]'  # Longer bracketed content
-        matches = re.finditer(instruction_pattern, document_text)
-        for match in matches:
-            content = match.group(1).strip()
-            # Check if it looks like a placeholder instruction
-            if any(word in content.lower() for word in ['enter', 'insert', 'fill', 'type', 'write']):
-                # Try to extract the field name
-                field_name = UserTemplateUploadService._extract_field_name_from_instruction(content)
-                if field_name:
-                    all_placeholders.append({
-                        "name": field_name,
-                        "pattern": "instruction",
-                        "method": "instruction",
-                        "position": match.start(),
-                        "original_text": match.group(0),
-                        "instruction": content
-                    })
-
-        return all_placeholders
+        return all_placeholders, document_length
+
+    @staticmethod
+    def _match_placeholder(method: str, content: str) -> Optional[Dict[str, Any]]:
+        """Turn one scan match into a raw placeholder, or None if it is not one"""
+        if method == "keyword":
+            return {"name": content.lower(), "pattern": "keyword_detection", "method": "keyword"}
+
+        if method == "instruction":
+            # Only bracketed text that reads like a fill-in instruction
+            if not any(word in content.lower() for word in ['enter', 'insert', 'fill', 'type', 'write']):
+                return None
+            field_name = UserTemplateUploadService._extract_field_name_from_instruction(content)
+            if not field_name:
+                return None
+            return {"name": field_name, "pattern": "instruction", "method": "instruction", "instruction": content}
+
+        # Sanitize placeholder name to prevent injection
+        placeholder_name = UserTemplateUploadService._sanitize_placeholder_name(content)
+        if not placeholder_name or len(placeholder_name) <= 1:
+            return None
+        return {
+            "name": placeholder_name,
+            "pattern": UserTemplateUploadService.PLACEHOLDER_PATTERNS[method],
+            "method": "regex"
+        }
 
     @staticmethod
     def _extract_field_name_from_instruction(instruction: str) -> Optional[str]:
@@ -459,9 +447,13 @@ class UserTemplateUploadService:
                         "extraction_method": placeholder["method"],
                         "original_text": placeholder.get("original_text", ""),
                         "instruction": placeholder.get("instruction"),
-                        "position": placeholder.get("position", 0)
+                        "position": placeholder.get("position", 0),
+                        "locations": []
                     }
 
+                if "location" in placeholder:
+                    unique_placeholders[name]["locations"].append(placeholder["location"])
+
         # Convert to list and sort by position
         processed_placeholders = list(unique_placeholders.values())
         processed_placeholders.sort(key=lambda x: x["position"])
@@ -4,10 +4,11 @@ User wallet management for credits, transactions, and premium features
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, func, desc, and_
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON, func, desc, and_, or_, case, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from enum import Enum
 
@@ -114,6 +115,201 @@ class WalletTransaction(Base):
     wallet = relationship("Wallet", backref="transactions")
 
 
+class WalletLedger:
+    """
+    Append-only wallet ledger
+
+    Every balance change is one conditional UPDATE ... RETURNING on the wallet
+    row plus one appended WalletTransaction, committed together. Funds and the
+    daily/monthly limits are checked inside the UPDATE itself, so concurrent
+    debits cannot overspend and no row is read or locked beforehand. A
+    `reference` makes a movement idempotent: replaying it returns the
+    original transaction instead of moving money twice.
+    """
+
+    @staticmethod
+    def _spend_windows(now: datetime):
+        """Daily/monthly spend as of `now`, resetting counters from a past period"""
+        day_start = datetime(now.year, now.month, now.day)
+        month_start = datetime(now.year, now.month, 1)
+        daily = case((Wallet.last_reset_date >= day_start, Wallet.daily_spent), else_=0.0)
+        monthly = case((Wallet.last_reset_date >= month_start, Wallet.monthly_spent), else_=0.0)
+        return daily, monthly
+
+    @staticmethod
+    def debit(db: Session, user_id: int, amount: float, description: str,
+              transaction_type: str = TransactionType.DEBIT, reference: str = None,
+              metadata: Dict = None, commit: bool = True, **related) -> Dict:
+        """Debit a wallet if funds and spending limits allow, in one statement"""
+
+        if amount <= 0:
+            return {"success": False, "error": "Amount must be positive"}
+
+        replay = WalletLedger._replay(db, reference, user_id)
+        if replay:
+            return replay
+
+        now = datetime.utcnow()
+        daily, monthly = WalletLedger._spend_windows(now)
+
+        row = db.execute(
+            update(Wallet)
+            .where(
+                Wallet.user_id == user_id,
+                Wallet.is_frozen.is_(False),
+                Wallet.balance >= amount,
+                or_(Wallet.daily_spend_limit.is_(None), Wallet.daily_spend_limit <= 0,
+                    daily + amount <= Wallet.daily_spend_limit),
+                or_(Wallet.monthly_spend_limit.is_(None), Wallet.monthly_spend_limit <= 0,
+                    monthly + amount <= Wallet.monthly_spend_limit)
+            )
+            .values(
+                balance=Wallet.balance - amount,
+                total_spent=Wallet.total_spent + amount,
+                daily_spent=daily + amount,
+                monthly_spent=monthly + amount,
+                last_reset_date=now,
+                last_transaction_at=now,
+                updated_at=now
+            )
+            .returning(Wallet.id, Wallet.balance, Wallet.currency)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if row is None:
+            return {"success": False, "error": WalletLedger._rejection_reason(db, user_id, amount, now)}
+
+        return WalletLedger._append(
+            db, row, user_id, -amount, transaction_type, description, reference,
+            metadata, commit, now, related
+        )
+
+    @staticmethod
+    def credit(db: Session, user_id: int, amount: float, description: str,
+               transaction_type: str = TransactionType.CREDIT, reference: str = None,
+               metadata: Dict = None, earned: bool = True, commit: bool = True, **related) -> Dict:
+        """Credit an existing wallet in one statement"""
+
+        if amount <= 0:
+            return {"success": False, "error": "Amount must be positive"}
+
+        replay = WalletLedger._replay(db, reference, user_id)
+        if replay:
+            return replay
+
+        now = datetime.utcnow()
+        values = {
+            "balance": Wallet.balance + amount,
+            "last_transaction_at": now,
+            "updated_at": now
+        }
+        if earned:
+            values["total_earned"] = Wallet.total_earned + amount
+
+        row = db.execute(
+            update(Wallet)
+            .where(Wallet.user_id == user_id, Wallet.is_frozen.is_(False))
+            .values(**values)
+            .returning(Wallet.id, Wallet.balance, Wallet.currency)
+            .execution_options(synchronize_session=False)
+        ).first()
+
+        if row is None:
+            return {"success": False, "error": "Wallet is frozen"}
+
+        return WalletLedger._append(
+            db, row, user_id, amount, transaction_type, description, reference,
+            metadata, commit, now, related
+        )
+
+    @staticmethod
+    def _append(db: Session, row, user_id: int, delta: float, transaction_type: str,
+                description: str, reference: Optional[str], metadata: Optional[Dict],
+                commit: bool, now: datetime, related: Dict) -> Dict:
+        """Append the ledger entry for a balance change made in this transaction"""
+
+        # SET expressions see the pre-update row, RETURNING the post-update one
+        transaction = WalletTransaction(
+            wallet_id=row.id,
+            transaction_type=transaction_type,
+            amount=abs(delta),
+            currency=row.currency,
+            description=description,
+            reference=reference,
+            transaction_metadata=metadata,
+            balance_before=row.balance - delta,
+            balance_after=row.balance,
+            status=TransactionStatus.COMPLETED,
+            processed_at=now,
+            **related
+        )
+        db.add(transaction)
+
+        if not commit:
+            db.flush()
+            return WalletLedger._result(transaction, user_id)
+
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent request claimed the same reference; its movement stands
+            db.rollback()
+            replay = WalletLedger._replay(db, reference, user_id)
+            if replay:
+                return replay
+            raise
+
+        return WalletLedger._result(transaction, user_id)
+
+    @staticmethod
+    def _replay(db: Session, reference: Optional[str], user_id: int) -> Optional[Dict]:
+        """Result of an earlier movement with the same reference, if any"""
+        if not reference:
+            return None
+
+        existing = db.query(WalletTransaction, Wallet.user_id).join(
+            Wallet, Wallet.id == WalletTransaction.wallet_id
+        ).filter(WalletTransaction.reference == reference).first()
+
+        if not existing:
+            return None
+        if existing.user_id != user_id:
+            return {"success": False, "error": "Reference already used"}
+
+        result = WalletLedger._result(existing.WalletTransaction, user_id)
+        result["replayed"] = True
+        return result
+
+    @staticmethod
+    def _result(transaction: WalletTransaction, user_id: int) -> Dict:
+        return {
+            "success": True,
+            "transaction_id": transaction.id,
+            "wallet_id": transaction.wallet_id,
+            "user_id": user_id,
+            "new_balance": transaction.balance_after,
+            "amount": transaction.amount,
+            "replayed": False
+        }
+
+    @staticmethod
+    def _rejection_reason(db: Session, user_id: int, amount: float, now: datetime) -> str:
+        """Explain a debit the conditional UPDATE refused (cold path only)"""
+
+        wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+        if wallet is None or (not wallet.is_frozen and wallet.balance < amount):
+            return "Insufficient balance"
+        if wallet.is_frozen:
+            return "Wallet is frozen"
+
+        daily_spent, monthly_spent = WalletService._current_spend(wallet, now)
+        if wallet.daily_spend_limit and daily_spent + amount > wallet.daily_spend_limit:
+            return f"Daily spending limit of {wallet.daily_spend_limit} {wallet.currency} exceeded"
+        if wallet.monthly_spend_limit and monthly_spent + amount > wallet.monthly_spend_limit:
+            return f"Monthly spending limit of {wallet.monthly_spend_limit} {wallet.currency} exceeded"
+        return "Insufficient balance"
+
+
 class WalletService:
     """Wallet management service"""
 
@@ -125,7 +321,12 @@ class WalletService:
         if not wallet:
             wallet = Wallet(user_id=user_id)
             db.add(wallet)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # Created concurrently by another request
+                db.rollback()
+                return db.query(Wallet).filter(Wallet.user_id == user_id).one()
             db.refresh(wallet)
 
             # Log wallet creation
@@ -142,8 +343,8 @@ class WalletService:
 
         wallet = WalletService.get_or_create_wallet(db, user_id)
 
-        # Reset daily/monthly limits if needed
-        WalletService._reset_spending_limits(db, wallet)
+        # Counters from a past day/month are reported as reset; the next debit stores it
+        daily_spent, monthly_spent = WalletService._current_spend(wallet, datetime.utcnow())
 
         return {
             "wallet_id": wallet.id,
@@ -156,8 +357,8 @@ class WalletService:
             "is_frozen": wallet.is_frozen,
             "daily_spend_limit": wallet.daily_spend_limit,
             "monthly_spend_limit": wallet.monthly_spend_limit,
-            "daily_spent": wallet.daily_spent,
-            "monthly_spent": wallet.monthly_spent,
+            "daily_spent": daily_spent,
+            "monthly_spent": monthly_spent,
             "last_transaction_at": wallet.last_transaction_at
         }
 
@@ -166,55 +367,25 @@ class WalletService:
                   reference: str = None, metadata: Dict = None) -> Dict:
         """Add funds to user's wallet"""
 
-        if amount <= 0:
-            return {"success": False, "error": "Amount must be positive"}
-
-        wallet = WalletService.get_or_create_wallet(db, user_id)
-
-        if wallet.is_frozen:
-            return {"success": False, "error": "Wallet is frozen"}
+        WalletService.get_or_create_wallet(db, user_id)
 
-        # Create transaction
-        transaction = WalletTransaction(
-            wallet_id=wallet.id,
-            transaction_type=TransactionType.CREDIT,
-            amount=amount,
-            currency=wallet.currency,
-            description=description,
-            reference=reference,
-            metadata=metadata,
-            balance_before=wallet.balance,
-            balance_after=wallet.balance + amount,
-            status=TransactionStatus.COMPLETED,
-            processed_at=datetime.utcnow()
+        result = WalletLedger.credit(
+            db, user_id, amount, description, reference=reference, metadata=metadata
         )
 
-        # Update wallet balance
-        wallet.balance += amount
-        wallet.total_earned += amount
-        wallet.last_transaction_at = datetime.utcnow()
-
-        db.add(transaction)
-        db.commit()
-
-        # Log transaction
-        AuditService.log_system_event(
-            "WALLET_CREDIT",
-            {
-                "user_id": user_id,
-                "wallet_id": wallet.id,
-                "amount": amount,
-                "transaction_id": transaction.id,
-                "new_balance": wallet.balance
-            }
-        )
+        if result["success"] and not result["replayed"]:
+            AuditService.log_system_event(
+                "WALLET_CREDIT",
+                {
+                    "user_id": user_id,
+                    "wallet_id": result["wallet_id"],
+                    "amount": amount,
+                    "transaction_id": result["transaction_id"],
+                    "new_balance": result["new_balance"]
+                }
+            )
 
-        return {
-            "success": True,
-            "transaction_id": transaction.id,
-            "new_balance": wallet.balance,
-            "amount": amount
-        }
+        return result
 
     @staticmethod
     def deduct_funds(db: Session, user_id: int, amount: float, description: str,
@@ -222,225 +393,180 @@ class WalletService:
                     related_template_id: int = None, related_document_id: int = None) -> Dict:
         """Deduct funds from user's wallet"""
 
-        if amount <= 0:
-            return {"success": False, "error": "Amount must be positive"}
-
-        wallet = WalletService.get_or_create_wallet(db, user_id)
-
-        if wallet.is_frozen:
-            return {"success": False, "error": "Wallet is frozen"}
-
-        if wallet.balance < amount:
-            return {"success": False, "error": "Insufficient balance"}
-
-        # Check spending limits
-        limit_check = WalletService._check_spending_limits(db, wallet, amount)
-        if not limit_check["allowed"]:
-            return {"success": False, "error": limit_check["reason"]}
-
-        # Create transaction
-        transaction = WalletTransaction(
-            wallet_id=wallet.id,
-            transaction_type=TransactionType.DEBIT,
-            amount=amount,
-            currency=wallet.currency,
-            description=description,
+        result = WalletLedger.debit(
+            db, user_id, amount, description,
             reference=reference,
             metadata=metadata,
             related_template_id=related_template_id,
-            related_document_id=related_document_id,
-            balance_before=wallet.balance,
-            balance_after=wallet.balance - amount,
-            status=TransactionStatus.COMPLETED,
-            processed_at=datetime.utcnow()
+            related_document_id=related_document_id
         )
 
-        # Update wallet balance
-        wallet.balance -= amount
-        wallet.total_spent += amount
-        wallet.daily_spent += amount
-        wallet.monthly_spent += amount
-        wallet.last_transaction_at = datetime.utcnow()
-
-        db.add(transaction)
-        db.commit()
-
-        # Log transaction
-        AuditService.log_system_event(
-            "WALLET_DEBIT",
-            {
-                "user_id": user_id,
-                "wallet_id": wallet.id,
-                "amount": amount,
-                "transaction_id": transaction.id,
-                "new_balance": wallet.balance
-            }
-        )
+        if result["success"] and not result["replayed"]:
+            # Queued for the background audit writer
+            AuditService.log_system_event(
+                "WALLET_DEBIT",
+                {
+                    "user_id": user_id,
+                    "wallet_id": result["wallet_id"],
+                    "amount": amount,
+                    "transaction_id": result["transaction_id"],
+                    "new_balance": result["new_balance"]
+                }
+            )
 
-        return {
-            "success": True,
-            "transaction_id": transaction.id,
-            "new_balance": wallet.balance,
-            "amount": amount
-        }
+        return result
 
     @staticmethod
     def transfer_funds(db: Session, from_user_id: int, to_user_id: int, amount: float,
                       description: str, reference: str = None) -> Dict:
         """Transfer funds between users"""
 
-        if amount <= 0:
-            return {"success": False, "error": "Amount must be positive"}
-
         if from_user_id == to_user_id:
             return {"success": False, "error": "Cannot transfer to yourself"}
 
-        from_wallet = WalletService.get_or_create_wallet(db, from_user_id)
-        to_wallet = WalletService.get_or_create_wallet(db, to_user_id)
-
-        if from_wallet.is_frozen or to_wallet.is_frozen:
-            return {"success": False, "error": "One or both wallets are frozen"}
-
-        if from_wallet.balance < amount:
-            return {"success": False, "error": "Insufficient balance"}
-
-        # Check spending limits for sender
-        limit_check = WalletService._check_spending_limits(db, from_wallet, amount)
-        if not limit_check["allowed"]:
-            return {"success": False, "error": limit_check["reason"]}
+        WalletService.get_or_create_wallet(db, to_user_id)
 
         try:
-            # Create outgoing transaction
-            out_transaction = WalletTransaction(
-                wallet_id=from_wallet.id,
+            # Both legs share one database transaction
+            out_result = WalletLedger.debit(
+                db, from_user_id, amount,
+                f"Transfer to user {to_user_id}: {description}",
                 transaction_type=TransactionType.TRANSFER_OUT,
-                amount=amount,
-                currency=from_wallet.currency,
-                description=f"Transfer to user {to_user_id}: {description}",
                 reference=reference,
-                related_user_id=to_user_id,
-                balance_before=from_wallet.balance,
-                balance_after=from_wallet.balance - amount,
-                status=TransactionStatus.COMPLETED,
-                processed_at=datetime.utcnow()
+                commit=False,
+                related_user_id=to_user_id
             )
+            if not out_result["success"] or out_result["replayed"]:
+                return WalletService._transfer_result(db, out_result, reference)
 
-            # Create incoming transaction
-            in_transaction = WalletTransaction(
-                wallet_id=to_wallet.id,
+            in_result = WalletLedger.credit(
+                db, to_user_id, amount,
+                f"Transfer from user {from_user_id}: {description}",
                 transaction_type=TransactionType.TRANSFER_IN,
-                amount=amount,
-                currency=to_wallet.currency,
-                description=f"Transfer from user {from_user_id}: {description}",
-                reference=reference,
-                related_user_id=from_user_id,
-                balance_before=to_wallet.balance,
-                balance_after=to_wallet.balance + amount,
-                status=TransactionStatus.COMPLETED,
-                processed_at=datetime.utcnow()
+                reference=f"{reference}:in" if reference else None,
+                commit=False,
+                related_user_id=from_user_id
             )
+            if not in_result["success"]:
+                db.rollback()
+                return {"success": False, "error": "One or both wallets are frozen"}
 
-            # Update wallet balances
-            from_wallet.balance -= amount
-            from_wallet.total_spent += amount
-            from_wallet.daily_spent += amount
-            from_wallet.monthly_spent += amount
-            from_wallet.last_transaction_at = datetime.utcnow()
-
-            to_wallet.balance += amount
-            to_wallet.total_earned += amount
-            to_wallet.last_transaction_at = datetime.utcnow()
-
-            db.add(out_transaction)
-            db.add(in_transaction)
             db.commit()
 
-            # Log transfer
-            AuditService.log_system_event(
-                "WALLET_TRANSFER",
-                {
-                    "from_user_id": from_user_id,
-                    "to_user_id": to_user_id,
-                    "amount": amount,
-                    "out_transaction_id": out_transaction.id,
-                    "in_transaction_id": in_transaction.id
-                }
-            )
-
-            return {
-                "success": True,
-                "out_transaction_id": out_transaction.id,
-                "in_transaction_id": in_transaction.id,
-                "sender_balance": from_wallet.balance,
-                "recipient_balance": to_wallet.balance
-            }
-
+        except IntegrityError:
+            db.rollback()
+            replay = WalletLedger._replay(db, reference, from_user_id)
+            if replay:
+                return WalletService._transfer_result(db, replay, reference)
+            return {"success": False, "error": "Transfer failed: duplicate reference"}
         except Exception as e:
             db.rollback()
             return {"success": False, "error": f"Transfer failed: {str(e)}"}
 
+        # Log transfer
+        AuditService.log_system_event(
+            "WALLET_TRANSFER",
+            {
+                "from_user_id": from_user_id,
+                "to_user_id": to_user_id,
+                "amount": amount,
+                "out_transaction_id": out_result["transaction_id"],
+                "in_transaction_id": in_result["transaction_id"]
+            }
+        )
+
+        return {
+            "success": True,
+            "out_transaction_id": out_result["transaction_id"],
+            "in_transaction_id": in_result["transaction_id"],
+            "sender_balance": out_result["new_balance"],
+            "recipient_balance": in_result["new_balance"]
+        }
+
+    @staticmethod
+    def _transfer_result(db: Session, out_result: Dict, reference: Optional[str]) -> Dict:
+        """Transfer response for a refused or replayed outgoing leg"""
+        if not out_result["success"]:
+            if out_result["error"] == "Wallet is frozen":
+                out_result["error"] = "One or both wallets are frozen"
+            return out_result
+
+        incoming = db.query(WalletTransaction).filter(
+            WalletTransaction.reference == f"{reference}:in"
+        ).first()
+        return {
+            "success": True,
+            "out_transaction_id": out_result["transaction_id"],
+            "in_transaction_id": incoming.id if incoming else None,
+            "sender_balance": out_result["new_balance"],
+            "recipient_balance": incoming.balance_after if incoming else None,
+            "replayed": True
+        }
+
     @staticmethod
     def refund_transaction(db: Session, transaction_id: int, reason: str = None) -> Dict:
         """Refund a wallet transaction"""
 
-        transaction = db.query(WalletTransaction).filter(
-            WalletTransaction.id == transaction_id
+        # Claim the original entry; only one refund can flip it from completed
+        claimed = db.execute(
+            update(WalletTransaction)
+            .where(
+                WalletTransaction.id == transaction_id,
+                WalletTransaction.status == TransactionStatus.COMPLETED,
+                WalletTransaction.transaction_type == TransactionType.DEBIT
+            )
+            .values(status=TransactionStatus.REFUNDED, updated_at=datetime.utcnow())
+            .returning(WalletTransaction.amount, WalletTransaction.description, WalletTransaction.wallet_id)
+            .execution_options(synchronize_session=False)
         ).first()
 
-        if not transaction:
-            return {"success": False, "error": "Transaction not found"}
-
-        if transaction.status != TransactionStatus.COMPLETED:
+        if claimed is None:
+            transaction = db.query(WalletTransaction).filter(
+                WalletTransaction.id == transaction_id
+            ).first()
+            if not transaction:
+                return {"success": False, "error": "Transaction not found"}
+            if transaction.transaction_type != TransactionType.DEBIT:
+                return {"success": False, "error": "Only debit transactions can be refunded"}
             return {"success": False, "error": "Only completed transactions can be refunded"}
 
-        if transaction.transaction_type != TransactionType.DEBIT:
-            return {"success": False, "error": "Only debit transactions can be refunded"}
-
-        wallet = transaction.wallet
-
-        # Create refund transaction
-        refund_transaction = WalletTransaction(
-            wallet_id=wallet.id,
-            transaction_type=TransactionType.REFUND,
-            amount=transaction.amount,
-            currency=transaction.currency,
-            description=f"Refund for: {transaction.description}",
-            reference=f"REFUND_{transaction.id}",
-            metadata={"original_transaction_id": transaction.id, "reason": reason},
-            balance_before=wallet.balance,
-            balance_after=wallet.balance + transaction.amount,
-            status=TransactionStatus.COMPLETED,
-            processed_at=datetime.utcnow()
-        )
-
-        # Update wallet balance
-        wallet.balance += transaction.amount
-        wallet.last_transaction_at = datetime.utcnow()
+        user_id = db.query(Wallet.user_id).filter(Wallet.id == claimed.wallet_id).scalar()
 
-        # Mark original transaction as refunded
-        transaction.status = TransactionStatus.REFUNDED
+        # Refunds land even on frozen wallets, and do not count as earnings
+        now = datetime.utcnow()
+        row = db.execute(
+            update(Wallet)
+            .where(Wallet.id == claimed.wallet_id)
+            .values(balance=Wallet.balance + claimed.amount, last_transaction_at=now, updated_at=now)
+            .returning(Wallet.id, Wallet.balance, Wallet.currency)
+            .execution_options(synchronize_session=False)
+        ).first()
 
-        db.add(refund_transaction)
-        db.commit()
+        result = WalletLedger._append(
+            db, row, user_id, claimed.amount, TransactionType.REFUND,
+            f"Refund for: {claimed.description}", f"REFUND_{transaction_id}",
+            {"original_transaction_id": transaction_id, "reason": reason},
+            True, now, {}
+        )
 
         # Log refund
         AuditService.log_system_event(
             "WALLET_REFUND",
             {
-                "user_id": wallet.user_id,
-                "wallet_id": wallet.id,
-                "amount": transaction.amount,
-                "original_transaction_id": transaction.id,
-                "refund_transaction_id": refund_transaction.id,
+                "user_id": user_id,
+                "wallet_id": claimed.wallet_id,
+                "amount": claimed.amount,
+                "original_transaction_id": transaction_id,
+                "refund_transaction_id": result["transaction_id"],
                 "reason": reason
             }
         )
 
         return {
             "success": True,
-            "refund_transaction_id": refund_transaction.id,
-            "amount": transaction.amount,
-            "new_balance": wallet.balance
+            "refund_transaction_id": result["transaction_id"],
+            "amount": claimed.amount,
+            "new_balance": result["new_balance"]
         }
 
     @staticmethod
@@ -541,50 +667,13 @@ class WalletService:
         return {"success": True, "message": "Wallet unfrozen successfully"}
 
     @staticmethod
-    def _check_spending_limits(db: Session, wallet: Wallet, amount: float) -> Dict:
-        """Check if transaction is within spending limits"""
-
-        # Reset limits if needed
-        WalletService._reset_spending_limits(db, wallet)
-
-        # Check daily limit
-        if wallet.daily_spend_limit and (wallet.daily_spent + amount) > wallet.daily_spend_limit:
-            return {
-                "allowed": False,
-                "reason": f"Daily spending limit of {wallet.daily_spend_limit} {wallet.currency} exceeded"
-            }
-
-        # Check monthly limit
-        if wallet.monthly_spend_limit and (wallet.monthly_spent + amount) > wallet.monthly_spend_limit:
-            return {
-                "allowed": False,
-                "reason": f"Monthly spending limit of {wallet.monthly_spend_limit} {wallet.currency} exceeded"
-            }
-
-        return {"allowed": True}
-
-    @staticmethod
-    def _reset_spending_limits(db: Session, wallet: Wallet):
-        """Reset daily/monthly spending limits if period has passed"""
+    def _current_spend(wallet: Wallet, now: datetime) -> Tuple[float, float]:
+        """Daily and monthly spend, treating counters from a past period as zero"""
 
-        now = datetime.utcnow()
-        today = now.date()
-
-        # Reset daily limit
-        if wallet.last_reset_date is None or wallet.last_reset_date.date() < today:
-            wallet.daily_spent = 0.0
-
-        # Reset monthly limit
-        current_month = (now.year, now.month)
-        last_reset_month = None
-        if wallet.last_reset_date:
-            last_reset_month = (wallet.last_reset_date.year, wallet.last_reset_date.month)
-
-        if last_reset_month != current_month:
-            wallet.monthly_spent = 0.0
-
-        wallet.last_reset_date = now
-        db.commit()
+        last = wallet.last_reset_date
+        daily = wallet.daily_spent if last and last.date() == now.date() else 0.0
+        monthly = wallet.monthly_spent if last and (last.year, last.month) == (now.year, now.month) else 0.0
+        return daily, monthly
 
     @staticmethod
     def _format_transaction(transaction: WalletTransaction) -> Dict:
@@ -0,0 +1,53 @@
+"""
+Campaign background tasks
+"""
+
+import asyncio
+import logging
+from celery import Celery
+
+from config import settings
+from database import SessionLocal
+from app.models.campaign import Campaign, CampaignStatus
+from app.services.campaign_engine import CampaignEngine, CampaignLease
+
+logger = logging.getLogger(__name__)
+
+# Create Celery instance
+celery_app = Celery(
+    "campaign_tasks",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
+)
+
+
+@celery_app.task(bind=True, max_retries=3, acks_late=True)
+def execute_campaign_task(self, campaign_id: int):
+    """Run a campaign; a retry or redelivery resumes from its last committed chunk"""
+
+    db = SessionLocal()
+    # Retries and redeliveries keep the task id, which is what owns the campaign's lease
+    redelivered = bool((self.request.delivery_info or {}).get('redelivered'))
+    resume = self.request.retries > 0 or redelivered
+
+    try:
+        return asyncio.run(CampaignEngine().run(db, campaign_id, owner=self.request.id, resume=resume))
+
+    except Exception as exc:
+        db.rollback()
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=60 * (self.request.retries + 1))
+
+        logger.error(f"Campaign {campaign_id} failed after {self.max_retries} retries: {exc}")
+        db.query(Campaign).filter(
+            Campaign.id == campaign_id, Campaign.status == CampaignStatus.RUNNING
+        ).update({"status": CampaignStatus.CANCELLED}, synchronize_session=False)
+        db.commit()
+        try:
+            CampaignLease().release(campaign_id, self.request.id)
+        except Exception as e:
+            logger.warning(f"Campaign {campaign_id} lease not released: {e}")
+        raise exc
+
+    finally:
+        db.close()
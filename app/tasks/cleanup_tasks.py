@@ -18,6 +18,7 @@ from app.models.template import Template
 from app.models.visit import Visit
 from app.services.audit_service import AuditService
 from app.services.encryption_service import EncryptionService
+from app.middleware.token_deduction import release_stale_reservations
 
 # Create Celery instance
 celery_app = Celery(
@@ -478,6 +479,18 @@ def system_health_check_task():
     return health_status
 
 
+@celery_app.task
+def release_stale_token_reservations_task():
+    """Return tokens held by generations that never settled their reservation"""
+
+    db = SessionLocal()
+
+    try:
+        return {"released": release_stale_reservations(db)}
+    finally:
+        db.close()
+
+
 # Schedule periodic tasks
 @celery_app.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -538,3 +551,10 @@ def setup_periodic_tasks(sender, **kwargs):
         system_health_check_task.s(),
         name='system health check'
     )
+
+    # Release stale token reservations hourly
+    sender.add_periodic_task(
+        3600.0,  # 1 hour
+        release_stale_token_reservations_task.s(),
+        name='release stale token reservations'
+    )
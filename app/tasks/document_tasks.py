@@ -6,7 +6,7 @@ import os
 import time
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from celery import Celery
 from sqlalchemy.orm import Session
 
@@ -16,6 +16,8 @@ from app.models.document import Document, DocumentStatus
 from app.models.template import Template
 from app.services.document_service import DocumentService
 from app.services.audit_service import AuditService
+from app.services.batch_generation_engine import BatchGenerationEngine
+from app.middleware.token_deduction import commit_reservation, release_reservation
 
 # Create Celery instance
 celery_app = Celery(
@@ -26,8 +28,9 @@ celery_app = Celery(
 
 
 @celery_app.task(bind=True, max_retries=3)
-def generate_document_task(self, document_id: int, placeholder_data: Dict[str, Any]):
-    """Generate document from template in background"""
+def generate_document_task(self, document_id: int, placeholder_data: Dict[str, Any],
+                           reservation_id: Optional[int] = None):
+    """Generate document from template in background, settling its token reservation"""
     
     db = SessionLocal()
     
@@ -55,6 +58,12 @@ def generate_document_task(self, document_id: int, placeholder_data: Dict[str, A
         # Refresh document to get updated data
         db.refresh(document)
         
+        if reservation_id:
+            if success:
+                commit_reservation(db, reservation_id)
+            else:
+                release_reservation(db, reservation_id, document.error_message)
+
         if success:
             # Log successful generation
             AuditService.log_document_event(
@@ -101,6 +110,9 @@ def generate_document_task(self, document_id: int, placeholder_data: Dict[str, A
         if self.request.retries < self.max_retries:
             raise self.retry(countdown=60 * (self.request.retries + 1))
         
+        if reservation_id:
+            release_reservation(db, reservation_id, str(exc))
+
         # Log final failure
         AuditService.log_system_event(
             "DOCUMENT_GENERATION_FAILED",
@@ -122,72 +134,40 @@ def generate_batch_documents_task(
     self, 
     batch_id: str, 
     document_ids: List[int], 
-    placeholder_data_list: List[Dict[str, Any]]
+    placeholder_data_list: List[Dict[str, Any]] = None,
+    batch_settings: Dict[str, Any] = None
 ):
-    """Generate multiple documents in batch"""
+    """Generate multiple documents in batch on a bounded worker pool"""
     
     db = SessionLocal()
-    results = []
+    batch_settings = batch_settings or {}
     
     try:
-        total_documents = len(document_ids)
-        successful = 0
-        failed = 0
+        def report_progress(progress: Dict[str, Any]):
+            # One aggregated state update instead of one per document
+            self.update_state(state='PROGRESS', meta=progress)
         
-        for i, (document_id, placeholder_data) in enumerate(zip(document_ids, placeholder_data_list)):
-            try:
-                # Update progress
-                progress = int((i / total_documents) * 100)
-                self.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': i,
-                        'total': total_documents,
-                        'progress': progress,
-                        'batch_id': batch_id
-                    }
-                )
-                
-                # Generate document directly (not using delay to avoid recursion)
-                result_data = generate_document_task(document_id, placeholder_data)
-                
-                if result_data["success"]:
-                    successful += 1
-                else:
-                    failed += 1
-                
-                results.append({
-                    "document_id": document_id,
-                    "success": result_data["success"],
-                    "status": result_data["status"]
-                })
-            
-            except Exception as e:
-                failed += 1
-                results.append({
-                    "document_id": document_id,
-                    "success": False,
-                    "error": str(e)
-                })
+        engine = BatchGenerationEngine(max_workers=batch_settings.get("max_workers"))
+        summary = engine.run(
+            db,
+            batch_id,
+            document_ids,
+            placeholder_data_list,
+            progress_callback=report_progress
+        )
         
         # Log batch completion
         AuditService.log_system_event(
             "BATCH_GENERATION_COMPLETED",
             {
                 "batch_id": batch_id,
-                "total_documents": total_documents,
-                "successful": successful,
-                "failed": failed
+                "total_documents": summary["total_documents"],
+                "successful": summary["successful"],
+                "failed": summary["failed"]
             }
         )
         
-        return {
-            "batch_id": batch_id,
-            "total_documents": total_documents,
-            "successful": successful,
-            "failed": failed,
-            "results": results
-        }
+        return summary
     
     except Exception as exc:
         AuditService.log_system_event(
@@ -0,0 +1,57 @@
+"""
+Email outbox dispatcher tasks
+"""
+
+import asyncio
+import logging
+from celery import Celery
+
+from config import settings
+from database import SessionLocal
+from app.services.email_outbox_service import EmailOutboxService
+
+logger = logging.getLogger(__name__)
+
+# Create Celery instance
+celery_app = Celery(
+    "email_tasks",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
+)
+
+# One event loop per worker process keeps provider connections alive between runs
+_loop = None
+
+
+def _run(coroutine):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coroutine)
+
+
+@celery_app.task
+def dispatch_email_outbox_task():
+    """Send every due outbox email in batches"""
+
+    db = SessionLocal()
+
+    try:
+        stats = _run(EmailOutboxService.drain(db))
+        if stats["claimed"]:
+            logger.info(f"Email outbox: {stats['sent']} sent, {stats['failed']} failed of {stats['claimed']}")
+        return stats
+
+    finally:
+        db.close()
+
+
+@celery_app.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    """Poll the outbox for due emails"""
+
+    sender.add_periodic_task(
+        float(settings.EMAIL_OUTBOX_POLL_SECONDS),
+        dispatch_email_outbox_task.s(),
+        name='dispatch email outbox'
+    )
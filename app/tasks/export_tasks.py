@@ -0,0 +1,56 @@
+"""
+Analytics export background tasks
+"""
+
+from celery import Celery
+
+from config import settings
+from database import SessionLocal
+from app.services.analytics_export import ExportJobStore, run_export_job
+from app.services.audit_service import AuditService
+
+# Create Celery instance
+celery_app = Celery(
+    "export_tasks",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
+)
+
+
+@celery_app.task(bind=True, max_retries=5, acks_late=True)
+def export_analytics_task(self, job_id: str):
+    """Run an analytics export job; retries resume from the last checkpoint"""
+
+    db = SessionLocal()
+    store = ExportJobStore()
+
+    try:
+        job = run_export_job(db, store, job_id)
+
+        AuditService.log_analytics_event(
+            "ANALYTICS_EXPORTED",
+            job["user_id"],
+            None,
+            {
+                "job_id": job_id,
+                "format": job["format"],
+                "document_id": job["document_id"],
+                "record_count": job["rows"]
+            }
+        )
+
+        return {"job_id": job_id, "status": job["status"], "rows": job["rows"]}
+
+    except Exception as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=30 * (self.request.retries + 1))
+
+        job = store.get(job_id)
+        if job:
+            job["status"] = "failed"
+            job["error"] = str(exc)
+            store.save(job)
+        raise exc
+
+    finally:
+        db.close()
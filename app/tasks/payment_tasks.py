@@ -214,7 +214,7 @@ def send_payment_notification_task(payment_id: int, notification_type: str):
 
         # Send notification based on type
         if notification_type == "payment_completed":
-            send_payment_success_notification(user, payment)
+            send_payment_success_notification(db, user, payment)
         elif notification_type == "payment_failed":
             send_payment_failure_notification(user, payment)
         elif notification_type == "subscription_renewed":
@@ -248,16 +248,23 @@ def send_payment_notification_task(payment_id: int, notification_type: str):
         db.close()
 
 
-def send_payment_success_notification(user: User, payment: Payment):
-    """Send payment success notification"""
+def send_payment_success_notification(db: Session, user: User, payment: Payment):
+    """Queue the payment confirmation email for the outbox dispatcher"""
     try:
         from app.services.email_service import email_service
         loop = asyncio.get_event_loop()
         loop.run_until_complete(
-            email_service.send_payment_confirmation_email(user.email, payment)
+            email_service.send_payment_confirmation_email(
+                user.email,
+                user.full_name,
+                payment.amount,
+                payment.currency,
+                payment.transaction_id,
+                db=db
+            )
         )
     except Exception as e:
-        logger.warning(f"Failed to send payment success email: {e}")
+        logger.warning(f"Failed to queue payment success email: {e}")
 
 
 def send_payment_failure_notification(user: User, payment: Payment):
@@ -0,0 +1,69 @@
+"""
+User template background tasks
+"""
+
+import time
+import logging
+from typing import Dict, Any
+from celery import Celery
+
+from config import settings
+from database import SessionLocal
+from app.services.user_template_upload_service import UserTemplateUploadService, UserUploadedTemplate
+
+logger = logging.getLogger(__name__)
+
+# Create Celery instance
+celery_app = Celery(
+    "template_tasks",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
+)
+
+
+@celery_app.task(bind=True, max_retries=3)
+def extract_placeholders_task(self, template_id: int):
+    """Extract placeholders from an uploaded template, reporting scan progress"""
+
+    db = SessionLocal()
+    last_report = 0.0
+
+    try:
+        template = db.query(UserUploadedTemplate).filter(
+            UserUploadedTemplate.id == template_id
+        ).first()
+        if not template:
+            return {"success": False, "error": "Template not found"}
+
+        def report_progress(progress: Dict[str, Any]):
+            nonlocal last_report
+            # Part boundaries always report; mid-part updates at most once a second
+            now = time.monotonic()
+            if not progress["part_done"] and now - last_report < 1.0:
+                return
+            last_report = now
+            total = progress["bytes_total"] or 1
+            self.update_state(
+                state='PROGRESS',
+                meta={"template_id": template_id, "percent": round(100 * progress["bytes_read"] / total), **progress}
+            )
+
+        result = UserTemplateUploadService._extract_placeholders(
+            db, template_id, template.file_path, progress_callback=report_progress
+        )
+
+        # Success and failure are already recorded in PlaceholderExtractionLog
+        logger.info(
+            f"Placeholder extraction for template {template_id} finished: "
+            f"{result.get('status')} ({result.get('placeholders_count', 0)} found)"
+        )
+
+        return {key: value for key, value in result.items() if key != "placeholders"}
+
+    except Exception as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=30 * (self.request.retries + 1))
+        raise exc
+
+    finally:
+        db.close()
@@ -0,0 +1,69 @@
+"""
+Tests for the streaming analytics export engine
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from app.services import analytics_export
+from app.services.analytics_export import ExportJobStore, encode_csv, encode_json, encode_ndjson, run_export_job
+
+
+def _row(visit_id):
+    return (visit_id, 7, "view", "NG", "Lagos", "mobile", "Chrome", "Android",
+            datetime(2025, 1, 1, 12, 0), 0.5, 42, False, "fp", {"source": "direct"})
+
+
+BATCHES = [[_row(1), _row(2)], [_row(3)]]
+
+
+def test_encoders_stream_one_chunk_per_batch():
+    csv_chunks = list(encode_csv(BATCHES))
+    rows = list(csv.DictReader(io.StringIO(b"".join(csv_chunks).decode())))
+    assert len(csv_chunks) == 2
+    assert [row["visit_id"] for row in rows] == ["1", "2", "3"]
+    assert json.loads(rows[0]["metadata"]) == {"source": "direct"}
+
+    lines = b"".join(encode_ndjson(BATCHES)).decode().splitlines()
+    assert [json.loads(line)["visit_id"] for line in lines] == [1, 2, 3]
+
+    envelope = json.loads(b"".join(encode_json(BATCHES)))
+    assert envelope["total_records"] == 3
+    assert envelope["visits"][2]["visitor_info"]["city"] == "Lagos"
+
+
+def test_export_job_resumes_after_last_checkpoint(tmp_path, monkeypatch):
+    store = ExportJobStore(str(tmp_path))
+    job = store.create(user_id=1, document_id=None, days=30, format="ndjson")
+    seen_after_ids = []
+
+    def failing_batches(db, query, batch_size):
+        yield BATCHES[0]
+        raise ConnectionError("worker lost")
+
+    def remaining_batches(db, query, batch_size):
+        seen_after_ids.append(query.compile().params.get("id_1"))
+        yield BATCHES[1]
+
+    monkeypatch.setattr(analytics_export, "iter_batches", failing_batches)
+    with pytest.raises(ConnectionError):
+        run_export_job(None, store, job["job_id"])
+
+    checkpoint = store.get(job["job_id"])
+    assert checkpoint["last_id"] == 2 and checkpoint["rows"] == 2
+
+    # Simulate a torn write after the checkpoint; the resumed run must drop it
+    with open(store.output_path(checkpoint), "ab") as output:
+        output.write(b'{"visit_id":')
+
+    monkeypatch.setattr(analytics_export, "iter_batches", remaining_batches)
+    finished = run_export_job(None, store, job["job_id"])
+
+    assert finished["status"] == "completed" and finished["rows"] == 3
+    assert seen_after_ids == [2]
+    with open(store.output_path(finished)) as output:
+        assert [json.loads(line)["visit_id"] for line in output] == [1, 2, 3]
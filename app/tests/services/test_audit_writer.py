@@ -0,0 +1,121 @@
+"""
+Tests for the background audit log writer
+"""
+
+import os
+import json
+import time
+
+import pytest
+from sqlalchemy.exc import DataError
+
+from app.services.audit_writer import AuditWriter
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return str(tmp_path / "audit_spill.jsonl")
+
+
+def test_events_are_written_in_batches(spill_path):
+    batches = []
+    writer = AuditWriter(batches.append, batch_size=10, flush_interval=0.05, spill_path=spill_path)
+
+    for i in range(25):
+        writer.submit({"n": i})
+    writer.stop()
+
+    assert [event["n"] for batch in batches for event in batch] == list(range(25))
+    assert all(len(batch) <= 10 for batch in batches)
+
+
+def test_failed_batch_is_spilled_and_replayed(spill_path):
+    written = []
+    healthy = {"value": False}
+
+    def write_batch(batch):
+        if not healthy["value"]:
+            raise RuntimeError("database unavailable")
+        written.extend(batch)
+
+    writer = AuditWriter(write_batch, flush_interval=0.05, spill_path=spill_path)
+    writer.submit({"n": 1})
+    assert wait_for(lambda: writer.stats.spilled == 1)
+
+    with open(spill_path) as f:
+        assert json.loads(f.readline()) == {"n": 1}
+
+    healthy["value"] = True
+    writer.submit({"n": 2})
+    assert wait_for(lambda: len(written) == 2)
+    writer.stop()
+
+    assert sorted(event["n"] for event in written) == [1, 2]
+    assert writer.stats.replayed == 1
+
+
+def test_full_queue_spills_instead_of_blocking(spill_path):
+    writer = AuditWriter(lambda batch: time.sleep(0.5), max_queue_size=1,
+                         batch_size=1, enqueue_timeout=0.01, spill_path=spill_path)
+
+    results = [writer.submit({"n": i}) for i in range(5)]
+    writer.stop(timeout=0.1)
+
+    assert False in results
+    assert writer.stats.spilled >= 1
+
+
+def _reject_poison(written):
+    def write_batch(batch):
+        if any(event.get("poison") for event in batch):
+            raise DataError("INSERT INTO audit_logs", {}, Exception("invalid byte sequence"))
+        written.extend(batch)
+    return write_batch
+
+
+def test_rejected_event_is_dead_lettered_and_the_rest_written(spill_path):
+    written = []
+    writer = AuditWriter(_reject_poison(written), batch_size=8, spill_path=spill_path)
+
+    batch = [{"n": i, "poison": i == 5} for i in range(8)]
+    assert writer._flush(batch)
+
+    assert [event["n"] for event in written] == [0, 1, 2, 3, 4, 6, 7]
+    assert writer.stats.dead_lettered == 1 and writer.stats.spilled == 0
+    with open(writer.dead_letter_path) as f:
+        record = json.loads(f.readline())
+    assert record["event"]["n"] == 5 and "invalid byte sequence" in record["error"]
+
+
+def test_replay_skips_past_rejected_events(spill_path):
+    with open(spill_path, "w") as f:
+        for i in range(6):
+            f.write(json.dumps({"n": i, "poison": i == 1}) + "\n")
+
+    written = []
+    writer = AuditWriter(_reject_poison(written), batch_size=2, spill_path=spill_path)
+    writer._replay_spill()
+
+    assert [event["n"] for event in written] == [0, 2, 3, 4, 5]
+    assert writer.stats.replayed == 5 and writer.stats.dead_lettered == 1
+    assert not os.path.exists(spill_path)
+
+
+def test_driver_type_errors_spill_instead_of_dead_lettering(spill_path):
+    def write_batch(batch):
+        raise TypeError("'connect_timeout' is an invalid keyword argument for Connection()")
+
+    writer = AuditWriter(write_batch, spill_path=spill_path)
+
+    assert not writer._flush([{"n": 1}, {"n": 2}])
+    assert writer.stats.spilled == 2 and writer.stats.dead_lettered == 0
+    assert not os.path.exists(writer.dead_letter_path)
@@ -0,0 +1,39 @@
+"""
+Tests for cross-worker cache invalidation messages
+"""
+
+import json
+
+import pytest
+
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def cache():
+    """Cache service without Redis: L1 only"""
+    return CacheService()
+
+
+def test_peer_invalidation_evicts_l1(cache):
+    cache.l1.set("mytypist:template:1:v1", {"id": 1}, "template", size=64)
+    cache.l1.set("mytypist:template:2:v1", {"id": 2}, "template", size=64)
+
+    message = json.dumps({"origin": "other-worker", "keys": ["mytypist:template:1:v1"]})
+
+    assert cache._apply_invalidation(message.encode("utf-8")) == 1
+    assert "mytypist:template:1:v1" not in cache.l1
+    assert "mytypist:template:2:v1" in cache.l1
+
+
+def test_own_invalidation_is_ignored(cache):
+    cache.l1.set("mytypist:template:1:v1", {"id": 1}, "template", size=64)
+
+    message = json.dumps({"origin": cache.instance_id, "keys": ["mytypist:template:1:v1"]})
+
+    assert cache._apply_invalidation(message) == 0
+    assert "mytypist:template:1:v1" in cache.l1
+
+
+def test_malformed_invalidation_is_ignored(cache):
+    assert cache._apply_invalidation(b"not json") == 0
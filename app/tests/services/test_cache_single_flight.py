@@ -0,0 +1,119 @@
+"""
+Tests for single-flight loading in CacheService
+"""
+
+import asyncio
+import hashlib
+import time
+
+import pytest
+
+from app.services.cache_service import CacheService
+
+
+@pytest.fixture
+def cache():
+    """Cache service without Redis: L1 only"""
+    return CacheService()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_run_loader_once(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"templates": [1, 2, 3]}
+
+    results = await asyncio.gather(*[
+        cache.get_or_load("api:popular", loader, expire=60) for _ in range(10)
+    ])
+
+    assert len(calls) == 1
+    assert all(result == {"templates": [1, 2, 3]} for result in results)
+    assert cache.get_single_flight_stats()["duplicate_loads_avoided"] == 9
+
+
+@pytest.mark.asyncio
+async def test_cached_value_served_without_loading(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return "value"
+
+    await cache.get_or_load("api:key", loader, expire=60, early_refresh_beta=0)
+    assert await cache.get_or_load("api:key", loader, expire=60, early_refresh_beta=0) == "value"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_value_served_while_revalidating(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return f"v{len(calls)}"
+
+    await cache.get_or_load("api:key", loader, expire=60, stale_ttl=30)
+
+    # Push the soft expiry into the past, inside the stale window
+    entry = cache._get_from_l1("api:key")
+    entry["exp"] = time.time() - 1
+
+    assert await cache.get_or_load("api:key", loader, expire=60, stale_ttl=30) == "v1"
+    await asyncio.sleep(0)
+    await asyncio.gather(*cache._refreshing.values())
+
+    assert len(calls) == 2
+    assert cache.get_single_flight_stats()["stale_served"] == 1
+    assert await cache.get_or_load("api:key", loader, expire=60, early_refresh_beta=0) == "v2"
+
+
+@pytest.mark.asyncio
+async def test_loader_errors_propagate_to_all_waiters(cache):
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("database unavailable")
+
+    results = await asyncio.gather(
+        *[cache.get_or_load("api:broken", loader) for _ in range(3)],
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert "api:broken" not in cache._inflight
+
+
+class _Session:
+    """Request-scoped session; every instance renders the same in cache keys"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<Session>"
+
+
+@pytest.mark.asyncio
+async def test_decorated_functions_never_refresh_in_background(cache, monkeypatch):
+    from app.services import cache_service as module
+
+    monkeypatch.setattr(module, "cache_service", cache)
+    sessions = []
+
+    @module.cache_query(expire=60)
+    async def count_documents(session):
+        sessions.append(session.name)
+        return len(sessions)
+
+    assert await count_documents(_Session("request-1")) == 1
+
+    # Expired entries are reloaded by the caller, with the caller's session
+    key = "query:count_documents:" + hashlib.md5(str((_Session("any"),)).encode()).hexdigest()
+    cache._get_from_l1(key)["exp"] = time.time() - 1
+    assert await count_documents(_Session("request-2")) == 2
+
+    assert not cache._refreshing
+    assert sessions == ["request-1", "request-2"]
@@ -0,0 +1,172 @@
+"""
+Tests for chunked, resumable campaign execution
+"""
+
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import User
+from app.models.campaign import Campaign, CampaignStatus
+from app.models.token import UserToken, TokenTransaction
+from app.services.campaign_service import CampaignExecution
+from app.services.campaign_engine import CampaignEngine, ProviderRateLimiter, Recipient, parse_rate_limits
+
+
+class _FakeEmailService:
+    primary_provider = "sendgrid"
+
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = set(fail_for)
+
+    async def send_email(self, to_email, subject, template_name, template_data):
+        if to_email in self.fail_for:
+            raise ConnectionError("provider unavailable")
+        self.sent.append((to_email, template_data["user_name"]))
+        return {"success": True, "provider_used": self.primary_provider}
+
+
+class _MemoryLease:
+    def __init__(self):
+        self.owners = {}
+
+    def acquire(self, campaign_id, owner):
+        return self.owners.setdefault(campaign_id, owner) == owner
+
+    def renew(self, campaign_id, owner):
+        return self.owners.get(campaign_id) == owner
+
+    def release(self, campaign_id, owner):
+        if self.owners.get(campaign_id) == owner:
+            del self.owners[campaign_id]
+
+
+def _session(users=7):
+    engine = create_engine("sqlite://")
+    for model in (User, UserToken, TokenTransaction, Campaign, CampaignExecution):
+        model.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+
+    for number in range(1, users + 1):
+        db.add(User(id=number, username=f"user{number}", email=f"user{number}@example.com",
+                    password_hash="x", first_name=f"User{number}"))
+    db.add(UserToken(user_id=2, document_tokens=10, lifetime_earned=10))
+    db.commit()
+    return db
+
+
+def _campaign(db, **overrides):
+    campaign = Campaign(name="Launch", status=CampaignStatus.SCHEDULED)
+    db.add(campaign)
+    db.commit()
+
+    # The service reads these beyond the persisted columns
+    settings = dict(
+        target_user_ids=None, target_audience=None, exclude_user_ids=None, max_recipients=None,
+        send_email=True, email_subject="Hello", email_template_name=None, email_template_data={"promo": "X"},
+        gift_tokens=True, token_type=None, token_amount=5, token_message=None,
+        max_tokens_per_campaign=None, recipients_count=0, emails_sent=0
+    )
+    settings.update(overrides)
+    for name, value in settings.items():
+        setattr(campaign, name, value)
+    return campaign
+
+
+def _engine(email_service, chunk_size=3, lease=None):
+    return CampaignEngine(email_service, chunk_size=chunk_size, concurrency=2, rate_limits={},
+                          lease=lease or _MemoryLease())
+
+
+def test_campaign_runs_in_chunks_with_bulk_gifts():
+    db = _session()
+    campaign = _campaign(db, exclude_user_ids=[4])
+    email = _FakeEmailService()
+
+    result = asyncio.run(_engine(email).run(db, campaign.id))
+
+    assert result["success"] and result["recipients_count"] == 6
+    assert campaign.status == CampaignStatus.COMPLETED
+    assert campaign.recipients_count == 6 and campaign.emails_sent == 6
+    assert campaign.tokens_distributed == 30
+    assert sorted(to for to, _ in email.sent) == sorted(f"user{n}@example.com" for n in (1, 2, 3, 5, 6, 7))
+    # Template data is copied per recipient
+    assert campaign.email_template_data == {"promo": "X"}
+
+    balances = dict(db.query(UserToken.user_id, UserToken.document_tokens).all())
+    assert balances[2] == 15 and balances[1] == 5 and 4 not in balances
+    assert db.query(TokenTransaction).filter(TokenTransaction.reference_type == "campaign_gift").count() == 6
+    assert db.query(CampaignExecution).filter(CampaignExecution.sent_at.is_(None)).count() == 0
+
+
+def test_interrupted_campaign_resumes_after_checkpoint():
+    db = _session()
+    campaign = _campaign(db, max_tokens_per_campaign=20)
+    lease = _MemoryLease()
+    engine = _engine(_FakeEmailService(), lease=lease)
+
+    # A crash after the first chunk committed but before its emails went out
+    async def crash(*args):
+        raise RuntimeError("worker lost")
+
+    engine._send_emails = crash
+    try:
+        asyncio.run(engine.run(db, campaign.id, owner="task-1"))
+    except RuntimeError:
+        pass
+    assert campaign.status == CampaignStatus.RUNNING
+
+    # A duplicate task never picks up a campaign another task owns
+    email = _FakeEmailService(fail_for={"user7@example.com"})
+    assert not asyncio.run(_engine(email, lease=lease).run(db, campaign.id, owner="task-2"))["success"]
+    assert not asyncio.run(_engine(email, lease=lease).run(db, campaign.id, owner="task-2", resume=True))["success"]
+    assert not email.sent
+
+    result = asyncio.run(_engine(email, lease=lease).run(db, campaign.id, owner="task-1", resume=True))
+
+    assert result["resumed"] and result["recipients_count"] == 7
+    assert len(email.sent) == 6 and result["failed_executions"] == 1
+    # Each user is recorded once and the token budget caps the gifts
+    assert db.query(CampaignExecution).count() == 7
+    assert campaign.tokens_distributed == 20
+    failed = db.query(CampaignExecution).filter(CampaignExecution.user_id == 7).one()
+    assert not failed.email_sent and failed.error_message == "provider unavailable"
+    assert failed.token_gift_error == "Campaign token budget exhausted"
+
+
+def test_users_already_recorded_are_not_gifted_or_emailed_again():
+    db = _session()
+    campaign = _campaign(db)
+    campaign.status = CampaignStatus.RUNNING
+    engine = _engine(_FakeEmailService())
+    users = [Recipient(n, f"user{n}@example.com", f"user{n}", None, None) for n in (1, 2, 3)]
+
+    summary = {"recipients": 0, "tokens_distributed": 0}
+    first = engine._commit_chunk(db, campaign, users, summary)
+    second = engine._commit_chunk(db, campaign, users[1:] + [Recipient(4, "user4@example.com", "user4", None, None)],
+                                  summary)
+
+    assert [user.id for _, user in first] == [1, 2, 3]
+    assert [user.id for _, user in second] == [4]
+    assert db.query(CampaignExecution).count() == 4
+    assert campaign.tokens_distributed == 20 and summary["recipients"] == 4
+    assert db.query(TokenTransaction).count() == 4
+
+
+def test_rate_limiter_spaces_sends_per_provider():
+    assert parse_rate_limits("sendgrid:100, smtp:5,") == {"sendgrid": 100.0, "smtp": 5.0}
+
+    limiter = ProviderRateLimiter({"smtp": 20})
+
+    async def burst():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(23):
+            await limiter.acquire("smtp")
+        await limiter.acquire("unlimited")
+        return loop.time() - start
+
+    # The bucket holds one second of sends; three more need ~0.15s
+    assert 0.1 < asyncio.run(burst()) < 1.0
@@ -0,0 +1,99 @@
+"""
+Tests for the email outbox dispatcher and provider circuit breakers
+"""
+
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.email_outbox import EmailOutbox, OutboxStatus
+from app.services.email_outbox_service import EmailOutboxService
+from app.services.email_service import EmailService
+from app.services.email_transport import CircuitBreaker, EmailTransportError
+
+
+class _FakeTransport:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.sent = []
+
+    async def send(self, message):
+        if self.fail:
+            raise EmailTransportError(f"{self.name} timed out")
+        self.sent.append(message.to_email)
+        return {'success': True, 'provider_used': self.name, 'message_id': f"{self.name}-{len(self.sent)}"}
+
+
+def _service(**transports):
+    service = EmailService()
+    service.providers = transports
+    service.breakers = {name: CircuitBreaker(name, failure_threshold=2, reset_seconds=60) for name in transports}
+    service.primary_provider = next(iter(transports))
+    return service
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    EmailOutbox.__table__.create(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_open_circuit_skips_failing_primary():
+    primary, fallback = _FakeTransport("sendgrid", fail=True), _FakeTransport("smtp")
+    service = _service(sendgrid=primary, smtp=fallback)
+
+    async def send_three():
+        return [
+            await service.send_email(f"user{n}@example.com", "Hi", "document_ready", {"user_name": "Ada"})
+            for n in range(3)
+        ]
+
+    results = asyncio.run(send_three())
+
+    assert all(result["provider_used"] == "smtp" for result in results)
+    assert service.breakers["sendgrid"].state == "open"
+    # Third send never touched the primary
+    assert primary.sent == [] and service.breakers["sendgrid"].failures == 2
+
+
+def test_dispatcher_sends_queued_emails_and_backs_off_failures():
+    db = _session()
+    smtp = _FakeTransport("smtp")
+    service = _service(smtp=smtp)
+
+    first = service.queue_email(db, "a@example.com", "Ready", "document_ready", {"document_title": "Lease"})
+    second = EmailOutboxService.enqueue(db, "b@example.com", "Paid", "payment_confirmation", {"amount": 10})
+    assert first["queued"] and smtp.sent == []
+
+    stats = asyncio.run(EmailOutboxService.dispatch_batch(db, service))
+
+    assert stats == {"claimed": 2, "sent": 2, "failed": 0}
+    assert sorted(smtp.sent) == ["a@example.com", "b@example.com"]
+    row = db.get(EmailOutbox, second)
+    assert row.status == OutboxStatus.SENT.value and row.provider_used == "smtp" and row.sent_at
+
+    smtp.fail = True
+    EmailOutboxService.enqueue(db, "c@example.com", "Paid", "payment_confirmation", {"amount": 10})
+    asyncio.run(EmailOutboxService.dispatch_batch(db, service))
+
+    retry = db.query(EmailOutbox).filter(EmailOutbox.to_email == "c@example.com").one()
+    assert retry.status == OutboxStatus.PENDING.value and retry.attempts == 1
+    assert retry.available_at > retry.created_at and "timed out" in retry.last_error
+    # Not due yet, so the next pass claims nothing
+    assert asyncio.run(EmailOutboxService.dispatch_batch(db, service))["claimed"] == 0
+
+
+def test_open_circuits_do_not_use_up_attempts():
+    db = _session()
+    service = _service(sendgrid=_FakeTransport("sendgrid"))
+    for _ in range(2):
+        service.breakers["sendgrid"].record_failure()
+
+    outbox_id = EmailOutboxService.enqueue(db, "a@example.com", "Hi", "welcome", {})
+    asyncio.run(EmailOutboxService.dispatch_batch(db, service))
+
+    row = db.get(EmailOutbox, outbox_id)
+    assert row.status == OutboxStatus.PENDING.value and row.attempts == 0
+    assert row.last_error == "All email provider circuits are open"
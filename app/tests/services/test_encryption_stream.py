@@ -0,0 +1,51 @@
+"""
+Tests for the chunked streaming file encryption format
+"""
+
+import asyncio
+import io
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.services.encryption_service import EncryptionService
+
+
+def _encrypt(data: bytes, chunk_size: int = 1024) -> bytes:
+    blocks = [data[i:i + 300] for i in range(0, len(data), 300)]
+    return b"".join(EncryptionService.encrypt_stream(blocks, chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("size", [0, 1, 1024, 1025, 5000])
+def test_stream_round_trip(size):
+    data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+    sealed = _encrypt(data)
+
+    assert b"".join(EncryptionService.decrypt_stream(io.BytesIO(sealed))) == data
+
+
+def test_truncated_stream_is_rejected():
+    sealed = _encrypt(b"x" * 4096)
+
+    # Drop the final chunk: the previous one was not sealed as the last
+    truncated = sealed[:-(4096 % 1024 or 1024) - 16]
+
+    with pytest.raises(ValueError):
+        b"".join(EncryptionService.decrypt_stream(io.BytesIO(truncated)))
+
+
+def test_encrypt_file_streams_and_legacy_files_still_decrypt(tmp_path):
+    source = tmp_path / "contract.pdf"
+    source.write_bytes(b"%PDF-1.4" + b"0123456789" * 20000)
+    original = source.read_bytes()
+
+    encrypted_path = asyncio.run(EncryptionService.encrypt_file(str(source)))
+
+    assert not source.exists()
+    assert EncryptionService.is_stream_encrypted(encrypted_path)
+    assert b"".join(EncryptionService.iter_decrypted_file(encrypted_path)) == original
+
+    legacy = tmp_path / "legacy.docx.encrypted"
+    legacy.write_bytes(Fernet(EncryptionService.get_encryption_key()).encrypt(b"legacy"))
+    assert b"".join(EncryptionService.iter_decrypted_file(str(legacy))) == b"legacy"
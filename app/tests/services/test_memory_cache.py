@@ -0,0 +1,93 @@
+"""
+Tests for the L1 LRU/TTL cache and the shared-memory tier
+"""
+
+import time
+
+import pytest
+
+from app.services.memory_cache import NamespacedLRUCache, SharedMemoryTier
+
+
+@pytest.fixture
+def l1():
+    return NamespacedLRUCache(default_budget_bytes=100, namespace_budgets={"template": 300}, default_ttl=60)
+
+
+def test_lru_evicts_least_recently_used(l1):
+    """Inserts beyond the byte budget evict from the LRU end"""
+    l1.set("a", 1, "api", size=40)
+    l1.set("b", 2, "api", size=40)
+    assert l1.get("a", "api") == 1  # "a" becomes most recently used
+
+    l1.set("c", 3, "api", size=40)
+
+    assert l1.get("b", "api") is None
+    assert l1.get("a", "api") == 1
+    assert l1.get("c", "api") == 3
+    assert l1.stats()["api"]["evictions"] == 1
+    assert l1.stats()["api"]["bytes"] == 80
+
+
+def test_namespace_budgets_are_independent(l1):
+    """Filling one namespace never evicts another"""
+    l1.set("t1", "template", "template", size=250)
+    for i in range(10):
+        l1.set(f"k{i}", i, "api", size=30)
+
+    assert l1.get("t1", "template") == "template"
+    assert l1.stats()["template"]["budget_bytes"] == 300
+    assert l1.stats()["api"]["bytes"] <= 100
+
+
+def test_ttl_expiry_counts_as_miss(l1):
+    """Expired entries are removed on access"""
+    l1.set("a", 1, "api", size=10, ttl=1)
+    l1._segments["api"].entries["a"] = (1, time.time() - 1, 10)
+
+    assert l1.get("a", "api") is None
+    stats = l1.stats()["api"]
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 0
+
+
+def test_oversized_entries_are_rejected(l1):
+    """Values larger than the namespace budget are not kept in memory"""
+    l1.set("a", "old", "api", size=10)
+    assert l1.set("a", "new", "api", size=500) is False
+    assert l1.get("a", "api") is None
+
+
+def test_replacing_key_updates_size_accounting(l1):
+    l1.set("a", 1, "api", size=60)
+    l1.set("a", 2, "api", size=20)
+
+    assert l1.get("a", "api") == 2
+    assert l1.stats()["api"]["bytes"] == 20
+    assert len(l1) == 1
+
+
+def test_shared_tier_round_trip(tmp_path):
+    """Entries written by one tier instance are visible to another"""
+    writer = SharedMemoryTier(str(tmp_path), namespaces=["template"])
+    reader = SharedMemoryTier(str(tmp_path), namespaces=["template"])
+
+    assert writer.set("mytypist:template:1", b"payload", ttl=60)
+    assert reader.get("mytypist:template:1") == b"payload"
+    assert reader.accepts("template") and not reader.accepts("api")
+
+    assert reader.delete("mytypist:template:1")
+    assert writer.get("mytypist:template:1") is None
+
+
+def test_shared_tier_sweep_enforces_budget(tmp_path):
+    tier = SharedMemoryTier(str(tmp_path), max_bytes=100)
+    tier.set("expired", b"x", ttl=-1)
+    for i in range(5):
+        tier.set(f"k{i}", b"y" * 30, ttl=60)
+
+    result = tier.sweep()
+
+    assert result["bytes"] <= 100
+    assert tier.get("expired") is None
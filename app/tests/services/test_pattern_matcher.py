@@ -0,0 +1,63 @@
+"""
+Tests for the shared multi-pattern matcher used by request screening
+"""
+
+import re
+from types import SimpleNamespace
+
+from app.middleware.security import SecurityMiddleware
+from app.services.document_service import DocumentService
+from app.utils.pattern_matcher import (
+    MultiPatternMatcher, PLACEHOLDER_INJECTION, REQUEST_INJECTION, get_pattern_stats
+)
+
+
+def _request(path, query="", user_agent="Mozilla/5.0"):
+    return SimpleNamespace(
+        url=SimpleNamespace(path=path, query=query),
+        headers={"user-agent": user_agent}
+    )
+
+
+def test_one_pass_reports_rule_and_counts_hits():
+    matcher = MultiPatternMatcher("test_rules", {"dots": "../", "pipe": "|"}, literal=True)
+
+    assert matcher.search("/a/b", "x=1") is None
+    assert matcher.search("/files/../etc", "") == "dots"
+    assert matcher.search("/ok", "cmd=a|b") == "pipe"
+    # Dropping the pipes exposes "../", which the next pass removes
+    assert matcher.sub(".|./|") == ""
+
+    assert matcher.stats() == {"dots": 2, "pipe": 3}
+    assert get_pattern_stats(["test_rules"]) == {"test_rules": {"dots": 2, "pipe": 3}}
+
+
+def test_security_middleware_screens_url_path_and_agent():
+    middleware = SecurityMiddleware.__new__(SecurityMiddleware)
+
+    assert not middleware._detect_suspicious_patterns(_request("/api/templates", "q=lease&page=2"))
+    assert middleware._detect_suspicious_patterns(_request("/api/x", "q=1 UNION SELECT password"))
+    assert middleware._detect_suspicious_patterns(_request("/static/..%2Fconfig.py"))
+    assert middleware._detect_suspicious_patterns(_request("/", user_agent="sqlmap/1.7"))
+    # Traversal markers only count in the path
+    assert not middleware._detect_suspicious_patterns(_request("/login", "next=../home"))
+
+
+def test_placeholder_sanitizer_matches_sequential_patterns():
+    legacy = [
+        r'<script[^>]*>.*?</script>', r'javascript:', r'vbscript:', r'on\w+\s*=', r'eval\s*\(',
+        r'exec\s*\(', r'system\s*\(', r'import\s+\w+', r'__\w+__', r'\.\./', r'\\\\',
+    ]
+    samples = [
+        "Jane Doe", "JavaScript:alert(1)", "onClick = go()", "eval (x) and exec(y)",
+        "__init__ ../../etc", "import os; system('ls')", "C:\\\\share", "O'Brien & Sons",
+    ]
+    for sample in samples:
+        expected = sample
+        for pattern in legacy:
+            expected = re.sub(pattern, '', expected, flags=re.IGNORECASE)
+        assert PLACEHOLDER_INJECTION.sub(sample) == expected
+
+    # Removing one marker cannot assemble another
+    assert "javascript:" not in DocumentService._sanitize_placeholder_value("javajavascript:script:x")
+    assert REQUEST_INJECTION.search("/api/run", "a=1;rm") == "command_injection"
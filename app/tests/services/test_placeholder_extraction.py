@@ -0,0 +1,85 @@
+"""
+Tests for single-pass placeholder extraction over WordprocessingML parts
+"""
+
+import zipfile
+
+from app.services.ooxml_text_scanner import iter_paragraphs
+from app.services.user_template_upload_service import UserTemplateUploadService
+
+_NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+)
+
+
+def _runs(*texts):
+    return "".join(f'<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>' for text in texts)
+
+
+def _docx(path):
+    textbox = (
+        '<w:p>' + _runs("See box") +
+        '<w:r><mc:AlternateContent>'
+        '<mc:Choice><w:drawing><w:txbxContent><w:p>' + _runs("{{company}}") + '</w:p></w:txbxContent></w:drawing></mc:Choice>'
+        '<mc:Fallback><w:pict><w:txbxContent><w:p>' + _runs("{{company}}") + '</w:p></w:txbxContent></w:pict></mc:Fallback>'
+        '</mc:AlternateContent></w:r></w:p>'
+    )
+    body = (
+        f'<w:document {_NS}><w:body>'
+        '<w:p>' + _runs("Dear ${first", "_na", "me}, welcome") + '</w:p>'
+        '<w:tbl><w:tr><w:tc><w:p>' + _runs("Date:", " _______") + '</w:p></w:tc></w:tr></w:tbl>'
+        '<w:p>' + _runs("[Please enter your phone number here]") + '</w:p>'
+        + textbox +
+        '</w:body></w:document>'
+    )
+    header = f'<w:hdr {_NS}><w:p>' + _runs("Ref _INVOICE_NO_ and ${first_name}") + '</w:p></w:hdr>'
+
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", body)
+        archive.writestr("word/header1.xml", header)
+    return str(path)
+
+
+def test_paragraphs_stream_with_run_map_and_context(tmp_path):
+    progress = []
+    paragraphs = list(iter_paragraphs(_docx(tmp_path / "t.docx"), progress.append))
+
+    texts = [paragraph.text for paragraph in paragraphs]
+    # The fallback copy of the text box is skipped; the box precedes its anchor
+    assert texts.count("{{company}}") == 1
+    assert texts.index("{{company}}") < texts.index("See box")
+    assert paragraphs[0].runs_for(5, 19) == (0, 2)
+    assert paragraphs[1].in_table and not paragraphs[0].in_table
+    assert next(p for p in paragraphs if p.text == "{{company}}").in_textbox
+
+    assert progress[-1]["parts_done"] == progress[-1]["parts_total"] == 2
+    assert [update["part_done"] for update in progress] == [True, True]
+    assert progress[-1]["bytes_read"] == progress[-1]["bytes_total"]
+
+
+def test_single_scan_finds_split_placeholders_with_locations(tmp_path):
+    raw, length = UserTemplateUploadService._scan_document(_docx(tmp_path / "t.docx"))
+    placeholders = {p["name"]: p for p in UserTemplateUploadService._process_placeholders(raw)}
+
+    assert set(placeholders) == {"first_name", "date", "phone", "company", "invoice_no"}
+    assert length > 0
+
+    first_name = placeholders["first_name"]
+    assert first_name["original_text"] == "${first_name}"
+    assert [location["part"] for location in first_name["locations"]] == ["word/document.xml", "word/header1.xml"]
+    assert first_name["locations"][0]["runs"] == [0, 2]
+    assert first_name["locations"][0]["split_across_runs"]
+
+    assert placeholders["date"]["extraction_method"] == "keyword"
+    assert placeholders["date"]["locations"][0]["in_table"]
+    assert placeholders["phone"]["extraction_method"] == "instruction"
+    assert placeholders["company"]["locations"][0]["in_textbox"]
+
+
+def test_double_bracket_placeholder_is_not_taken_for_an_instruction():
+    text = "Dear [[customer_full_name]], [Please enter the delivery date]"
+    matches = [match.lastgroup for match in UserTemplateUploadService.SCAN_PATTERN.finditer(text)]
+
+    assert matches == ["double_bracket", "instruction"]
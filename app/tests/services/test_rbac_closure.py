@@ -0,0 +1,107 @@
+"""
+Tests for the RBAC role closure and compiled permission cache
+"""
+
+import time
+from types import MappingProxyType
+
+from app.services import rbac_service
+from app.services.rbac_service import CompiledPermissions, PermissionGrant, RBACService
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class _FakeSession:
+    """Records closure writes for a fixed role_hierarchy"""
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.inserted = []
+
+    def query(self, *columns):
+        return _Rows(self.edges)
+
+    def execute(self, statement, rows=None):
+        if rows:
+            self.inserted = rows
+
+
+def _compiled(user_id, version, *actions):
+    grant = PermissionGrant(1, "template:read", "Read", "template", "read", "global", None)
+    return CompiledPermissions(
+        user_id=user_id,
+        version=version,
+        role_ids=frozenset({1}),
+        actions=frozenset(actions),
+        grants=MappingProxyType({action: (grant,) for action in actions}),
+        valid_until=time.time() + 60
+    )
+
+
+def test_closure_records_shortest_depth_and_survives_cycles():
+    # (parent, child): admin(1) -> moderator(2) -> user(3), plus a direct 1 -> 3 and a 3 -> 1 cycle
+    db = _FakeSession([(1, 2), (2, 3), (1, 3), (3, 1)])
+
+    RBACService.rebuild_role_closure(db)
+
+    closure = {(row["role_id"], row["ancestor_role_id"]): row["depth"] for row in db.inserted}
+    assert closure[(3, 1)] == 1
+    assert closure[(3, 2)] == 1
+    assert closure[(2, 1)] == 1
+    assert closure[(2, 3)] == 2
+    assert (3, 3) not in closure
+
+
+def test_compiled_permissions_reused_until_version_changes(monkeypatch):
+    version = [(5, 0)]
+    compiles = []
+
+    def compile_permissions(db, user_id, current):
+        compiles.append(current)
+        return _compiled(user_id, current, ("template", "read"))
+
+    monkeypatch.setattr(rbac_service.rbac_version, "current", lambda: version[0])
+    monkeypatch.setattr(RBACService, "_compile_permissions", staticmethod(compile_permissions))
+    rbac_service._permission_cache.clear()
+
+    assert RBACService.check_permission(None, 42, "template", "read")
+    assert RBACService.check_permission(None, 42, "template", "read")
+    assert not RBACService.check_permission(None, 42, "template", "delete")
+    assert len(compiles) == 1
+
+    version[0] = (6, 0)
+    assert RBACService.check_permission(None, 42, "template", "read")
+    assert len(compiles) == 2
+
+
+def test_empty_closure_is_rebuilt_before_permissions_are_compiled(monkeypatch):
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.orm import sessionmaker
+
+    engine = create_engine("sqlite://")
+    rbac_service.RBACRole.__table__.create(engine)
+    rbac_service.role_hierarchy.create(engine)
+    rbac_service.role_closure.create(engine)
+    db = sessionmaker(bind=engine)()
+    db.execute(rbac_service.role_hierarchy.insert(), [
+        {"parent_role_id": 1, "child_role_id": 2},
+        {"parent_role_id": 2, "child_role_id": 3},
+    ])
+    db.commit()
+
+    monkeypatch.setattr(rbac_service, "_closure_verified", False)
+    monkeypatch.setattr(rbac_service.rbac_version, "bump", lambda: None)
+
+    RBACService.ensure_role_closure(db)
+
+    closure = set(db.execute(select(
+        rbac_service.role_closure.c.role_id, rbac_service.role_closure.c.ancestor_role_id
+    )).all())
+    assert closure == {(2, 1), (3, 2), (3, 1)}
+    assert rbac_service._closure_verified
@@ -0,0 +1,200 @@
+"""
+Tests for Redis-backed realtime drafts and the write-behind journal
+"""
+
+import time
+import asyncio
+
+from app.services.realtime_drafts_service import RealtimeDraftsManager, ValidationResult
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        results = []
+        for name, args, kwargs in self.calls:
+            results.append(await getattr(self.redis, name)(*args, **kwargs))
+        self.calls = []
+        return results
+
+
+class _FakeRedis:
+    """Just enough of redis.asyncio for drafts: hashes and the journal sorted set"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zset = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        target = self.hashes.setdefault(key, {})
+        if field is not None:
+            target[field] = str(value)
+        target.update({name: str(item) for name, item in (mapping or {}).items()})
+
+    async def hdel(self, key, *fields):
+        for name in fields:
+            self.hashes.get(key, {}).pop(name, None)
+
+    async def hmget(self, key, *fields):
+        return [self.hashes.get(key, {}).get(name) for name in fields]
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def delete(self, key):
+        self.hashes.pop(key, None)
+
+    async def zadd(self, key, mapping, nx=False, lt=False):
+        for member, score in mapping.items():
+            if member in self.zset and (nx or (lt and score >= self.zset[member])):
+                continue
+            self.zset[member] = score
+
+    async def zrem(self, key, member):
+        self.zset.pop(member, None)
+
+    def register_script(self, script):
+        async def claim(keys, args):
+            cutoff, limit = args
+            due = sorted((score, member) for member, score in self.zset.items() if score <= cutoff)
+            ids = [member for _, member in due[:limit]]
+            for member in ids:
+                del self.zset[member]
+            return ids
+        return claim
+
+
+def _manager(monkeypatch):
+    manager = RealtimeDraftsManager(redis_client=_FakeRedis())
+
+    async def valid(field_name, field_value, template_id, db):
+        return ValidationResult(field_name=field_name, is_valid=True)
+
+    monkeypatch.setattr(manager, "_validate_field", valid)
+    return manager
+
+
+def test_state_is_shared_between_manager_instances(monkeypatch):
+    manager = _manager(monkeypatch)
+    other_worker = RealtimeDraftsManager(redis_client=manager.redis)
+
+    async def scenario():
+        draft_id = await manager.create_draft(template_id=3, user_id=7, initial_data={"name": "ada"})
+        await manager.update_draft_field(draft_id, "city", "Lagos", db=None)
+        return draft_id, await other_worker.get_draft_state(draft_id)
+
+    draft_id, state = asyncio.run(scenario())
+
+    assert state["form_data"] == {"name": "ada", "city": "Lagos"}
+    assert state["validation_results"]["city"]["is_valid"] is True
+    assert state["pre_processing_complete"] == 1
+
+
+def test_journal_coalesces_edits_into_one_batched_write(monkeypatch):
+    manager = _manager(monkeypatch)
+    written = []
+    monkeypatch.setattr(manager.journal, "_write_batch", lambda drafts: written.append(drafts) or {})
+
+    async def scenario():
+        first = await manager.create_draft(template_id=3, user_id=7, document_draft_id=11)
+        second = await manager.create_draft(template_id=3, user_id=8, document_draft_id=12)
+        for text in ("A", "Ad", "Ada"):
+            await manager.update_draft_field(first, "name", text, db=None)
+        await manager.update_draft_field(second, "name", "Bo", db=None)
+
+        # Nothing is due inside the coalescing window
+        assert await manager.journal.flush(cutoff=0) == 0
+        return await manager.journal.flush(cutoff=float("inf"))
+
+    flushed = asyncio.run(scenario())
+
+    assert flushed == 2 and len(written) == 1
+    by_row = {draft.document_draft_id: draft.form_data for draft in written[0]}
+    assert by_row == {11: {"name": "Ada"}, 12: {"name": "Bo"}}
+    assert manager.redis.zset == {}
+
+
+def test_failed_flush_returns_drafts_to_the_journal(monkeypatch):
+    manager = _manager(monkeypatch)
+
+    def broken(drafts):
+        raise ConnectionError("database unavailable")
+
+    monkeypatch.setattr(manager.journal, "_write_batch", broken)
+
+    async def scenario():
+        draft_id = await manager.create_draft(template_id=3, user_id=7, initial_data={"name": "ada"})
+        try:
+            await manager.journal.flush(cutoff=float("inf"))
+        except ConnectionError:
+            pass
+        return draft_id
+
+    draft_id = asyncio.run(scenario())
+
+    assert draft_id in manager.redis.zset
+
+
+def _slow_write(written, document_draft_id=42):
+    def write_batch(drafts):
+        time.sleep(0.1)
+        written.append(drafts)
+        return {draft.draft_id: document_draft_id for draft in drafts}
+    return write_batch
+
+
+def test_cancelled_flush_still_records_created_rows(monkeypatch):
+    manager = _manager(monkeypatch)
+    written = []
+    monkeypatch.setattr(manager.journal, "_write_batch", _slow_write(written))
+
+    async def scenario():
+        draft_id = await manager.create_draft(template_id=3, user_id=7, initial_data={"name": "ada"})
+        flush = asyncio.ensure_future(manager.journal.flush(cutoff=float("inf")))
+        await asyncio.sleep(0.02)
+        flush.cancel()
+        try:
+            await flush
+        except asyncio.CancelledError:
+            pass
+        return draft_id
+
+    draft_id = asyncio.run(scenario())
+
+    assert len(written) == 1
+    # The next flush updates the row instead of creating a duplicate
+    assert manager.redis.hashes[f"draft:{draft_id}"]["document_draft_id"] == "42"
+
+
+def test_stop_waits_for_the_batch_in_flight(monkeypatch):
+    manager = _manager(monkeypatch)
+    written = []
+    monkeypatch.setattr(manager.journal, "_write_batch", _slow_write(written))
+    manager.journal.flush_interval = 0
+
+    async def scenario():
+        draft_id = await manager.create_draft(template_id=3, user_id=7, initial_data={"name": "ada"})
+        manager.start()
+        await asyncio.sleep(0.02)
+        await manager.stop()
+        return draft_id
+
+    draft_id = asyncio.run(scenario())
+
+    assert [[draft.draft_id for draft in batch] for batch in written] == [[draft_id]]
+    assert manager.redis.hashes[f"draft:{draft_id}"]["document_draft_id"] == "42"
+    assert manager.redis.zset == {}
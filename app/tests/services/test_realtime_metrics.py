@@ -0,0 +1,115 @@
+"""
+Tests for the pre-aggregated realtime dashboard metrics
+"""
+
+import time
+from datetime import datetime
+
+from app.models.analytics.visit import DocumentVisit, PageVisit
+from app.services.realtime_metrics import RealtimeMetrics
+
+
+class _FakePipeline:
+    """Just enough of a Redis pipeline for the metrics summaries"""
+
+    def __init__(self, store):
+        self.store = store
+        self.results = []
+
+    def pfadd(self, key, value):
+        self.store.setdefault(key, set()).add(value)
+        self.results.append(1)
+
+    def incrby(self, key, value):
+        self.store[key] = int(self.store.get(key, 0)) + value
+        self.results.append(self.store[key])
+
+    def incrbyfloat(self, key, value):
+        self.store[key] = float(self.store.get(key, 0)) + value
+        self.results.append(self.store[key])
+
+    def expire(self, key, ttl):
+        self.results.append(True)
+
+    def set(self, key, value, ex=None, nx=False):
+        if not (nx and key in self.store):
+            self.store[key] = value
+        self.results.append(True)
+
+    def pfcount(self, *keys):
+        self.results.append(len(set().union(*(self.store.get(key, set()) for key in keys))))
+
+    def mget(self, keys):
+        self.results.append([None if self.store.get(key) is None else str(self.store[key]) for key in keys])
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def pipeline(self, transaction=False):
+        return _FakePipeline(self.store)
+
+
+def test_snapshot_counts_unique_visitors_and_bounces():
+    metrics = RealtimeMetrics(redis_client=_FakeRedis())
+    now = datetime.utcnow()
+    metrics.seed_day(pages=0, engaged=0, revenue=0.0, now=now)
+
+    ops = []
+    for fingerprint, bounce in [("a", True), ("b", False), ("a", True)]:
+        ops += metrics.page_visit_ops(PageVisit(device_fingerprint=fingerprint, bounce=bounce, created_at=now))
+    ops += metrics.document_visit_ops(DocumentVisit(device_fingerprint="c", visit_type="edit"))
+    metrics.apply(ops)
+
+    stats = metrics.snapshot(now)
+
+    assert stats["active_users_now"] == 3
+    assert stats["active_documents"] == 1
+    assert stats["bounce_rate_today"] == round(2 / 3 * 100, 2)
+
+
+def test_snapshot_is_empty_until_the_day_is_seeded():
+    metrics = RealtimeMetrics(redis_client=_FakeRedis())
+
+    assert metrics.snapshot() is None
+
+    metrics.seed_day(pages=10, engaged=4, revenue=2500.0)
+    stats = metrics.snapshot()
+
+    assert stats["revenue_today"] == 2500.0
+    assert stats["bounce_rate_today"] == 60.0
+
+
+def test_counters_bumped_before_seeding_are_replaced_by_database_totals():
+    metrics = RealtimeMetrics(redis_client=_FakeRedis())
+    now = datetime.utcnow()
+
+    # A visit lands before the first dashboard read of the day
+    metrics.apply(metrics.page_visit_ops(PageVisit(bounce=True, created_at=now)))
+    assert metrics.snapshot(now) is None
+
+    # The database totals already include that visit
+    metrics.seed_day(pages=11, engaged=4, revenue=300.0, now=now)
+    metrics.apply(metrics.page_visit_ops(PageVisit(bounce=False, created_at=now)))
+    stats = metrics.snapshot(now)
+
+    assert stats["revenue_today"] == 300.0
+    assert stats["bounce_rate_today"] == round((12 - 5) / 12 * 100, 2)
+
+
+def test_committed_updates_are_sent_off_the_calling_thread():
+    redis_client = _FakeRedis()
+    metrics = RealtimeMetrics(redis_client=redis_client)
+    now = datetime.utcnow()
+
+    metrics.submit(metrics.page_visit_ops(PageVisit(bounce=False, created_at=now)))
+
+    deadline = time.time() + 2
+    while metrics.day_key("engaged", now) not in redis_client.store and time.time() < deadline:
+        time.sleep(0.01)
+    assert redis_client.store[metrics.day_key("pages", now)] == 1
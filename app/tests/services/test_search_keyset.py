@@ -0,0 +1,44 @@
+"""
+Tests for keyset paging of relevance-ranked search results
+"""
+
+from sqlalchemy import Column, Float, Integer, create_engine, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.services.advanced_search_service import AdvancedSearchService
+
+_Base = declarative_base()
+
+
+class _Ranked(_Base):
+    __tablename__ = "ranked"
+
+    id = Column(Integer, primary_key=True)
+    score = Column(Float)
+
+
+def test_rank_is_compared_as_double_precision():
+    rank = AdvancedSearchService._rank_key(func.ts_rank(func.to_tsvector("a"), func.to_tsquery("a")))
+
+    sql = str(rank.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("CAST(ts_rank(") and sql.endswith("AS FLOAT(53))")
+
+
+def test_tied_ranks_page_without_gaps_or_repeats():
+    engine = create_engine("sqlite://")
+    _Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    # float4 ts_rank values such as 0.0607927 tie across many rows
+    db.add_all(_Ranked(id=n, score=0.0607927 if n % 3 else 0.1) for n in range(1, 12))
+    db.commit()
+
+    rank = AdvancedSearchService._rank_key(_Ranked.score)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = AdvancedSearchService._keyset_page(db, _Ranked, [], [rank], True, cursor, 1, 2)
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+
+    assert seen == [9, 6, 3, 11, 10, 8, 7, 5, 4, 2, 1]
@@ -0,0 +1,83 @@
+"""
+Tests for the OpenCV signature processing pipeline
+"""
+
+import asyncio
+import base64
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.services import signature_service
+from app.services.signature_service import SignatureProcessingOptions, SignatureService
+
+
+def _canvas(width=400, height=200):
+    """White canvas with a dark stroke, as a PNG data URL"""
+    image = np.full((height, width, 3), 255, np.uint8)
+    cv2.line(image, (100, 80), (300, 120), (20, 20, 20), 6)
+    ok, png = cv2.imencode(".png", image)
+    return "data:image/png;base64," + base64.b64encode(png).decode()
+
+
+def _decode(data_url):
+    png = base64.b64decode(data_url.split(",", 1)[1])
+    return png, cv2.imdecode(np.frombuffer(png, np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def test_canvas_is_cropped_transparent_and_tagged_with_dpi():
+    result = SignatureService.process_canvas_signature(_canvas())
+
+    assert result["success"]
+    assert result["original_size"] == {"width": 400, "height": 200}
+
+    png, image = _decode(result["signature_data"])
+    assert image.shape[2] == 4
+    # Cropped to the stroke plus padding, with the white background removed
+    assert result["processed_size"] == {"width": image.shape[1], "height": image.shape[0]}
+    assert image.shape[1] < 400 and image.shape[0] < 200
+    assert image[0, 0, 3] == 0
+    assert image[..., 3].max() == 255
+    assert 0 < result["metadata"]["density"] < 1
+
+    # pHYs chunk right after IHDR: 300 dpi in pixels per metre
+    assert png[37:41] == b"pHYs"
+    assert struct.unpack("!IIB", png[41:50]) == (11811, 11811, 1)
+
+
+def test_oversized_signature_is_scaled_within_limits():
+    options = SignatureProcessingOptions()
+    options.auto_crop = False
+    options.max_width = 200
+
+    result = SignatureService.process_canvas_signature(_canvas(800, 400), options)
+
+    assert result["processed_size"] == {"width": 200, "height": 100}
+
+
+def test_batch_keeps_input_order_and_reports_bad_items(monkeypatch):
+    pool = signature_service.SignatureWorkerPool(max_workers=2)
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(pool, "_get_executor", lambda: executor)
+    monkeypatch.setattr(signature_service, "signature_pool", pool)
+
+    jobs = [(_canvas(), None), ("not-an-image", None), (_canvas(600, 300), None)]
+    results = asyncio.run(SignatureService.process_canvas_signatures_async(jobs))
+
+    assert [result["success"] for result in results] == [True, False, True]
+    assert results[2]["original_size"] == {"width": 600, "height": 300}
+
+
+def test_uploaded_image_runs_the_same_pipeline_on_the_pool(monkeypatch):
+    pool = signature_service.SignatureWorkerPool(max_workers=1)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pool, "_get_executor", lambda: executor)
+    monkeypatch.setattr(signature_service, "signature_pool", pool)
+
+    png, _ = _decode(_canvas())
+    result = asyncio.run(SignatureService.process_uploaded_signature_async(png))
+
+    assert result["success"] and result["original_size"] == {"width": 400, "height": 200}
+    assert result["signature_data"].startswith("data:image/png;base64,")
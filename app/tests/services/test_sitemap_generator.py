@@ -0,0 +1,66 @@
+"""
+Tests for incremental sharded sitemap generation
+"""
+
+import gzip
+import os
+from datetime import datetime
+
+from app.models.document import Document
+from app.services.sitemap_generator import SitemapGenerator
+
+
+def _generator(tmp_path, rows):
+    """Generator whose public documents come from `rows` ({id: updated_at}); no templates"""
+    generator = SitemapGenerator(output_dir=str(tmp_path), shard_size=2)
+
+    def watermarks(db, model):
+        if model is not Document:
+            return []
+        buckets = {}
+        for row_id, updated_at in rows.items():
+            count, newest = buckets.get(row_id // 2, (0, None))
+            buckets[row_id // 2] = (count + 1, max(filter(None, [newest, updated_at])))
+        return [(bucket, count, newest) for bucket, (count, newest) in sorted(buckets.items())]
+
+    def shard_rows(db, model, bucket):
+        return [(row_id, rows[row_id]) for row_id in sorted(rows) if row_id // 2 == bucket]
+
+    generator._shard_watermarks = watermarks
+    generator._shard_rows = shard_rows
+    return generator
+
+
+def test_only_changed_shards_are_rewritten(tmp_path):
+    rows = {1: datetime(2025, 1, 1), 2: datetime(2025, 1, 2), 3: datetime(2025, 1, 3)}
+    generator = _generator(tmp_path, rows)
+
+    index_path = generator.generate_sitemap(None, force=True)
+
+    index = open(index_path).read()
+    assert "/sitemaps/sitemap-documents-0.xml.gz" in index
+    assert "/sitemaps/sitemap-documents-1.xml.gz" in index
+    shard_1 = tmp_path / "sitemap-documents-1.xml.gz"
+    assert "/document/2</loc>" in gzip.decompress(shard_1.read_bytes()).decode()
+
+    os.utime(tmp_path / "sitemap-documents-0.xml.gz", (0, 0))
+    os.utime(shard_1, (0, 0))
+    rows[3] = datetime(2025, 2, 1)
+
+    generator.generate_sitemap(None, force=True)
+
+    assert os.path.getmtime(tmp_path / "sitemap-documents-0.xml.gz") == 0
+    assert os.path.getmtime(shard_1) != 0
+
+
+def test_emptied_shards_are_removed(tmp_path):
+    rows = {1: datetime(2025, 1, 1), 4: datetime(2025, 1, 4)}
+    generator = _generator(tmp_path, rows)
+    generator.generate_sitemap(None, force=True)
+
+    del rows[4]
+    generator.generate_sitemap(None, force=True)
+
+    assert not (tmp_path / "sitemap-documents-2.xml.gz").exists()
+    assert "sitemap-documents-2" not in open(generator.index_path).read()
+    assert generator.shard_path("../manifest.json") is None
@@ -0,0 +1,131 @@
+"""
+Tests for compiled template render plans
+"""
+
+import io
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.template_render_service import (
+    PlaceholderSlot, RenderPlanCache, compile_render_plan, render_plan
+)
+
+
+DOCUMENT_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:body>'
+    '<w:p><w:r><w:rPr><w:sz w:val="24"/></w:rPr><w:t>Dear ${cli</w:t></w:r>'
+    '<w:r><w:t>ent_name}, dated ${date} &amp; ${unknown}</w:t></w:r></w:p>'
+    '</w:body></w:document>'
+)
+
+
+def make_placeholder(name, **overrides):
+    values = dict(name=name, placeholder_type="text", casing="none", default_value=None,
+                  bold=False, italic=False, underline=False)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture
+def template_file(tmp_path):
+    """Write a minimal .docx package with a run-split placeholder"""
+    path = tmp_path / "template.docx"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr("word/document.xml", DOCUMENT_XML)
+        archive.writestr("word/media/logo.png", b"\x89PNG")
+    return str(path)
+
+
+@pytest.fixture
+def template():
+    return SimpleNamespace(id=7, file_hash="abc123", updated_at=None)
+
+
+def render_document_xml(plan, values):
+    output = io.BytesIO()
+    render_plan(plan, values, output)
+    with zipfile.ZipFile(output) as archive:
+        return archive.read("word/document.xml").decode("utf-8")
+
+
+def test_compile_locates_split_placeholders(template, template_file):
+    """Placeholders split across runs are compiled into single slots"""
+    plan = compile_render_plan(
+        template, template_file, [make_placeholder("client_name"), make_placeholder("date")]
+    )
+
+    assert plan.slot_count == 2
+    assert set(plan.occurrences()) == {"client_name", "date"}
+    assert all(isinstance(s, (str, PlaceholderSlot)) for s in plan.parts["word/document.xml"])
+
+
+def test_render_splices_values(template, template_file):
+    """Rendering splices values and leaves unknown placeholders untouched"""
+    plan = compile_render_plan(
+        template, template_file, [make_placeholder("client_name"), make_placeholder("date")]
+    )
+
+    xml = render_document_xml(plan, {"client_name": "Ada", "date": "May 1, 2025"})
+
+    assert "Dear Ada, dated May 1, 2025 &amp; ${unknown}" in xml.replace(
+        '</w:t></w:r><w:r><w:t xml:space="preserve">', ''
+    )
+    assert "${cli" not in xml
+
+
+def test_render_keeps_other_members(template, template_file):
+    """Non-XML members are copied through unchanged"""
+    plan = compile_render_plan(template, template_file, [make_placeholder("date")])
+
+    output = io.BytesIO()
+    render_plan(plan, {"date": "today"}, output)
+    with zipfile.ZipFile(output) as archive:
+        assert archive.read("word/media/logo.png") == b"\x89PNG"
+
+
+def test_styled_placeholder_gets_own_run(template, template_file):
+    """Bold placeholders are wrapped in a run with merged run properties"""
+    plan = compile_render_plan(
+        template, template_file, [make_placeholder("client_name", bold=True)]
+    )
+
+    xml = render_document_xml(plan, {"client_name": "Ada"})
+
+    assert '<w:rPr><w:b/><w:bCs/><w:sz w:val="24"/></w:rPr><w:t xml:space="preserve">Ada</w:t>' in xml
+
+
+def test_plan_cache_reuses_and_invalidates(template, template_file):
+    """Plans are compiled once per template version and dropped on invalidate"""
+    cache = RenderPlanCache(max_entries=2)
+    loads = []
+
+    def load_placeholders():
+        loads.append(1)
+        return [make_placeholder("date")]
+
+    first = cache.get_or_compile(template, template_file, load_placeholders)
+    second = cache.get_or_compile(template, template_file, load_placeholders)
+
+    assert first is second
+    assert len(loads) == 1
+
+    assert cache.invalidate(template.id) == 1
+    cache.get_or_compile(template, template_file, load_placeholders)
+    assert len(loads) == 2
+
+
+def test_plan_cache_recompiles_on_new_file_hash(template, template_file):
+    """A changed file hash replaces the superseded plan"""
+    cache = RenderPlanCache(max_entries=4)
+    cache.get_or_compile(template, template_file, lambda: [make_placeholder("date")])
+
+    template.file_hash = "def456"
+    cache.get_or_compile(template, template_file, lambda: [make_placeholder("date")])
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["compilations"] == 2
@@ -0,0 +1,61 @@
+"""
+Tests for the pooled, content-addressed thumbnail engine
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app.routes.documents import _etag_matches
+from app.services.thumbnail_service import ThumbnailService, thumbnail_key
+
+_thread_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def _service(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.thumbnail_service.settings.THUMBNAILS_PATH", str(tmp_path / "thumbs"))
+    service = ThumbnailService(max_workers=1)
+    # Threads keep the test independent of process start-up
+    monkeypatch.setattr(service._pool, "_get_executor", lambda: _thread_pool)
+    return service
+
+
+def test_one_decode_writes_every_size_and_format(tmp_path, monkeypatch):
+    service = _service(tmp_path, monkeypatch)
+    source = tmp_path / "scan.png"
+    Image.new("RGB", (1200, 1600), "navy").save(source)
+
+    result = asyncio.run(service.generate_thumbnail(1, str(source), "png", content_hash="ab" * 32))
+
+    assert result["success"] and not result["cached"]
+    for width in service.widths:
+        for fmt in service.formats:
+            with Image.open(result["variants"][width][fmt]) as image:
+                assert image.size == (width, width * 4 // 3)
+
+    # A different document with the same content reuses the stored set
+    again = asyncio.run(service.generate_thumbnail(2, str(source), "png", content_hash="ab" * 32))
+    assert again["cached"] and again["variants"] == result["variants"]
+
+
+def test_unknown_hash_is_computed_in_the_worker(tmp_path, monkeypatch):
+    service = _service(tmp_path, monkeypatch)
+    source = tmp_path / "notes.txt"
+    source.write_text("quarterly notes " * 20)
+
+    result = asyncio.run(service.generate_thumbnail(3, str(source), "txt"))
+
+    assert len(result["content_hash"]) == 64
+    assert os.path.exists(service.variant_file(result["content_hash"], 300, "png"))
+
+
+def test_etag_matching():
+    etag = f'"{thumbnail_key("cd" * 32)}-300.webp"'
+
+    assert _etag_matches(etag, etag)
+    assert _etag_matches(f'"other", W/{etag}', etag)
+    assert _etag_matches("*", etag)
+    assert not _etag_matches('"other"', etag)
+    assert not _etag_matches(None, etag)
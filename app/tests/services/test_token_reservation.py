@@ -0,0 +1,74 @@
+"""
+Tests for atomic token reservations around paid generation
+"""
+
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.middleware import token_deduction
+from app.middleware.token_deduction import (
+    TemplateCost, TokenCostCache, commit_reservation, release_reservation, reserve_tokens
+)
+from app.models.token import TokenTransaction, TokenTransactionType, UserToken
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    UserToken.__table__.create(engine)
+    TokenTransaction.__table__.create(engine)
+
+    costs = TokenCostCache(ttl=3600)
+    costs._costs = {1: TemplateCost(True, 3), 2: TemplateCost(False, 3)}
+    costs._loaded_at = time.monotonic()
+    monkeypatch.setattr(token_deduction, "token_costs", costs)
+
+    session = sessionmaker(bind=engine)()
+    session.add(UserToken(user_id=7, document_tokens=5))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _balance(db):
+    db.expire_all()
+    return db.query(UserToken).one().document_tokens
+
+
+def test_reservation_takes_tokens_once_and_commit_settles_it(db):
+    reservation = reserve_tokens(db, 1, user_id=7)
+
+    assert reservation.amount == 3 and _balance(db) == 2
+    # The second reservation cannot overdraw the balance
+    with pytest.raises(HTTPException) as error:
+        reserve_tokens(db, 1, user_id=7)
+    assert error.value.status_code == 402
+
+    assert commit_reservation(db, reservation.transaction_id)
+    assert db.get(TokenTransaction, reservation.transaction_id).processed_at is not None
+    # A settled reservation can no longer be released
+    assert not release_reservation(db, reservation.transaction_id)
+    assert _balance(db) == 2
+
+
+def test_release_returns_tokens_exactly_once(db):
+    reservation = reserve_tokens(db, 1, user_id=7)
+
+    assert release_reservation(db, reservation.transaction_id, "render failed")
+    assert not release_reservation(db, reservation.transaction_id)
+
+    assert _balance(db) == 5
+    transaction = db.get(TokenTransaction, reservation.transaction_id)
+    assert transaction.transaction_type == TokenTransactionType.REFUNDED
+
+
+def test_free_templates_and_anonymous_users(db):
+    assert reserve_tokens(db, 2, user_id=7) is None
+    assert reserve_tokens(db, 2) is None
+    with pytest.raises(HTTPException):
+        reserve_tokens(db, 1)
+    assert _balance(db) == 5
@@ -0,0 +1,84 @@
+"""
+Tests for conditional-UPDATE wallet debits and the append-only ledger
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services import wallet_service
+from app.services.wallet_service import Wallet, WalletService, WalletTransaction
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    Wallet.__table__.create(engine)
+    WalletTransaction.__table__.create(engine)
+    events = []
+    monkeypatch.setattr(wallet_service.AuditService, "log_system_event",
+                        lambda event, details=None: events.append(event) or True)
+    session = sessionmaker(bind=engine)()
+    session.audit_events = events
+    yield session
+    session.close()
+
+
+def _wallet(db, user_id=1, balance=100.0, **fields):
+    db.add(Wallet(user_id=user_id, balance=balance, **fields))
+    db.commit()
+
+
+def test_debit_is_conditional_and_appends_a_ledger_entry(db):
+    _wallet(db)
+
+    spent = WalletService.deduct_funds(db, 1, 60.0, "Template purchase", related_template_id=9)
+    refused = WalletService.deduct_funds(db, 1, 60.0, "Template purchase")
+
+    assert spent["success"] and spent["new_balance"] == 40.0
+    assert refused == {"success": False, "error": "Insufficient balance"}
+
+    entries = db.query(WalletTransaction).all()
+    assert len(entries) == 1
+    assert (entries[0].balance_before, entries[0].balance_after, entries[0].related_template_id) == (100.0, 40.0, 9)
+    assert db.audit_events == ["WALLET_DEBIT"]
+
+
+def test_reference_makes_debits_idempotent(db):
+    _wallet(db)
+
+    first = WalletService.deduct_funds(db, 1, 30.0, "Edit", reference="DOC_EDIT_5")
+    again = WalletService.deduct_funds(db, 1, 30.0, "Edit", reference="DOC_EDIT_5")
+
+    assert again["replayed"] and again["transaction_id"] == first["transaction_id"]
+    assert db.query(Wallet).one().balance == 70.0
+    assert WalletService.deduct_funds(db, 2, 30.0, "Edit", reference="DOC_EDIT_5")["error"] == "Reference already used"
+
+
+def test_limits_are_enforced_in_the_update_and_reset_by_period(db):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    _wallet(db, daily_spend_limit=50.0, daily_spent=45.0, monthly_spent=45.0, last_reset_date=yesterday)
+
+    # Yesterday's spend no longer counts against today's limit
+    assert WalletService.deduct_funds(db, 1, 40.0, "a")["success"]
+    refused = WalletService.deduct_funds(db, 1, 20.0, "b")
+
+    assert refused["error"].startswith("Daily spending limit of 50.0")
+    assert WalletService.get_wallet_balance(db, 1)["daily_spent"] == 40.0
+
+
+def test_transfer_and_refund_move_balances_once(db):
+    _wallet(db, user_id=1)
+    _wallet(db, user_id=2, balance=0.0)
+
+    transfer = WalletService.transfer_funds(db, 1, 2, 25.0, "gift", reference="T1")
+    assert (transfer["sender_balance"], transfer["recipient_balance"]) == (75.0, 25.0)
+    assert WalletService.transfer_funds(db, 1, 2, 25.0, "gift", reference="T1")["replayed"]
+
+    debit = WalletService.deduct_funds(db, 1, 10.0, "doc")
+    refund = WalletService.refund_transaction(db, debit["transaction_id"], "failed")
+
+    assert refund["new_balance"] == 75.0
+    assert not WalletService.refund_transaction(db, debit["transaction_id"])["success"]
@@ -0,0 +1,50 @@
+"""
+Tests for the shared CPU worker pool
+"""
+
+import pytest
+
+from app.services.batch_generation_engine import BatchGenerationEngine
+from app.utils import worker_pool
+from app.utils.worker_pool import WorkerPool
+
+
+def _square(value):
+    if value < 0:
+        raise ValueError("negative")
+    return value * value
+
+
+def test_pool_inside_a_daemonic_worker_uses_billiard_processes(monkeypatch):
+    monkeypatch.setattr(worker_pool, "in_daemon_process", lambda: True)
+    pool = WorkerPool(2)
+
+    try:
+        futures = [pool.submit(_square, value) for value in range(4)]
+        assert [future.result(timeout=10) for future in futures] == [0, 1, 4, 9]
+        assert isinstance(pool._executor, worker_pool._BilliardExecutor)
+
+        with pytest.raises(ValueError, match="negative"):
+            pool.submit(_square, -1).result(timeout=10)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=False)
+
+
+def test_pool_restarts_after_shutdown():
+    pool = WorkerPool(1)
+    assert pool.submit(_square, 3).result(timeout=10) == 9
+    pool.shutdown()
+    assert pool.submit(_square, 4).result(timeout=10) == 16
+    pool.shutdown(wait=True)
+
+
+def test_batch_engine_renders_on_processes_inside_celery_workers(monkeypatch):
+    monkeypatch.setattr(worker_pool, "in_daemon_process", lambda: True)
+    jobs = [{"document_id": n, "template_id": 7, "output_path": f"/tmp/{n}.docx", "values": {}, "encrypt": False}
+            for n in range(4)]
+
+    # No plan was compiled for template 7, so every worker reports the failure
+    results = list(BatchGenerationEngine(max_workers=2)._execute(jobs, {}))
+
+    assert sorted(result["document_id"] for result in results) == [0, 1, 2, 3]
+    assert all(not result["success"] and result["error"] == "7" for result in results)
@@ -0,0 +1,30 @@
+"""
+Tests for the cached authenticated principal
+"""
+
+from types import SimpleNamespace
+
+from app.middleware.auth import Principal, _token_id
+from app.models.user import UserRole, UserStatus
+
+
+def make_user(**overrides):
+    values = dict(id=5, username="ada", email="ada@example.com", role=UserRole.ADMIN,
+                  status=UserStatus.ACTIVE, is_active=True, email_verified=True)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_principal_round_trips_through_cache_form():
+    principal = Principal.from_user(make_user())
+
+    restored = Principal.from_dict(principal.to_dict())
+
+    assert restored == principal
+    assert restored.is_admin
+    assert isinstance(principal.to_dict()["role"], str)
+
+
+def test_token_id_prefers_jti():
+    assert _token_id("token", {"jti": "abc"}) == "abc"
+    assert _token_id("token-a", {}) != _token_id("token-b", {})
@@ -0,0 +1,101 @@
+"""
+Tests for the streaming compression middleware
+"""
+
+import asyncio
+import gzip
+import zlib
+
+from app.middleware.performance import CompressionMiddleware
+
+
+def _app(chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type)]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk,
+                        "more_body": index < len(chunks) - 1})
+    return app
+
+
+def _request(app, path="/api/data", accept_encoding=b"gzip"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "path": path, "headers": [(b"accept-encoding", accept_encoding)]}
+    asyncio.run(app(scope, receive, send))
+    headers = {k.decode(): v.decode() for k, v in messages[0]["headers"]}
+    return headers, messages[1:]
+
+
+def test_streamed_body_is_compressed_incrementally():
+    chunks = [b'{"rows": [' + b'"x", ' * 2000, b'"y"]}']
+    middleware = CompressionMiddleware(_app(chunks))
+    middleware.encodings = ["gzip"]
+
+    headers, body_messages = _request(middleware)
+
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    assert len(body_messages) >= 2
+    assert gzip.decompress(b"".join(m["body"] for m in body_messages)) == b"".join(chunks)
+
+
+def test_each_streamed_chunk_is_decodable_on_arrival():
+    chunks = [b'{"progress": 10}\n', b'{"progress": 50}\n', b'{"progress": 100}\n']
+    middleware = CompressionMiddleware(_app(chunks, b"application/x-ndjson"), minimum_size=0)
+    middleware.encodings = ["gzip"]
+
+    headers, body_messages = _request(middleware)
+    decoder = zlib.decompressobj(31)
+
+    assert headers["content-encoding"] == "gzip"
+    # Nothing is held back in the compressor between chunks
+    for chunk, message in zip(chunks, body_messages):
+        assert decoder.decompress(message["body"]) == chunk
+
+
+def test_event_streams_are_not_compressed():
+    chunks = [b"data: one\n\n", b"data: two\n\n"]
+    middleware = CompressionMiddleware(_app(chunks, b"text/event-stream"), minimum_size=0)
+
+    headers, body_messages = _request(middleware)
+
+    assert "content-encoding" not in headers
+    assert [m["body"] for m in body_messages] == chunks
+
+
+def test_precompressed_media_passes_through():
+    chunks = [b"PK\x03\x04" + bytes(5000)]
+    middleware = CompressionMiddleware(_app(chunks, b"application/zip"))
+
+    headers, body_messages = _request(middleware)
+
+    assert "content-encoding" not in headers
+    assert body_messages[0]["body"] == chunks[0]
+
+
+def test_static_json_variant_is_cached():
+    chunks = [b'{"categories": [' + b'"legal", ' * 500 + b'"tax"]}']
+    middleware = CompressionMiddleware(_app(chunks))
+    middleware.encodings = ["gzip"]
+
+    first = _request(middleware, path="/api/templates/categories")[1][0]["body"]
+    second = _request(middleware, path="/api/templates/categories")[1][0]["body"]
+
+    assert first is second
+    assert gzip.decompress(first) == chunks[0]
+
+
+def test_select_encoding_honours_quality():
+    middleware = CompressionMiddleware(_app([b""]))
+    middleware.encodings = ["zstd", "br", "gzip"]
+
+    assert middleware.select_encoding("gzip, br;q=0.5, zstd;q=0") == "br"
+    assert middleware.select_encoding("identity") is None
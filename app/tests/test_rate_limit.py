@@ -0,0 +1,118 @@
+"""
+Tests for the GCRA rate limiter and its local token leases
+"""
+
+import asyncio
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.middleware.rate_limit import RateLimitMiddleware
+
+
+class FakeGCRAScript:
+    """In-memory stand-in for the Lua script with a frozen clock"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.returned = []
+        self.tat = {}
+
+    async def __call__(self, keys, args):
+        limit, window, requested, returned = args
+        self.calls.append(requested)
+        self.returned.append(returned)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        interval = window / limit
+        now = 0
+        tat = max(self.tat.get(keys[0], now) - returned * interval, now)
+        self.tat[keys[0]] = tat
+        available = int((now + window - tat) // interval)
+        if available < 1:
+            return [0, 0, int(tat - now), int(tat + interval - window - now)]
+        if available < requested * 2:
+            requested = 1
+        granted = min(requested, available)
+        self.tat[keys[0]] = tat + granted * interval
+        return [granted, available - granted, int(self.tat[keys[0]] - now), 0]
+
+
+@pytest.fixture
+def limiter():
+    middleware = RateLimitMiddleware(app=None)
+    middleware._script = FakeGCRAScript()
+    return middleware
+
+
+def check_many(limiter, count, category="default"):
+    async def run():
+        return [await limiter._check_rate_limit("ip:1.2.3.4", category) for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_limit_is_enforced(limiter):
+    results = check_many(limiter, 210)
+
+    assert sum(result.allowed for result in results) == 200
+    denied = results[-1]
+    assert not denied.allowed
+    assert denied.retry_after >= 1
+
+
+def test_hot_clients_spend_local_leases(limiter):
+    results = check_many(limiter, 100)
+
+    assert all(result.allowed for result in results)
+    assert len(limiter._script.calls) < 100
+    assert results[-1].remaining == 100
+
+
+def test_redis_errors_fail_open(limiter):
+    async def broken_script(keys, args):
+        raise RedisError("connection refused")
+
+    limiter._script = broken_script
+
+    assert check_many(limiter, 1)[0].allowed
+
+
+def test_quiet_clients_also_spend_leases(limiter):
+    results = check_many(limiter, 3)
+
+    assert all(result.allowed for result in results)
+    assert len(limiter._script.calls) == 1
+
+
+def test_unspent_lease_tokens_are_returned(limiter):
+    check_many(limiter, 1)
+    lease = next(iter(limiter._leases.values()))
+    unspent = lease.tokens
+    assert unspent > 0
+
+    # The lease lapses before the client comes back
+    lease.expires_at = 0
+    result = check_many(limiter, 1)[0]
+
+    assert limiter._script.returned[-1] == unspent
+    # Only the two requests actually served count against the limit
+    assert result.allowed and result.remaining == 198
+
+
+def test_concurrent_misses_return_unspent_tokens_once(limiter):
+    limiter._script = FakeGCRAScript(delay=0.01)
+    check_many(limiter, 1)
+    lease = next(iter(limiter._leases.values()))
+    unspent = lease.tokens
+    lease.expires_at = 0
+
+    async def burst():
+        return await asyncio.gather(*[limiter._check_rate_limit("ip:1.2.3.4", "default") for _ in range(10)])
+
+    results = asyncio.run(burst())
+    results += check_many(limiter, 300)
+
+    assert sum(limiter._script.returned) == unspent
+    # No grant is discarded, so the whole limit is served
+    assert sum(result.allowed for result in results) + 1 == 200
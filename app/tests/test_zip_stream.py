@@ -0,0 +1,55 @@
+"""
+Tests for the streaming ZIP writer used by batch downloads
+"""
+
+import io
+import zipfile
+
+from app.utils.zip_stream import stream_zip
+
+
+def test_stream_zip_round_trip(tmp_path):
+    """Streamed archives are valid and keep member contents intact"""
+    text_file = tmp_path / "notes.txt"
+    text_file.write_text("hello " * 1000)
+    pdf_file = tmp_path / "report.pdf"
+    pdf_file.write_bytes(b"%PDF-1.4" + bytes(range(256)) * 400)
+
+    chunks = list(stream_zip(
+        [(str(text_file), "notes.txt"), (str(pdf_file), "report.pdf")],
+        chunk_size=4096
+    ))
+
+    assert len(chunks) > 2
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.read("notes.txt") == text_file.read_bytes()
+        assert archive.read("report.pdf") == pdf_file.read_bytes()
+
+
+def test_stream_zip_stores_precompressed_formats(tmp_path):
+    """Already-compressed formats are stored, text is deflated"""
+    (tmp_path / "a.docx").write_bytes(b"PK" * 100)
+    (tmp_path / "b.txt").write_text("text")
+
+    data = b"".join(stream_zip([
+        (str(tmp_path / "a.docx"), "a.docx"),
+        (str(tmp_path / "b.txt"), "b.txt"),
+    ]))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.getinfo("a.docx").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("b.txt").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_stream_zip_skips_missing_files(tmp_path):
+    """Missing files are skipped instead of failing the whole archive"""
+    (tmp_path / "present.txt").write_text("ok")
+
+    data = b"".join(stream_zip([
+        (str(tmp_path / "missing.txt"), "missing.txt"),
+        (str(tmp_path / "present.txt"), "present.txt"),
+    ]))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ["present.txt"]
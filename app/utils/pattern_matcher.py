@@ -0,0 +1,142 @@
+"""
+Shared multi-pattern matching for request screening and input sanitizing
+
+Every rule set is compiled once, at import, into a single alternation of
+named groups, so checking a string costs one regex pass however many rules
+the set holds, instead of one scan per pattern. The middlewares and the
+document sanitizer all use the rule sets defined here, and every match is
+counted per rule so the monitoring stats show which rules actually fire.
+"""
+
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+
+class MultiPatternMatcher:
+    """A named set of rules matched together in one pass"""
+
+    def __init__(self, name: str, rules: Dict[str, str], literal: bool = False, flags: int = 0):
+        self.name = name
+        self.rule_names = list(rules)
+        alternatives = (
+            f"(?P<r{index}>{re.escape(pattern) if literal else pattern})"
+            for index, pattern in enumerate(rules.values())
+        )
+        self.pattern = re.compile("|".join(alternatives), flags)
+        self._hits: Counter = Counter()
+        self._lock = threading.Lock()
+
+        _registry[name] = self
+
+    def _rule(self, match: re.Match) -> str:
+        return self.rule_names[int(match.lastgroup[1:])]
+
+    def _count(self, rule: str) -> None:
+        with self._lock:
+            self._hits[rule] += 1
+
+    def search(self, *texts: str) -> Optional[str]:
+        """Name of the first rule matching any of the texts, or None"""
+        for text in texts:
+            match = self.pattern.search(text)
+            if match:
+                rule = self._rule(match)
+                self._count(rule)
+                return rule
+        return None
+
+    def sub(self, text: str, replacement: str = "") -> str:
+        """Remove every match, repeating until removals stop exposing new ones"""
+
+        def replace(match: re.Match) -> str:
+            self._count(self._rule(match))
+            return replacement
+
+        while True:
+            result = self.pattern.sub(replace, text)
+            if result == text or replacement:
+                return result
+            text = result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {rule: self._hits[rule] for rule in self.rule_names}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits.clear()
+
+
+_registry: Dict[str, MultiPatternMatcher] = {}
+
+
+def get_pattern_stats(names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+    """Per-rule hit counts for each rule set"""
+    return {
+        name: matcher.stats()
+        for name, matcher in _registry.items()
+        if names is None or name in names
+    }
+
+
+# Injection markers in a lowercased URL path or query string
+URL_ATTACKS = MultiPatternMatcher("url_attacks", {
+    "union_select": "union select",
+    "drop_table": "drop table",
+    "delete_from": "delete from",
+    "insert_into": "insert into",
+    "update_set": "update set",
+    "exec_call": "exec(",
+    "script_tag": "script>",
+    "javascript_uri": "javascript:",
+    "vbscript_uri": "vbscript:",
+    "onload_handler": "onload=",
+    "onerror_handler": "onerror=",
+    "iframe_tag": "<iframe",
+    "object_tag": "<object",
+    "embed_tag": "<embed",
+}, literal=True)
+
+# Directory traversal in a lowercased URL path
+PATH_TRAVERSAL = MultiPatternMatcher("path_traversal", {
+    "dot_dot_slash": "../",
+    "encoded_slash": "..%2f",
+    "encoded_backslash": "..%5c",
+}, literal=True)
+
+# Vulnerability scanners, matched against the lowercased User-Agent
+SCANNER_AGENTS = MultiPatternMatcher("scanner_agents", {
+    "sqlmap": "sqlmap",
+    "nikto": "nikto",
+    "dirbuster": "dirbuster",
+    "burp": "burp",
+    "nessus": "nessus",
+    "whatweb": "whatweb",
+    "wpscan": "wpscan",
+    "metasploit": "metasploit",
+}, literal=True)
+
+# Stricter screening of the raw path and query, used by AdvancedSecurityMiddleware
+REQUEST_INJECTION = MultiPatternMatcher("request_injection", {
+    "sql_injection": r"(?i:union\s+select|drop\s+table|insert\s+into|delete\s+from)",
+    "xss": r"(?i:<script|javascript:|on\w+\s*=)",
+    "path_traversal": r"\.\./|\.\.\\|%2e%2e",
+    "command_injection": r"(?i:;|\||&|\$\(|`|nc\s+|wget\s+|curl\s+)",
+})
+
+# Code and markup fragments stripped from placeholder values
+PLACEHOLDER_INJECTION = MultiPatternMatcher("placeholder_injection", {
+    "script_block": r"<script[^>]*>.*?</script>",
+    "javascript_uri": r"javascript:",
+    "vbscript_uri": r"vbscript:",
+    "event_handler": r"on\w+\s*=",
+    "eval_call": r"eval\s*\(",
+    "exec_call": r"exec\s*\(",
+    "system_call": r"system\s*\(",
+    "import_statement": r"import\s+\w+",
+    "dunder": r"__\w+__",
+    "dot_dot_slash": r"\.\./",
+    "double_backslash": r"\\\\",
+}, flags=re.IGNORECASE)
@@ -0,0 +1,104 @@
+"""
+Process pools for CPU-bound work, usable from the API and from Celery workers
+
+The standard library refuses to start child processes from a daemonic
+process, and Celery prefork children are daemonic. Inside a Celery child the
+pool is therefore built on billiard, Celery's own fork of multiprocessing,
+which allows it; everywhere else it is a ProcessPoolExecutor. Either way
+callers get concurrent.futures Futures, and a pool whose worker crashed is
+replaced on the next submit.
+"""
+
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Set, Tuple
+
+import billiard
+
+logger = logging.getLogger(__name__)
+
+
+def in_daemon_process() -> bool:
+    """Whether this process may not fork children through the standard library"""
+    return multiprocessing.current_process().daemon or billiard.current_process().daemon
+
+
+class _BilliardExecutor:
+    """The submit/shutdown subset of an Executor, backed by a billiard pool"""
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        self._pool = billiard.Pool(processes=max_workers, initializer=initializer, initargs=initargs)
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+
+        def failed(error):
+            # billiard reports failures wrapped in an ExceptionInfo
+            future.set_exception(getattr(error, "exception", error))
+
+        self._pool.apply_async(fn, args, callback=future.set_result, error_callback=failed)
+        return future
+
+    def _discard(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        if wait and not cancel_futures:
+            self._pool.close()
+            self._pool.join()
+            return
+
+        self._pool.terminate()
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for future in pending:
+            future.cancel()
+
+
+class WorkerPool:
+    """A process pool started on first use and restarted if a worker breaks it"""
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None, initargs: Tuple = ()):
+        self.max_workers = max(1, max_workers)
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if in_daemon_process():
+                    self._executor = _BilliardExecutor(self.max_workers, self.initializer, self.initargs)
+                else:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=self.initializer,
+                        initargs=self.initargs
+                    )
+            return self._executor
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        try:
+            return self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a fresh one
+            logger.warning("Worker pool broken by a crashed worker; restarting it")
+            self.shutdown()
+            return self._get_executor().submit(fn, *args)
+
+    def shutdown(self, wait: bool = False, cancel_futures: bool = True) -> None:
+        """Stop the pool; the next submit starts a new one"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -0,0 +1,84 @@
+"""
+Streaming ZIP writer
+Builds ZIP archives chunk by chunk so they can be sent as they are produced
+"""
+
+import os
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+# Formats that are already compressed; deflating them again only costs CPU
+PRECOMPRESSED_EXTENSIONS = {
+    ".docx", ".xlsx", ".pptx", ".pdf", ".png", ".jpg", ".jpeg", ".gif",
+    ".webp", ".zip", ".gz", ".7z", ".mp3", ".mp4",
+}
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer:
+    """Write-only sink for ZipFile.
+
+    It deliberately has no `seek`/`tell`, so zipfile writes local headers
+    with data descriptors instead of seeking back, which lets every byte be
+    handed to the client as soon as it is written.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compression_for(filename: str) -> int:
+    """Pick ZIP_STORED for already-compressed formats, ZIP_DEFLATED otherwise"""
+    extension = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if extension in PRECOMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def stream_zip(entries: Iterable[Tuple[str, str]],
+               chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a ZIP archive of `(file_path, archive_name)` entries.
+
+    Members are read and compressed `chunk_size` bytes at a time, so memory
+    stays bounded by roughly one chunk plus the compressor state regardless
+    of archive size. Missing files are skipped.
+    """
+    sink = _ZipStreamBuffer()
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for file_path, archive_name in entries:
+            if not file_path or not os.path.exists(file_path):
+                continue
+
+            zinfo = zipfile.ZipInfo.from_file(file_path, archive_name)
+            zinfo.compress_type = compression_for(archive_name)
+            force_zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT
+
+            with open(file_path, "rb") as source, archive.open(zinfo, mode="w", force_zip64=force_zip64) as member:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+            # Data descriptor for the finished member
+            data = sink.drain()
+            if data:
+                yield data
+
+    # Central directory
+    data = sink.drain()
+    if data:
+        yield data
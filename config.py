@@ -122,6 +122,19 @@ class Settings(BaseSettings):
     # When True, attempt to generate thumbnails synchronously for previews (may be skipped in async environments).
     ENABLE_SYNC_THUMBNAILS: bool = os.getenv("ENABLE_SYNC_THUMBNAILS",
                                              "false").lower() == "true"
+    # Widths rendered for every document (3:4 boxes) and the render pool size
+    THUMBNAIL_SIZES: List[int] = [int(width) for width in os.getenv("THUMBNAIL_SIZES", "150,300,600").split(",")]
+    THUMBNAIL_MAX_WORKERS: int = int(os.getenv("THUMBNAIL_MAX_WORKERS", "0"))  # 0 = min(4, CPU count)
+
+    # Sitemap shards, index and regeneration manifest
+    SITEMAPS_PATH: str = os.getenv("SITEMAPS_PATH", os.path.join(STORAGE_PATH, "sitemaps"))
+
+    # Realtime drafts: write-behind journal flush cadence and batch size
+    DRAFT_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("DRAFT_FLUSH_INTERVAL_SECONDS", "3"))
+    DRAFT_FLUSH_BATCH_SIZE: int = int(os.getenv("DRAFT_FLUSH_BATCH_SIZE", "500"))
+
+    # Background analytics export jobs (output files and checkpoints)
+    EXPORTS_PATH: str = os.getenv("EXPORTS_PATH", os.path.join(STORAGE_PATH, "exports"))
 
     # Flutterwave
     FLUTTERWAVE_PUBLIC_KEY: str = os.getenv("FLUTTERWAVE_PUBLIC_KEY", "")
@@ -146,10 +159,34 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
     SMTP_FROM_EMAIL: str = os.getenv("SMTP_FROM_EMAIL", "noreply@mytypist.com")
 
+    # Email delivery: provider timeouts, circuit breakers and the outbox dispatcher
+    EMAIL_PROVIDER_TIMEOUT: float = float(os.getenv("EMAIL_PROVIDER_TIMEOUT", "10"))  # seconds
+    EMAIL_BREAKER_FAILURES: int = int(os.getenv("EMAIL_BREAKER_FAILURES", "5"))
+    EMAIL_BREAKER_RESET_SECONDS: float = float(os.getenv("EMAIL_BREAKER_RESET_SECONDS", "60"))
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "100"))
+    EMAIL_OUTBOX_CONCURRENCY: int = int(os.getenv("EMAIL_OUTBOX_CONCURRENCY", "10"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+    EMAIL_OUTBOX_POLL_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+
     # Performance
     CACHE_TTL: int = 3600  # 1 hour
     TEMPLATE_CACHE_TTL: int = 86400  # 24 hours
     DOCUMENT_GENERATION_TIMEOUT: int = 30  # seconds
+    TEMPLATE_RENDER_PLAN_CACHE_SIZE: int = int(os.getenv("TEMPLATE_RENDER_PLAN_CACHE_SIZE", "128"))
+    CACHE_L1_NAMESPACE_BUDGET_BYTES: int = int(os.getenv("CACHE_L1_NAMESPACE_BUDGET_BYTES", str(16 * 1024 * 1024)))
+    CACHE_L1_TEMPLATE_BUDGET_BYTES: int = int(os.getenv("CACHE_L1_TEMPLATE_BUDGET_BYTES", str(64 * 1024 * 1024)))
+    # Host-wide cache tier on tmpfs (e.g. /dev/shm/mytypist-cache); empty disables it
+    CACHE_SHARED_MEMORY_DIR: str = os.getenv("CACHE_SHARED_MEMORY_DIR", "")
+    CACHE_SHARED_MEMORY_MAX_BYTES: int = int(os.getenv("CACHE_SHARED_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+    CACHE_SHARED_MEMORY_NAMESPACES: List[str] = os.getenv("CACHE_SHARED_MEMORY_NAMESPACES", "template,template_placeholders").split(",")
+    BATCH_GENERATION_MAX_WORKERS: int = int(os.getenv("BATCH_GENERATION_MAX_WORKERS", "0"))  # 0 = CPU count
+    SIGNATURE_MAX_WORKERS: int = int(os.getenv("SIGNATURE_MAX_WORKERS", "0"))  # 0 = min(4, CPU count)
+    TOKEN_COST_CACHE_TTL: int = int(os.getenv("TOKEN_COST_CACHE_TTL", "300"))  # seconds
+    CAMPAIGN_CHUNK_SIZE: int = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "500"))
+    CAMPAIGN_EMAIL_CONCURRENCY: int = int(os.getenv("CAMPAIGN_EMAIL_CONCURRENCY", "20"))
+    CAMPAIGN_LEASE_SECONDS: int = int(os.getenv("CAMPAIGN_LEASE_SECONDS", "300"))  # renewed after every chunk
+    # Sends per second for each email provider, e.g. "sendgrid:100,smtp:5"
+    CAMPAIGN_EMAIL_RATE_LIMITS: str = os.getenv("CAMPAIGN_EMAIL_RATE_LIMITS", "sendgrid:100,resend:10,smtp:5")
 
     # Advanced Performance Settings
     MAX_CONCURRENT_UPLOADS: int = 10
@@ -173,6 +210,14 @@ class Settings(BaseSettings):
     SOC2_ENABLED: bool = True
     AUDIT_LOG_RETENTION_DAYS: int = 2555  # 7 years
 
+    # Audit events are queued and written in batches by a background writer
+    AUDIT_QUEUE_MAX_SIZE: int = int(os.getenv("AUDIT_QUEUE_MAX_SIZE", "10000"))
+    AUDIT_BATCH_SIZE: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    AUDIT_FLUSH_INTERVAL: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))  # seconds
+    AUDIT_ENQUEUE_TIMEOUT: float = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))  # backpressure wait before spilling
+    AUDIT_SPILL_PATH: str = os.getenv("AUDIT_SPILL_PATH", os.path.join(STORAGE_PATH, "audit_spill.jsonl"))
+    AUDIT_DEAD_LETTER_PATH: str = os.getenv("AUDIT_DEAD_LETTER_PATH", os.path.join(STORAGE_PATH, "audit_dead_letter.jsonl"))
+
     # Subscription Plans
     FREE_PLAN_DOCUMENTS_PER_MONTH: int = 5
     BASIC_PLAN_DOCUMENTS_PER_MONTH: int = 100
@@ -12,6 +12,7 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
 import redis
+import redis.asyncio as redis_async
 from celery import Celery
 
 from config import settings
@@ -26,7 +27,8 @@ from app.middleware.performance import PerformanceMiddleware, CompressionMiddlew
 from app.middleware.advanced_security import RequestValidationMiddleware
 from app.middleware.csrf_protection import CSRFProtectionMiddleware
 from app.middleware.guest_session import GuestSessionMiddleware
-from app.services.audit_service import AuditService
+from app.services.audit_service import AuditService, audit_writer
+from app.services.realtime_drafts_service import realtime_drafts_manager
 from app.services.cache_service import cache_service
 # Enterprise services removed for MVP
 
@@ -62,7 +64,7 @@ celery_app = Celery(
     "mytypist",
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
-    include=['app.tasks.document_tasks', 'app.tasks.payment_tasks', 'app.tasks.cleanup_tasks']
+    include=['app.tasks.document_tasks', 'app.tasks.payment_tasks', 'app.tasks.cleanup_tasks', 'app.tasks.export_tasks', 'app.tasks.template_tasks', 'app.tasks.campaign_tasks', 'app.tasks.email_tasks']
 )
 
 # Configure Celery
@@ -111,10 +113,17 @@ async def lifespan(app: FastAPI):
 
     # Initialize audit service
     try:
+        audit_writer.start()
         AuditService.log_system_event(audit.AuditEventType.SYSTEM_STARTUP.value, {"service": settings.APP_NAME})
     except Exception as e:
         print(f"⚠️ Audit service failed to start: {e}")
 
+    # Realtime drafts write-behind journal
+    try:
+        realtime_drafts_manager.start()
+    except Exception as e:
+        print(f"⚠️ Draft journal failed to start: {e}")
+
     # Enterprise RBAC system removed for MVP
 
     yield
@@ -123,9 +132,28 @@ async def lifespan(app: FastAPI):
     print("🛑 MyTypist Backend Shutting down...")
     try:
         AuditService.log_system_event(audit.AuditEventType.SYSTEM_SHUTDOWN.value, {})
+        audit_writer.stop()
     except Exception as e:
         print(f"⚠️ Audit service error during shutdown: {e}")
 
+    try:
+        await realtime_drafts_manager.stop()
+    except Exception as e:
+        print(f"⚠️ Draft journal error during shutdown: {e}")
+
+    try:
+        await cache_service.close()
+    except Exception as e:
+        print(f"⚠️ Cache service error during shutdown: {e}")
+
+    try:
+        from app.services.thumbnail_service import thumbnail_service
+        from app.services.signature_service import signature_pool
+        thumbnail_service.shutdown()
+        signature_pool.shutdown()
+    except Exception as e:
+        print(f"⚠️ Worker pool error during shutdown: {e}")
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -144,7 +172,17 @@ app.add_middleware(SecurityMiddleware)
 app.add_middleware(RequestValidationMiddleware)
 app.add_middleware(CSRFProtectionMiddleware)
 app.add_middleware(AuditMiddleware)
-app.add_middleware(RateLimitMiddleware, redis_client=redis_client)  # type: ignore
+app.add_middleware(
+    RateLimitMiddleware,
+    redis_client=redis_async.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        retry_on_timeout=True
+    ) if REDIS_AVAILABLE else None
+)
 
 # CORS middleware
 app.add_middleware(